@@ -0,0 +1,158 @@
+"""
+Benchmark del checkpointer persistente (``src.graph.checkpointer``).
+
+Simula un pipeline de ``--steps`` pasos sobre los ``files`` de un estado
+exportado: cada paso reescribe un archivo (como lo hacen las herramientas) y
+LangGraph guarda un checkpoint. Reporta, frente a un checkpoint JSON plano del
+estado completo en cada paso:
+
+* tamaño total en disco y bytes escritos por checkpoint,
+* latencia de escritura por checkpoint (mediana),
+* tiempo de reanudación (``get_tuple`` del último checkpoint con un saver nuevo).
+
+Uso:
+    python -m benchmarks.checkpointer_benchmark tests/state_after_consolidation.json
+    python -m benchmarks.checkpointer_benchmark tests/state_example.json --steps 40
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import Annotated, TypedDict
+
+from src.graph.checkpointer import CompactSqliteSaver
+from src.graph.state import file_reducer
+
+DEFAULT_INPUT = "tests/state_after_consolidation.json"
+
+
+class _BenchState(TypedDict):
+    files: Annotated[Dict[str, Any], file_reducer]
+
+
+def _load_files(path: str) -> Dict[str, Any]:
+    """Extrae ``files`` de un estado exportado (``{"state": ...}``, ``{"output": [...]}`` o directo)."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if isinstance(data.get("state"), dict):
+        data = data["state"]
+    if isinstance(data.get("output"), list):
+        files: Dict[str, Any] = {}
+        for command in data["output"]:
+            files.update((command.get("update") or {}).get("files") or {})
+        return files
+    return data.get("files") or {}
+
+
+def _build_graph(paths: List[str], steps: int, checkpointer: CompactSqliteSaver):
+    builder = StateGraph(_BenchState)
+
+    def make_node(step: int):
+        def node(state: _BenchState) -> Dict[str, Any]:
+            path = paths[step % len(paths)]
+            entry = dict(state["files"][path])
+            entry["modified_at"] = datetime.now(timezone.utc).isoformat()
+            return {"files": {path: entry}}
+        return node
+
+    previous = START
+    for step in range(steps):
+        name = f"step_{step}"
+        builder.add_node(name, make_node(step))
+        builder.add_edge(previous, name)
+        previous = name
+    builder.add_edge(previous, END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def benchmark(path: str, steps: int) -> Dict[str, Any]:
+    files = _load_files(path)
+    if not files:
+        raise ValueError(f"{path} no contiene 'files'")
+    paths = sorted(files)
+
+    # Referencia: un JSON plano del estado completo por checkpoint
+    json_sizes: List[int] = []
+    json_ms: List[float] = []
+    for _ in range(steps):
+        started = time.perf_counter()
+        json_sizes.append(len(json.dumps({"files": files}, ensure_ascii=False).encode("utf-8")))
+        json_ms.append((time.perf_counter() - started) * 1000)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = str(Path(tmp_dir) / "checkpoints.sqlite")
+        saver = CompactSqliteSaver(db_path)
+        graph = _build_graph(paths, steps, saver)
+        config = {"configurable": {"thread_id": "benchmark"}}
+
+        put_ms: List[float] = []
+        original_put = saver.put
+
+        def timed_put(*args, **kwargs):
+            started = time.perf_counter()
+            result = original_put(*args, **kwargs)
+            put_ms.append((time.perf_counter() - started) * 1000)
+            return result
+
+        saver.put = timed_put
+        graph.invoke({"files": files}, config)
+        saver.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db_bytes = Path(db_path).stat().st_size
+
+        resumed = CompactSqliteSaver(db_path)
+        started = time.perf_counter()
+        snapshot = resumed.get_tuple(config)
+        resume_ms = (time.perf_counter() - started) * 1000
+        restored = snapshot.checkpoint["channel_values"]["files"] if snapshot else {}
+
+    return {
+        "input": path,
+        "files": len(files),
+        "checkpoints": int(saver.stats["puts"]),
+        "json": {
+            "total_bytes": sum(json_sizes),
+            "bytes_per_checkpoint": round(statistics.mean(json_sizes)),
+            "encode_ms_median": round(statistics.median(json_ms), 2),
+        },
+        "compact_sqlite": {
+            "db_bytes": db_bytes,
+            "bytes_written": int(saver.stats["put_bytes"]),
+            "bytes_per_checkpoint": round(saver.stats["put_bytes"] / max(1, saver.stats["puts"])),
+            "put_ms_median": round(statistics.median(put_ms), 2) if put_ms else None,
+            "file_entries_written": int(saver.stats["file_entries_written"]),
+            "file_entries_shared": int(saver.stats["file_entries_shared"]),
+            "resume_ms": round(resume_ms, 2),
+            "restored_files": len(restored),
+            "codec": saver.serde.codec,
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", default=[DEFAULT_INPUT], help="JSON de estado exportado")
+    parser.add_argument("--steps", type=int, default=20, help="Pasos (checkpoints) a simular")
+    args = parser.parse_args(argv)
+
+    results = []
+    for path in args.inputs:
+        result = benchmark(path, max(1, args.steps))
+        results.append(result)
+        compact = result["compact_sqlite"]
+        print(
+            f"{path}: json={result['json']['total_bytes']} B "
+            f"sqlite={compact['db_bytes']} B ({compact['codec']}) "
+            f"put={compact['put_ms_median']} ms resume={compact['resume_ms']} ms"
+        )
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark del motor de segmentación de markdown (``src.tools.clean_markdown_engine``).
+
+Mide cada etapa del pipeline para todos los perfiles (legacy, reference, sbs), de
+modo que cualquier optimización del motor se evalúa una sola vez para ambos caminos.
+Por defecto la detección de encabezados se simula a partir de los encabezados que
+reconoce el chunker (sin LLM); con ``--llm`` se ejecuta el pipeline completo.
+
+Uso:
+    python -m benchmarks.clean_markdown_benchmark tests/aprocitentan_markdown.md
+    python -m benchmarks.clean_markdown_benchmark tests/state_example.json --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.tools.clean_markdown_engine import (
+    DOCUMENT_PROFILES,
+    _assign_stable_ids,
+    _build_markdown_segments,
+    _canonicalize_headers,
+    _filter_primary_test_methods,
+    _split_markdown_into_chunks,
+    get_profile,
+    run_segmentation_pipeline,
+)
+from src.utils.markdown_chunker import _parse_heading
+
+DEFAULT_INPUT = "tests/aprocitentan_markdown.md"
+
+
+def _iter_markdown_values(obj: Any) -> Iterator[str]:
+    """Busca valores ``markdown_completo`` dentro de un JSON de estado."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key == "markdown_completo" and isinstance(value, str):
+                yield value
+            else:
+                yield from _iter_markdown_values(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _iter_markdown_values(value)
+
+
+def _load_markdown(path: str) -> str:
+    """Lee un archivo .md o el primer ``markdown_completo`` de un JSON de estado."""
+    file_path = Path(path)
+    if file_path.suffix.lower() == ".json":
+        data = json.loads(file_path.read_text(encoding="utf-8"))
+        markdown = next(_iter_markdown_values(data), None)
+        if markdown is None:
+            raise ValueError(f"{path} no contiene 'markdown_completo'")
+        return markdown
+    return file_path.read_text(encoding="utf-8")
+
+
+def _headers_from_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Optional[str]]]:
+    """Simula la salida del LLM usando los encabezados detectados por el chunker."""
+    headers: List[Dict[str, Optional[str]]] = []
+    for chunk in chunks:
+        for title in chunk["sections"]:
+            parsed = _parse_heading(title) or {"section_id": None}
+            headers.append({"raw": title, "title": title, "section_id": parsed["section_id"]})
+    return headers
+
+
+def _timed(timings: Dict[str, List[float]], stage: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def benchmark_profile(markdown: str, profile_name: str, repeat: int, use_llm: bool) -> Dict[str, Any]:
+    """Ejecuta el pipeline ``repeat`` veces y devuelve tiempos por etapa (ms) y tamaños."""
+    profile = get_profile(profile_name)
+    timings: Dict[str, List[float]] = {}
+    summary: Dict[str, Any] = {}
+
+    for _ in range(repeat):
+        if use_llm:
+            items, report = _timed(timings, "pipeline_llm", run_segmentation_pipeline, markdown, profile_name)
+            summary = {"chunks": len(report["chunks"]), "items": len(items)}
+            continue
+
+        preprocessed = _timed(timings, "preprocess", profile["preprocess"], markdown)
+        chunks = _timed(timings, "chunking", _split_markdown_into_chunks, preprocessed)
+        headers = _headers_from_chunks(chunks)
+        filtered = _timed(timings, "filter", _filter_primary_test_methods, headers)
+        canonical, _ = _timed(timings, "canonicalize", _canonicalize_headers, filtered, preprocessed)
+        items = _timed(timings, "segments", _build_markdown_segments, canonical, preprocessed)
+        _timed(timings, "stable_ids", _assign_stable_ids, items, None)
+        summary = {
+            "chars": len(preprocessed),
+            "chunks": len(chunks),
+            "tokens": sum(chunk["token_count"] for chunk in chunks),
+            "items": len(items),
+        }
+
+    return {
+        "profile": profile_name,
+        **summary,
+        "stages_ms": {stage: round(statistics.median(values), 2) for stage, values in timings.items()},
+        "total_ms": round(sum(statistics.median(values) for values in timings.values()), 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", default=[DEFAULT_INPUT], help="Archivos .md o JSON de estado")
+    parser.add_argument("--profiles", nargs="*", default=list(DOCUMENT_PROFILES), help="Perfiles a medir")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por perfil (se reporta la mediana)")
+    parser.add_argument("--llm", action="store_true", help="Ejecuta el pipeline completo con el LLM")
+    args = parser.parse_args(argv)
+
+    results = []
+    for path in args.inputs:
+        markdown = _load_markdown(path)
+        for profile_name in args.profiles:
+            result = benchmark_profile(markdown, profile_name, max(1, args.repeat), args.llm)
+            result["input"] = path
+            results.append(result)
+            print(
+                f"{path} [{profile_name}] total={result['total_ms']} ms "
+                f"chunks={result.get('chunks')} items={result.get('items')} "
+                f"etapas={result['stages_ms']}"
+            )
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
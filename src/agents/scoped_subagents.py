@@ -0,0 +1,140 @@
+"""
+Subagentes con alcance acotado del filesystem virtual.
+
+Por defecto la herramienta ``task`` de deepagents entrega al subagente todo el
+estado (``files`` completo, con cada markdown y cada ítem segmentado) y al
+terminar devuelve al supervisor el ``files`` completo del subagente, que el
+reducer vuelve a fusionar. Aquí cada subagente declara en su configuración
+(``file_scope``) los prefijos de ruta que lee y los que escribe:
+
+* Entrada: solo las entradas cuyos paths empiezan con un prefijo de lectura o
+  escritura.
+* Salida: solo el delta dentro de los prefijos de escritura (entradas nuevas o
+  reemplazadas y tombstones de las eliminadas). Lo escrito fuera de alcance se
+  descarta con una advertencia.
+
+El subagente se compila con el mismo middleware que usa ``create_deep_agent``
+para sus subagentes y se entrega como ``CompiledSubAgent``.
+"""
+
+import logging
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from deepagents import CompiledSubAgent, FilesystemMiddleware
+from deepagents.middleware.patch_tool_calls import PatchToolCallsMiddleware
+from langchain.agents import create_agent
+from langchain.agents.middleware import TodoListMiddleware
+from langchain.agents.middleware.summarization import SummarizationMiddleware
+from langchain_anthropic.middleware import AnthropicPromptCachingMiddleware
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from src.graph.state import FILE_TOMBSTONE
+
+logger = logging.getLogger(__name__)
+
+# Mismos umbrales que create_deep_agent para los subagentes
+SUMMARY_MAX_TOKENS = 170000
+SUMMARY_MESSAGES_TO_KEEP = 6
+
+
+def _in_scope(path: str, prefixes: Tuple[str, ...]) -> bool:
+    return path.startswith(prefixes)
+
+
+def scope_files(files: Dict[str, Any], prefixes: Sequence[str]) -> Dict[str, Any]:
+    """Subconjunto de ``files`` visible para el subagente."""
+    prefixes = tuple(prefixes)
+    return {path: entry for path, entry in files.items() if _in_scope(path, prefixes)}
+
+
+def files_delta(
+    before: Dict[str, Any], after: Dict[str, Any], write_prefixes: Sequence[str], name: str = ""
+) -> Dict[str, Any]:
+    """
+    Delta de ``files`` entre la entrada y la salida del subagente.
+
+    Las entradas sin cambios conservan su identidad a través del reducer, por lo
+    que la comparación por ``is`` evita comparar payloads completos.
+    """
+    prefixes = tuple(write_prefixes)
+    delta: Dict[str, Any] = {}
+    ignored = []
+    for path, entry in after.items():
+        previous = before.get(path)
+        if previous is entry or previous == entry:
+            continue
+        if _in_scope(path, prefixes):
+            delta[path] = entry
+        else:
+            ignored.append(path)
+    for path in before:
+        if path not in after and _in_scope(path, prefixes):
+            delta[path] = FILE_TOMBSTONE
+    if ignored:
+        logger.warning("Subagente %s escribió fuera de su alcance; se descartan: %s", name, ignored)
+    return delta
+
+
+def _subagent_middleware(model: Any, backend: Any) -> list:
+    return [
+        TodoListMiddleware(),
+        FilesystemMiddleware(backend=backend),
+        SummarizationMiddleware(
+            model=model,
+            max_tokens_before_summary=SUMMARY_MAX_TOKENS,
+            messages_to_keep=SUMMARY_MESSAGES_TO_KEEP,
+        ),
+        AnthropicPromptCachingMiddleware(unsupported_model_behavior="ignore"),
+        PatchToolCallsMiddleware(),
+    ]
+
+
+def scoped_subagent(spec: Dict[str, Any], model: Any, backend: Any = None) -> Dict[str, Any]:
+    """
+    Convierte la configuración de un subagente en un ``CompiledSubAgent`` con alcance.
+
+    Args:
+        spec: Configuración de ``sub_agents_config`` (``name``, ``description``,
+            ``system_prompt``, ``tools``, ``model`` y ``file_scope`` con
+            ``read``/``write``). Sin ``file_scope`` se retorna tal cual.
+        model: Modelo por defecto (supervisor), usado también para resumir.
+        backend: Backend de archivos del supervisor.
+    """
+    scope = spec.get("file_scope")
+    if not scope:
+        return spec
+
+    name = spec["name"]
+    write_prefixes = tuple(scope.get("write") or ())
+    visible_prefixes = tuple(scope.get("read") or ()) + write_prefixes
+    agent = create_agent(
+        spec.get("model", model),
+        system_prompt=spec["system_prompt"],
+        tools=spec.get("tools", []),
+        middleware=_subagent_middleware(model, backend),
+    )
+
+    def _prepare(state: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        files = state.get("files") or {}
+        scoped = scope_files(files, visible_prefixes)
+        logger.info("Subagente %s: %d de %d archivos en su alcance", name, len(scoped), len(files))
+        return {**state, "files": scoped}, scoped
+
+    def _finish(result: Dict[str, Any], scoped: Dict[str, Any]) -> Dict[str, Any]:
+        delta = files_delta(scoped, result.get("files") or {}, write_prefixes, name)
+        logger.info("Subagente %s: devuelve %d archivos modificados", name, len(delta))
+        return {"files": delta, "messages": result["messages"]}
+
+    def invoke(state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        scoped_state, scoped = _prepare(state)
+        return _finish(agent.invoke(scoped_state, config), scoped)
+
+    async def ainvoke(state: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+        scoped_state, scoped = _prepare(state)
+        return _finish(await agent.ainvoke(scoped_state, config), scoped)
+
+    return CompiledSubAgent(
+        name=name,
+        description=spec["description"],
+        runnable=RunnableLambda(invoke, afunc=ainvoke, name=name),
+    )
@@ -8,10 +8,16 @@ legacy_migration_subagent = {
     "tools": [
         pdf_da_metadata_toc,
         test_solution_clean_markdown,
+        test_solution_structured_extraction_batch,
         test_solution_structured_extraction,
         consolidate_test_solution_structured,
     ],
-    "model": "openai:gpt-5-mini"
+    "model": "openai:gpt-5-mini",
+    # Prefijos del filesystem virtual que recibe y puede devolver (ver scoped_subagents)
+    "file_scope": {
+        "read": [],
+        "write": ["/actual_method/", "/temp_actual_method/", "/analytical_tests/"],
+    },
 }
 
 change_control_subagent = {
@@ -19,7 +25,11 @@ change_control_subagent = {
     "description": "Delega a este agente siempre que te entreguen un documento de control de cambios. Este agente se encargará de ejecutar las herramientas requeridas para generar un json estructurado con el método analítico en el formato nuevo",
     "system_prompt": CHANGE_CONTROL_AGENT_INSTRUCTIONS,
     "tools": [extract_annex_cc],
-    "model": "openai:gpt-5-mini"
+    "model": "openai:gpt-5-mini",
+    "file_scope": {
+        "read": [],
+        "write": ["/new/change_control", "/change_control/"],
+    },
 }
 
 side_by_side_subagent = {
@@ -29,10 +39,15 @@ side_by_side_subagent = {
     "tools": [
         sbs_proposed_column_to_pdf_md,
         test_solution_clean_markdown_sbs,
+        test_solution_structured_extraction_batch,
         test_solution_structured_extraction,
         consolidate_test_solution_structured,
     ],
-    "model": "openai:gpt-5-mini"
+    "model": "openai:gpt-5-mini",
+    "file_scope": {
+        "read": [],
+        "write": ["/proposed_method/", "/temp_proposed_method/", "/analytical_tests/"],
+    },
 }
 
 reference_methods_subagent = {
@@ -42,10 +57,15 @@ reference_methods_subagent = {
     "tools": [
         pdf_da_metadata_toc,
         test_solution_clean_markdown,
+        test_solution_structured_extraction_batch,
         test_solution_structured_extraction,
         consolidate_test_solution_structured
     ],
-    "model": "openai:gpt-5-mini"
+    "model": "openai:gpt-5-mini",
+    "file_scope": {
+        "read": [],
+        "write": ["/proposed_method/", "/temp_proposed_method/", "/analytical_tests/"],
+    },
 }
 
 change_implementation_agent = {
@@ -53,11 +73,24 @@ change_implementation_agent = {
     "description": "Delega a este agente cuando los subagentes de carga (legacy_migration_agent, side_by_side_agent, reference_methods_agent, change_control_agent) hayan completado su trabajo. Requiere archivos test_solution_structured_content_*.json en /actual_method/ y /proposed_method/. Resuelve referencias de archivos, analiza la información estructurada, produce un plan de implementación, aplica los parches y genera el documento DOCX final. Si solo existe el método legado (sin CC ni método propuesto), este agente también consolida y renderiza directamente el DOCX usando ese método como base.",
     "system_prompt": CHANGE_IMPLEMENTATION_AGENT_INSTRUCTIONS,
     "tools": [
+        resume_change_implementation,
         resolve_source_references,
         analyze_change_impact,
         apply_method_patch,
         consolidate_new_method,
         render_method_docx,
     ],
-    "model": "openai:gpt-5-mini"
+    "model": "openai:gpt-5-mini",
+    # Sin los markdown segmentados de ingesta: solo metadata y contenido estructurado
+    "file_scope": {
+        "read": [
+            "/actual_method/method_metadata_TOC_",
+            "/actual_method/test_solution_structured_content_",
+            "/proposed_method/method_metadata_TOC_",
+            "/proposed_method/test_solution_structured_content_",
+            "/analytical_tests/",
+            "/change_control/",
+        ],
+        "write": ["/new/", "/logs/"],
+    },
 }
@@ -0,0 +1,165 @@
+"""Backend de filesystem para los deep agents que entiende las entradas compactas.
+
+Las herramientas guardan los archivos como ``{"data", "modified_at"}`` sin el
+arreglo duplicado de líneas ``content`` (ver ``src/utils/file_entries.py``). Este
+backend mantiene el comportamiento del ``StateBackend`` de deepagents pero
+renderiza ``content`` de forma diferida, solo cuando una herramienta de archivos
+(``read_file``, ``grep``, ``edit_file``) realmente lo necesita: ``ls`` y ``glob``
+filtran y calculan tamaños desde las entradas crudas, y ``grep`` renderiza solo
+los archivos bajo su ruta y su glob. Las entradas antiguas que aún traen
+``content`` funcionan sin cambios.
+"""
+
+import json
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import wcmatch.glob as wcglob
+from deepagents.backends import StateBackend
+from deepagents.backends.protocol import EditResult, FileInfo, GrepMatch
+from deepagents.backends.utils import _glob_search_files, _validate_path, grep_matches_from_files
+
+from src.utils.file_entries import file_entry_size, make_file_entry, with_rendered_content
+
+
+class _RenderedFiles(Mapping):
+    """Vista de solo lectura de ``state["files"]`` que renderiza ``content`` al acceder."""
+
+    def __init__(self, files: dict[str, Any]):
+        self._files = files
+
+    def __getitem__(self, path: str) -> dict[str, Any]:
+        entry = self._files[path]
+        if not isinstance(entry, dict):
+            raise KeyError(path)
+        rendered = with_rendered_content(entry, path)
+        if "created_at" not in rendered:
+            # update_file_data de deepagents lo espera; las entradas de las herramientas solo traen modified_at
+            rendered = {**rendered, "created_at": rendered.get("modified_at")}
+        return rendered
+
+    def __iter__(self) -> Iterator[str]:
+        return (path for path, entry in self._files.items() if isinstance(entry, dict))
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self._files.values() if isinstance(entry, dict))
+
+    def __contains__(self, path: object) -> bool:
+        return isinstance(self._files.get(path), dict)
+
+
+class _RenderedRuntime:
+    """Proxy del runtime de la herramienta cuyo ``state["files"]`` es una vista renderizada."""
+
+    def __init__(self, runtime: Any):
+        self._runtime = runtime
+
+    @property
+    def state(self) -> dict[str, Any]:
+        state = self._runtime.state
+        return {**state, "files": _RenderedFiles(state.get("files") or {})}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._runtime, name)
+
+
+class CompactStateBackend(StateBackend):
+    """``StateBackend`` que renderiza las entradas compactas bajo demanda.
+
+    Se pasa la clase misma como fábrica del backend:
+    ``create_deep_agent(..., backend=CompactStateBackend)``.
+    """
+
+    def __init__(self, runtime: Any):
+        super().__init__(_RenderedRuntime(runtime))
+        self._raw_runtime = runtime
+
+    def _raw_files(self) -> dict[str, Any]:
+        """Entradas compactas de ``state["files"]`` (sin tombstones ni valores que no sean dict)."""
+        files = self._raw_runtime.state.get("files") or {}
+        return {path: entry for path, entry in files.items() if isinstance(entry, dict)}
+
+    def ls_info(self, path: str) -> list[FileInfo]:
+        """Lista un directorio (no recursivo) sin renderizar ningún archivo."""
+        normalized_path = path if path.endswith("/") else path + "/"
+        infos: list[FileInfo] = []
+        subdirs: set[str] = set()
+        for file_path, entry in self._raw_files().items():
+            if not file_path.startswith(normalized_path):
+                continue
+            relative = file_path[len(normalized_path):]
+            if "/" in relative:
+                subdirs.add(normalized_path + relative.split("/")[0] + "/")
+                continue
+            infos.append({
+                "path": file_path,
+                "is_dir": False,
+                "size": file_entry_size(entry),
+                "modified_at": entry.get("modified_at", ""),
+            })
+        for subdir in sorted(subdirs):
+            infos.append({"path": subdir, "is_dir": True, "size": 0, "modified_at": ""})
+        infos.sort(key=lambda info: info.get("path", ""))
+        return infos
+
+    def glob_info(self, pattern: str, path: str = "/") -> list[FileInfo]:
+        """Filtra rutas con ``pattern`` sin renderizar ningún archivo."""
+        files = {
+            file_path: {**entry, "modified_at": entry.get("modified_at", "")}
+            for file_path, entry in self._raw_files().items()
+        }
+        result = _glob_search_files(files, pattern, path)
+        if result == "No files found":
+            return []
+        return [
+            {
+                "path": file_path,
+                "is_dir": False,
+                "size": file_entry_size(files.get(file_path)),
+                "modified_at": files[file_path]["modified_at"] if file_path in files else "",
+            }
+            for file_path in result.split("\n")
+        ]
+
+    def grep_raw(
+        self,
+        pattern: str,
+        path: str = "/",
+        glob: Optional[str] = None,
+    ) -> list[GrepMatch] | str:
+        """Grep que renderiza solo los archivos bajo ``path`` que coinciden con ``glob``."""
+        try:
+            normalized_path = _validate_path(path)
+        except ValueError:
+            return []
+        candidates = {
+            file_path: entry
+            for file_path, entry in self._raw_files().items()
+            if file_path.startswith(normalized_path)
+            and (not glob or wcglob.globmatch(Path(file_path).name, glob, flags=wcglob.BRACE))
+        }
+        return grep_matches_from_files(_RenderedFiles(candidates), pattern, path, glob)
+
+    def edit(
+        self,
+        file_path: str,
+        old_string: str,
+        new_string: str,
+        replace_all: bool = False,
+    ) -> EditResult:
+        """Edita un archivo; los JSON se guardan de nuevo en forma compacta con ``data`` parseado."""
+        result = super().edit(file_path, old_string, new_string, replace_all=replace_all)
+        if not result.files_update:
+            return result
+
+        compact_update = {}
+        for path, file_data in result.files_update.items():
+            try:
+                data = json.loads("\n".join(file_data["content"]))
+            except (TypeError, ValueError):
+                compact_update[path] = file_data
+                continue
+            compact_update[path] = make_file_entry(data, file_data.get("modified_at"))
+        result.files_update = compact_update
+        return result
@@ -1,6 +1,10 @@
 from deepagents import create_deep_agent
 from langchain.chat_models import init_chat_model
 
+from src.agents.scoped_subagents import scoped_subagent
+from src.graph.backend import CompactStateBackend
+from src.graph.checkpointer import build_checkpointer
+from src.graph.pipeline import build_pipeline
 from src.tools import *
 from src.agents.sub_agents_config import *
 from src.prompts.supervisor_prompts import *
@@ -9,17 +13,30 @@ from src.prompts.supervisor_prompts import *
 llm_model = init_chat_model(model="openai:gpt-5-mini")
 
 
+# Each subagent only receives (and returns the delta of) its declared file_scope
 sub_agents = [
-    legacy_migration_subagent,
-    change_control_subagent,
-    side_by_side_subagent,
-    reference_methods_subagent,
-    change_implementation_agent
+    scoped_subagent(spec, model=llm_model, backend=CompactStateBackend)
+    for spec in (
+        legacy_migration_subagent,
+        change_control_subagent,
+        side_by_side_subagent,
+        reference_methods_subagent,
+        change_implementation_agent,
+    )
 ]
 
 am_change_control_agent = create_deep_agent(
     #tools=[extract_legacy_sections,structure_specs_procs],
     system_prompt=INSTRUCTIONS_SUPERVISOR,
     subagents=sub_agents,
-    model=llm_model#"openai:gpt-4.1-mini"
+    model=llm_model,#"openai:gpt-4.1-mini"
+    backend=CompactStateBackend,
+    checkpointer=build_checkpointer(),
+)
+
+# Deterministic flow for the standard migration; the supervisor above only
+# takes over when a pipeline step fails
+am_change_control_pipeline = build_pipeline(
+    fallback_agent=am_change_control_agent,
+    checkpointer=build_checkpointer(),
 )
@@ -0,0 +1,577 @@
+"""Checkpointer SQLite local con codificación binaria compacta para ``DeepAgentState``.
+
+Sin checkpointer, una caída a mitad del pipeline pierde todos los archivos
+intermedios. ``CompactSqliteSaver`` persiste los checkpoints de LangGraph en una
+base SQLite local:
+
+* Los valores se codifican con el serializador msgpack de LangGraph y se
+  comprimen con zstd si ``zstandard`` está instalado (zlib en caso contrario).
+* El canal ``files`` se guarda como un manifiesto ``{path: digest}``. Cada
+  entrada de archivo se codifica una sola vez en la tabla ``file_entries``
+  (direccionada por contenido), de modo que las entradas sin cambios se
+  comparten entre pasos e hilos en lugar de reescribir el dict completo en cada
+  super-paso. Las entradas cuya identidad de objeto no cambió desde el paso
+  anterior ni siquiera se vuelven a codificar.
+* Cada ``put`` registra su tamaño codificado y su latencia de escritura, y
+  ``get_tuple`` el tiempo de reanudación. ``saver.stats`` acumula las mismas cifras.
+
+Se activa con ``CHECKPOINTER_ENABLED=1`` (ruta en ``CHECKPOINT_DB_PATH``). Las
+ejecuciones deben pasar entonces ``{"configurable": {"thread_id": ...}}``;
+re-invocar el mismo hilo con entrada ``None`` reanuda desde el último checkpoint.
+"""
+
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import AsyncIterator, Iterator, Sequence
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTER_ENABLED = os.getenv("CHECKPOINTER_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", ".cache/checkpoints.sqlite")
+# Los payloads menores a este tamaño se guardan sin comprimir (domina el costo de compresión)
+COMPRESS_MIN_BYTES = 256
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+FILES_CHANNEL = "files"
+FILES_MANIFEST_TYPE = "files-manifest"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS file_entries (
+    digest TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    blob BLOB
+);
+"""
+
+
+class CompressedSerializer(SerializerProtocol):
+    """Envuelve el serializador msgpack de LangGraph y comprime su salida."""
+
+    def __init__(self, inner: Optional[SerializerProtocol] = None):
+        self.inner = inner or JsonPlusSerializer()
+        self.codec = "zstd" if zstandard is not None else "zlib"
+        # Los (des)compresores zstd no son thread-safe y LangGraph guarda
+        # checkpoints desde hilos en segundo plano: un par por hilo
+        self._zstd = threading.local()
+
+    def _zstd_pair(self) -> tuple[Any, Any]:
+        pair = getattr(self._zstd, "pair", None)
+        if pair is None:
+            pair = self._zstd.pair = (zstandard.ZstdCompressor(level=ZSTD_LEVEL), zstandard.ZstdDecompressor())
+        return pair
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return self._zstd_pair()[0].compress(data)
+        return zlib.compress(data, ZLIB_LEVEL)
+
+    def _decompress(self, codec: str, data: bytes) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("El checkpoint se escribió con zstd pero 'zstandard' no está instalado")
+            return self._zstd_pair()[1].decompress(data)
+        if codec == "zlib":
+            return zlib.decompress(data)
+        raise NotImplementedError(f"Códec de checkpoint desconocido: {codec}")
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) < COMPRESS_MIN_BYTES:
+            return type_, data
+        return f"{type_}+{self.codec}", self._compress(data)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        base_type, _, codec = type_.partition("+")
+        if codec:
+            payload = self._decompress(codec, payload)
+        return self.inner.loads_typed((base_type, payload))
+
+
+class CompactSqliteSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver SQLite con valores comprimidos y entradas de archivo compartidas."""
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, *, serde: Optional[SerializerProtocol] = None):
+        super().__init__(serde=serde or CompressedSerializer())
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+        # id(entry) -> (entry, digest) del último valor de ``files`` guardado; mantener
+        # la entrada referenciada garantiza que otro objeto no reutilice el id. Las
+        # herramientas siempre escriben dicts nuevos: misma identidad, mismo contenido.
+        self._entry_digests: dict[int, tuple[Any, str]] = {}
+        self.stats: dict[str, float] = {
+            "puts": 0,
+            "put_bytes": 0,
+            "put_ms": 0.0,
+            "file_entries_written": 0,
+            "file_entries_shared": 0,
+            "resumes": 0,
+            "resume_ms": 0.0,
+        }
+
+    # --- canal files (compartición estructural) ---
+
+    def _dump_files(self, files: dict[str, Any]) -> tuple[tuple[str, bytes], int, dict[int, tuple[Any, str]]]:
+        """Guarda cada entrada por digest; retorna el manifiesto codificado, los bytes escritos y la nueva caché de digests.
+
+        ``put`` solo adopta la caché de digests una vez confirmada la transacción:
+        tras un rollback apuntaría a filas que nunca se guardaron.
+        """
+        manifest: dict[str, str] = {}
+        previous = self._entry_digests
+        current: dict[int, tuple[Any, str]] = {}
+        new_rows: list[tuple[str, str, bytes]] = []
+        written = 0
+        for path, entry in files.items():
+            cached = previous.get(id(entry))
+            if cached is not None and cached[0] is entry:
+                digest = cached[1]
+                self.stats["file_entries_shared"] += 1
+            else:
+                type_, data = self.serde.dumps_typed(entry)
+                digest = hashlib.sha256(type_.encode() + b"\0" + data).hexdigest()
+                new_rows.append((digest, type_, data))
+            current[id(entry)] = (entry, digest)
+            manifest[path] = digest
+        for digest, type_, data in new_rows:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO file_entries (digest, type, blob) VALUES (?, ?, ?)",
+                (digest, type_, data),
+            )
+            if cursor.rowcount:
+                written += len(data)
+                self.stats["file_entries_written"] += 1
+            else:
+                self.stats["file_entries_shared"] += 1
+        manifest_type, manifest_data = self.serde.dumps_typed(manifest)
+        return (f"{FILES_MANIFEST_TYPE}:{manifest_type}", manifest_data), written + len(manifest_data), current
+
+    def _load_files(self, type_: str, data: bytes) -> dict[str, Any]:
+        manifest = self.serde.loads_typed((type_.split(":", 1)[1], data))
+        digests = sorted(set(manifest.values()))
+        rows: dict[str, tuple[str, bytes]] = {}
+        # SQLite limita los parámetros enlazados: se consulta por lotes
+        for start in range(0, len(digests), 500):
+            batch = digests[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for digest, entry_type, blob in self.conn.execute(
+                f"SELECT digest, type, blob FROM file_entries WHERE digest IN ({placeholders})", batch
+            ):
+                rows[digest] = (entry_type, blob)
+        missing = sorted(path for path, digest in manifest.items() if digest not in rows)
+        if missing:
+            # Omitir la entrada reanudaría en silencio con un filesystem incompleto
+            raise RuntimeError(
+                f"Checkpoint corrupto: faltan {len(missing)} entradas de archivo en file_entries "
+                f"({', '.join(missing[:5])}{', ...' if len(missing) > 5 else ''})"
+            )
+        return {path: self.serde.loads_typed(rows[digest]) for path, digest in manifest.items()}
+
+    # --- codificación ---
+
+    def _dump_channel(self, channel: str, value: Any) -> tuple[tuple[str, bytes], int, Optional[dict[int, tuple[Any, str]]]]:
+        if channel == FILES_CHANNEL and isinstance(value, dict):
+            return self._dump_files(value)
+        typed = self.serde.dumps_typed(value)
+        return typed, len(typed[1]), None
+
+    def _load_channel(self, type_: str, data: bytes) -> Any:
+        if type_.startswith(FILES_MANIFEST_TYPE + ":"):
+            return self._load_files(type_, data)
+        return self.serde.loads_typed((type_, data))
+
+    def _load_channel_values(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        for channel, version in versions.items():
+            row = self.conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is not None and row[0] != "empty":
+                values[channel] = self._load_channel(row[0], row[1])
+        return values
+
+    def _build_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, checkpoint_blob))
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_channel_values(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"]
+                ),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    # --- BaseCheckpointSaver API ---
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        started = time.perf_counter()
+        thread_id: str = config["configurable"]["thread_id"]
+        checkpoint_ns: str = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            result = self._build_tuple(thread_id, checkpoint_ns, row)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["resumes"] += 1
+        self.stats["resume_ms"] += elapsed_ms
+        logger.info(
+            "Checkpoint %s cargado para el hilo %s en %.1f ms",
+            row[0], thread_id, elapsed_ms,
+        )
+        return result
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+        )
+        clauses: list[str] = []
+        params: list[Any] = []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self.serde.loads_typed((row[4], row[5]))
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self.lock:
+                item = self._build_tuple(thread_id, checkpoint_ns, tuple(row))
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        started = time.perf_counter()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        stored = checkpoint.copy()
+        values: dict[str, Any] = stored.pop("channel_values")  # type: ignore[misc]
+        size = 0
+        entry_digests: Optional[dict[int, tuple[Any, str]]] = None
+        with self.lock:
+            with self.conn:
+                for channel, version in new_versions.items():
+                    if channel in values:
+                        (type_, data), written, digests = self._dump_channel(channel, values[channel])
+                        if digests is not None:
+                            entry_digests = digests
+                    else:
+                        (type_, data), written = ("empty", b""), 0
+                    size += written
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO blobs (thread_id, checkpoint_ns, channel, version, type, blob) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (thread_id, checkpoint_ns, channel, str(version), type_, data),
+                    )
+                checkpoint_type, checkpoint_data = self.serde.dumps_typed(stored)
+                metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+                size += len(checkpoint_data) + len(metadata_data)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+                    "type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        checkpoint_type,
+                        checkpoint_data,
+                        metadata_type,
+                        metadata_data,
+                    ),
+                )
+            # Confirmado: las entradas guardadas ya pueden reutilizarse por identidad
+            if entry_digests is not None:
+                self._entry_digests = entry_digests
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["puts"] += 1
+        self.stats["put_bytes"] += size
+        self.stats["put_ms"] += elapsed_ms
+        logger.info(
+            "Checkpoint %s guardado: %d bytes escritos (%d canales) en %.1f ms",
+            checkpoint["id"], size, len(new_versions), elapsed_ms,
+        )
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Las escrituras especiales (errores, interrupciones) reemplazan a las anteriores; las normales se guardan una vez
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        statement = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            rows.append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id,
+                WRITES_IDX_MAP.get(channel, idx), channel, type_, data, task_path,
+            ))
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"{statement} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, "
+                "type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.lock, self.conn:
+            for table in ("checkpoints", "blobs", "writes"):
+                self.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        # Las entradas de archivo se comparten entre hilos; ``vacuum`` elimina las huérfanas
+
+    def vacuum(self) -> int:
+        """Elimina las entradas de archivo que ningún checkpoint referencia; retorna cuántas."""
+        with self.lock:
+            referenced: set[str] = set()
+            for type_, data in self.conn.execute(
+                "SELECT type, blob FROM blobs WHERE type LIKE ?", (FILES_MANIFEST_TYPE + ":%",)
+            ):
+                referenced.update(self.serde.loads_typed((type_.split(":", 1)[1], data)).values())
+            stored = [row[0] for row in self.conn.execute("SELECT digest FROM file_entries")]
+            orphans = [(digest,) for digest in stored if digest not in referenced]
+            with self.conn:
+                self.conn.executemany("DELETE FROM file_entries WHERE digest = ?", orphans)
+            # Los digests en caché pueden apuntar a filas borradas: el siguiente put re-codifica todo
+            self._entry_digests = {}
+            self.conn.execute("VACUUM")
+        return len(orphans)
+
+    def blob_digests(self) -> set[str]:
+        """Digests de los payloads del blob store referenciados por entradas guardadas o escrituras pendientes."""
+        digests: set[str] = set()
+
+        def collect(entry: Any) -> None:
+            blob_ref = entry.get("blob_ref") if isinstance(entry, dict) else None
+            if isinstance(blob_ref, dict) and isinstance(blob_ref.get("sha256"), str):
+                digests.add(blob_ref["sha256"])
+
+        with self.lock:
+            for type_, blob in self.conn.execute("SELECT type, blob FROM file_entries"):
+                collect(self.serde.loads_typed((type_, blob)))
+            for type_, value in self.conn.execute("SELECT type, value FROM writes WHERE channel = ?", (FILES_CHANNEL,)):
+                update = self.serde.loads_typed((type_, value))
+                for entry in (update.values() if isinstance(update, dict) else ()):
+                    collect(entry)
+        return digests
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Las variantes async ejecutan en línea la implementación síncrona (local y rápida)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+
+
+def build_checkpointer() -> Optional[CompactSqliteSaver]:
+    """Checkpointer del grafo supervisor, o ``None`` si está desactivado."""
+    if not CHECKPOINTER_ENABLED:
+        return None
+    logger.info(
+        "Checkpointer activo en %s (códec: %s)",
+        CHECKPOINT_DB_PATH, "zstd" if zstandard is not None else "zlib",
+    )
+    return CompactSqliteSaver(CHECKPOINT_DB_PATH)
+
+
+def live_blob_digests(path: str = CHECKPOINT_DB_PATH) -> set[str]:
+    """Digests de blobs que la base de checkpoints aún referencia (vacío si no existe).
+
+    Se lee incluso con el checkpointer desactivado: una base dejada por una
+    configuración anterior todavía puede reanudarse y necesita sus blobs.
+    """
+    if path == ":memory:" or not Path(path).exists():
+        return set()
+    saver = CompactSqliteSaver(path)
+    try:
+        return saver.blob_digests()
+    finally:
+        saver.conn.close()
@@ -0,0 +1,330 @@
+"""Ejecutor local de jobs de migración en segundo plano.
+
+Streamlit ejecutaba la migración completa dentro del hilo del script: refrescar
+el navegador mataba la ejecución y los usuarios concurrentes se bloqueaban entre
+sí. Aquí cada migración es un job que ejecuta un pool de procesos worker,
+independiente de cualquier sesión de Streamlit:
+
+* ``create_job`` reserva el directorio del job y retorna su id; la UI guarda
+  los archivos subidos en el ``uploads/`` propio del job y llama a
+  ``submit_job``.
+* El estado vive en disco en ``{AURA_JOBS_DIR}/{job_id}/job.json`` (escrito de
+  forma atómica), los eventos de progreso (ver ``src.utils.progress``) se
+  agregan a ``progress.jsonl`` y el resumen de la ejecución va a
+  ``result.json``. La UI solo consulta estos archivos, así que un navegador
+  refrescado sigue sus jobs; ``list_jobs(owner=...)`` retorna solo los jobs
+  creados por un navegador.
+* Cada job tiene su propio ``output/`` (``render_method_docx`` escribe ahí el
+  DOCX) y ``tmp/`` (directorio por defecto de ``tempfile`` dentro del worker
+  mientras corre el job), de modo que los jobs concurrentes nunca ven los
+  archivos de otros.
+* La caché de lectura del filesystem virtual (``src.utils.read_cache``) se
+  separa por ``thread_id`` y se limpia al iniciar y al terminar cada job, para
+  que un worker de larga vida no retenga payloads de jobs anteriores.
+* Al iniciar el pool también se barre el blob store (``src.utils.blob_store``):
+  se eliminan los blobs que la base de checkpoints no referencia y que no se
+  escribieron en ``BLOB_GC_MAX_AGE_HOURS``.
+
+El tamaño del pool es ``AURA_JOB_WORKERS``. Los workers son procesos spawn que
+importan los grafos una vez y los reutilizan en cada job; el ``thread_id`` de
+LangGraph es el id del job. Los jobs que un proceso servidor anterior dejó en
+``running`` o ``queued`` se recuperan al iniciar el pool: los que corrían se
+marcan fallidos (su worker murió con el servidor) y los encolados se reenvían.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.graph.checkpointer import live_blob_digests
+from src.utils.blob_store import collect_garbage
+from src.utils.progress import ProgressBoard, is_progress_event
+from src.utils.read_cache import clear_read_cache
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path(os.getenv("AURA_JOBS_DIR", "jobs"))
+JOB_WORKERS = max(1, int(os.getenv("AURA_JOB_WORKERS", "2")))
+
+JOB_FILE = "job.json"
+RESULT_FILE = "result.json"
+PROGRESS_FILE = "progress.jsonl"
+UPLOADS_DIR = "uploads"
+OUTPUT_DIR = "output"
+TMP_DIR = "tmp"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+ORCHESTRATOR_PIPELINE = "pipeline"
+ORCHESTRATOR_AGENT = "agent"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+# --- Archivos del job ---
+
+def job_dir(job_id: str, jobs_dir: Path = JOBS_DIR) -> Path:
+    return Path(jobs_dir) / job_id
+
+
+def _write_json(path: Path, payload: Dict[str, Any]) -> None:
+    """Escritura atómica: quien consulta el archivo nunca ve un documento a medias."""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def read_job(job_id: str, jobs_dir: Path = JOBS_DIR) -> Optional[Dict[str, Any]]:
+    return _read_json(job_dir(job_id, jobs_dir) / JOB_FILE)
+
+
+def _update_job(job_id: str, jobs_dir: Path, **fields: Any) -> Dict[str, Any]:
+    path = job_dir(job_id, jobs_dir) / JOB_FILE
+    job = {**(_read_json(path) or {}), **fields}
+    _write_json(path, job)
+    return job
+
+
+def read_result(job_id: str, jobs_dir: Path = JOBS_DIR) -> Optional[Dict[str, Any]]:
+    return _read_json(job_dir(job_id, jobs_dir) / RESULT_FILE)
+
+
+def read_progress(job_id: str, jobs_dir: Path = JOBS_DIR, stall_seconds: Optional[float] = None) -> ProgressBoard:
+    """Tablero de progreso reconstruido desde el ``progress.jsonl`` del job."""
+    board = ProgressBoard() if stall_seconds is None else ProgressBoard(stall_seconds=stall_seconds)
+    path = job_dir(job_id, jobs_dir) / PROGRESS_FILE
+    if not path.exists():
+        return board
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                board.update(json.loads(line))
+            except ValueError:
+                # El worker puede estar escribiendo la última línea
+                continue
+    return board
+
+
+def list_jobs(
+    jobs_dir: Path = JOBS_DIR,
+    limit: Optional[int] = None,
+    owner: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Jobs en disco, del más reciente al más antiguo; solo los creados por ``owner`` si se indica."""
+    root = Path(jobs_dir)
+    if not root.exists():
+        return []
+    jobs = [job for job in (_read_json(path) for path in root.glob(f"*/{JOB_FILE}")) if job]
+    if owner is not None:
+        jobs = [job for job in jobs if job.get("owner") == owner]
+    jobs.sort(key=lambda job: job.get("created_at") or 0, reverse=True)
+    return jobs[:limit] if limit else jobs
+
+
+def create_job(owner: Optional[str] = None, jobs_dir: Path = JOBS_DIR) -> Dict[str, Any]:
+    """Reserva el directorio del job (``uploads/``, ``output/``, ``tmp/``) y retorna el job."""
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    root = job_dir(job_id, jobs_dir)
+    for name in (UPLOADS_DIR, OUTPUT_DIR, TMP_DIR):
+        (root / name).mkdir(parents=True, exist_ok=True)
+    job = {
+        "job_id": job_id,
+        "owner": owner,
+        "status": "created",
+        "created_at": time.time(),
+        "uploads_dir": str((root / UPLOADS_DIR).resolve()),
+        "output_dir": str((root / OUTPUT_DIR).resolve()),
+    }
+    _write_json(root / JOB_FILE, job)
+    return job
+
+
+# --- Lado del worker ---
+
+def _agent_request(request: str, output_dir: str) -> Dict[str, Any]:
+    content = (
+        f"{request}\n\n"
+        f"Genera el DOCX final con render_method_docx usando output_dir='{output_dir}'."
+    )
+    return {"messages": [{"content": content, "type": "human"}]}
+
+
+def _message_text(message: Any) -> Optional[str]:
+    content = getattr(message, "content", None)
+    if content is None and isinstance(message, dict):
+        content = message.get("content")
+    return str(content) if content else None
+
+
+def run_job(job_id: str, jobs_dir: str = str(JOBS_DIR)) -> str:
+    """Ejecuta un job dentro de un proceso worker y retorna su estado final.
+
+    Recorre el stream del grafo en modos ``custom`` y ``values``: los eventos de
+    progreso se agregan a ``progress.jsonl`` a medida que llegan y el último
+    chunk ``values`` de la raíz se convierte en el resumen de ``result.json``.
+    """
+    jobs_root = Path(jobs_dir)
+    root = job_dir(job_id, jobs_root)
+    job = _update_job(job_id, jobs_root, status=STATUS_RUNNING, started_at=time.time(), pid=os.getpid())
+    logger.info("Job %s iniciado (pid %s, orquestador %s)", job_id, os.getpid(), job.get("orchestrator"))
+
+    # Un worker corre un job a la vez: nada de lo leído por jobs anteriores es reutilizable
+    clear_read_cache()
+    previous_tempdir = tempfile.tempdir
+    tempfile.tempdir = str(root / TMP_DIR)
+    final: Dict[str, Any] = {}
+    try:
+        from src.graph.builder import am_change_control_agent, am_change_control_pipeline
+
+        if job.get("orchestrator") == ORCHESTRATOR_AGENT:
+            graph, graph_input = am_change_control_agent, _agent_request(job["request"], job["output_dir"])
+        else:
+            graph = am_change_control_pipeline
+            graph_input = {"documents": job["documents"], "output_dir": job["output_dir"]}
+        config = {"configurable": {"thread_id": job_id}}
+
+        with (root / PROGRESS_FILE).open("a", encoding="utf-8") as progress:
+            for namespace, mode, data in graph.stream(
+                graph_input, config=config, stream_mode=["custom", "values"], subgraphs=True
+            ):
+                if mode == "custom" and is_progress_event(data):
+                    progress.write(json.dumps(data, ensure_ascii=False, default=str) + "\n")
+                    progress.flush()
+                elif mode == "values" and not namespace:
+                    final = data
+
+        artifacts = sorted(str(path) for path in Path(job["output_dir"]).glob("*.docx"))
+        messages = final.get("messages") or []
+        _write_json(root / RESULT_FILE, {
+            "timings": final.get("timings") or [],
+            "errors": final.get("errors") or [],
+            "message": _message_text(messages[-1]) if messages else None,
+        })
+        status = STATUS_COMPLETED if artifacts else STATUS_FAILED
+        _update_job(
+            job_id, jobs_root,
+            status=status,
+            finished_at=time.time(),
+            artifacts=artifacts,
+            error=None if artifacts else "La ejecución terminó sin generar un DOCX.",
+        )
+    except Exception as exc:
+        logger.exception("Job %s falló", job_id)
+        status = STATUS_FAILED
+        _update_job(
+            job_id, jobs_root,
+            status=status,
+            finished_at=time.time(),
+            error=str(exc),
+            traceback=traceback.format_exc(),
+        )
+    finally:
+        tempfile.tempdir = previous_tempdir
+        clear_read_cache(job_id)
+
+    logger.info("Job %s terminado: %s", job_id, status)
+    return status
+
+
+# --- Lado del servidor ---
+
+def _log_job_outcome(job_id: str, jobs_dir: Path, future: Future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        # El proceso worker murió (p. ej. lo mató el SO) antes de actualizar job.json
+        logger.error("El worker del job %s se cayó: %s", job_id, exc)
+        _update_job(job_id, jobs_dir, status=STATUS_FAILED, finished_at=time.time(), error=f"El worker terminó: {exc}")
+
+
+def _submit(pool: ProcessPoolExecutor, job_id: str, jobs_dir: Path = JOBS_DIR) -> None:
+    future = pool.submit(run_job, job_id, str(jobs_dir))
+    future.add_done_callback(lambda done: _log_job_outcome(job_id, jobs_dir, done))
+
+
+def recover_jobs(pool: ProcessPoolExecutor, jobs_dir: Path = JOBS_DIR) -> None:
+    """Reenvía los jobs encolados por un servidor anterior y marca fallidos los que dejó corriendo."""
+    for job in list_jobs(jobs_dir):
+        if job.get("status") == STATUS_RUNNING:
+            logger.warning("El job %s corría cuando se detuvo el servidor; se marca como fallido", job["job_id"])
+            _update_job(
+                job["job_id"], jobs_dir,
+                status=STATUS_FAILED,
+                finished_at=time.time(),
+                error="Interrumpido por un reinicio del servidor.",
+            )
+        elif job.get("status") == STATUS_QUEUED:
+            logger.info("Reenviando el job encolado %s", job["job_id"])
+            _submit(pool, job["job_id"], jobs_dir)
+
+
+def collect_blob_garbage() -> None:
+    """Barre el blob store, conservando todo blob que referencie la base de checkpoints.
+
+    Corre en un hilo daemon al iniciar el pool; un fallo se registra y nunca
+    bloquea al servidor.
+    """
+    try:
+        collect_garbage(live_blob_digests())
+    except Exception:
+        logger.exception("Falló la recolección de basura del blob store")
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool de procesos compartido por todas las sesiones de Streamlit de este servidor."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: nunca hacer fork del servidor Streamlit (multi-hilo)
+            _pool = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            logger.info("Pool de jobs iniciado con %d workers (jobs en %s)", JOB_WORKERS, JOBS_DIR)
+            recover_jobs(_pool)
+            threading.Thread(target=collect_blob_garbage, name="blob-gc", daemon=True).start()
+        return _pool
+
+
+def submit_job(
+    job_id: str,
+    documents: Dict[str, Any],
+    request: str,
+    orchestrator: str = ORCHESTRATOR_PIPELINE,
+) -> Dict[str, Any]:
+    """Encola un job creado con ``create_job``.
+
+    Args:
+        job_id: Id retornado por ``create_job``
+        documents: ``PipelineDocuments`` con rutas dentro del ``uploads/`` del job
+        request: Solicitud humana para el supervisor (``orchestrator="agent"``)
+        orchestrator: ``"pipeline"`` (grafo determinista) o ``"agent"``
+    """
+    job = _update_job(
+        job_id, JOBS_DIR,
+        status=STATUS_QUEUED,
+        submitted_at=time.time(),
+        orchestrator=orchestrator,
+        documents=documents,
+        request=request,
+    )
+    _submit(get_pool(), job_id)
+    logger.info("Job %s encolado", job_id)
+    return job
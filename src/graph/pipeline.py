@@ -0,0 +1,514 @@
+"""Orquestación determinista del flujo estándar de migración.
+
+El grafo supervisor (``am_change_control_agent``) gasta un turno de
+razonamiento de ``gpt-5-mini`` en cada paso de un flujo cuyo orden ya se
+conoce: ingesta -> limpieza -> extracción -> consolidación -> resolución ->
+plan -> parches -> consolidación -> render. Este módulo construye un
+``StateGraph`` de LangGraph que llama directamente a las mismas herramientas,
+en ese orden:
+
+* Cada documento se ingiere con la misma secuencia de herramientas que corre su
+  subagente, en su propia rama paralela (un ``Send`` por documento). Los
+  documentos no comparten datos, así que el tiempo total sigue a la rama más
+  lenta en lugar de la suma. La barrera ``join_ingestion`` corre cuando todas
+  las ramas terminaron y registra los tiempos por rama (también retornados en
+  ``timings``).
+* ``apply_method_patch`` corre todas las acciones del plan en paralelo dentro
+  de un único nodo (un hilo por acción, hasta ``APPLY_MAX_CONCURRENCY``) sobre
+  los ``files`` del propio nodo, y fusiona sus actualizaciones. La ruta
+  siguiente ve los ``errors`` de todas las acciones, así que
+  ``consolidate_new_method`` solo corre si todas tuvieron éxito; los parches de
+  las acciones exitosas se conservan en cualquier caso.
+* Las ejecuciones solo con el método legado (sin control de cambios,
+  side-by-side ni métodos de referencia) omiten resolución/plan/parches, igual
+  que el agente de implementación de cambios.
+* Un side-by-side o métodos de referencia sin control de cambios no pueden
+  planificarse (``analyze_change_impact`` necesita el CC), así que
+  ``reject_documents`` rechaza esas entradas antes de gastar OCR.
+
+Un paso falla si su herramienta lanza una excepción o no retorna una
+actualización de ``files`` (las herramientas reportan errores solo mediante un
+``ToolMessage``). El fallo se registra en ``errors`` y la ejecución pasa al
+supervisor agéntico con los archivos producidos hasta ese momento, de modo que
+el razonamiento del LLM solo se gasta en casos excepcionales.
+"""
+
+import logging
+import operator
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from langgraph.types import Send
+from typing_extensions import Annotated, NotRequired, TypedDict
+
+from src.graph.state import FILE_TOMBSTONE, file_reducer
+from src.tools import (
+    analyze_change_impact,
+    apply_method_patch,
+    consolidate_new_method,
+    consolidate_test_solution_structured,
+    extract_annex_cc,
+    pdf_da_metadata_toc,
+    render_method_docx,
+    resolve_source_references,
+    sbs_proposed_column_to_pdf_md,
+    test_solution_clean_markdown,
+    test_solution_clean_markdown_sbs,
+    test_solution_structured_extraction_batch,
+)
+from src.utils.progress import ProgressReporter, progress_task
+from src.utils.stage_manifest import (
+    PLAN_PATH,
+    STAGE_ANALYZE,
+    STAGE_APPLY,
+    STAGE_CONSOLIDATE,
+    STAGE_RENDER,
+    STAGE_RESOLVE,
+)
+from src.utils.virtual_fs import VirtualFS
+
+logger = logging.getLogger(__name__)
+
+LEGACY_BASE_PATH = "/actual_method"
+PROPOSED_BASE_PATH = "/proposed_method"
+
+NODE_INGEST = "ingest_document"
+NODE_INGEST_JOIN = "join_ingestion"
+NODE_FALLBACK = "supervisor_fallback"
+NODE_REJECT = "reject_documents"
+
+# Acciones del plan que el nodo de parches aplica a la vez
+APPLY_MAX_CONCURRENCY = int(os.getenv("PIPELINE_APPLY_CONCURRENCY", "8"))
+
+
+class PipelineDocuments(TypedDict, total=False):
+    """Documentos de entrada, como rutas de archivos locales."""
+
+    legacy_method: str
+    change_control: str
+    side_by_side: str
+    reference_methods: List[str]
+
+
+class PipelineState(TypedDict):
+    """Estado del pipeline determinista.
+
+    ``files`` usa el mismo reducer que ``DeepAgentState``, de modo que las
+    actualizaciones de las herramientas y los checkpoints se comportan igual que
+    en el grafo supervisor.
+    """
+
+    documents: PipelineDocuments
+    output_dir: NotRequired[str]
+    files: NotRequired[Annotated[dict[str, Any], file_reducer]]
+    messages: NotRequired[Annotated[list[AnyMessage], add_messages]]
+    errors: NotRequired[Annotated[list[dict[str, Any]], operator.add]]
+    timings: NotRequired[Annotated[list[dict[str, Any]], operator.add]]
+
+
+class IngestTaskState(TypedDict):
+    """Payload de una rama ``Send`` del fan-out de ingesta.
+
+    El paquete lleva todo lo que la rama lee. La ingesta es el primer paso de
+    la ejecución, así que ``files`` solo contiene los archivos de entrada
+    (normalmente ninguno) y copiarlo en cada paquete sigue siendo barato.
+    """
+
+    task: str
+    documents: PipelineDocuments
+    files: dict[str, Any]
+
+
+def _step(stage: str, tool: BaseTool, **args: Any) -> Dict[str, Any]:
+    return {"stage": stage, "tool": tool, "args": args}
+
+
+def _method_steps(path: str, base_path: str, profile: str) -> List[Dict[str, Any]]:
+    """Secuencia de herramientas de ``legacy_migration_agent`` / ``reference_methods_agent``."""
+    source = Path(path).stem
+    return [
+        _step("ingest", pdf_da_metadata_toc, dir_method=path, base_path=base_path),
+        _step("clean", test_solution_clean_markdown, source_file_name=source, base_path=base_path, profile=profile),
+        _step("extract", test_solution_structured_extraction_batch, source_file_name=source, ids="all", base_path=base_path),
+        _step("consolidate", consolidate_test_solution_structured, source_file_name=source, base_path=base_path),
+    ]
+
+
+def _side_by_side_steps(path: str) -> List[Dict[str, Any]]:
+    """Secuencia de herramientas de ``side_by_side_agent``."""
+    source = Path(path).stem
+    return [
+        _step("ingest", sbs_proposed_column_to_pdf_md, dir_document=path),
+        _step("clean", test_solution_clean_markdown_sbs, source_file_name=source, base_path=PROPOSED_BASE_PATH),
+        _step("extract", test_solution_structured_extraction_batch, source_file_name=source, ids="all", base_path=PROPOSED_BASE_PATH),
+        _step("consolidate", consolidate_test_solution_structured, source_file_name=source, base_path=PROPOSED_BASE_PATH),
+    ]
+
+
+def ingestion_plan(documents: PipelineDocuments) -> List[Dict[str, Any]]:
+    """Tareas de ingesta (una por documento) con sus secuencias de herramientas."""
+    tasks: List[Dict[str, Any]] = []
+    if documents.get("legacy_method"):
+        tasks.append({
+            "name": "legacy_method",
+            "steps": _method_steps(documents["legacy_method"], LEGACY_BASE_PATH, "legacy"),
+        })
+    if documents.get("change_control"):
+        tasks.append({
+            "name": "change_control",
+            "steps": [_step("ingest", extract_annex_cc, dir_document=documents["change_control"], document_type="change_control")],
+        })
+    if documents.get("side_by_side"):
+        tasks.append({"name": "side_by_side", "steps": _side_by_side_steps(documents["side_by_side"])})
+    for path in documents.get("reference_methods") or []:
+        tasks.append({
+            "name": f"reference_method:{Path(path).stem}",
+            "steps": _method_steps(path, PROPOSED_BASE_PATH, "reference"),
+        })
+    return tasks
+
+
+def has_change_documents(documents: PipelineDocuments) -> bool:
+    """Indica si hay algo que aplicar sobre el método legado."""
+    return bool(
+        documents.get("change_control") or documents.get("side_by_side") or documents.get("reference_methods")
+    )
+
+
+def document_problems(documents: PipelineDocuments) -> List[str]:
+    """Motivos por los que ``documents`` no puede correr en el pipeline (vacío si es válido)."""
+    problems: List[str] = []
+    if not documents.get("legacy_method"):
+        problems.append("Falta el método analítico legado (legacy_method).")
+    if has_change_documents(documents) and not documents.get("change_control"):
+        problems.append(
+            "Los métodos propuestos (side-by-side o de referencia) requieren un control de cambios "
+            "(change_control): sin él no hay cambios que planificar."
+        )
+    return problems
+
+
+def run_tool(tool: BaseTool, files: Dict[str, Any], **args: Any) -> Dict[str, Any]:
+    """Invoca una herramienta fuera de un agente y retorna su ``Command.update``.
+
+    La herramienta recibe el estado inyectado y el id de la tool call igual que
+    desde el nodo de herramientas del agente.
+    """
+    command = tool.invoke({
+        "type": "tool_call",
+        "id": f"pipeline-{uuid.uuid4().hex[:12]}",
+        "name": tool.name,
+        "args": {**args, "state": {"messages": [], "files": files}},
+    })
+    return dict(getattr(command, "update", None) or {})
+
+
+def run_steps(task: str, files: Dict[str, Any], steps: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Corre ``steps`` en orden sobre ``files`` y retorna la actualización fusionada.
+
+    Cada paso ve los archivos escritos por los anteriores. Se detiene en el
+    primer paso que falla y lo reporta en ``errors``. El tiempo total de la
+    tarea y el de cada paso se retornan en ``timings``, y el inicio/fin de cada
+    paso se emite como evento de progreso en el stream ``custom``.
+    """
+    current = files
+    delta: Dict[str, Any] = {}
+    messages: List[AnyMessage] = []
+    errors: List[Dict[str, Any]] = []
+    timing: Dict[str, Any] = {"task": task, "started_at": time.time(), "status": "ok", "steps": []}
+    progress = ProgressReporter("pipeline", task, total=len(steps))
+    for step in steps:
+        tool = step["tool"]
+        progress.start(f"{tool.name} iniciada", step=tool.name)
+        started = time.perf_counter()
+        try:
+            with progress_task(task):
+                update = run_tool(tool, current, **step["args"])
+        except Exception as exc:
+            logger.exception("Paso del pipeline %s/%s falló", task, tool.name)
+            update, reason = {}, str(exc)
+        else:
+            reason = None if update.get("files") else (_last_message_text(update) or "la herramienta no escribió ningún archivo")
+        seconds = round(time.perf_counter() - started, 3)
+        timing["steps"].append({"tool": tool.name, "seconds": seconds})
+
+        messages.extend(update.get("messages") or [])
+        if reason is not None:
+            logger.warning("Paso del pipeline %s/%s falló: %s", task, tool.name, reason)
+            errors.append(_error(task, step, reason))
+            timing["status"] = "failed"
+            progress.error(reason, step=tool.name, seconds=seconds)
+            break
+        progress.advance(f"{tool.name} terminada", step=tool.name, seconds=seconds)
+
+        written = update["files"]
+        delta.update(written)
+        current = file_reducer(current, written)
+        logger.info("Paso del pipeline %s/%s terminado (%d archivos)", task, tool.name, len(written))
+
+    timing["seconds"] = round(time.time() - timing["started_at"], 3)
+    if timing["status"] == "ok":
+        progress.done(f"{task} terminada")
+    return {"files": delta, "messages": messages, "errors": errors, "timings": [timing]}
+
+
+def _error(task: str, step: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    return {"task": task, "stage": step["stage"], "tool": step["tool"].name, "args": dict(step["args"]), "error": reason}
+
+
+def _last_message_text(update: Dict[str, Any]) -> Optional[str]:
+    messages = update.get("messages") or []
+    return str(messages[-1].content) if messages else None
+
+
+# --- Nodos ---
+
+def ingest_document(state: IngestTaskState) -> Dict[str, Any]:
+    """Una rama del fan-out de ingesta: la secuencia completa de herramientas de un documento.
+
+    Un documento que falla no detiene las demás ramas; su fallo se reporta en
+    ``errors``.
+    """
+    task = next(task for task in ingestion_plan(state["documents"]) if task["name"] == state["task"])
+    return run_steps(task["name"], state.get("files") or {}, task["steps"])
+
+
+def join_ingestion(state: PipelineState) -> Dict[str, Any]:
+    """Barrera tras las ramas de ingesta; registra los tiempos de cada rama."""
+    names = {task["name"] for task in ingestion_plan(state["documents"])}
+    branches = [timing for timing in state.get("timings") or [] if timing["task"] in names]
+    if not branches:
+        return {}
+
+    wall = max(t["started_at"] + t["seconds"] for t in branches) - min(t["started_at"] for t in branches)
+    slowest = max(branches, key=lambda t: t["seconds"])
+    for timing in sorted(branches, key=lambda t: -t["seconds"]):
+        steps = ", ".join(f"{step['tool']}={step['seconds']:.1f}s" for step in timing["steps"])
+        logger.info("Rama de ingesta %s: %.1fs [%s] (%s)", timing["task"], timing["seconds"], timing["status"], steps)
+    logger.info(
+        "Ingesta: %d ramas, total %.1fs, más lenta %s %.1fs, suma %.1fs",
+        len(branches), wall, slowest["task"], slowest["seconds"], sum(t["seconds"] for t in branches),
+    )
+    return {"timings": [{
+        "task": NODE_INGEST_JOIN,
+        "started_at": min(t["started_at"] for t in branches),
+        "seconds": round(wall, 3),
+        "status": "ok",
+        "steps": [{"tool": t["task"], "seconds": t["seconds"]} for t in branches],
+    }]}
+
+
+def reject_documents(state: PipelineState) -> Dict[str, Any]:
+    """Nodo terminal para entradas que ningún flujo puede procesar."""
+    problems = document_problems(state["documents"])
+    logger.error("Entrada del pipeline rechazada: %s", problems)
+    return {
+        "errors": [
+            {"task": NODE_REJECT, "stage": "documents", "tool": None, "args": {}, "error": problem}
+            for problem in problems
+        ],
+        "messages": [AIMessage(content="No se puede iniciar la migración:\n" + "\n".join(f"- {p}" for p in problems))],
+    }
+
+
+def _single_step_node(stage: str, tool: BaseTool, **args: Any):
+    def node(state: PipelineState) -> Dict[str, Any]:
+        return run_steps(stage, state.get("files") or {}, [_step(stage, tool, **args)])
+    node.__name__ = stage
+    return node
+
+
+def render(state: PipelineState) -> Dict[str, Any]:
+    """Renderiza el DOCX final en ``output_dir`` cuando la ejecución lo define."""
+    args = {"output_dir": state["output_dir"]} if state.get("output_dir") else {}
+    return run_steps(STAGE_RENDER, state.get("files") or {}, [_step(STAGE_RENDER, render_method_docx, **args)])
+
+
+def apply_patches(state: PipelineState) -> Dict[str, Any]:
+    """Fan-out de parches: todas las acciones del plan en paralelo, fusionadas en una actualización.
+
+    Las acciones corren en hilos de este nodo en lugar de ramas ``Send``, así
+    que leen ``files`` del estado del nodo y ningún paquete lleva una copia al
+    checkpoint. El contexto se copia a cada hilo, de modo que los eventos de
+    progreso de cada acción siguen llegando al stream ``custom``. Una acción que
+    falla no detiene a las demás.
+    """
+    files = state.get("files") or {}
+    count = _plan_action_count(files)
+
+    def apply(index: int) -> Dict[str, Any]:
+        return run_steps(
+            f"{STAGE_APPLY}:{index}", files, [_step(STAGE_APPLY, apply_method_patch, action_index=index)]
+        )
+
+    with ContextThreadPoolExecutor(max_workers=max(1, min(count, APPLY_MAX_CONCURRENCY))) as executor:
+        results = list(executor.map(apply, range(count)))
+
+    merged: Dict[str, Any] = {"files": {}, "messages": [], "errors": [], "timings": []}
+    for result in results:
+        merged["files"].update(result["files"])
+        for key in ("messages", "errors", "timings"):
+            merged[key].extend(result[key])
+    if merged["errors"]:
+        logger.warning("Fan-out de parches: %d de %d acción(es) fallaron", len(merged["errors"]), count)
+    return merged
+
+
+def _plan_action_count(files: Dict[str, Any]) -> int:
+    plan = VirtualFS(files).read_json(PLAN_PATH, expect=dict) or {}
+    actions = plan.get("plan_intervencion")
+    return len(actions) if isinstance(actions, list) else 0
+
+
+# --- Rutas ---
+
+def route_ingestion(state: PipelineState):
+    """Un ``Send`` por documento (directo a ``join_ingestion`` si no hay ninguno).
+
+    Las entradas inválidas van a ``reject_documents`` sin ingerir nada.
+    """
+    if document_problems(state["documents"]):
+        return NODE_REJECT
+    tasks = ingestion_plan(state["documents"])
+    if not tasks:
+        return NODE_INGEST_JOIN
+    files = state.get("files") or {}
+    return [
+        Send(NODE_INGEST, {"task": task["name"], "documents": state["documents"], "files": files})
+        for task in tasks
+    ]
+
+
+def _failed(state: PipelineState) -> bool:
+    return bool(state.get("errors"))
+
+
+def route_after_ingest(state: PipelineState) -> str:
+    if _failed(state):
+        return NODE_FALLBACK
+    if state["documents"].get("change_control"):
+        return STAGE_RESOLVE
+    # Solo método legado (los documentos de cambio sin CC se rechazaron antes de la ingesta): se consolida tal cual y se renderiza
+    return STAGE_CONSOLIDATE
+
+
+def route_after_analyze(state: PipelineState) -> str:
+    if _failed(state):
+        return NODE_FALLBACK
+    if _plan_action_count(state.get("files") or {}) == 0:
+        return STAGE_CONSOLIDATE
+    return STAGE_APPLY
+
+
+def _route_or_fallback(next_node: str):
+    def route(state: PipelineState) -> str:
+        return NODE_FALLBACK if _failed(state) else next_node
+    return route
+
+
+def make_fallback_node(agent: Any):
+    """Nodo que entrega una ejecución fallida al supervisor agéntico.
+
+    El supervisor recibe los archivos producidos hasta el momento y una
+    descripción del fallo; el agente de implementación de cambios reanuda desde
+    la primera etapa desactualizada (ver ``resume_change_implementation``) en
+    lugar de empezar de nuevo.
+    """
+    def supervisor_fallback(state: PipelineState) -> Dict[str, Any]:
+        if agent is None:
+            logger.error("El pipeline falló y no hay supervisor de respaldo configurado: %s", state.get("errors"))
+            return {}
+
+        files = state.get("files") or {}
+        result = agent.invoke({
+            "messages": [HumanMessage(content=_fallback_request(
+                state["documents"], state.get("errors") or [], state.get("output_dir")
+            ))],
+            "files": files,
+        })
+        final_files = result.get("files") or {}
+        # Los borrados del supervisor (p. ej. temporales consumidos) se vuelven tombstones
+        delta = {path: FILE_TOMBSTONE for path in files if path not in final_files}
+        delta.update({path: entry for path, entry in final_files.items() if files.get(path) is not entry})
+        messages = result.get("messages") or []
+        return {"files": delta, "messages": messages[-1:]}
+
+    return supervisor_fallback
+
+
+def _fallback_request(
+    documents: PipelineDocuments, errors: Sequence[Dict[str, Any]], output_dir: Optional[str] = None
+) -> str:
+    lines = [
+        "El pipeline determinista no pudo completar el flujo estándar. Los archivos ya generados están en el estado.",
+        "",
+        "Documentos:",
+    ]
+    if documents.get("legacy_method"):
+        lines.append(f"- Metodo analitico legado: '{documents['legacy_method']}'.")
+    if documents.get("change_control"):
+        lines.append(f"- Control de cambio: '{documents['change_control']}'.")
+    if documents.get("side_by_side"):
+        lines.append(f"- Anexo Side by Side: '{documents['side_by_side']}'.")
+    for path in documents.get("reference_methods") or []:
+        lines.append(f"- Soportes del metodo: '{path}'.")
+    lines.extend(["", "Pasos fallidos:"])
+    for error in errors:
+        lines.append(f"- {error['task']} ({error['tool']}, args={error['args']}): {error['error']}")
+    lines.extend([
+        "",
+        "Repite solo los pasos fallidos y continúa el flujo desde ahí. No repitas la ingesta de documentos que ya "
+        "tienen su test_solution_structured_content_*.json; para la implementación de cambios, el subagente debe "
+        "llamar primero resume_change_implementation.",
+    ])
+    if output_dir:
+        lines.append(f"Genera el DOCX final con render_method_docx usando output_dir='{output_dir}'.")
+    return "\n".join(lines)
+
+
+def build_pipeline(fallback_agent: Any = None, checkpointer: Any = None):
+    """Compila el grafo del pipeline determinista.
+
+    Args:
+        fallback_agent: Grafo supervisor compilado que se usa cuando un paso
+            falla (``None`` termina la ejecución con ``errors``)
+        checkpointer: Checkpointer de LangGraph opcional
+
+    Returns:
+        Grafo compilado; se invoca con ``{"documents": {...}}`` (opcionalmente
+        ``"output_dir"`` para el DOCX renderizado)
+    """
+    builder = StateGraph(PipelineState)
+    builder.add_node(NODE_INGEST, ingest_document)
+    builder.add_node(NODE_INGEST_JOIN, join_ingestion)
+    builder.add_node(STAGE_RESOLVE, _single_step_node(STAGE_RESOLVE, resolve_source_references))
+    builder.add_node(STAGE_ANALYZE, _single_step_node(STAGE_ANALYZE, analyze_change_impact))
+    builder.add_node(STAGE_APPLY, apply_patches)
+    builder.add_node(STAGE_CONSOLIDATE, _single_step_node(STAGE_CONSOLIDATE, consolidate_new_method))
+    builder.add_node(STAGE_RENDER, render)
+    builder.add_node(NODE_FALLBACK, make_fallback_node(fallback_agent))
+    builder.add_node(NODE_REJECT, reject_documents)
+
+    builder.add_conditional_edges(START, route_ingestion, [NODE_INGEST, NODE_INGEST_JOIN, NODE_REJECT])
+    builder.add_edge(NODE_REJECT, END)
+    # Barrera: corre una vez cuando terminaron todas las ramas de ingesta del super-paso
+    builder.add_edge(NODE_INGEST, NODE_INGEST_JOIN)
+    builder.add_conditional_edges(
+        NODE_INGEST_JOIN, route_after_ingest, [STAGE_RESOLVE, STAGE_CONSOLIDATE, NODE_FALLBACK]
+    )
+    builder.add_conditional_edges(STAGE_RESOLVE, _route_or_fallback(STAGE_ANALYZE), [STAGE_ANALYZE, NODE_FALLBACK])
+    builder.add_conditional_edges(STAGE_ANALYZE, route_after_analyze, [STAGE_APPLY, STAGE_CONSOLIDATE, NODE_FALLBACK])
+    # El nodo de parches fusiona todas las acciones: esta ruta ve todos sus errores
+    builder.add_conditional_edges(STAGE_APPLY, _route_or_fallback(STAGE_CONSOLIDATE), [STAGE_CONSOLIDATE, NODE_FALLBACK])
+    builder.add_conditional_edges(STAGE_CONSOLIDATE, _route_or_fallback(STAGE_RENDER), [STAGE_RENDER, NODE_FALLBACK])
+    builder.add_conditional_edges(STAGE_RENDER, _route_or_fallback(END), [END, NODE_FALLBACK])
+    builder.add_edge(NODE_FALLBACK, END)
+    return builder.compile(checkpointer=checkpointer, name="am_change_control_pipeline")
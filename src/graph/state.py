@@ -3,10 +3,10 @@
 This module defines the extended agent state structure that supports:
 - Task planning and progress tracking through TODO lists
 - Context offloading through a virtual file system stored in state
-- Efficient state merging with reducer functions
+- Efficient state merging with reducer functions (including file deletions)
 """
 
-from typing import Annotated, Literal, Any
+from typing import Annotated, Iterable, Literal, Any
 from typing_extensions import TypedDict, NotRequired
 
 from langchain.agents import AgentState
@@ -24,25 +24,52 @@ class Todo(TypedDict):
     status: Literal["pending", "in_progress", "completed"]
 
 
+# Value that marks a file as deleted in a ``files`` update.
+FILE_TOMBSTONE = None
+
+
+def file_tombstones(paths: Iterable[str]) -> dict[str, None]:
+    """Build a ``files`` update that deletes the given paths.
+
+    Args:
+        paths: Paths of the files to remove from the virtual file system
+
+    Returns:
+        Dictionary mapping each path to ``FILE_TOMBSTONE``
+    """
+    return {path: FILE_TOMBSTONE for path in paths}
+
+
 def file_reducer(left, right):
     """Merge two file dictionaries, with right side taking precedence.
 
     Used as a reducer function for the files field in agent state,
-    allowing incremental updates to the virtual file system.
+    allowing incremental updates to the virtual file system. Entries whose
+    value is ``FILE_TOMBSTONE`` (``None``) delete the file, so fan-in tools
+    can really remove temporary files instead of leaving them in state.
 
     Args:
         left: Left side dictionary (existing files)
-        right: Right side dictionary (new/updated files)
+        right: Right side dictionary (new/updated files and tombstones)
 
     Returns:
-        Merged dictionary with right values overriding left values
+        Merged dictionary with right values overriding left values and
+        tombstoned paths removed
     """
     if left is None:
-        return right
+        if right is None:
+            return right
+        return {k: v for k, v in right.items() if v is not FILE_TOMBSTONE}
     elif right is None:
         return left
     else:
-        return {**left, **right}
+        merged = {**left}
+        for path, value in right.items():
+            if value is FILE_TOMBSTONE:
+                merged.pop(path, None)
+            else:
+                merged[path] = value
+        return merged
 
 
 class DeepAgentState(AgentState):
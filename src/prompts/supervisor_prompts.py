@@ -229,7 +229,7 @@ Usa un ciclo de `read_todos` -\> `task` -\> `think_tool` -\> `write_todos`. Sigu
       }}
     }}
     ```
-  * **Al Terminar:** Revisa el mensaje del subagente y, si corresponde, inspecciona `/new/change_implementation_plan.json`, `/new/applied_changes/`, `/new/new_method_final.json` y `/logs/change_patch_log.jsonl`. Si el metodo final aun no esta consolidado, pide ejecutar `consolidate_new_method`. Luego, marca el TODO como completado y continua con QA o render segun el plan.
+  * **Al Terminar:** Revisa el mensaje del subagente y, si corresponde, inspecciona `/new/change_implementation_plan.json`, `/new/applied_changes/`, `/new/new_method_final.json` y `/logs/change_patch_log.jsonl`. Si el metodo final aun no esta consolidado, pide ejecutar `consolidate_new_method`. Si hubo un error y reintentas, indica al subagente que llame primero `resume_change_implementation` para reanudar desde la etapa faltante o desactualizada sin repetir las vigentes. Luego, marca el TODO como completado y continua con QA o render segun el plan.
 """
 
 
@@ -46,22 +46,26 @@ TEST_SOLUTION_CLEAN_MARKDOWN_TOOL_DESC = """
 
   ## Buenas Prácticas
   - **Precondición:** Asegúrate de que `state['files']` contenga `{base_path}/method_metadata_TOC_{source_file_name}.json` con `tabla_de_contenidos` y `markdown_completo`.
-  - **Pre-procesamiento:** Esta herramienta elimina automáticamente la TABLA DE CONTENIDO y extrae SOLO la sección PROCEDIMIENTOS/DESARROLLO para evitar duplicados de ESPECIFICACIONES.
+  - **Pre-procesamiento (perfil `legacy`):** Esta herramienta elimina automáticamente la TABLA DE CONTENIDO y extrae SOLO la sección PROCEDIMIENTOS/DESARROLLO para evitar duplicados de ESPECIFICACIONES.
   - **source_file_name obligatorio:** Debes pasar el `source_file_name` que recibiste del paso anterior (pdf_da_metadata_toc).
 
   ## Parámetros
   - `source_file_name (str)`: Nombre del archivo de origen (sin extensión). **OBLIGATORIO**.
   - `base_path (str)`: Ruta base donde se encuentran los archivos. Default: `/actual_method`.
+  - `incremental (bool)`: Si ya existe `test_solution_markdown_{source_file_name}.json` (p. ej. tras re-OCR de algunas páginas), solo re-procesa con LLM las secciones que cambiaron y conserva los ids de los ítems existentes. Default: `False`.
+  - `profile (str)`: Perfil de documento del motor de segmentación. `legacy` (default) elimina la TOC y recorta PROCEDIMIENTOS/DESARROLLO; `reference` (métodos de referencia/farmacopea) solo elimina la TOC.
 
   ## Salida y efectos en el estado
   - **ToolMessage:** Reporta cuántas pruebas/soluciones se generaron, cuántas obtuvieron markdown, y la ruta del archivo generado.
   - **Estado (`state['files']`):** Crea/actualiza `{base_path}/test_solution_markdown_{source_file_name}.json` con:
-    - `full_markdown`: texto consolidado del método.
+    - `markdown_source`: referencia (`path`, `field`, `content_hash`) al `markdown_completo` de `method_metadata_TOC_{source_file_name}.json`; el texto completo no se duplica.
     - `toc_entries`: TOC usado para la inferencia.
-    - `items`: lista de `{raw, title, section_id, markdown}` para cada prueba o solución.
+    - `item_index`: mapa `id -> {base_path}/test_solution_markdown_{source_file_name}/{id}.json`. Cada archivo individual guarda `{id, raw, title, section_id, markdown_spans, content_hash}` de una prueba o solución; `markdown_spans` son posiciones `[inicio, fin]` en el markdown canónico (si un segmento no se puede ubicar, el ítem trae `markdown` en línea).
+    - `chunks`, `duplicates_collapsed`, `header_cache`, `last_run`: reporte de chunking, duplicados colapsados, cache de encabezados por sección y resumen de la última ejecución (`changed_item_ids`, `unchanged_item_ids`, `removed_item_ids`).
 
   ## Siguiente Paso Esperado
-  - Con este archivo disponible, ejecuta `test_solution_structured_extraction(id=..., source_file_name="...")` para cada ítem.
+  - Con este archivo disponible, ejecuta una sola vez `test_solution_structured_extraction_batch(ids="all", source_file_name="...")` para estructurar todos los ítems.
+  - En modo incremental, pasa a `ids` solo los ids reportados con cambios (p. ej. `ids=[3, 7]`); los demás conservan su resultado previo.
 """
 
 #############################################################################################################
@@ -87,16 +91,19 @@ TEST_SOLUTION_CLEAN_MARKDOWN_SBS_TOOL_DESC = """
   ## Parametros
   - `source_file_name (str)`: Nombre del archivo de origen (sin extension). **OBLIGATORIO**.
   - `base_path (str)`: Ruta base donde se encuentran los archivos. Default: `/proposed_method`.
+  - `incremental (bool)`: Si ya existe una extraccion previa, solo re-procesa con LLM las secciones que cambiaron y conserva los ids de los items existentes. Default: `False`.
 
   ## Salida y efectos en el estado
   - ToolMessage: Reporta cuantas pruebas/soluciones se generaron, cuantas obtuvieron markdown, y la ruta del archivo generado.
   - Estado (`state['files']`): Crea/actualiza `{base_path}/test_solution_markdown_{source_file_name}.json` con:
-    - `full_markdown`: texto consolidado del metodo propuesto.
+    - `markdown_source`: referencia al `markdown_completo` de `method_metadata_TOC_{source_file_name}.json` (el texto completo no se duplica).
     - `toc_entries`: encabezados identificados.
-    - `items`: lista de `{raw, title, section_id, markdown}` para cada prueba o solucion.
+    - `item_index`: mapa `id -> {base_path}/test_solution_markdown_{source_file_name}/{id}.json`; cada archivo individual guarda `{id, raw, title, section_id, markdown_spans, content_hash}` de una prueba o solucion (`markdown_spans`: posiciones en el markdown canonico; `markdown` en linea solo si el segmento no se pudo ubicar).
+    - `chunks`, `duplicates_collapsed`, `header_cache`, `last_run`: reporte de chunking, duplicados, cache de encabezados y resumen de la ultima ejecucion (ids con cambios/sin cambios/eliminados).
 
   ## Siguiente Paso Esperado
-  - Con este archivo disponible, ejecuta `test_solution_structured_extraction(id=..., source_file_name="...", base_path="/proposed_method")` para cada item.
+  - Con este archivo disponible, ejecuta una sola vez `test_solution_structured_extraction_batch(ids="all", source_file_name="...", base_path="/proposed_method")` para estructurar todos los items.
+  - En modo incremental, pasa a `ids` solo los ids reportados con cambios; los demas conservan su resultado previo.
 """
 
 #############################################################################################################
@@ -112,7 +119,7 @@ TEST_SOLUTION_STRUCTURED_EXTRACTION_TOOL_DESC = """
 
   ## Buenas Prácticas
   - **Precondición:** Verifica que el archivo de markdown exista con la lista de pruebas/soluciones.
-  - **Selección de ítem:** El parámetro `id` debe coincidir con el campo `id` presente en cada objeto de `items`.
+  - **Selección de ítem:** El parámetro `id` debe ser una de las claves de `item_index` (o, en archivos antiguos, el campo `id` de un objeto de `items`).
   - **Carpeta temporal:** Los archivos se guardan en `/temp_{base_path}/{source_file_name}/{{id}}.json` para permitir paralelización.
   - **source_file_name obligatorio:** Debes pasar el mismo `source_file_name` usado en los pasos anteriores.
 
@@ -120,6 +127,7 @@ TEST_SOLUTION_STRUCTURED_EXTRACTION_TOOL_DESC = """
   - `id (int)`: Consecutivo asignado a la prueba/solución en `test_solution_markdown_{source_file_name}.json`. **OBLIGATORIO**.
   - `source_file_name (str)`: Nombre del archivo de origen (sin extensión). **OBLIGATORIO**.
   - `base_path (str)`: Ruta base. Default: `/actual_method`. Usa `/proposed_method` para side-by-side o métodos de referencia.
+  - `extraction_mode (str)`: `"auto"` (default), `"full"` o `"sliced"`. En `"sliced"` cada parte de la prueba (identificación, soluciones, condiciones cromatográficas, procedimiento/SST, cálculos, criterio de aceptación) se extrae con un sub-esquema en paralelo y luego se ensambla y valida; `"auto"` lo activa solo para pruebas grandes. Úsalo en `"sliced"` para reintentar pruebas con tablas muy extensas.
 
   ## Salida y efectos en el estado
   - **ToolMessage:** Confirma qué identificador se procesó, el source_file_name, y la ruta del archivo temporal.
@@ -131,6 +139,31 @@ TEST_SOLUTION_STRUCTURED_EXTRACTION_TOOL_DESC = """
   - Una vez que hayas generado todos los archivos individuales, ejecuta `consolidate_test_solution_structured(source_file_name="...")` para construir el archivo consolidado final.
 """
 
+#############################################################################################################
+# Test/Solution Structured Extraction (batch) tool description
+#############################################################################################################
+TEST_SOLUTION_STRUCTURED_EXTRACTION_BATCH_TOOL_DESC = """
+  Versión batch de `test_solution_structured_extraction`: estructura varias (o todas) las pruebas/soluciones de `{base_path}/test_solution_markdown_{source_file_name}.json` en UNA sola llamada, ejecutando el LLM en paralelo con un límite de concurrencia y escribiendo todos los archivos temporales a la vez.
+
+  ## Cuándo usar
+  - Es la forma preferida del Paso 3 (Fan-Out): una sola llamada con `ids="all"` reemplaza N llamadas individuales.
+  - Para reintentar ids que fallaron, vuelve a invocarla con `ids=[...]`.
+
+  ## Parámetros
+  - `source_file_name (str)`: Nombre del archivo de origen (sin extensión). **OBLIGATORIO**.
+  - `ids (list[int] | str)`: Ids a procesar: lista de enteros, ids separados por comas (`"3,4"`) o `"all"` (todos los ítems del markdown). Default: `"all"`.
+  - `base_path (str)`: Ruta base. Default: `/actual_method`. Usa `/proposed_method` para side-by-side o métodos de referencia.
+  - `max_concurrency (int)`: Máximo de ítems extraídos a la vez (las llamadas al LLM del proceso tienen además un tope global). Default: `8`.
+  - `extraction_mode (str)`: `"auto"` (default), `"full"` o `"sliced"`; mismo significado que en la herramienta individual.
+
+  ## Salida y efectos en el estado
+  - **ToolMessage:** Ids generados, ids fallidos (si los hay) e ids sin markdown asociado.
+  - **Estado (`state['files']`):** Crea `/temp_{base_path}/{source_file_name}/{{id}}.json` para cada id procesado con éxito (mismo formato que la herramienta individual).
+
+  ## Siguiente Paso Esperado
+  - Ejecuta `consolidate_test_solution_structured(source_file_name="...")` para construir el archivo consolidado final.
+"""
+
 #############################################################################################################
 # Test/Solution Structured Consolidation tool description
 #############################################################################################################
@@ -351,3 +384,29 @@ RESOLVE_SOURCE_REFERENCES_TOOL_DESC = """
   - Ejecutar `analyze_change_impact` que ahora podrá usar `resolved_source_file_name` para hacer matching correcto.
   """
 
+RESUME_CHANGE_IMPLEMENTATION_TOOL_DESC = """
+  Reporta qué etapas del flujo de implementación (resolve_source_references, analyze_change_impact,
+  apply_method_patch, consolidate_new_method, render_method_docx) siguen vigentes y desde cuál reanudar.
+
+  ## Cuándo usar
+  - Ejecuta esta herramienta PRIMERO cuando ya existan archivos en `/new/` (reintento tras un error,
+    p. ej. una plantilla DOCX corregida o un método legado re-extraído).
+  - No la uses en una primera ejecución sin artefactos previos.
+
+  ## Qué hace
+  1. Lee los registros de `/new/stage_manifest/` que cada herramienta escribe al terminar.
+  2. Recalcula el hash del contenido de las entradas de cada etapa (no usa fechas de modificación).
+  3. Marca cada etapa como `vigente`, `pendiente`, `desactualizada` o `no aplica` (modo solo método legado).
+
+  ## Parámetros
+  - No requiere parámetros. Lee automáticamente del estado.
+
+  ## Salida y efectos en el estado
+  - **ToolMessage:** Estado de cada etapa, la etapa desde la que reanudar y, si corresponde, los
+    `action_index` que faltan de `apply_method_patch`.
+  - **Estado (`state['files']`):** No modifica archivos.
+
+  ## Siguiente Paso Esperado
+  - Ejecutar solo la etapa indicada y las posteriores; no repetir las etapas vigentes.
+  """
+
@@ -81,6 +81,30 @@ TEST_SOLUTION_STRUCTURED_EXTRACTION_HUMAN_PROMPT = """
 """
 
 
+TEST_SOLUTION_STRUCTURED_EXTRACTION_COMPACT_HUMAN_PROMPT = """
+  Extrae la información estructurada del siguiente método analítico:
+
+  Sección: {section_id}
+  Título: {title}
+  {part_note}
+  <texto_del_metodo>
+{markdown}
+  </texto_del_metodo>
+"""
+
+TEST_SOLUTION_STRUCTURED_EXTRACTION_PART_NOTE = (
+  "Este texto es la parte {part} de {total} de la misma prueba (se dividió por tamaño). "
+  "Extrae solo lo que aparece en esta parte y conserva section_id, section_title y test_name de la prueba."
+)
+
+TEST_SOLUTION_STRUCTURED_EXTRACTION_SLICE_NOTE = """
+  <alcance_de_la_extraccion>
+  En esta llamada extrae ÚNICAMENTE los campos: {fields}.
+  El resto de la prueba se extrae en llamadas separadas; aplica las mismas reglas y devuelve null si el campo no aparece en el texto.
+  </alcance_de_la_extraccion>
+"""
+
+
 TEST_SOLUTION_STRUCTURED_EXTRACTION_PROMPT = """
   Eres un químico analítico senior especializado en métodos analíticos farmacéuticos, con experiencia en integridad de datos, farmacopea USP y normatividad GMP. Tu tarea es extraer información de documentos de métodos analíticos y transformarla en JSON estructurado siguiendo el esquema proporcionado.
 
@@ -1060,3 +1084,356 @@ STRUCTURED_EXTRACTION_REFERENCE_METHODS = """
   {metadata_content}
   </datos_metodo_referencia>
 """
+
+
+#############################################################################################################
+# Test/Solution Clean Markdown: detección de encabezados por chunk (perfiles legacy/reference)
+#############################################################################################################
+
+TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_SYSTEM_PROMPT = """
+### ROLE
+Eres un experto en análisis de documentos de métodos analíticos farmacéuticos. Tu objetivo es identificar ÚNICAMENTE los **NOMBRES DE PRUEBAS ANALÍTICAS PRINCIPALES** de la sección de **PROCEDIMIENTOS** de un documento en formato Markdown.
+
+### TASK
+Analiza el texto en Markdown e identifica SOLO los encabezados que corresponden a **PRUEBAS ANALÍTICAS** dentro de la sección de PROCEDIMIENTOS/DESARROLLO. Las pruebas pueden aparecer:
+- Con numeración (ej: "5.1 DESCRIPCIÓN", "## 5.8 VALORACIÓN")
+- Sin numeración (ej: "DESCRIPCIÓN (USP)", "**VALORACIÓN (USP)**", "SOLVENTES RESIDUALES (USP)")
+- En diferentes formatos: encabezados markdown (#, ##), texto en negrita (**texto**), o texto en mayúsculas dentro de tablas
+
+### LENGUAJE
+- Detecta el idioma predominante del texto. **No traduzcas.**
+- Copia encabezados exactamente como aparezcan en el documento (si el documento está en inglés, devuelve los títulos en inglés; si está en español, en español).
+
+Para cada prueba analítica detectada, extrae:
+- `raw`: El encabezado/título EXACTO como aparece en el markdown (solo la línea del título, NO el contenido).
+- `section_id`: El número de sección si existe (ej: "5.1", "5.8"), o `null` si no tiene numeración.
+- `title`: El nombre de la prueba SIN la numeración inicial, copiado EXACTAMENTE como aparece.
+
+### IMPORTANTE: SECCIÓN CORRECTA
+- **SOLO** extrae pruebas de la sección **PROCEDIMIENTOS** o **DESARROLLO** (típicamente sección 5, 6 o 7 dependiendo del documento).
+- **NUNCA** extraigas de la sección **ESPECIFICACIONES** (típicamente sección 3).
+- **NUNCA** extraigas de la **TABLA DE CONTENIDO** o **ÍNDICE**.
+- Las pruebas en ESPECIFICACIONES solo listan criterios de aceptación, NO procedimientos analíticos.
+
+### CRITERIOS DE INCLUSIÓN (QUÉ SÍ EXTRAER)
+Extrae encabezados que sean **pruebas analíticas** de la sección PROCEDIMIENTOS, tales como:
+- DESCRIPCIÓN / DESCRIPCION
+- PUNTO DE FUSIÓN / PUNTO DE FUSION
+- IDENTIFICACIÓN / IDENTIFICACION (IR, UV, HPLC, etc.)
+- VALORACIÓN / VALORACION / ENSAYO / POTENCIA
+- PUREZA CROMATOGRÁFICA / PUREZA CROMATOGRAFICA
+- SUSTANCIAS RELACIONADAS / IMPUREZAS / IMPUREZAS ORGÁNICAS / IMPUREZAS ORGANICAS
+- PUREZA ENANTIOMÉRICA / PUREZA ENANTIOMERICA
+- UNIFORMIDAD DE CONTENIDO / UNIFORMIDAD DE DOSIS
+- DISOLUCIÓN / DISOLUCION
+- pH
+- PÉRDIDA POR SECADO / PERDIDA POR SECADO / HUMEDAD
+- METALES PESADOS
+- SOLVENTES RESIDUALES
+- CENIZAS SULFATADAS
+- LÍMITE MICROBIANO / LIMITE MICROBIANO
+- ESTERILIDAD
+- ENDOTOXINAS BACTERIANAS
+- LÍMITE DE NAPROXENO LIBRE / NAPROXENO LIBRE (y similares para otros APIs)
+- Otras pruebas analíticas con nombres similares
+
+### CRITERIOS DE EXCLUSIÓN (QUÉ NO EXTRAER)
+**NO extraigas** las siguientes secciones:
+- **Entradas de TABLA DE CONTENIDO** (líneas con "..." seguido de número de página)
+- **Sección ESPECIFICACIONES** (sección 3.x con criterios de aceptación, NO procedimientos)
+- Preparación de soluciones (Solución estándar, Solución madre, Solución test, Solución muestra, Solución Stock, etc.)
+- Preparación de reactivos (Tioacetamida SR, Buffer, Fase móvil, Diluyente, etc.)
+- Condiciones cromatográficas / Condiciones Instrumentales
+- Procedimiento / Procedimientos / Test de adecuabilidad (como subsección)
+- Criterio de aceptación (como sección independiente)
+- Cálculos / Fórmulas
+- Equipos / Materiales
+- Subsecciones numeradas con más de un punto decimal (ej: 5.1.1, 5.9.2, 5.10.3)
+- Encabezados de página/documento (ej: "DE CAMBIO SC-25-777", "PRUEBAS PARA LA MATERIA PRIMA", "Página X de Y")
+- **Parámetros de SST (Test de Adecuabilidad del Sistema)**: NO extraer parámetros que aparecen en tablas de orden de inyección como: "Relación Pico/Valle", "Desviación Estándar Relativa de las Áreas (RSD)", "Factor de Cola", "Factor de Exactitud", "Asimetría", "Señal/Ruido (S/N)", "Resolución", "Factor de Capacidad", "Platos Teóricos". Estos son parámetros de adecuabilidad, NO pruebas analíticas.
+- **Contenido de celdas de tablas de SST**: Si el texto proviene de una tabla con columnas como "Solución", "Número de Inyecciones", "Test de Adecuabilidad", "Especificación", NO extraer ningún valor de esas celdas como prueba analítica.
+
+### REGLAS DE EXTRACCIÓN
+- **raw**: Copia SOLO la línea del encabezado/título EXACTAMENTE como aparece (incluyendo #, **, |, etc.), NO incluyas el contenido/procedimiento de la prueba.
+- **section_id**: Extrae el número de sección si existe (ej: "7.1", "7.8"). Si NO hay número, usa `null`. **NUNCA inventes números de sección**.
+- **title**: Copia el nombre de la prueba EXACTAMENTE como aparece, sin la numeración inicial.
+
+### OUTPUT FORMAT
+```json
+{{
+  "test_methods": [
+    {{
+      "raw": "string",
+      "section_id": "string o null",
+      "title": "string"
+    }}
+  ]
+}}
+```
+
+Si no encuentras ninguna prueba analítica principal, devuelve:
+```json
+{{
+  "test_methods": []
+}}
+```
+
+### EJEMPLOS
+
+**Ejemplo 1 - Prueba CON numeración:**
+Input: "## 7.8 NAPROXENO LIBRE (USP)"
+Output:
+```json
+{{
+  "raw": "## 7.8 NAPROXENO LIBRE (USP)",
+  "section_id": "7.8",
+  "title": "NAPROXENO LIBRE (USP)"
+}}
+```
+
+**Ejemplo 2 - Prueba SIN numeración (en tabla):**
+Input: "|  DESCRIPCIÓN (USP)  |"
+Output:
+```json
+{{
+  "raw": "|  DESCRIPCIÓN (USP)  |",
+  "section_id": null,
+  "title": "DESCRIPCIÓN (USP)"
+}}
+```
+
+**Ejemplo 3 - Prueba SIN numeración (texto plano en mayúsculas):**
+Input: "SOLVENTES RESIDUALES (USP)"
+Output:
+```json
+{{
+  "raw": "SOLVENTES RESIDUALES (USP)",
+  "section_id": null,
+  "title": "SOLVENTES RESIDUALES (USP)"
+}}
+```
+
+**Ejemplo 4 - Prueba SIN numeración (en negrita):**
+Input: "**PRUEBA DE PUREZA ENANTIOMERICA (USP)**"
+Output:
+```json
+{{
+  "raw": "**PRUEBA DE PUREZA ENANTIOMERICA (USP)**",
+  "section_id": null,
+  "title": "PRUEBA DE PUREZA ENANTIOMERICA (USP)"
+}}
+```
+
+**Ejemplo 5 - Prueba CON numeración y encabezado markdown:**
+Input: "## IMPUREZAS ORGANICAS (USP)"
+Output:
+```json
+{{
+  "raw": "## IMPUREZAS ORGANICAS (USP)",
+  "section_id": null,
+  "title": "IMPUREZAS ORGANICAS (USP)"
+}}
+```
+
+**Ejemplo 6 - NO es prueba analítica (NO extraer):**
+Input: "### Solución Stock Estándar de Naproxeno Sódico"
+→ NO extraer (es preparación de solución)
+
+**Ejemplo 7 - NO es prueba analítica (NO extraer):**
+Input: "## Procedimiento"
+→ NO extraer (es un procedimiento, no una prueba)
+
+**Ejemplo 8 - NO es prueba analítica (NO extraer):**
+Input: "## Cálculos"
+→ NO extraer (es sección de cálculos)
+"""
+
+TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_HUMAN_PROMPT = """
+A continuación se encuentra la sección del documento a analizar:
+ 
+<DOCUMENT_CHUNK>
+{chunk_text}
+</DOCUMENT_CHUNK>
+"""
+
+#############################################################################################################
+# Test/Solution Clean Markdown: detección de encabezados por chunk (perfil side-by-side)
+#############################################################################################################
+
+TEST_SOLUTION_CLEAN_MARKDOWN_SBS_CHUNK_SYSTEM_PROMPT = """
+    ### ROLE
+    Eres un experto en análisis de documentos de métodos analíticos farmacéuticos. Tu objetivo es identificar ÚNICAMENTE los **NOMBRES DE PRUEBAS ANALÍTICAS PRINCIPALES** de un documento en formato Markdown.
+
+    ### TASK
+    Analiza el texto en Markdown e identifica SOLO los encabezados que corresponden a **PRUEBAS ANALÍTICAS**. Las pruebas pueden aparecer:
+    - Con numeración (ej: "7.1 DESCRIPCIÓN", "## 7.8 VALORACIÓN")
+    - Sin numeración (ej: "DESCRIPCIÓN (USP)", "**VALORACIÓN (USP)**", "SOLVENTES RESIDUALES (USP)")
+    - En diferentes formatos: encabezados markdown (#, ##), texto en negrita (**texto**), o texto en mayúsculas dentro de tablas
+
+    ### LENGUAJE
+    - Detecta el idioma predominante del texto y manténlo. **No traduzcas.**
+    - Copia los encabezados exactamente como aparezcan (si el documento está en inglés, devuelve los títulos en inglés; si está en español, en español).
+
+    Para cada prueba analítica detectada, extrae:
+    - `raw`: El encabezado/título EXACTO como aparece en el markdown (solo la línea del título, NO el contenido).
+    - `section_id`: El número de sección si existe (ej: "7.1", "7.8"), o `null` si no tiene numeración.
+    - `title`: El nombre de la prueba SIN la numeración inicial, copiado EXACTAMENTE como aparece.
+
+    ### CRITERIOS DE INCLUSIÓN (QUÉ SÍ EXTRAER)
+    Extrae encabezados que sean **pruebas analíticas**, tales como:
+    - DESCRIPCIÓN / DESCRIPCION
+    - PUNTO DE FUSIÓN / PUNTO DE FUSION
+    - IDENTIFICACIÓN / IDENTIFICACION (IR, UV, HPLC, etc.)
+    - VALORACIÓN / VALORACION / ENSAYO / POTENCIA
+    - PUREZA CROMATOGRÁFICA / PUREZA CROMATOGRAFICA
+    - SUSTANCIAS RELACIONADAS / IMPUREZAS / IMPUREZAS ORGÁNICAS / IMPUREZAS ORGANICAS
+    - PUREZA ENANTIOMÉRICA / PUREZA ENANTIOMERICA
+    - UNIFORMIDAD DE CONTENIDO / UNIFORMIDAD DE DOSIS
+    - DISOLUCIÓN / DISOLUCION
+    - pH
+    - PÉRDIDA POR SECADO / PERDIDA POR SECADO / HUMEDAD
+    - METALES PESADOS
+    - SOLVENTES RESIDUALES
+    - CENIZAS SULFATADAS
+    - LÍMITE MICROBIANO / LIMITE MICROBIANO
+    - ESTERILIDAD
+    - ENDOTOXINAS BACTERIANAS
+    - LÍMITE DE NAPROXENO LIBRE / NAPROXENO LIBRE (y similares para otros APIs)
+    - Otras pruebas analíticas con nombres similares
+
+    ### CRITERIOS DE EXCLUSIÓN (QUÉ NO EXTRAER)
+    **NO extraigas** las siguientes secciones:
+    - Preparación de soluciones (Solución estándar, Solución madre, Solución test, Solución muestra, Solución Stock, etc.)
+    - Preparación de reactivos (Tioacetamida SR, Buffer, Fase móvil, Diluyente, etc.)
+    - Condiciones cromatográficas / Condiciones Instrumentales
+    - Procedimiento / Procedimientos / Test de adecuabilidad
+    - Criterio de aceptación (como sección independiente)
+    - Cálculos / Fórmulas
+    - Equipos / Materiales
+    - Subsecciones numeradas con más de un punto decimal (ej: 7.1.1, 7.9.2, 7.10.3)
+    - Encabezados de página/documento (ej: "DE CAMBIO SC-25-777", "PRUEBAS PARA LA MATERIA PRIMA", "Página X de Y")
+    
+    **IMPORTANTE - NO extraigas contenido de tablas de adecuabilidad del sistema:**
+    - Filas de tablas que contengan columnas como "Solución", "Número de Inyecciones", "Parámetro a evaluar", "Especificación"
+    - Valores en columnas de "Parámetro a evaluar" (ej: "Resolución", "Señal/ruido", "Pureza Enantiomérica", "Identificación de picos", "Cuantificación Solvente Residual")
+    - Filas que describen inyecciones de soluciones (ej: "Solución estándar | 1 | ...", "Solución muestra | 1 | ...")
+    - Las pruebas analíticas son ENCABEZADOS/TÍTULOS de sección (##, ###, **texto**), NO contenido dentro de celdas de tablas de procedimiento
+    
+    **Parámetros de SST (Test de Adecuabilidad del Sistema) - NO extraer:**
+    - "Relación Pico/Valle", "Desviación Estándar Relativa (%RSD)", "Factor de Cola", "Asimetría", "Señal/Ruido (S/N)", "Resolución R", "Factor de Capacidad", "Platos Teóricos"
+    - Estos son PARÁMETROS de adecuabilidad que aparecen en tablas, NO pruebas analíticas principales
+
+    ### REGLAS DE EXTRACCIÓN
+    - **raw**: Copia SOLO la línea del encabezado/título EXACTAMENTE como aparece (incluyendo #, **, |, etc.), NO incluyas el contenido/procedimiento de la prueba.
+    - **section_id**: Extrae el número de sección si existe (ej: "7.1", "7.8"). Si NO hay número, usa `null`. **NUNCA inventes números de sección**.
+    - **title**: Copia el nombre de la prueba EXACTAMENTE como aparece, sin la numeración inicial.
+
+    ### OUTPUT FORMAT
+    ```json
+    {{
+    "test_methods": [
+        {{
+        "raw": "string",
+        "section_id": "string o null",
+        "title": "string"
+        }}
+    ]
+    }}
+    ```
+
+    Si no encuentras ninguna prueba analítica principal, devuelve:
+    ```json
+    {{
+    "test_methods": []
+    }}
+    ```
+
+    ### EJEMPLOS
+
+    **Ejemplo 1 - Prueba CON numeración:**
+    Input: "## 7.8 NAPROXENO LIBRE (USP)"
+    Output:
+    ```json
+    {{
+    "raw": "## 7.8 NAPROXENO LIBRE (USP)",
+    "section_id": "7.8",
+    "title": "NAPROXENO LIBRE (USP)"
+    }}
+    ```
+
+    **Ejemplo 2 - Prueba SIN numeración (en tabla):**
+    Input: "|  DESCRIPCIÓN (USP)  |"
+    Output:
+    ```json
+    {{
+    "raw": "|  DESCRIPCIÓN (USP)  |",
+    "section_id": null,
+    "title": "DESCRIPCIÓN (USP)"
+    }}
+    ```
+
+    **Ejemplo 3 - Prueba SIN numeración (texto plano en mayúsculas):**
+    Input: "SOLVENTES RESIDUALES (USP)"
+    Output:
+    ```json
+    {{
+    "raw": "SOLVENTES RESIDUALES (USP)",
+    "section_id": null,
+    "title": "SOLVENTES RESIDUALES (USP)"
+    }}
+    ```
+
+    **Ejemplo 4 - Prueba SIN numeración (en negrita):**
+    Input: "**PRUEBA DE PUREZA ENANTIOMERICA (USP)**"
+    Output:
+    ```json
+    {{
+    "raw": "**PRUEBA DE PUREZA ENANTIOMERICA (USP)**",
+    "section_id": null,
+    "title": "PRUEBA DE PUREZA ENANTIOMERICA (USP)"
+    }}
+    ```
+
+    **Ejemplo 5 - Prueba CON numeración y encabezado markdown:**
+    Input: "## IMPUREZAS ORGANICAS (USP)"
+    Output:
+    ```json
+    {{
+    "raw": "## IMPUREZAS ORGANICAS (USP)",
+    "section_id": null,
+    "title": "IMPUREZAS ORGANICAS (USP)"
+    }}
+    ```
+
+    **Ejemplo 6 - NO es prueba analítica (NO extraer):**
+    Input: "### Solución Stock Estándar de Naproxeno Sódico"
+    → NO extraer (es preparación de solución)
+
+    **Ejemplo 7 - NO es prueba analítica (NO extraer):**
+    Input: "## Procedimiento"
+    → NO extraer (es un procedimiento, no una prueba)
+
+    **Ejemplo 8 - NO es prueba analítica (NO extraer):**
+    Input: "## Cálculos"
+    → NO extraer (es sección de cálculos)
+
+    **Ejemplo 9 - NO es prueba analítica (NO extraer - contenido de tabla de adecuabilidad):**
+    Input: "|  Solución estándar | 1 | Identificación de picos | Identificar los picos principales...  |"
+    → NO extraer ("Identificación de picos" es un PARÁMETRO A EVALUAR dentro de una tabla, NO un encabezado de prueba)
+
+    **Ejemplo 10 - NO es prueba analítica (NO extraer - parámetro en tabla):**
+    Input: "|  5. Resolución (Muestra) | 1 | Pureza Enantiomérica | No más de 2.5%  |"
+    → NO extraer ("Pureza Enantiomérica" aquí es un parámetro de evaluación en una fila de tabla, NO un título de prueba)
+
+    **Ejemplo 11 - NO es prueba analítica (NO extraer - parámetro en tabla):**
+    Input: "|  Solución muestra (1 réplica) | 1 | Cuantificación Solvente Residual | Tolueno: No más de 890 ppm  |"
+    → NO extraer (es una fila de tabla de procedimiento con parámetros, NO un encabezado de prueba)
+"""
+
+TEST_SOLUTION_CLEAN_MARKDOWN_SBS_CHUNK_HUMAN_PROMPT = """
+    A continuación se encuentra la sección del documento a analizar:
+    
+    <DOCUMENT_CHUNK>
+    {chunk_text}
+    </DOCUMENT_CHUNK>
+"""
@@ -4,12 +4,14 @@ from src.tools.apply_method_patch import apply_method_patch
 from src.tools.consolidate_new_method import consolidate_new_method
 from src.tools.consolidate_test_solution_structured import consolidate_test_solution_structured
 from src.tools.test_solution_structured_extraction import test_solution_structured_extraction
+from src.tools.test_solution_structured_extraction_batch import test_solution_structured_extraction_batch
 from src.tools.test_solution_clean_markdown import test_solution_clean_markdown
 from src.tools.test_solution_clean_markdown_sbs import test_solution_clean_markdown_sbs
 from src.tools.pdf_da_metadata_toc import pdf_da_metadata_toc
 from src.tools.sbs_proposed_column import sbs_proposed_column_to_pdf_md
 from src.tools.render_method_docx import render_method_docx
 from src.tools.resolve_source_references import resolve_source_references
+from src.tools.resume_change_implementation import resume_change_implementation
 
 __all__ = [
     "extract_annex_cc",
@@ -18,10 +20,12 @@ __all__ = [
     "consolidate_new_method",
     "consolidate_test_solution_structured",
     "test_solution_structured_extraction",
+    "test_solution_structured_extraction_batch",
     "test_solution_clean_markdown",
     "test_solution_clean_markdown_sbs",
     "pdf_da_metadata_toc",
     "sbs_proposed_column_to_pdf_md",
     "render_method_docx",
     "resolve_source_references",
+    "resume_change_implementation",
 ]
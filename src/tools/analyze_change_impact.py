@@ -17,7 +17,6 @@ warnings.filterwarnings(
 
 import json
 import logging
-from datetime import datetime, timezone
 from typing import Annotated, Any, Optional, Literal, List, Dict
 
 from langchain.chat_models import init_chat_model
@@ -34,6 +33,10 @@ from src.prompts.tool_llm_calls_prompts import (
     UNIFIED_CHANGE_HUMAN_ANALYSIS_PROMPT,
     UNIFIED_CHANGE_SYSTEM_ANALYSIS_PROMPT,
 )
+from src.utils.progress import ProgressReporter
+from src.utils.stage_manifest import STAGE_ANALYZE, record_stage, stage_input_hash
+from src.utils.token_counter import count_tokens
+from src.utils.virtual_fs import VirtualFS
 
 # --- Configuración ---
 logger = logging.getLogger(__name__)
@@ -151,30 +154,6 @@ def _normalize_name(name: Optional[str]) -> Optional[str]:
     return " ".join(normalized.split())
 
 
-def _safe_get_file_data(files: dict[str, Any], path: str) -> Optional[Any]:
-    """
-    Lee files[path]["data"] de forma segura.
-    Fallback: si no existe "data" pero sí "content" (string JSON), intenta json.loads(content).
-    """
-    entry = files.get(path)
-    if not isinstance(entry, dict):
-        return None
-
-    data = entry.get("data")
-    if data is not None:
-        return data
-
-    content = entry.get("content")
-    if isinstance(content, str) and content.strip():
-        try:
-            return json.loads(content)
-        except Exception:
-            logger.exception(f"No se pudo parsear content JSON en {path}")
-            return None
-
-    return None
-
-
 def _collect_prueba_records_with_index(
     pruebas: Optional[list],
     source_id_key: str = "_source_id",
@@ -448,27 +427,21 @@ import re
 STRUCTURED_CONTENT_PATTERN = re.compile(r"test_solution_structured_content_(.+)\.json$")
 
 
-def _find_structured_content_files(files: Dict[str, Any], base_dir: str) -> List[str]:
+def _find_structured_content_files(vfs: VirtualFS, base_dir: str) -> List[str]:
     """Encuentra todos los archivos test_solution_structured_content_*.json en un directorio."""
-    found = []
-    prefix = base_dir.rstrip("/") + "/"
-    for path in files.keys():
-        if isinstance(path, str) and path.startswith(prefix):
-            if STRUCTURED_CONTENT_PATTERN.search(path):
-                found.append(path)
-    return sorted(found)
+    return vfs.glob(f"{base_dir.rstrip('/')}/test_solution_structured_content_*.json")
 
 
-def _load_all_tests_from_directory(files: Dict[str, Any], base_dir: str) -> List[Dict[str, Any]]:
+def _load_all_tests_from_directory(vfs: VirtualFS, base_dir: str) -> List[Dict[str, Any]]:
     """
     Carga y combina todas las pruebas de todos los archivos estructurados en un directorio.
     Preserva source_file_name para trazabilidad.
     """
     all_tests = []
-    structured_files = _find_structured_content_files(files, base_dir)
+    structured_files = _find_structured_content_files(vfs, base_dir)
     
     for file_path in structured_files:
-        payload = _safe_get_file_data(files, file_path)
+        payload = vfs.read_json(file_path)
         if payload is None:
             continue
         
@@ -482,10 +455,11 @@ def _load_all_tests_from_directory(files: Dict[str, Any], base_dir: str) -> List
         else:
             tests = _extract_tests_from_proposed(payload)
         
-        # Agregar source_file_name a cada prueba
-        for test in tests:
-            if isinstance(test, dict):
-                test["_source_file_name"] = source_file_name
+        # Agregar source_file_name a cada prueba (copias: el payload leído es inmutable)
+        tests = [
+            {**test, "_source_file_name": source_file_name} if isinstance(test, dict) else test
+            for test in tests
+        ]
         
         all_tests.extend(tests)
         logger.info(f"  Cargadas {len(tests)} pruebas de {file_path}")
@@ -493,7 +467,7 @@ def _load_all_tests_from_directory(files: Dict[str, Any], base_dir: str) -> List
     return all_tests
 
 
-def _load_analytical_tests_registry(files: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+def _load_analytical_tests_registry(vfs: VirtualFS) -> Dict[str, List[Dict[str, Any]]]:
     """
     Carga todos los registros de /analytical_tests/ y los organiza por source_type.
     
@@ -507,14 +481,9 @@ def _load_analytical_tests_registry(files: Dict[str, Any]) -> Dict[str, List[Dic
         "proposed_method": [],
     }
     
-    prefix = ANALYTICAL_TESTS_DIR.rstrip("/") + "/"
-    
-    for path, entry in files.items():
-        if not isinstance(path, str) or not path.startswith(prefix):
-            continue
-        
-        payload = _safe_get_file_data(files, path)
-        if not isinstance(payload, dict):
+    for path in vfs.listdir(ANALYTICAL_TESTS_DIR, recursive=True):
+        payload = vfs.read_json(path, expect=dict)
+        if payload is None:
             continue
         
         source_type = payload.get("source_type", "unknown")
@@ -538,17 +507,17 @@ def analyze_change_impact(
     logger.info("Iniciando 'analyze_change_impact'")
     logger.info("=" * 80)
 
-    files = state.get("files", {}) or {}
-    logger.info(f"Archivos disponibles: {len(files)}")
+    vfs = VirtualFS.from_state(state)
+    input_hash = stage_input_hash(vfs, STAGE_ANALYZE)
 
     # --- Paso 1: Cargar payloads desde múltiples archivos ---
     logger.info("Cargando archivos necesarios...")
 
     # Cargar control de cambios
-    cc_payload = _safe_get_file_data(files, CHANGE_CONTROL_DEFAULT_PATH)
-    if not isinstance(cc_payload, dict):
+    cc_payload = vfs.read_json(CHANGE_CONTROL_DEFAULT_PATH, expect=dict)
+    if cc_payload is None:
         # Intentar ruta legacy
-        cc_payload = _safe_get_file_data(files, "/new/change_control_summary.json")
+        cc_payload = vfs.read_json("/new/change_control_summary.json", expect=dict)
     
     if not isinstance(cc_payload, dict):
         msg = f"ERROR: No se encontró (o es inválido) el control de cambios en {CHANGE_CONTROL_DEFAULT_PATH}."
@@ -557,27 +526,27 @@ def analyze_change_impact(
     logger.info("✓ Control de cambios cargado")
 
     # Cargar pruebas del método legado (puede haber múltiples archivos)
-    legacy_files = _find_structured_content_files(files, ACTUAL_METHOD_DIR)
+    legacy_files = _find_structured_content_files(vfs, ACTUAL_METHOD_DIR)
     if not legacy_files:
         msg = f"ERROR: No se encontraron archivos de método legado en {ACTUAL_METHOD_DIR}/"
         logger.error(msg)
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
     
-    legacy_tests_raw = _load_all_tests_from_directory(files, ACTUAL_METHOD_DIR)
+    legacy_tests_raw = _load_all_tests_from_directory(vfs, ACTUAL_METHOD_DIR)
     logger.info(f"✓ Método legado cargado: {len(legacy_files)} archivo(s), {len(legacy_tests_raw)} pruebas")
 
     # Cargar pruebas del método propuesto (puede haber múltiples archivos)
-    proposed_files = _find_structured_content_files(files, PROPOSED_METHOD_DIR)
+    proposed_files = _find_structured_content_files(vfs, PROPOSED_METHOD_DIR)
     if not proposed_files:
         msg = f"ERROR: No se encontraron archivos de método propuesto en {PROPOSED_METHOD_DIR}/"
         logger.error(msg)
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
     
-    proposed_tests_raw = _load_all_tests_from_directory(files, PROPOSED_METHOD_DIR)
+    proposed_tests_raw = _load_all_tests_from_directory(vfs, PROPOSED_METHOD_DIR)
     logger.info(f"✓ Método propuesto cargado: {len(proposed_files)} archivo(s), {len(proposed_tests_raw)} pruebas")
     
     # Cargar registro de pruebas analíticas (opcional, para referencia cruzada)
-    analytical_registry = _load_analytical_tests_registry(files)
+    analytical_registry = _load_analytical_tests_registry(vfs)
     logger.info(f"✓ Registro de pruebas analíticas: {len(analytical_registry['actual_method'])} actual, {len(analytical_registry['proposed_method'])} propuesto")
 
     # --- Paso 2: Validación mínima de cambios ---
@@ -643,17 +612,25 @@ def analyze_change_impact(
     # --- Paso 5: Invocar LLM ---
     logger.info("Invocando LLM para generar plan de intervención...")
 
+    human_prompt = UNIFIED_CHANGE_HUMAN_ANALYSIS_PROMPT.format(context=context_json)
+    prompt_tokens = count_tokens(UNIFIED_CHANGE_SYSTEM_ANALYSIS_PROMPT) + count_tokens(human_prompt)
+    logger.info(f"  → Tamaño del prompt: ~{prompt_tokens} tokens")
+    progress = ProgressReporter("analyze_change_impact", "plan")
+    progress.add_tokens(prompt_tokens)
+    progress.start(f"{total_cambios} cambios, {len(pruebas_metodo_legado)} pruebas legado")
+
     try:
         llm_structured = change_control_analysis_model.with_structured_output(UnifiedInterventionPlan)
         response = _invoke_llm_with_retry(
             llm_structured=llm_structured,
-            human_prompt=UNIFIED_CHANGE_HUMAN_ANALYSIS_PROMPT.format(context=context_json),
+            human_prompt=human_prompt,
             system_prompt=UNIFIED_CHANGE_SYSTEM_ANALYSIS_PROMPT,
         )
         logger.info("✓ Plan de intervención generado exitosamente")
     except Exception as exc:
         msg = f"ERROR: Fallo al invocar LLM después de reintentos: {exc}"
         logger.exception(msg)
+        progress.error(msg)
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
 
     # --- Paso 6: Validar completitud del plan ---
@@ -688,14 +665,12 @@ def analyze_change_impact(
     # --- Paso 7: Guardar resultado ---
     plan_payload = response.model_dump()
 
-    files_update = dict(files)
-    files_update[CHANGE_IMPLEMENTATION_PLAN_PATH] = {
-        "content": json.dumps(plan_payload, ensure_ascii=False, indent=2),
-        "data": plan_payload,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    # Solo el archivo escrito: el reducer de archivos lo combina con el estado
+    vfs.write_json(CHANGE_IMPLEMENTATION_PLAN_PATH, plan_payload)
+    record_stage(vfs, STAGE_ANALYZE, input_hash)
 
     logger.info(f"✓ Plan guardado en {CHANGE_IMPLEMENTATION_PLAN_PATH}")
+    progress.done(f"Plan con {len(response.plan_intervencion)} acciones")
 
     # --- Paso 8: Mensaje resumen ---
     summary = response.resumen
@@ -724,7 +699,7 @@ def analyze_change_impact(
 
     return Command(
         update={
-            "files": files_update,
+            "files": vfs.updates,
             "messages": [ToolMessage(content=tool_message, tool_call_id=tool_call_id)],
         }
     )
@@ -60,6 +60,11 @@ from src.models.structured_test_model import (
     TestSolution,
     MetodoAnaliticoFinal,
 )
+from src.utils.token_counter import count_tokens
+from src.utils.read_cache import cached_read
+from src.utils.progress import ProgressReporter
+from src.utils.stage_manifest import apply_action_input_hash, record_apply_action
+from src.utils.virtual_fs import VirtualFS
 
 logger = logging.getLogger(__name__)
 
@@ -309,91 +314,56 @@ def find_test(
     return None, None
 
 
-def _load_json_payload(files: Dict[str, Any], path: str) -> Optional[Dict[str, Any] | List]:
-    """
-    Carga un payload JSON desde el filesystem virtual.
-    
-    Retorna dict, list, o None si no se encuentra o hay error de parseo.
-    """
-    entry = files.get(path)
-    if entry is None:
-        return None
-
-    if isinstance(entry, dict):
-        # Caso: entry tiene estructura {"data": ..., "content": ...}
-        if "data" in entry and isinstance(entry["data"], (dict, list)):
-            return entry["data"]
-        if isinstance(entry.get("content"), str):
-            try:
-                return json.loads(entry["content"])
-            except json.JSONDecodeError:
-                logger.warning(f"Error parseando JSON desde 'content' en {path}")
-                return None
-        # Si no tiene 'data' ni 'content', asumimos que es el payload directo
-        return entry
-
-    if isinstance(entry, str):
-        try:
-            return json.loads(entry)
-        except json.JSONDecodeError:
-            logger.warning(f"Error parseando JSON string en {path}")
-            return None
-    
-    if isinstance(entry, list):
-        return entry
-
-    return None
-
-
-def _find_structured_content_files(files: Dict[str, Any], directory: str) -> List[str]:
+def _find_structured_content_files(vfs: VirtualFS, directory: str) -> List[str]:
     """
     Busca archivos con patrón test_solution_structured_content_*.json en un directorio.
     
     Args:
-        files: Diccionario de archivos del estado
+        vfs: Filesystem virtual del estado
         directory: Directorio base (ej: '/actual_method')
     
     Returns:
         Lista de rutas de archivos encontrados
     """
-    found = []
-    dir_prefix = directory.rstrip("/") + "/"
-    for path in files.keys():
-        if path.startswith(dir_prefix) and STRUCTURED_CONTENT_PATTERN.search(path):
-            found.append(path)
-    return sorted(found)
+    return vfs.glob(f"{directory.rstrip('/')}/test_solution_structured_content_*.json")
 
 
-def _load_all_tests_from_directory(files: Dict[str, Any], directory: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+def _load_all_tests_from_directory(vfs: VirtualFS, directory: str) -> Tuple[List[Dict[str, Any]], List[str]]:
     """
     Carga todas las pruebas de archivos test_solution_structured_content_*.json en un directorio.
     
     Args:
-        files: Diccionario de archivos del estado
+        vfs: Filesystem virtual del estado
         directory: Directorio base (ej: '/actual_method')
     
     Returns:
-        Tupla (lista_de_pruebas, lista_de_archivos_usados)
+        Tupla (lista_de_pruebas, lista_de_archivos_usados). Las pruebas son de
+        solo lectura: se memorizan mientras los archivos no cambien, de modo que
+        las acciones sucesivas del plan no reconstruyen las listas.
     """
-    all_tests: List[Dict[str, Any]] = []
-    used_files: List[str] = []
-    
-    content_files = _find_structured_content_files(files, directory)
-    
-    for file_path in content_files:
-        payload = _load_json_payload(files, file_path)
-        if payload is not None:
-            tests = load_tests(payload)
-            # Agregar _source_file_name a cada prueba para trazabilidad
-            match = STRUCTURED_CONTENT_PATTERN.search(file_path)
-            source_file_name = match.group(1) if match else None
-            for test in tests:
-                if source_file_name:
-                    test["_source_file_name"] = source_file_name
-            all_tests.extend(tests)
-            used_files.append(file_path)
-            logger.info(f"  Cargadas {len(tests)} pruebas de {file_path}")
-    
+    content_files = _find_structured_content_files(vfs, directory)
+    fingerprint = vfs.fingerprint(content_files)
+    cache_key = ("apply_method_patch.tests", directory, fingerprint) if fingerprint is not None else None
+
+    def _load() -> Tuple[List[Dict[str, Any]], List[str]]:
+        all_tests: List[Dict[str, Any]] = []
+        used_files: List[str] = []
+        for file_path in content_files:
+            payload = vfs.read_json(file_path, expect=(dict, list))
+            if payload is not None:
+                tests = load_tests(payload)
+                # Agregar _source_file_name a cada prueba para trazabilidad
+                match = STRUCTURED_CONTENT_PATTERN.search(file_path)
+                source_file_name = match.group(1) if match else None
+                for test in tests:
+                    if source_file_name:
+                        test["_source_file_name"] = source_file_name
+                all_tests.extend(tests)
+                used_files.append(file_path)
+                logger.info(f"  Cargadas {len(tests)} pruebas de {file_path}")
+        return all_tests, used_files
+
+    all_tests, used_files = cached_read(cache_key, _load)
     return all_tests, used_files
 
 
@@ -412,15 +382,16 @@ def _build_method_summary(method_payload: dict[str, Any]) -> dict[str, Any]:
     }
 
 
-def _append_log(files: dict[str, Any], entry: dict[str, Any]) -> None:
+def _append_log(vfs: VirtualFS, entry: dict[str, Any]) -> None:
+    """Agrega una línea al log de parches (archivo de texto: se guarda como ``content``)."""
     payload = json.dumps(entry, ensure_ascii=False)
     log_entry = payload + "\n"
 
-    existing = files.get(PATCH_LOG_PATH)
+    existing = vfs.entry(PATCH_LOG_PATH)
     if isinstance(existing, dict) and isinstance(existing.get("content"), str):
         log_entry = existing["content"] + log_entry
 
-    files[PATCH_LOG_PATH] = {"content": log_entry, "data": None, "modified_at": datetime.now(timezone.utc).isoformat()}
+    vfs.write_entry(PATCH_LOG_PATH, {"content": log_entry, "data": None, "modified_at": datetime.now(timezone.utc).isoformat()})
 
 
 def _format_indices(indices: Iterable[int]) -> str:
@@ -464,13 +435,13 @@ def _invoke_patch_llm(
 
 
 def _save_patch(
-    files: dict[str, Any],
+    vfs: VirtualFS,
     action_index: int,
     accion: str,
     prueba_json: Optional[dict[str, Any]],
     target_id: Optional[str],
     target_name: Optional[str],
-) -> None:
+) -> str:
     patch_payload = {
         "action_index": action_index,
         "accion": accion,
@@ -479,11 +450,8 @@ def _save_patch(
         "contenido": prueba_json,
     }
     patch_path = f"{PATCHES_DIR}/{action_index}.json"
-    files[patch_path] = {
-        "content": json.dumps(patch_payload, ensure_ascii=False, indent=2),
-        "data": patch_payload,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    vfs.write_json(patch_path, patch_payload)
+    return patch_path
 
 
 @tool(description=APPLY_METHOD_PATCH_TOOL_DESCRIPTION)
@@ -502,12 +470,12 @@ def apply_method_patch(
     nuevas se utilizan los datos del método propuesto.
     """
     logger.info("Iniciando 'apply_method_patch' para la accion %s", action_index)
-    files = state.get("files", {}) or {}
+    vfs = VirtualFS.from_state(state)
 
     # -------------------------------------------------------------------------
     # 1. Cargar el plan de intervención
     # -------------------------------------------------------------------------
-    plan_payload = _load_json_payload(files, plan_path)
+    plan_payload = vfs.read_json(plan_path)
     if plan_payload is None:
         msg = f"No se encontró el plan de implementación en {plan_path}."
         logger.error(msg)
@@ -525,6 +493,9 @@ def apply_method_patch(
         logger.error(msg)
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
 
+    input_hash = apply_action_input_hash(vfs, plan_payload["plan_intervencion"][action_index])
+    # Una invocación por acción (en paralelo en el pipeline): una etapa por acción
+    progress = ProgressReporter("apply_method_patch", f"patch #{action_index}")
     action: UnifiedInterventionAction = plan.plan_intervencion[action_index]
     accion = (action.accion or "").lower().strip()
     descripcion = action.cambio or ""
@@ -534,12 +505,12 @@ def apply_method_patch(
     # -------------------------------------------------------------------------
     # 2. Cargar método base (nuevo o legado)
     # -------------------------------------------------------------------------
-    method_entry = _load_json_payload(files, new_method_path)
-    if method_entry and isinstance(method_entry, (dict, list)):
+    method_entry = vfs.read_json(new_method_path, expect=(dict, list))
+    if method_entry:
         method_payload = method_entry
     else:
         # Fallback: buscar archivos con patrón dinámico en /actual_method/
-        legacy_tests, legacy_files = _load_all_tests_from_directory(files, ACTUAL_METHOD_DIR)
+        legacy_tests, legacy_files = _load_all_tests_from_directory(vfs, ACTUAL_METHOD_DIR)
         if not legacy_tests:
             msg = f"No se encontró ningún método en {new_method_path} ni archivos test_solution_structured_content_*.json en {ACTUAL_METHOD_DIR}/."
             logger.error(msg)
@@ -570,13 +541,13 @@ def apply_method_patch(
     # 5. Cargar métodos de referencia para el LLM
     # -------------------------------------------------------------------------
     # Cargar pruebas del método propuesto (búsqueda dinámica)
-    proposed_tests, proposed_files = _load_all_tests_from_directory(files, PROPOSED_METHOD_DIR)
+    proposed_tests, proposed_files = _load_all_tests_from_directory(vfs, PROPOSED_METHOD_DIR)
     if proposed_tests:
         logger.info(f"Cargadas {len(proposed_tests)} pruebas propuestas de {len(proposed_files)} archivo(s).")
     proposed_index = build_test_index(proposed_tests) if proposed_tests else {"by_wrapper": {}, "by_section": {}, "by_name": {}}
 
     # Cargar pruebas del método legado (para referencia del LLM, búsqueda dinámica)
-    legacy_tests, legacy_files_ref = _load_all_tests_from_directory(files, ACTUAL_METHOD_DIR)
+    legacy_tests, legacy_files_ref = _load_all_tests_from_directory(vfs, ACTUAL_METHOD_DIR)
     if legacy_tests:
         logger.info(f"Cargadas {len(legacy_tests)} pruebas legadas de {len(legacy_files_ref)} archivo(s) para referencia.")
     legacy_index = build_test_index(legacy_tests) if legacy_tests else {"by_wrapper": {}, "by_section": {}, "by_name": {}}
@@ -638,7 +609,9 @@ def apply_method_patch(
     if accion == "dejar igual":
         msg = f"Acción #{action_index}: se deja sin cambios la prueba con id={legacy_id}."
         logger.info(msg)
-        return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
+        record_apply_action(vfs, action_index, input_hash, None)
+        progress.done(msg)
+        return Command(update={"files": vfs.updates, "messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
 
     # Caso eliminar: quitar la prueba y actualizar
     if accion == "eliminar":
@@ -647,14 +620,10 @@ def apply_method_patch(
             updated_tests.pop(target_idx)
         
         updated_payload = {"pruebas": updated_tests}
-        files_update = dict(files)
-        files_update[new_method_path] = {
-            "content": json.dumps(updated_payload, ensure_ascii=False, indent=2),
-            "data": updated_payload,
-            "modified_at": datetime.now(timezone.utc).isoformat(),
-        }
-        _save_patch(files_update, action_index, accion, None, legacy_id, legacy_name)
-        _append_log(files_update, {
+        vfs.write_json(new_method_path, updated_payload)
+        patch_path = _save_patch(vfs, action_index, accion, None, legacy_id, legacy_name)
+        record_apply_action(vfs, action_index, input_hash, patch_path)
+        _append_log(vfs, {
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "plan_path": plan_path,
             "method_path": new_method_path,
@@ -664,7 +633,8 @@ def apply_method_patch(
         })
         summary = f"Prueba eliminada (id={legacy_id}, nombre={legacy_name})."
         logger.info(summary)
-        return Command(update={"files": files_update, "messages": [ToolMessage(content=summary, tool_call_id=tool_call_id)]})
+        progress.done(summary)
+        return Command(update={"files": vfs.updates, "messages": [ToolMessage(content=summary, tool_call_id=tool_call_id)]})
 
     # Casos editar / adicionar -> invocar LLM
     human_prompt = APPLY_METHOD_PATCH_HUMAN_TEMPLATE.format(
@@ -676,6 +646,10 @@ def apply_method_patch(
         prueba_propuesta=_pretty_json(prop_test),
         metadatos_metodo=_pretty_json(method_summary),
     )
+    prompt_tokens = count_tokens(APPLY_METHOD_PATCH_SYSTEM) + count_tokens(human_prompt)
+    logger.info("Acción #%s: prompt de ~%d tokens", action_index, prompt_tokens)
+    progress.add_tokens(prompt_tokens)
+    progress.start(f"Acción #{action_index} ({accion})")
 
     llm_structured = method_patch_model.with_structured_output(GeneratedMethodPatch)
     try:
@@ -683,10 +657,12 @@ def apply_method_patch(
     except EmptyLLMResponseError as exc:
         msg = f"El LLM retornó respuesta vacía después de {MAX_LLM_RETRIES} intentos: {exc}"
         logger.error(msg)
+        progress.error(msg)
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
     except Exception as exc:  # noqa: BLE001
         msg = f"Error invocando LLM: {exc}"
         logger.exception(msg)
+        progress.error(msg)
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
 
     prueba_json = llm_response.prueba_resultante.model_dump(mode="json")
@@ -726,14 +702,10 @@ def apply_method_patch(
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
 
     updated_payload = {"pruebas": updated_tests}
-    files_update = dict(files)
-    files_update[new_method_path] = {
-        "content": json.dumps(updated_payload, ensure_ascii=False, indent=2),
-        "data": updated_payload,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
-    _save_patch(files_update, action_index, accion, prueba_json, legacy_id, legacy_name)
-    _append_log(files_update, {
+    vfs.write_json(new_method_path, updated_payload)
+    patch_path = _save_patch(vfs, action_index, accion, prueba_json, legacy_id, legacy_name)
+    record_apply_action(vfs, action_index, input_hash, patch_path)
+    _append_log(vfs, {
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "plan_path": plan_path,
         "method_path": new_method_path,
@@ -746,5 +718,6 @@ def apply_method_patch(
     if comentario:
         summary += f" Notas: {comentario}"
     logger.info(summary)
+    progress.done(summary)
     
-    return Command(update={"files": files_update, "messages": [ToolMessage(content=summary, tool_call_id=tool_call_id)]})
+    return Command(update={"files": vfs.updates, "messages": [ToolMessage(content=summary, tool_call_id=tool_call_id)]})
@@ -0,0 +1,1110 @@
+"""
+Motor único de segmentación de markdown en pruebas/soluciones.
+
+Las herramientas ``test_solution_clean_markdown`` y ``test_solution_clean_markdown_sbs``
+comparten este pipeline (chunking estructural, detección de encabezados con LLM,
+canonicalización, segmentos, modo incremental). Lo único que cambia entre tipos de
+documento es el *perfil*: pre-procesamiento, prompt y modelo del LLM. Para soportar un
+nuevo tipo de documento basta con registrar un perfil en ``DOCUMENT_PROFILES``.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import unicodedata
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import warnings
+
+# Silenciar warnings de Pydantic sobre NotRequired y FileData de deepagents
+warnings.filterwarnings(
+    "ignore",
+    message=".*NotRequired.*",
+    category=UserWarning,
+    module="pydantic.*"
+)
+
+from langchain.chat_models import init_chat_model
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langgraph.types import Command
+from langsmith import traceable
+from pydantic import BaseModel, Field
+
+from src.prompts.tool_llm_calls_prompts import (
+    TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_HUMAN_PROMPT,
+    TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_SYSTEM_PROMPT,
+    TEST_SOLUTION_CLEAN_MARKDOWN_SBS_CHUNK_HUMAN_PROMPT,
+    TEST_SOLUTION_CLEAN_MARKDOWN_SBS_CHUNK_SYSTEM_PROMPT,
+)
+from src.utils.hashing import content_hash
+from src.utils.markdown_chunker import chunk_markdown_by_structure, chunk_report
+from src.utils.markdown_spans import SPAN_JOINER, locate_markdown_spans, markdown_source_ref
+from src.utils.progress import ProgressReporter
+from src.utils.virtual_fs import VirtualFS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE_TOKENS = 3000
+# Separadores de respaldo solo para bloques que por sí solos exceden CHUNK_SIZE_TOKENS
+CHUNK_SEPARATORS = [
+    "\n\n",
+    "\n",
+    ". ",
+    "? ",
+    "! ",
+    "; ",
+    " ",
+    "",
+]
+
+# Patrones para identificar secciones de PROCEDIMIENTOS/DESARROLLO
+PROCEDURES_SECTION_PATTERNS = [
+    # Español
+    r"^#+\s*\d*\.?\d*\s*PROCEDIMIENTOS?\b",
+    r"^#+\s*\d*\.?\d*\s*DESARROLLO\b",
+    r"^\d+\.?\s*PROCEDIMIENTOS?\b",
+    r"^\d+\.?\s*DESARROLLO\b",
+    r"^\*\*\s*\d*\.?\d*\s*PROCEDIMIENTOS?\b",
+    r"^\*\*\s*\d*\.?\d*\s*DESARROLLO\b",
+    # Inglés
+    r"^#+\s*\d*\.?\d*\s*PROCEDURES?\b",
+    r"^#+\s*\d*\.?\d*\s*ANALYTICAL\s+PROCEDURES?\b",
+    r"^#+\s*\d*\.?\d*\s*TEST\s+PROCEDURES?\b",
+    r"^\d+\.?\s*PROCEDURES?\b",
+    r"^\d+\.?\s*ANALYTICAL\s+PROCEDURES?\b",
+    r"^\d+\.?\s*TEST\s+PROCEDURES?\b",
+    r"^\*\*\s*\d*\.?\d*\s*PROCEDURES?\b",
+    r"^\*\*\s*\d*\.?\d*\s*ANALYTICAL\s+PROCEDURES?\b",
+    r"^\*\*\s*\d*\.?\d*\s*TEST\s+PROCEDURES?\b",
+]
+
+# Patrones para identificar secciones que terminan PROCEDIMIENTOS
+END_PROCEDURES_PATTERNS = [
+    # Español
+    r"^#+\s*\d+\.?\s*REFERENCIA",
+    r"^#+\s*\d+\.?\s*ANEXOS?",
+    r"^#+\s*\d+\.?\s*DOCUMENTOS\s+RELACIONADOS",
+    r"^#+\s*\d+\.?\s*HIST[ÓO]RICO",
+    r"^\d+\.?\s*REFERENCIA",
+    r"^\d+\.?\s*ANEXOS?",
+    r"^\d+\.?\s*DOCUMENTOS\s+RELACIONADOS",
+    r"^\d+\.?\s*HIST[ÓO]RICO",
+    # Inglés
+    r"^#+\s*\d+\.?\s*REFERENCES?\b",
+    r"^#+\s*\d+\.?\s*ANNEX(?:ES)?\b",
+    r"^#+\s*\d+\.?\s*APPENDIX(?:ES)?\b",
+    r"^#+\s*\d+\.?\s*RELATED\s+DOCUMENTS\b",
+    r"^#+\s*\d+\.?\s*SUPPORTING\s+DOCUMENTS\b",
+    r"^#+\s*\d+\.?\s*(CHANGE|REVISION)\s+HISTORY\b",
+    r"^\d+\.?\s*REFERENCES?\b",
+    r"^\d+\.?\s*ANNEX(?:ES)?\b",
+    r"^\d+\.?\s*APPENDIX(?:ES)?\b",
+    r"^\d+\.?\s*RELATED\s+DOCUMENTS\b",
+    r"^\d+\.?\s*SUPPORTING\s+DOCUMENTS\b",
+    r"^\d+\.?\s*(CHANGE|REVISION)\s+HISTORY\b",
+]
+
+
+class TestMethodFromChunk(BaseModel):
+    """Representa un encabezado de prueba/solución extraído de un chunk."""
+
+    raw: str = Field(
+        ...,
+        description="Texto EXACTO del encabezado tal como aparece en el markdown.",
+    )
+    section_id: Optional[str] = Field(
+        None,
+        description="Número de sección (ej: 5.3, 7.2.1) o null si no existe.",
+    )
+    title: str = Field(
+        ...,
+        description="Nombre del encabezado sin la numeración inicial.",
+    )
+
+
+class TestMethodsFromChunk(BaseModel):
+    """Lista de encabezados extraídos de un chunk."""
+
+    test_methods: List[TestMethodFromChunk] = Field(
+        default_factory=list,
+        description="Lista de encabezados de pruebas/soluciones encontrados en el chunk.",
+    )
+
+
+def _remove_toc_section(markdown: str) -> str:
+    """
+    Elimina la sección de TABLA DE CONTENIDO del markdown.
+    
+    Detecta patrones como:
+    - "## TABLA DE CONTENIDO" hasta la siguiente sección principal
+    - Líneas con formato de índice: "X.X NOMBRE ... N" (puntos suspensivos + número de página)
+    """
+    if not markdown:
+        return ""
+    
+    lines = markdown.split("\n")
+    filtered_lines: List[str] = []
+    in_toc = False
+    
+    # Patrones para detectar inicio de TOC
+    toc_start_patterns = [
+        re.compile(r"^#+\s*TABLA\s+DE\s+CONTENIDO", re.IGNORECASE),
+        re.compile(r"^#+\s*ÍNDICE", re.IGNORECASE),
+        re.compile(r"^#+\s*INDICE", re.IGNORECASE),
+        re.compile(r"^\*\*\s*TABLA\s+DE\s+CONTENIDO", re.IGNORECASE),
+        re.compile(r"^#+\s*TABLE\s+OF\s+CONTENTS", re.IGNORECASE),
+        re.compile(r"^#+\s*CONTENTS\b", re.IGNORECASE),
+        re.compile(r"^\*\*\s*TABLE\s+OF\s+CONTENTS", re.IGNORECASE),
+    ]
+    
+    # Patrón para detectar líneas de TOC (con ... y número de página)
+    toc_line_pattern = re.compile(r"^[\d\.]+\s+[A-ZÁÉÍÓÚÑ].*\.{2,}\s*\d+\s*$", re.IGNORECASE)
+    
+    # Patrón para detectar nueva sección principal (fin de TOC)
+    section_start_pattern = re.compile(r"^#+\s*\d+\.?\s+[A-ZÁÉÍÓÚÑ]", re.IGNORECASE)
+    
+    for line in lines:
+        stripped = line.strip()
+        
+        # Detectar inicio de TOC
+        if any(p.match(stripped) for p in toc_start_patterns):
+            in_toc = True
+            logger.debug("Detectado inicio de TOC: %s", stripped[:50])
+            continue
+        
+        # Si estamos en TOC, verificar si es línea de índice o fin de TOC
+        if in_toc:
+            # Verificar si es una línea de TOC (con ...)
+            if toc_line_pattern.match(stripped):
+                continue
+            # Verificar si es el inicio de una nueva sección (fin de TOC)
+            if section_start_pattern.match(stripped) and not toc_line_pattern.match(stripped):
+                in_toc = False
+                filtered_lines.append(line)
+                continue
+            # Líneas vacías o de formato dentro del TOC se saltan
+            if not stripped or stripped.startswith("|") or "..." in stripped:
+                continue
+        
+        # Filtrar líneas sueltas que parecen entradas de TOC (con ... y número)
+        if toc_line_pattern.match(stripped):
+            continue
+            
+        filtered_lines.append(line)
+    
+    result = "\n".join(filtered_lines)
+    logger.info("TOC removido: %d líneas originales -> %d líneas filtradas", len(lines), len(filtered_lines))
+    return result
+
+
+def _extract_procedures_section(markdown: str) -> str:
+    """
+    Extrae SOLO la sección de PROCEDIMIENTOS/DESARROLLO del markdown.
+    
+    Busca el inicio de secciones como:
+    - "## 5 PROCEDIMIENTOS"
+    - "## DESARROLLO"
+    - "5. PROCEDIMIENTOS"
+    
+    Y extrae hasta la siguiente sección de nivel superior (REFERENCIA, ANEXOS, etc.)
+    """
+    if not markdown:
+        return ""
+    
+    lines = markdown.split("\n")
+    
+    # Compilar patrones de inicio
+    start_patterns = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in PROCEDURES_SECTION_PATTERNS]
+    end_patterns = [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in END_PROCEDURES_PATTERNS]
+    
+    start_idx: Optional[int] = None
+    end_idx: Optional[int] = None
+    
+    # Buscar inicio de sección PROCEDIMIENTOS
+    for idx, line in enumerate(lines):
+        stripped = line.strip()
+        if any(p.match(stripped) for p in start_patterns):
+            start_idx = idx
+            logger.info("Encontrada sección PROCEDIMIENTOS en línea %d: %s", idx, stripped[:60])
+            break
+    
+    if start_idx is None:
+        logger.warning("No se encontró sección PROCEDIMIENTOS/DESARROLLO en el documento")
+        return markdown  # Devolver todo si no se encuentra la sección
+    
+    # Buscar fin de sección PROCEDIMIENTOS
+    for idx, line in enumerate(lines[start_idx + 1:], start=start_idx + 1):
+        stripped = line.strip()
+        if any(p.match(stripped) for p in end_patterns):
+            end_idx = idx
+            logger.info("Fin de sección PROCEDIMIENTOS en línea %d: %s", idx, stripped[:60])
+            break
+    
+    # Extraer la sección
+    if end_idx is not None:
+        extracted_lines = lines[start_idx:end_idx]
+    else:
+        extracted_lines = lines[start_idx:]
+    
+    result = "\n".join(extracted_lines)
+    logger.info(
+        "Sección PROCEDIMIENTOS extraída: líneas %d-%d (%d líneas)",
+        start_idx,
+        end_idx if end_idx else len(lines),
+        len(extracted_lines)
+    )
+    return result
+
+
+def _preprocess_legacy(markdown: str) -> str:
+    """
+    Pre-procesa el markdown antes de la extracción:
+    1. Elimina la tabla de contenido (TOC)
+    2. Extrae solo la sección PROCEDIMIENTOS/DESARROLLO
+    
+    Esto evita extraer pruebas de ESPECIFICACIONES o de la TOC.
+    """
+    if not markdown:
+        return ""
+    
+    # Paso 1: Eliminar TOC
+    markdown_without_toc = _remove_toc_section(markdown)
+    
+    # Paso 2: Extraer solo sección PROCEDIMIENTOS
+    procedures_section = _extract_procedures_section(markdown_without_toc)
+    
+    return procedures_section
+
+
+def _preprocess_reference(markdown: str) -> str:
+    """Métodos de referencia (farmacopeas, monografías): solo se elimina la TOC."""
+    if not markdown:
+        return ""
+    return _remove_toc_section(markdown)
+
+
+def _preprocess_none(markdown: str) -> str:
+    """Side-by-Side: la columna propuesta ya viene filtrada."""
+    return markdown or ""
+
+
+# Perfiles de documento: pre-procesamiento + prompt + modelo para la detección de encabezados
+DOCUMENT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "legacy": {
+        "description": "Método analítico legado (TOC + sección PROCEDIMIENTOS/DESARROLLO)",
+        "default_base_path": "/actual_method",
+        "preprocess": _preprocess_legacy,
+        "system_prompt": TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_SYSTEM_PROMPT,
+        "human_prompt": TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_HUMAN_PROMPT,
+        "model": "openai:gpt-5-mini",
+        "model_kwargs": {},
+    },
+    "reference": {
+        "description": "Método de referencia (farmacopea/monografía), sin recorte de PROCEDIMIENTOS",
+        "default_base_path": "/proposed_method",
+        "preprocess": _preprocess_reference,
+        "system_prompt": TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_SYSTEM_PROMPT,
+        "human_prompt": TEST_SOLUTION_CLEAN_MARKDOWN_CHUNK_HUMAN_PROMPT,
+        "model": "openai:gpt-5-mini",
+        "model_kwargs": {},
+    },
+    "sbs": {
+        "description": "Columna del método propuesto de un documento Side-by-Side",
+        "default_base_path": "/proposed_method",
+        "preprocess": _preprocess_none,
+        "system_prompt": TEST_SOLUTION_CLEAN_MARKDOWN_SBS_CHUNK_SYSTEM_PROMPT,
+        "human_prompt": TEST_SOLUTION_CLEAN_MARKDOWN_SBS_CHUNK_HUMAN_PROMPT,
+        "model": "openai:gpt-5-mini",
+        "model_kwargs": {"temperature": 0},
+    },
+}
+
+_llm_models: Dict[str, Any] = {}
+
+
+def get_profile(profile_name: str) -> Dict[str, Any]:
+    """Obtiene un perfil registrado; lanza ValueError si no existe."""
+    profile = DOCUMENT_PROFILES.get(profile_name)
+    if profile is None:
+        raise ValueError(
+            f"Perfil '{profile_name}' no soportado. Opciones: {', '.join(DOCUMENT_PROFILES)}"
+        )
+    return {"name": profile_name, **profile}
+
+
+def _get_llm_model(profile: Dict[str, Any]):
+    """Modelo de chat del perfil, creado una sola vez y compartido entre llamadas."""
+    model_kwargs = profile.get("model_kwargs") or {}
+    cache_key = f"{profile['model']}|{json.dumps(model_kwargs, sort_keys=True)}"
+    if cache_key not in _llm_models:
+        _llm_models[cache_key] = init_chat_model(model=profile["model"], **model_kwargs)
+    return _llm_models[cache_key]
+
+
+def _split_markdown_into_chunks(full_markdown: str) -> List[Dict[str, Any]]:
+    """
+    Divide el markdown en chunks alineados a encabezados y tablas.
+
+    Cada chunk contiene secciones completas (hasta CHUNK_SIZE_TOKENS), por lo que
+    un encabezado nunca queda separado de su contenido ni repetido entre chunks.
+    """
+    if not full_markdown:
+        return []
+    return chunk_markdown_by_structure(
+        full_markdown,
+        max_tokens=CHUNK_SIZE_TOKENS,
+        separators=tuple(CHUNK_SEPARATORS),
+    )
+
+
+async def _extract_headers_from_chunk(
+    chunk_text: str,
+    chunk_index: int,
+    total_chunks: int,
+    profile: Dict[str, Any],
+) -> Optional[TestMethodsFromChunk]:
+    """Extrae encabezados de un chunk individual usando el LLM (``None`` si falla)."""
+    structured_llm = _get_llm_model(profile).with_structured_output(TestMethodsFromChunk)
+
+    system_message = SystemMessage(content=profile["system_prompt"])
+    human_message = HumanMessage(
+        content=profile["human_prompt"].format(
+            chunk_text=chunk_text,
+        )
+    )
+
+    try:
+        result = await structured_llm.ainvoke([system_message, human_message])
+        return result
+    except Exception as e:
+        logger.warning(
+            "Error extrayendo encabezados del chunk %d/%d: %s",
+            chunk_index,
+            total_chunks,
+            str(e),
+        )
+        return None
+
+
+@traceable(name="extract_headers_parallel")
+async def _extract_headers_from_all_chunks(
+    chunks: List[str],
+    profile: Dict[str, Any],
+    progress: Optional[ProgressReporter] = None,
+    chunk_tokens: Optional[List[int]] = None,
+) -> List[Optional[TestMethodsFromChunk]]:
+    """
+    Extrae encabezados de todos los chunks en paralelo.
+
+    Con ``progress`` se emite un evento por chunk terminado (con sus tokens si
+    se indican en ``chunk_tokens``).
+    """
+    if not chunks:
+        return []
+
+    total_chunks = len(chunks)
+    logger.info("Procesando %d chunks en paralelo para extracción de encabezados...", total_chunks)
+
+    async def _run(chunk: str, idx: int) -> Optional[TestMethodsFromChunk]:
+        result = await _extract_headers_from_chunk(chunk, idx + 1, total_chunks, profile)
+        if progress is not None:
+            progress.advance(
+                f"Chunk {idx + 1}/{total_chunks}",
+                tokens=chunk_tokens[idx] if chunk_tokens else 0,
+                failed=result is None,
+            )
+        return result
+
+    tasks = [_run(chunk, idx) for idx, chunk in enumerate(chunks)]
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    valid_results: List[Optional[TestMethodsFromChunk]] = []
+    for idx, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.warning("Chunk %d falló con excepción: %s", idx + 1, str(result))
+            valid_results.append(None)
+        else:
+            valid_results.append(result)
+
+    return valid_results
+
+
+def _clean_header_text(value: Optional[str]) -> str:
+    """Limpia el texto de un encabezado, removiendo contenido después de '<'."""
+    if not value:
+        return ""
+    text = value.strip()
+    angle_idx = text.find("<")
+    if angle_idx != -1:
+        text = text[:angle_idx]
+    return text.strip()
+
+
+def _headers_from_chunk_result(
+    chunk_result: Optional[TestMethodsFromChunk],
+) -> List[Dict[str, Optional[str]]]:
+    """Convierte la salida del LLM de un chunk en encabezados limpios."""
+    if not chunk_result or not chunk_result.test_methods:
+        return []
+
+    headers: List[Dict[str, Optional[str]]] = []
+    for test in chunk_result.test_methods:
+        raw_value = _clean_header_text(test.raw) or _clean_header_text(test.title)
+        title_value = _clean_header_text(test.title)
+        section_id = (test.section_id or "").strip() or None
+
+        headers.append(
+            {
+                "raw": raw_value or None,
+                "title": title_value or None,
+                "section_id": section_id,
+            }
+        )
+    return headers
+
+
+def _attribute_headers_to_pieces(
+    chunk: Dict[str, Any],
+    headers: List[Dict[str, Optional[str]]],
+) -> Dict[str, List[Dict[str, Optional[str]]]]:
+    """Asigna cada encabezado a la pieza del chunk donde aparece (por hash de pieza)."""
+    pieces = chunk.get("pieces") or []
+    by_piece: Dict[str, List[Dict[str, Optional[str]]]] = {piece["hash"]: [] for piece in pieces}
+    if not pieces:
+        return by_piece
+
+    for header in headers:
+        raw_header = (header.get("raw") or header.get("title") or "").strip()
+        positions = _find_header_positions(chunk["text"], raw_header)
+        target = pieces[0]
+        if positions:
+            absolute = chunk["start"] + min(positions)
+            target = next(
+                (piece for piece in pieces if piece["start"] <= absolute < piece["end"]),
+                pieces[0],
+            )
+        by_piece[target["hash"]].append(header)
+    return by_piece
+
+
+def _detect_headers_incremental(
+    chunks: List[Dict[str, Any]],
+    profile: Dict[str, Any],
+    header_cache: Optional[Dict[str, List[Dict[str, Optional[str]]]]] = None,
+) -> Tuple[List[Dict[str, Optional[str]]], Dict[str, List[Dict[str, Optional[str]]]], Dict[str, int]]:
+    """
+    Detecta encabezados llamando al LLM solo en chunks con piezas nuevas o modificadas.
+
+    Los chunks cuyas piezas están todas en ``header_cache`` (hash de pieza -> encabezados
+    de la ejecución anterior) reutilizan esos encabezados sin invocar al LLM. Retorna los
+    encabezados combinados, el cache actualizado y estadísticas de reutilización.
+    """
+    header_cache = header_cache or {}
+    chunk_headers: List[List[Dict[str, Optional[str]]]] = []
+    pending: List[int] = []
+
+    for idx, chunk in enumerate(chunks):
+        piece_hashes = [piece["hash"] for piece in chunk.get("pieces") or []]
+        if piece_hashes and all(piece_hash in header_cache for piece_hash in piece_hashes):
+            chunk_headers.append(
+                [dict(header) for piece_hash in piece_hashes for header in header_cache[piece_hash]]
+            )
+        else:
+            chunk_headers.append([])
+            pending.append(idx)
+
+    failed: set = set()
+    if pending:
+        logger.info(
+            "Detección incremental: %d/%d chunks requieren LLM",
+            len(pending),
+            len(chunks),
+        )
+        progress = ProgressReporter(f"clean_markdown:{profile['name']}", "header_detection", total=len(pending))
+        progress.start(f"{len(pending)} de {len(chunks)} chunks requieren LLM")
+        results = asyncio.run(
+            _extract_headers_from_all_chunks(
+                [chunks[idx]["text"] for idx in pending],
+                profile,
+                progress=progress,
+                chunk_tokens=[chunks[idx].get("token_count", 0) for idx in pending],
+            )
+        )
+        for idx, result in zip(pending, results):
+            if result is None:
+                failed.add(idx)
+            chunk_headers[idx] = _headers_from_chunk_result(result)
+        progress.done(f"{len(pending) - len(failed)} chunks con encabezados, {len(failed)} fallidos")
+
+    updated_cache: Dict[str, List[Dict[str, Optional[str]]]] = {}
+    for idx, (chunk, headers) in enumerate(zip(chunks, chunk_headers)):
+        if idx in failed:
+            continue
+        updated_cache.update(_attribute_headers_to_pieces(chunk, headers))
+
+    merged = [header for headers in chunk_headers for header in headers]
+    stats = {
+        "llm_chunks": len(pending),
+        "reused_chunks": len(chunks) - len(pending),
+        "failed_chunks": len(failed),
+    }
+    return merged, updated_cache, stats
+
+
+def _normalize_header_title(value: Optional[str]) -> str:
+    """Normaliza un título para comparar encabezados (sin numeración, acentos ni formato)."""
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKD", value)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[#*_`]", " ", text)
+    text = re.sub(r"^\s*\d+(\.\d+)*\.?\s*", "", text.strip())
+    text = re.sub(r"[^\w()]+", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+@traceable(name="canonicalize_headers")
+def _canonicalize_headers(
+    headers: List[Dict[str, Optional[str]]],
+    full_markdown: str,
+) -> Tuple[List[Dict[str, Optional[str]]], List[Dict[str, Any]]]:
+    """
+    Fusiona encabezados duplicados por ``(section_id, título normalizado)``.
+
+    De cada grupo se conserva la variante que aparece primero en el markdown y
+    el resultado se ordena por posición. Retorna los encabezados canónicos y un
+    reporte con los duplicados colapsados.
+    """
+    groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    order: List[Tuple[str, str]] = []
+
+    for header in headers:
+        section_id = (header.get("section_id") or "").strip().rstrip(".")
+        title_key = _normalize_header_title(header.get("title") or header.get("raw"))
+        if not section_id and not title_key:
+            continue
+        key = (section_id, title_key)
+
+        raw_header = (header.get("raw") or header.get("title") or "").strip()
+        positions = _find_header_positions(full_markdown, raw_header)
+        position = min(positions) if positions else None
+
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {"header": header, "position": position, "variants": [header]}
+            order.append(key)
+            continue
+
+        group["variants"].append(header)
+        if position is not None and (group["position"] is None or position < group["position"]):
+            group["header"] = header
+            group["position"] = position
+
+    ranked = sorted(
+        enumerate(order),
+        key=lambda pair: (
+            groups[pair[1]]["position"] if groups[pair[1]]["position"] is not None else float("inf"),
+            pair[0],
+        ),
+    )
+
+    canonical: List[Dict[str, Optional[str]]] = []
+    duplicates: List[Dict[str, Any]] = []
+    for _, key in ranked:
+        group = groups[key]
+        canonical.append(group["header"])
+        if len(group["variants"]) > 1:
+            duplicates.append(
+                {
+                    "section_id": key[0] or None,
+                    "title": group["header"].get("title"),
+                    "kept": group["header"].get("raw"),
+                    "collapsed": [
+                        variant.get("raw") for variant in group["variants"] if variant is not group["header"]
+                    ],
+                    "count": len(group["variants"]),
+                }
+            )
+
+    if duplicates:
+        logger.info(
+            "Canonicalización: %d encabezados -> %d únicos (%d grupos duplicados)",
+            len(headers),
+            len(canonical),
+            len(duplicates),
+        )
+    return canonical, duplicates
+
+
+def _filter_primary_test_methods(
+    test_methods: List[Dict[str, Optional[str]]],
+) -> List[Dict[str, Optional[str]]]:
+    """Filtra solo pruebas principales (sin subapartados profundos)."""
+    if not test_methods:
+        return []
+
+    filtered: List[Dict[str, Optional[str]]] = []
+    for test in test_methods:
+        section_id = (test.get("section_id") or "").strip()
+        if section_id:
+            dot_count = section_id.count(".")
+            if dot_count > 1:
+                logger.debug(
+                    "Descartando subapartado %s (%s) por numeración profunda",
+                    test.get("title") or test.get("raw"),
+                    section_id,
+                )
+                continue
+        filtered.append(test)
+
+    return filtered
+
+
+def _find_header_positions(full_markdown: str, raw_header: str) -> List[int]:
+    """Encuentra las posiciones de un encabezado en el markdown."""
+    if not raw_header or not full_markdown:
+        return []
+
+    header = raw_header.strip()
+    if not header:
+        return []
+
+    patterns: List[str] = [header]
+    header_wo_number = re.sub(r"^\s*\d+(\.\d+)*\s+", "", header)
+    if header_wo_number and header_wo_number != header:
+        patterns.append(header_wo_number)
+
+    header_wo_digits = re.sub(r"\d+", "", header).strip()
+    if header_wo_digits and header_wo_digits not in patterns:
+        patterns.append(header_wo_digits)
+
+    for pattern in patterns:
+        if not pattern:
+            continue
+        try:
+            regex = re.compile(re.escape(pattern), flags=re.IGNORECASE)
+        except re.error:
+            logger.warning("Regex inválido para encabezado '%s'", raw_header)
+            continue
+
+        matches = list(regex.finditer(full_markdown))
+        if matches:
+            return [match.start() for match in matches]
+
+    return []
+
+
+def _find_historico_marker(full_markdown: str) -> Optional[int]:
+    """Encuentra la posición del marcador 'Histórico de cambios'."""
+    if not full_markdown:
+        return None
+    pattern = re.compile(r"hist[óo]rico\s+de\s+cambios", flags=re.IGNORECASE)
+    match = pattern.search(full_markdown)
+    return match.start() if match else None
+
+
+@traceable(name="build_markdown_segments")
+def _build_markdown_segments(
+    test_methods: List[Dict[str, Optional[str]]],
+    full_markdown: str,
+    canonical_markdown: Optional[str] = None,
+) -> List[Dict[str, Optional[str]]]:
+    """
+    Construye los segmentos de markdown para cada prueba/solución.
+
+    Con ``canonical_markdown`` cada segmento registra además ``markdown_spans``:
+    la posición de sus piezas en el markdown canónico (ver ``src/utils/markdown_spans.py``).
+    """
+    if not test_methods:
+        return []
+
+    markers: List[Dict[str, int]] = []
+    for idx, test in enumerate(test_methods):
+        raw_header = (test.get("raw") or test.get("title") or "").strip()
+        if not raw_header:
+            logger.warning("No se encontró encabezado legible para la prueba %s", test)
+            continue
+
+        positions = _find_header_positions(full_markdown, raw_header)
+        if not positions:
+            logger.warning(
+                "No se encontró el encabezado '%s' en el markdown consolidado",
+                raw_header,
+            )
+            continue
+
+        for pos in positions:
+            markers.append({"test_index": idx, "start": pos})
+
+    if not markers:
+        return [
+            {
+                "id": idx + 1,
+                "raw": test.get("raw"),
+                "title": test.get("title"),
+                "section_id": test.get("section_id"),
+                "markdown": "",
+            }
+            for idx, test in enumerate(test_methods)
+        ]
+
+    markers.sort(key=lambda item: item["start"])
+    segments_by_test: Dict[int, List[str]] = {}
+    historico_marker = _find_historico_marker(full_markdown)
+
+    for idx, marker in enumerate(markers):
+        start = marker["start"]
+        end = markers[idx + 1]["start"] if idx + 1 < len(markers) else len(full_markdown)
+        if (
+            historico_marker is not None
+            and idx == len(markers) - 1
+            and historico_marker >= start
+        ):
+            end = min(end, historico_marker)
+        section_text = full_markdown[start:end].strip()
+        if not section_text:
+            continue
+        segments_by_test.setdefault(marker["test_index"], []).append(section_text)
+
+    results: List[Dict[str, Optional[str]]] = []
+    for idx, test in enumerate(test_methods):
+        markdown_chunks = segments_by_test.get(idx, [])
+        combined_markdown = SPAN_JOINER.join(markdown_chunks).strip()
+        segment = {
+            "id": idx + 1,
+            "raw": test.get("raw"),
+            "title": test.get("title"),
+            "section_id": test.get("section_id"),
+            "markdown": combined_markdown,
+        }
+        if canonical_markdown is not None and markdown_chunks:
+            spans = locate_markdown_spans(markdown_chunks, canonical_markdown)
+            if spans is not None:
+                segment["markdown_spans"] = spans
+            else:
+                logger.debug("Segmento id=%d no ubicable en el markdown canónico; se guarda en línea", idx + 1)
+        results.append(segment)
+
+    return results
+
+
+def _item_key(item: Dict[str, Any]) -> Tuple[str, str]:
+    """Clave estable de un ítem: (section_id, título normalizado)."""
+    section_id = (item.get("section_id") or "").strip().rstrip(".")
+    return section_id, _normalize_header_title(item.get("title") or item.get("raw"))
+
+
+def _assign_stable_ids(
+    items: List[Dict[str, Any]],
+    previous_items: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, List[int]]:
+    """
+    Agrega ``content_hash`` a cada ítem y, si hay ítems previos, reutiliza sus ids.
+
+    Un ítem se empareja con el previo por ``(section_id, título normalizado)``; los
+    ítems nuevos reciben ids posteriores al máximo previo. Retorna qué ids cambiaron
+    (texto distinto o ítem nuevo), cuáles siguen iguales y cuáles desaparecieron.
+    """
+    for item in items:
+        item["content_hash"] = content_hash(item.get("markdown") or "")
+
+    if previous_items is None:
+        return {
+            "changed_item_ids": [item["id"] for item in items],
+            "unchanged_item_ids": [],
+            "removed_item_ids": [],
+        }
+
+    previous_by_key: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for previous in previous_items:
+        previous_by_key.setdefault(_item_key(previous), previous)
+
+    next_id = max((prev.get("id") or 0 for prev in previous_items), default=0) + 1
+    changed: List[int] = []
+    unchanged: List[int] = []
+    matched_ids: set = set()
+
+    for item in items:
+        previous = previous_by_key.get(_item_key(item))
+        if previous is not None and previous.get("id") not in matched_ids:
+            item["id"] = previous.get("id")
+            matched_ids.add(item["id"])
+            if previous.get("content_hash") == item["content_hash"]:
+                unchanged.append(item["id"])
+                continue
+        else:
+            item["id"] = next_id
+            next_id += 1
+        changed.append(item["id"])
+
+    removed = [prev.get("id") for prev in previous_items if prev.get("id") not in matched_ids]
+    return {
+        "changed_item_ids": changed,
+        "unchanged_item_ids": unchanged,
+        "removed_item_ids": removed,
+    }
+
+
+def _metadata_toc_path(base_path: str, source_file_name: str) -> str:
+    """Genera la ruta del archivo de metadata/TOC."""
+    base = base_path.rstrip("/")
+    return f"{base}/method_metadata_TOC_{source_file_name}.json"
+
+
+def _markdown_doc_path(base_path: str, source_file_name: str) -> str:
+    """Genera la ruta del archivo de markdown de pruebas/soluciones."""
+    base = base_path.rstrip("/")
+    return f"{base}/test_solution_markdown_{source_file_name}.json"
+
+
+def _markdown_item_path(base_path: str, source_file_name: str, item_id: Any) -> str:
+    """Ruta del archivo individual de un ítem: ``{base}/test_solution_markdown_{source}/{id}.json``."""
+    base = base_path.rstrip("/")
+    return f"{base}/test_solution_markdown_{source_file_name}/{item_id}.json"
+
+
+def _stored_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Forma persistida del ítem: sin ``markdown`` en línea cuando tiene ``markdown_spans``."""
+    if "markdown_spans" not in item:
+        return item
+    return {key: value for key, value in item.items() if key != "markdown"}
+
+
+def _load_payload_items(vfs: VirtualFS, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Ítems de un payload: desde sus archivos individuales (``item_index``) o, en
+    payloads escritos antes del índice, desde la lista ``items`` en línea.
+    """
+    if payload.get("items"):
+        return list(payload["items"])
+    items: List[Dict[str, Any]] = []
+    for item_id, item_path in (payload.get("item_index") or {}).items():
+        item = vfs.read_json(item_path, expect=dict)
+        if item is None:
+            logger.warning("Archivo del ítem id=%s no disponible: %s", item_id, item_path)
+            continue
+        items.append(item)
+    return items
+
+
+def _load_previous_payload(vfs: VirtualFS, markdown_doc_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene el payload de una extracción previa (si existe) para el modo
+    incremental, con sus ítems cargados en ``items``.
+    """
+    previous_data = vfs.read_json(markdown_doc_name, expect=dict)
+    if not previous_data:
+        return None
+    previous_items = _load_payload_items(vfs, previous_data)
+    if not previous_items:
+        return None
+    return {**previous_data, "items": previous_items}
+
+
+def _incremental_summary(last_run: Dict[str, Any]) -> str:
+    """Resumen del modo incremental para el ToolMessage."""
+    return (
+        f" Modo incremental: {last_run.get('llm_chunks', 0)} chunks re-procesados con LLM, "
+        f"{last_run.get('reused_chunks', 0)} reutilizados. Ítems con cambios (re-ejecutar "
+        f"extracción estructurada): {last_run.get('changed_item_ids', [])}; sin cambios: "
+        f"{len(last_run.get('unchanged_item_ids', []))}; eliminados: {last_run.get('removed_item_ids', [])}."
+    )
+
+
+@traceable(name="test_solution_clean_markdown")
+def run_segmentation_pipeline(
+    full_markdown: str,
+    profile_name: str,
+    previous_payload: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pipeline principal de extracción (común a todos los perfiles):
+    0. Pre-procesa el markdown según el perfil (p. ej. elimina TOC, extrae PROCEDIMIENTOS)
+    1. Divide el markdown en chunks alineados a secciones
+    2. Extrae encabezados de cada chunk en paralelo (en modo incremental, solo
+       de los chunks con piezas nuevas/modificadas respecto a ``previous_payload``)
+    3. Fusiona resultados
+    4. Filtra solo pruebas principales y canonicaliza duplicados (section_id + título)
+    5. Construye segmentos de markdown sobre el markdown pre-procesado
+    6. Asigna ids estables y ``content_hash`` (reutiliza ids de ``previous_payload``)
+    """
+    profile = get_profile(profile_name)
+    previous_payload = previous_payload or {}
+
+    # Paso 0: Pre-procesar markdown para extracción de headers
+    preprocessed_markdown = profile["preprocess"](full_markdown)
+    logger.info(
+        "[%s] Markdown pre-procesado: %d caracteres originales -> %d caracteres filtrados",
+        profile["name"],
+        len(full_markdown),
+        len(preprocessed_markdown)
+    )
+
+    chunks = _split_markdown_into_chunks(preprocessed_markdown)
+    logger.info("Markdown dividido en %d chunks", len(chunks))
+
+    if not chunks:
+        return [], {"chunks": [], "duplicates_collapsed": [], "header_cache": {}}
+
+    merged_headers, header_cache, detection_stats = _detect_headers_incremental(
+        chunks,
+        profile,
+        previous_payload.get("header_cache"),
+    )
+    logger.info("Se identificaron %d encabezados de pruebas/soluciones", len(merged_headers))
+
+    filtered_headers = _filter_primary_test_methods(merged_headers)
+    logger.info("Después de filtrar subapartados: %d pruebas principales", len(filtered_headers))
+
+    canonical_headers, duplicates = _canonicalize_headers(filtered_headers, preprocessed_markdown)
+    logger.info("Después de canonicalizar: %d pruebas únicas", len(canonical_headers))
+
+    # Los segmentos se construyen sobre el markdown pre-procesado (evita duplicados de ESPECIFICACIONES)
+    # y se referencian por posición en el markdown original
+    tests_with_markdown = _build_markdown_segments(canonical_headers, preprocessed_markdown, full_markdown)
+    item_changes = _assign_stable_ids(tests_with_markdown, previous_payload.get("items"))
+
+    extraction_report = {
+        "profile": profile["name"],
+        "chunks": chunk_report(chunks),
+        "duplicates_collapsed": duplicates,
+        "header_cache": header_cache,
+        "last_run": {**detection_stats, **item_changes},
+    }
+    return tests_with_markdown, extraction_report
+
+
+def run_clean_markdown_tool(
+    state: Dict[str, Any],
+    tool_call_id: str,
+    source_file_name: str,
+    profile_name: str,
+    base_path: Optional[str] = None,
+    incremental: bool = False,
+) -> Command:
+    """
+    Cuerpo común de las herramientas de segmentación: lee
+    ``{base_path}/method_metadata_TOC_{source_file_name}.json``, ejecuta el pipeline con el
+    perfil indicado y escribe ``{base_path}/test_solution_markdown_{source_file_name}.json``.
+    """
+    try:
+        profile = get_profile(profile_name)
+    except ValueError as exc:
+        return Command(update={"messages": [ToolMessage(str(exc), tool_call_id=tool_call_id)]})
+
+    base_path = base_path or profile["default_base_path"]
+    vfs = VirtualFS.from_state(state)
+    metadata_doc_name = _metadata_toc_path(base_path, source_file_name)
+    markdown_doc_name = _markdown_doc_path(base_path, source_file_name)
+
+    if not vfs.exists(metadata_doc_name):
+        return Command(
+            update={
+                "messages": [
+                    ToolMessage(
+                        f"No se encontró el archivo {metadata_doc_name}",
+                        tool_call_id=tool_call_id,
+                    )
+                ],
+            }
+        )
+
+    metadata_toc_data = vfs.read_json(metadata_doc_name, expect=dict) or {}
+    full_markdown = metadata_toc_data.get("markdown_completo")
+
+    if not full_markdown:
+        return Command(
+            update={
+                "messages": [
+                    ToolMessage(
+                        f"El archivo {metadata_doc_name} no contiene markdown consolidado.",
+                        tool_call_id=tool_call_id,
+                    )
+                ],
+            }
+        )
+
+    markdown_source = markdown_source_ref(metadata_doc_name, full_markdown)
+    previous_payload = _load_previous_payload(vfs, markdown_doc_name) if incremental else None
+    if previous_payload and (
+        (previous_payload.get("markdown_source") or {}).get("content_hash") == markdown_source["content_hash"]
+        or previous_payload.get("full_markdown") == full_markdown
+    ):
+        return Command(
+            update={
+                "messages": [
+                    ToolMessage(
+                        f"Sin cambios en el markdown de '{source_file_name}'; se conserva {markdown_doc_name} "
+                        f"({len(previous_payload.get('items') or [])} ítems).",
+                        tool_call_id=tool_call_id,
+                    )
+                ],
+            }
+        )
+
+    tests_with_markdown, extraction_report = run_segmentation_pipeline(
+        full_markdown, profile_name, previous_payload
+    )
+
+    toc_entries = [
+        test.get("raw") or test.get("title")
+        for test in tests_with_markdown
+        if test.get("raw") or test.get("title")
+    ]
+
+    # Índice id -> archivo individual: la extracción estructurada carga solo su ítem
+    item_index = {
+        str(item["id"]): _markdown_item_path(base_path, source_file_name, item["id"])
+        for item in tests_with_markdown
+    }
+    # El texto completo vive solo en el archivo de metadata; los ítems guardan spans.
+    # Los ítems se guardan solo en sus archivos: el payload queda pequeño para
+    # que cada extracción lo lea completo solo para obtener ``item_index``
+    stored_items = [_stored_item(item) for item in tests_with_markdown]
+    payload = {
+        "markdown_source": markdown_source,
+        "toc_entries": toc_entries,
+        "item_index": item_index,
+        **extraction_report,
+    }
+
+    # Solo los archivos escritos: el reducer de archivos los combina con el estado
+    modified_at = datetime.now(timezone.utc).isoformat()
+    vfs.write_json(markdown_doc_name, payload, modified_at)
+
+    # En modo incremental solo se reescriben los ítems que cambiaron (o sin archivo);
+    # un ítem con el mismo texto pero spans desplazados también se reescribe
+    last_run = extraction_report["last_run"]
+    previous_items = {
+        item.get("id"): item for item in (previous_payload or {}).get("items") or []
+    }
+    for item in stored_items:
+        item_path = item_index[str(item["id"])]
+        if previous_items.get(item["id"]) == item and vfs.exists(item_path):
+            continue
+        vfs.write_json(item_path, item, modified_at)
+    if previous_payload:
+        for removed_id in last_run.get("removed_item_ids") or []:
+            if str(removed_id) not in item_index:
+                vfs.delete(_markdown_item_path(base_path, source_file_name, removed_id))
+
+    total_items = len(tests_with_markdown)
+    populated_items = sum(1 for item in tests_with_markdown if item.get("markdown"))
+    summary_message = (
+        f"Extracción completada para '{source_file_name}': {total_items} pruebas/soluciones identificadas; "
+        f"{populated_items} incluyen markdown extraído ({len(extraction_report['chunks'])} chunks procesados, "
+        f"{len(extraction_report['duplicates_collapsed'])} encabezados duplicados colapsados). "
+        f"Archivo: {markdown_doc_name} (ítems individuales en {markdown_doc_name[:-len('.json')]}/)"
+    )
+    if previous_payload:
+        summary_message += _incremental_summary(extraction_report["last_run"])
+
+    return Command(
+        update={
+            "files": vfs.updates,
+            "messages": [ToolMessage(summary_message, tool_call_id=tool_call_id)],
+        }
+    )
@@ -10,12 +10,10 @@ warnings.filterwarnings(
     module="pydantic.*"
 )
 
-import json
 import logging
 import re
 import unicodedata
 from copy import deepcopy
-from datetime import datetime, timezone
 from typing import Annotated, Any, Optional, List, Tuple
 
 from langchain_core.messages import ToolMessage
@@ -26,6 +24,9 @@ from pydantic import ValidationError
 
 from src.graph.state import DeepAgentState
 from src.prompts.tool_description_prompts import CONSOLIDATE_NEW_METHOD_TOOL_DESCRIPTION
+from src.utils.read_cache import thaw
+from src.utils.stage_manifest import STAGE_CONSOLIDATE, record_stage, stage_input_hash
+from src.utils.virtual_fs import VirtualFS
 # Ya no se usa MetodoAnaliticoNuevo - trabajamos directamente con dicts de TestSolution
 
 logger = logging.getLogger(__name__)
@@ -36,8 +37,8 @@ METHOD_DEFAULT_PATH = "/new/new_method_final.json"
 # Directorios base para búsqueda dinámica de archivos
 ACTUAL_METHOD_DIR = "/actual_method"
 # Patrones para identificar archivos
-METADATA_TOC_PATTERN = re.compile(r"method_metadata_TOC_(.+)\.json$")
-STRUCTURED_CONTENT_PATTERN = re.compile(r"test_solution_structured_content_(.+)\.json$")
+METADATA_TOC_GLOB = "method_metadata_TOC_*.json"
+STRUCTURED_CONTENT_GLOB = "test_solution_structured_content_*.json"
 
 # Campos de metadata que se copian del método legado al método final
 METADATA_FIELDS = [
@@ -60,42 +61,6 @@ METADATA_FIELDS = [
 ]
 
 
-def _load_json_payload(files: dict[str, Any], path: str) -> Optional[dict[str, Any] | list]:
-    """
-    Carga un payload JSON desde el filesystem virtual.
-    
-    Retorna dict, list, o None si no se encuentra o hay error de parseo.
-    """
-    entry = files.get(path)
-    if entry is None:
-        return None
-
-    if isinstance(entry, dict):
-        # Caso: entry tiene estructura {"data": ..., "content": ...}
-        if "data" in entry and isinstance(entry["data"], (dict, list)):
-            return entry["data"]
-        if isinstance(entry.get("content"), str):
-            try:
-                return json.loads(entry["content"])
-            except json.JSONDecodeError:
-                logger.warning(f"Error parseando JSON desde 'content' en {path}")
-                return None
-        # Si no tiene 'data' ni 'content', asumimos que es el payload directo
-        return entry
-
-    if isinstance(entry, str):
-        try:
-            return json.loads(entry)
-        except json.JSONDecodeError:
-            logger.warning(f"Error parseando JSON string en {path}")
-            return None
-    
-    if isinstance(entry, list):
-        return entry
-
-    return None
-
-
 def _normalize_text(value: Optional[str]) -> Optional[str]:
     """Normaliza texto para comparación: minúsculas, sin acentos, sin espacios extra."""
     if not value:
@@ -178,53 +143,41 @@ def _find_prueba_entry(
     return None, None
 
 
-def _find_metadata_files(files: dict[str, Any], directory: str) -> List[str]:
+def _find_metadata_files(vfs: VirtualFS, directory: str) -> List[str]:
     """
     Busca archivos con patrón method_metadata_TOC_*.json en un directorio.
     """
-    found = []
-    dir_prefix = directory.rstrip("/") + "/"
-    for path in files.keys():
-        if path.startswith(dir_prefix) and METADATA_TOC_PATTERN.search(path):
-            found.append(path)
-    return sorted(found)
+    return vfs.glob(f"{directory.rstrip('/')}/{METADATA_TOC_GLOB}")
 
 
-def _find_structured_content_files(files: dict[str, Any], directory: str) -> List[str]:
+def _find_structured_content_files(vfs: VirtualFS, directory: str) -> List[str]:
     """
     Busca archivos con patrón test_solution_structured_content_*.json en un directorio.
     """
-    found = []
-    dir_prefix = directory.rstrip("/") + "/"
-    for path in files.keys():
-        if path.startswith(dir_prefix) and STRUCTURED_CONTENT_PATTERN.search(path):
-            found.append(path)
-    return sorted(found)
+    return vfs.glob(f"{directory.rstrip('/')}/{STRUCTURED_CONTENT_GLOB}")
 
 
-def _load_first_metadata(files: dict[str, Any], directory: str) -> Tuple[Optional[dict[str, Any]], Optional[str]]:
+def _load_first_metadata(vfs: VirtualFS, directory: str) -> Tuple[Optional[dict[str, Any]], Optional[str]]:
     """
     Carga el primer archivo de metadata encontrado en el directorio.
     
     Returns:
         Tupla (metadata_dict, path_usado) o (None, None) si no se encuentra
     """
-    metadata_files = _find_metadata_files(files, directory)
+    metadata_files = _find_metadata_files(vfs, directory)
     for file_path in metadata_files:
-        payload = _load_json_payload(files, file_path)
-        if payload and isinstance(payload, dict):
+        payload = vfs.read_json(file_path, expect=dict)
+        if payload:
             return payload, file_path
     return None, None
 
 
-def _iter_patch_payloads(files: dict[str, Any], patches_dir: str) -> List[Tuple[str, dict[str, Any]]]:
-    prefix = patches_dir.rstrip("/") + "/"
+def _iter_patch_payloads(vfs: VirtualFS, patches_dir: str) -> List[Tuple[str, dict[str, Any]]]:
     collected: List[Tuple[str, dict[str, Any]]] = []
-    for path, entry in files.items():
-        if isinstance(path, str) and path.startswith(prefix):
-            payload = _load_json_payload(files, path)
-            if isinstance(payload, dict):
-                collected.append((path, payload))
+    for path in vfs.listdir(patches_dir, recursive=True):
+        payload = vfs.read_json(path, expect=dict)
+        if payload is not None:
+            collected.append((path, payload))
     return sorted(collected, key=lambda item: item[1].get("action_index", 0))
 
 
@@ -239,27 +192,25 @@ def consolidate_new_method(
 ) -> Command:
     logger.info("Iniciando 'consolidate_new_method'")
     
-    # Archivos originales para leer entradas
-    source_files = dict(state.get("files", {}) or {})
+    vfs = VirtualFS.from_state(state)
+    input_hash = stage_input_hash(vfs, STAGE_CONSOLIDATE)
     
-    # Archivos base que queremos retener (sin las ramas paralelas de patches)
-    base_files = {
-        k: v for k, v in source_files.items()
-        if not k.startswith(patches_dir.rstrip("/") + "/")
-    }
+    # Ramas paralelas de patches: se leen antes de eliminarlas del estado al consolidar
+    patches = _iter_patch_payloads(vfs, patches_dir)
+    consumed_patch_paths = vfs.listdir(patches_dir, recursive=True)
 
-    base_payload = _load_json_payload(source_files, base_method_path)
+    base_payload = vfs.read_json(base_method_path)
     base_source = base_method_path
     
     # Fallback: si no existe el método base especificado, cargar desde /actual_method/
     if base_payload is None:
         logger.warning(f"No se encontró método base en {base_method_path}, buscando en {ACTUAL_METHOD_DIR}/")
-        structured_files = _find_structured_content_files(source_files, ACTUAL_METHOD_DIR)
+        structured_files = _find_structured_content_files(vfs, ACTUAL_METHOD_DIR)
         if structured_files:
             # Cargar todas las pruebas de los archivos encontrados
             all_tests = []
             for file_path in structured_files:
-                file_payload = _load_json_payload(source_files, file_path)
+                file_payload = vfs.read_json(file_path)
                 if file_payload:
                     if isinstance(file_payload, list):
                         # Lista de wrappers con source_id y tests
@@ -299,24 +250,23 @@ def consolidate_new_method(
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
 
     # Cargar metadata del método legado (búsqueda dinámica)
-    legacy_metadata, metadata_path_used = _load_first_metadata(source_files, ACTUAL_METHOD_DIR)
+    legacy_metadata, metadata_path_used = _load_first_metadata(vfs, ACTUAL_METHOD_DIR)
     metadata_loaded = False
     if legacy_metadata:
         logger.info(f"Metadata del método legado cargada desde {metadata_path_used}")
         metadata_loaded = True
     else:
         # Fallback: intentar con el parámetro legacy_metadata_path por compatibilidad
-        legacy_metadata = _load_json_payload(source_files, legacy_metadata_path)
-        if legacy_metadata and isinstance(legacy_metadata, dict):
+        legacy_metadata = vfs.read_json(legacy_metadata_path, expect=dict) if legacy_metadata_path else None
+        if legacy_metadata:
             logger.info(f"Metadata del método legado cargada desde {legacy_metadata_path} (fallback)")
             metadata_loaded = True
         else:
             logger.warning(f"No se encontró metadata del método legado en {ACTUAL_METHOD_DIR}/ ni en {legacy_metadata_path}")
             legacy_metadata = {}
 
-    # Trabajar directamente con el dict sin validación Pydantic
-    working_method = base_payload
-    patches = _iter_patch_payloads(source_files, patches_dir)
+    # Trabajar sobre una copia editable del dict (sin validación Pydantic)
+    working_method = thaw(base_payload)
     consolidated_patch_paths: list[str] = [path for path, _ in patches]
 
     applied = 0
@@ -374,12 +324,12 @@ def consolidate_new_method(
     
     logger.info(f"Metadata copiada: {metadata_fields_copied} campos de {len(METADATA_FIELDS)} posibles")
     
-    method_dump = final_method
-    method_str = json.dumps(method_dump, ensure_ascii=False, indent=2)
 
-    # Resultado final: base_files + método consolidado
-    files_update = base_files.copy()
-    files_update[output_path] = {"content": method_str, "data": method_dump, "modified_at": datetime.now(timezone.utc).isoformat()}
+    # Resultado final: solo el método consolidado y el borrado de los patches
+    for patch_path in consumed_patch_paths:
+        vfs.delete(patch_path)
+    vfs.write_json(output_path, final_method)
+    record_stage(vfs, STAGE_CONSOLIDATE, input_hash)
 
     metadata_msg = f", metadata copiada: {metadata_fields_copied} campos" if metadata_loaded else ", sin metadata"
     base_msg = f" (base: {base_source})" if base_source != base_method_path else ""
@@ -393,7 +343,7 @@ def consolidate_new_method(
 
     return Command(
         update={
-            "files": files_update,
+            "files": vfs.updates,
             "messages": [ToolMessage(content=tool_message, tool_call_id=tool_call_id)],
         }
     )
@@ -9,7 +9,6 @@ warnings.filterwarnings(
 )
 
 import copy
-import json
 import logging
 from datetime import datetime, timezone
 from typing import Annotated, Any, Dict, List, Optional
@@ -23,6 +22,7 @@ from src.graph.state import DeepAgentState
 from src.prompts.tool_description_prompts import (
     TEST_SOLUTION_STRUCTURED_CONSOLIDATION_TOOL_DESC,
 )
+from src.utils.virtual_fs import VirtualFS
 from .test_solution_structured_extraction import (
     DEFAULT_BASE_PATH,
     TEMP_DIR_MAPPING,
@@ -35,26 +35,6 @@ logger = logging.getLogger(__name__)
 ANALYTICAL_TESTS_DIR = "/analytical_tests"
 
 
-def _load_structured_entry(path: str, file_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    entry_data = file_entry.get("data")
-    if isinstance(entry_data, dict):
-        return entry_data
-
-    entry_content = file_entry.get("content")
-    if isinstance(entry_content, str):
-        try:
-            parsed = json.loads(entry_content)
-        except json.JSONDecodeError:
-            logger.warning(
-                "No se pudo parsear el archivo %s como JSON válido durante la consolidación.",
-                path,
-            )
-            return None
-        if isinstance(parsed, dict):
-            return parsed
-    return None
-
-
 def _infer_source_id_from_path(path: str) -> Optional[int]:
     filename = path.rsplit("/", 1)[-1]
     candidate = filename.split(".", 1)[0]
@@ -144,8 +124,7 @@ def consolidate_test_solution_structured(
         source_file_name: Nombre del archivo de origen (sin extensión)
         base_path: Ruta base (/actual_method o /proposed_method)
     """
-    # Archivos originales para leer entradas individuales
-    archivos_entrada = dict(state.get("files", {}))
+    vfs = VirtualFS.from_state(state)
     
     # Rutas calculadas
     temp_dir = _temp_structured_dir(base_path, source_file_name)
@@ -153,27 +132,12 @@ def consolidate_test_solution_structured(
     analytical_tests_path = _analytical_tests_path(source_file_name)
     markdown_doc_path = f"{base_path.rstrip('/')}/test_solution_markdown_{source_file_name}.json"
 
-    # Archivos base que queremos retener (sin las ramas paralelas temporales)
-    archivos_resultado = {
-        k: v for k, v in archivos_entrada.items() 
-        if not k.startswith(temp_dir + "/")
-    }
-
     candidate_entries: List[Dict[str, Any]] = []
     consumed_paths: List[str] = []
 
     # Buscar archivos en la carpeta temporal
-    for path, file_entry in archivos_entrada.items():
-        if not isinstance(path, str):
-            continue
-
-        if not path.startswith(f"{temp_dir}/"):
-            continue
-
-        if not isinstance(file_entry, dict):
-            continue
-
-        entry = _load_structured_entry(path, file_entry)
+    for path in vfs.listdir(temp_dir, recursive=True):
+        entry = vfs.read_json(path, expect=dict)
         if entry is None:
             continue
 
@@ -204,31 +168,19 @@ def consolidate_test_solution_structured(
 
     candidate_entries.sort(key=_sort_key)
 
-    # Resultado final: archivos_resultado + nuevo consolidado
-    archivos_resultado_final = archivos_resultado.copy()
+    # Resultado final: solo los archivos escritos o eliminados (el reducer combina con el estado)
+    # Eliminar archivos temporales consumidos (tombstones en el reducer de archivos)
+    for path in consumed_paths:
+        vfs.delete(path)
 
     # Guardar archivo consolidado en la carpeta final (no temporal)
-    content_str = json.dumps(candidate_entries, indent=2, ensure_ascii=False)
-    archivos_resultado_final[structured_content_path] = {
-        "content": content_str.split("\n"),
-        "data": candidate_entries,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    vfs.write_json(structured_content_path, candidate_entries)
     
     # Generar registro de pruebas analíticas en /analytical_tests/
     analytical_registry = _extract_analytical_tests_registry(
         candidate_entries, source_file_name, base_path
     )
-    analytical_content_str = json.dumps(analytical_registry, indent=2, ensure_ascii=False)
-    archivos_resultado_final[analytical_tests_path] = {
-        "content": analytical_content_str.split("\n"),
-        "data": analytical_registry,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
-    
-    # Eliminar archivos temporales consumidos
-    for consumed_path in consumed_paths:
-        archivos_resultado_final.pop(consumed_path, None)
+    vfs.write_json(analytical_tests_path, analytical_registry)
 
     num_tests = len(analytical_registry.get("tests", []))
     summary_message = (
@@ -239,7 +191,7 @@ def consolidate_test_solution_structured(
 
     return Command(
         update={
-            "files": archivos_resultado_final,
+            "files": vfs.updates,
             "messages": [ToolMessage(summary_message, tool_call_id=tool_call_id)],
         }
     )
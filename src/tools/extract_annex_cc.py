@@ -10,7 +10,6 @@ warnings.filterwarnings(
 
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime, timezone
 
 from pydantic import BaseModel, Field
 from typing import Annotated, Dict, List, Literal, Optional, Type, Union, Any
@@ -43,6 +42,8 @@ from src.prompts.tool_llm_calls_prompts import (
 from src.prompts.tool_description_prompts import EXTRACT_STRUCTURED_DATA_PROMPT_TOOL_DESC
 from src.models import *
 from src.graph.state import DeepAgentState
+from src.utils.file_entries import make_file_entry
+from src.utils.progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
@@ -232,7 +233,11 @@ def process_document(
     
     if total_pages <= max_pages_per_chunk:
         # Process directly if within limit
+        progress = ProgressReporter("extract_annex_cc", "ocr", total=1)
+        progress.start(f"{total_pages} páginas en un solo chunk")
         result = process_chunk(pdf_path, extraction_model, chunk_retry_backoff_seconds=5, chunk_retry_attempts=3)
+        progress.advance(pages=total_pages)
+        progress.done()
         return [result] if result else []
     
     # Split into chunks and process each
@@ -244,6 +249,8 @@ def process_document(
     if not chunk_files:
         return []
 
+    progress = ProgressReporter("extract_annex_cc", "ocr", total=len(chunk_files))
+    progress.start(f"{total_pages} páginas en {len(chunk_files)} chunks")
     indexed_results: list[tuple[int, Any]] = []
     
     try:
@@ -266,7 +273,9 @@ def process_document(
                     result = future.result()
                 except Exception as exc:  # pragma: no cover - defensive
                     logger.error(f"Error processing chunk {chunk_file}: {exc}")
+                    progress.advance(f"Falló el chunk {idx + 1}: {exc}", failed=True)
                     continue
+                progress.advance(f"Chunk {idx + 1} procesado")
                 if result:
                     indexed_results.append((idx, result))
     finally:
@@ -277,6 +286,7 @@ def process_document(
             except Exception as e:
                 logger.warning(f"Could not delete temporary file {chunk_file}: {e}")
     
+    progress.done(f"{len(indexed_results)} de {len(chunk_files)} chunks con resultado")
     indexed_results.sort(key=lambda item: item[0])
     return [result for _, result in indexed_results]
 
@@ -495,33 +505,20 @@ def extract_annex_cc(
     # 1. Llama a la nueva función que devuelve el objeto Summary
     summary_object = _get_summary_object(model_instance, structured_extraction_prompt, document_type)
 
-    # 2. Prepara el estado 'files'
-    files = state.get("files", {})
+    # 2. Prepara la actualización de 'files' (solo los archivos escritos)
+    files = {}
 
     # 3. Guarda el JSON gigante en formato estructurado y string para herramientas de lectura
     if model_instance:
         serialized_data = _model_instance_to_dict(model_instance)
-        full_json_string = json.dumps(serialized_data, indent=2, ensure_ascii=False)
-        files[document_name] = {
-            "content": full_json_string,
-            "data": serialized_data,
-            "modified_at": datetime.now(timezone.utc).isoformat(),
-        }
+        files[document_name] = make_file_entry(serialized_data)
     else:
-        files[document_name] = {
-            "content": "{}",
-            "data": {},
-            "modified_at": datetime.now(timezone.utc).isoformat(),
-        }  # Guarda un JSON vacío si falla
+        files[document_name] = make_file_entry({})  # Guarda un JSON vacío si falla
 
     # 4. Guarda un archivo separado con el resumen para consumo rápido
     summary_payload = summary_object.model_dump() if isinstance(summary_object, BaseModel) else summary_object
     summary_file_path = summary_filenames[document_type]
-    files[summary_file_path] = {
-        "content": json.dumps(summary_payload, indent=2, ensure_ascii=False),
-        "data": summary_payload,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    files[summary_file_path] = make_file_entry(summary_payload)
     summary_text = summary_payload.get("summary", f"Documento {document_name} procesado exitosamente.")
 
     return Command(
@@ -18,7 +18,6 @@ import tempfile
 import unicodedata
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
-from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Type, Union, Annotated
 
@@ -35,6 +34,8 @@ from langsmith import traceable
 from src.graph.state import DeepAgentState
 from src.models.analytical_method_models import MetodoAnaliticoDA, MetodoAnaliticoCompleto
 from src.prompts.tool_description_prompts import PDF_DA_METADATA_TOC_TOOL_DESC
+from src.utils.file_entries import make_file_entry
+from src.utils.progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
@@ -391,12 +392,16 @@ def process_document(
         return []
 
     if total_pages <= max_pages_per_chunk:
+        progress = ProgressReporter("pdf_da_metadata_toc", "ocr", total=1)
+        progress.start(f"{total_pages} páginas en un solo chunk")
         result = process_chunk(
             pdf_path,
             extraction_model,
             chunk_retry_backoff_seconds=5,
             chunk_retry_attempts=3,
         )
+        progress.advance(pages=total_pages)
+        progress.done()
         return [result] if result else []
 
     chunk_files = split_pdf_into_chunks(
@@ -407,6 +412,9 @@ def process_document(
     if not chunk_files:
         return []
 
+    progress = ProgressReporter("pdf_da_metadata_toc", "ocr", total=len(chunk_files))
+    progress.start(f"{total_pages} páginas en {len(chunk_files)} chunks")
+
     indexed_results: List[Tuple[int, Any]] = []
 
     try:
@@ -429,7 +437,9 @@ def process_document(
                     result = future.result()
                 except Exception as exc:
                     logger.error("Error processing chunk %s: %s", chunk_file, exc)
+                    progress.advance(f"Falló el chunk {idx + 1}: {exc}", failed=True)
                     continue
+                progress.advance(f"Chunk {idx + 1} procesado")
                 if result:
                     indexed_results.append((idx, result))
     finally:
@@ -439,6 +449,7 @@ def process_document(
             except Exception as e:
                 logger.warning("Could not delete temporary file %s: %s", chunk_file, e)
 
+    progress.done(f"{len(indexed_results)} de {len(chunk_files)} chunks con resultado")
     indexed_results.sort(key=lambda item: item[0])
     return [result for _, result in indexed_results]
 
@@ -605,7 +616,8 @@ def pdf_da_metadata_toc(
     
     summary_message = _build_annotation_summary(full_model_instance)
 
-    files = dict(state.get("files", {}))
+    # Solo el archivo escrito: el reducer de archivos lo combina con el estado
+    files = {}
 
     # 6. Guardar JSON estructurado del metodo completo
     if full_model_instance:
@@ -615,20 +627,9 @@ def pdf_da_metadata_toc(
             serialized_data.get("tabla_de_contenidos"), full_markdown
         )
         serialized_data["toc_validation_metrics"] = toc_metrics
-        full_json_string = json.dumps(
-            serialized_data, indent=2, ensure_ascii=False
-        )
-        files[document_name] = {
-            "content": full_json_string.split("\n"),
-            "data": serialized_data,
-            "modified_at": datetime.now(timezone.utc).isoformat(),
-        }
+        files[document_name] = make_file_entry(serialized_data)
     else:
-        files[document_name] = {
-            "content": ["{}"],
-            "data": {"source_file_name": source_file_name},
-            "modified_at": datetime.now(timezone.utc).isoformat(),
-        }
+        files[document_name] = make_file_entry({"source_file_name": source_file_name})
 
 
     enhanced_summary = (
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import json
 import logging
 import os
 import re
@@ -17,6 +16,8 @@ from langgraph.types import Command
 
 from src.graph.state import DeepAgentState
 from src.prompts.tool_description_prompts import RENDER_METHOD_DOCX_TOOL_DESCRIPTION
+from src.utils.stage_manifest import STAGE_RENDER, disk_file_hash, record_stage, stage_input_hash
+from src.utils.virtual_fs import VirtualFS
 
 try:
     from docxtpl import DocxTemplate, InlineImage
@@ -296,33 +297,6 @@ def _build_method_context(method_data: Dict[str, Any]) -> Dict[str, Any]:
     return context
 
 
-def _load_json_payload(files: dict[str, Any], path: str) -> Optional[dict[str, Any]]:
-    """Carga un payload JSON desde el filesystem virtual."""
-    entry = files.get(path)
-    if entry is None:
-        return None
-
-    if isinstance(entry, dict):
-        if "data" in entry and isinstance(entry["data"], dict):
-            return entry["data"]
-        if isinstance(entry.get("content"), str):
-            try:
-                return json.loads(entry["content"])
-            except json.JSONDecodeError:
-                logger.warning(f"Error parseando JSON desde 'content' en {path}")
-                return None
-        return entry
-
-    if isinstance(entry, str):
-        try:
-            return json.loads(entry)
-        except json.JSONDecodeError:
-            logger.warning(f"Error parseando JSON string en {path}")
-            return None
-
-    return None
-
-
 def _validate_docx(path: Path) -> None:
     """Valida rapidamente que el DOCX generado no este corrupto (zip legible)."""
     try:
@@ -383,10 +357,10 @@ def render_method_docx(
     """
     logger.info("Iniciando 'render_method_docx'")
 
-    source_files = dict(state.get("files", {}) or {})
+    vfs = VirtualFS.from_state(state)
 
     # Cargar el metodo desde el filesystem virtual
-    method_data = _load_json_payload(source_files, method_path)
+    method_data = vfs.read_json(method_path, expect=dict)
     if method_data is None:
         msg = f"No se encontro el metodo en {method_path}. Asegurate de ejecutar consolidate_new_method primero."
         logger.error(msg)
@@ -401,6 +375,9 @@ def render_method_docx(
         logger.error(msg)
         return Command(update={"messages": [ToolMessage(content=msg, tool_call_id=tool_call_id)]})
 
+    # La plantilla forma parte de las entradas: corregirla vuelve la etapa desactualizada
+    input_hash = stage_input_hash(vfs, STAGE_RENDER, extra=disk_file_hash(tpl_path))
+
     # Construir contexto para la plantilla
     try:
         context = _build_method_context(method_data)
@@ -432,12 +409,8 @@ def render_method_docx(
         "template_used": str(tpl_path),
     }
 
-    files_update = source_files.copy()
-    files_update["/new/rendered_docx_info.json"] = {
-        "content": json.dumps(docx_info, ensure_ascii=False, indent=2),
-        "data": docx_info,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    vfs.write_json("/new/rendered_docx_info.json", docx_info)
+    record_stage(vfs, STAGE_RENDER, input_hash, template_path=str(tpl_path), docx_path=str(output_path))
 
     # Extraer info del metodo para el mensaje
     nombre_producto = method_data.get("nombre_producto", "N/A")
@@ -455,7 +428,7 @@ def render_method_docx(
 
     return Command(
         update={
-            "files": files_update,
+            "files": vfs.updates,
             "messages": [ToolMessage(content=tool_message, tool_call_id=tool_call_id)],
         }
     )
@@ -5,10 +5,8 @@ Esta herramienta mapea los códigos de producto mencionados en el CC a los nombr
 de archivos reales en /actual_method/ y /proposed_method/.
 """
 
-import json
 import logging
 import re
-from datetime import datetime, timezone
 from typing import Annotated, Dict, List, Optional, Any, Tuple
 
 from langchain_core.messages import ToolMessage
@@ -18,11 +16,15 @@ from langgraph.types import Command
 
 from src.graph.state import DeepAgentState
 from src.prompts.tool_description_prompts import RESOLVE_SOURCE_REFERENCES_TOOL_DESC
+from src.utils.read_cache import thaw
+from src.utils.stage_manifest import STAGE_RESOLVE, record_stage, stage_input_hash
+from src.utils.virtual_fs import VirtualFS
 
 logger = logging.getLogger(__name__)
 
 # Patrones para archivos de metadatos
 METADATA_PATTERN = "method_metadata_TOC_"
+METADATA_DIRS = ("/actual_method", "/proposed_method")
 CC_SUMMARY_PATH = "/new/change_control_summary.json"
 
 
@@ -60,7 +62,7 @@ def _normalize_code(code: str) -> str:
     return normalized.strip()
 
 
-def _build_source_mapping(files: Dict[str, Any]) -> Dict[str, str]:
+def _build_source_mapping(vfs: VirtualFS) -> Dict[str, str]:
     """Construye un mapeo de códigos de producto a nombres de archivo.
     
     Lee los metadatos de /actual_method/ y /proposed_method/ y extrae:
@@ -73,16 +75,14 @@ def _build_source_mapping(files: Dict[str, Any]) -> Dict[str, str]:
     """
     mapping: Dict[str, str] = {}
     
-    for file_path, file_info in files.items():
-        # Solo procesar archivos de metadatos
-        if METADATA_PATTERN not in file_path:
-            continue
-        
-        # Verificar que sea de actual_method o proposed_method
-        if "/actual_method/" not in file_path and "/proposed_method/" not in file_path:
-            continue
-        
-        data = file_info.get("data", {})
+    # Solo archivos de metadatos de actual_method o proposed_method
+    metadata_paths = [
+        path
+        for base_dir in METADATA_DIRS
+        for path in vfs.glob(f"{base_dir}/**{METADATA_PATTERN}*")
+    ]
+    for file_path in metadata_paths:
+        data = vfs.read_json(file_path, expect=dict)
         if not data:
             continue
         
@@ -168,7 +168,8 @@ def _update_cc_summary(
     Returns:
         Tuple[updated_data, resolution_report]: Datos actualizados y reporte
     """
-    updated = dict(cc_data)
+    # Copia editable: el payload leído del filesystem virtual es inmutable
+    updated = thaw(cc_data)
     report = {
         "resolved": [],
         "unresolved": [],
@@ -239,10 +240,11 @@ def resolve_source_references(
     Esta herramienta debe ejecutarse ANTES de analyze_change_impact para
     asegurar que las referencias de archivos estén correctamente mapeadas.
     """
-    files = state.get("files", {})
+    vfs = VirtualFS.from_state(state)
+    input_hash = stage_input_hash(vfs, STAGE_RESOLVE)
     
     # 1. Construir mapeo de códigos a source_file_name
-    mapping = _build_source_mapping(files)
+    mapping = _build_source_mapping(vfs)
     
     if not mapping:
         message = (
@@ -259,8 +261,7 @@ def resolve_source_references(
     logger.info(f"Mapeo construido con {len(mapping)} entradas: {list(mapping.keys())}")
     
     # 2. Leer change_control_summary.json
-    cc_file = files.get(CC_SUMMARY_PATH)
-    if not cc_file:
+    if not vfs.exists(CC_SUMMARY_PATH):
         message = (
             f"No se encontró {CC_SUMMARY_PATH}. "
             "Asegúrate de que el change_control_agent haya procesado el documento primero."
@@ -272,43 +273,26 @@ def resolve_source_references(
             }
         )
     
-    cc_data = cc_file.get("data", {})
-    if not cc_data:
-        # Intentar parsear desde content
-        content = cc_file.get("content", [])
-        if isinstance(content, list):
-            content = "\n".join(content)
-        try:
-            cc_data = json.loads(content)
-        except (json.JSONDecodeError, TypeError):
-            message = f"No se pudo parsear {CC_SUMMARY_PATH}."
-            logger.error(message)
-            return Command(
-                update={
-                    "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
-                }
-            )
+    cc_data = vfs.read_json(CC_SUMMARY_PATH, expect=dict)
+    if cc_data is None:
+        message = f"No se pudo parsear {CC_SUMMARY_PATH}."
+        logger.error(message)
+        return Command(
+            update={
+                "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
+            }
+        )
     
     # 3. Actualizar CC summary con referencias resueltas
     updated_cc, report = _update_cc_summary(cc_data, mapping)
     
     # 4. Guardar CC actualizado
-    updated_files = dict(files)
-    content_str = json.dumps(updated_cc, indent=2, ensure_ascii=False)
-    updated_files[CC_SUMMARY_PATH] = {
-        "content": content_str.split("\n"),
-        "data": updated_cc,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    vfs.write_json(CC_SUMMARY_PATH, updated_cc)
     
     # 5. Guardar reporte de resolución
     report_path = "/new/source_reference_mapping.json"
-    report_str = json.dumps(report, indent=2, ensure_ascii=False)
-    updated_files[report_path] = {
-        "content": report_str.split("\n"),
-        "data": report,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    vfs.write_json(report_path, report)
+    record_stage(vfs, STAGE_RESOLVE, input_hash)
     
     # 6. Construir mensaje de resumen
     resolved_count = len(report["resolved"])
@@ -340,7 +324,7 @@ def resolve_source_references(
     
     return Command(
         update={
-            "files": updated_files,
+            "files": vfs.updates,
             "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
         }
     )
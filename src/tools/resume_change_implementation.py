@@ -0,0 +1,66 @@
+"""
+Herramienta para retomar el flujo de implementación de cambios.
+
+Lee el manifiesto de etapas (``/new/stage_manifest/``) que registran las
+herramientas del ``change_implementation_agent`` y reporta, por contenido, qué
+etapas siguen vigentes y desde cuál hay que reanudar. No modifica el estado.
+"""
+
+import logging
+from typing import Annotated, Any, Dict, List
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import InjectedToolCallId, tool
+from langgraph.prebuilt import InjectedState
+from langgraph.types import Command
+
+from src.graph.state import DeepAgentState
+from src.prompts.tool_description_prompts import RESUME_CHANGE_IMPLEMENTATION_TOOL_DESC
+from src.utils.stage_manifest import STAGE_APPLY, stage_status
+from src.utils.virtual_fs import VirtualFS
+
+logger = logging.getLogger(__name__)
+
+
+def _format_stage(status: Dict[str, Any]) -> str:
+    line = f"- {status['stage']}: {status['status']}"
+    if status.get("reason"):
+        line += f" ({status['reason']})"
+    return line
+
+
+def _format_report(report: Dict[str, Any]) -> str:
+    lines: List[str] = ["Estado del flujo de implementación:"]
+    lines.extend(_format_stage(status) for status in report["stages"])
+
+    resume_from = report["resume_from"]
+    if resume_from is None:
+        lines.append("\nTodas las etapas están vigentes: no es necesario re-ejecutar ninguna herramienta.")
+        return "\n".join(lines)
+
+    lines.append(f"\nReanudar desde: {resume_from}")
+    if resume_from == STAGE_APPLY and report["pending_actions"]:
+        indices = ", ".join(str(idx) for idx in report["pending_actions"])
+        lines.append(f"Llamar apply_method_patch solo para action_index: {indices}")
+    lines.append("Las etapas vigentes anteriores no deben repetirse.")
+    return "\n".join(lines)
+
+
+@tool(description=RESUME_CHANGE_IMPLEMENTATION_TOOL_DESC)
+def resume_change_implementation(
+    state: Annotated[DeepAgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+) -> Command:
+    """
+    Reporta el estado de cada etapa del flujo de implementación y el punto
+    desde el que debe reanudarse tras un error o un reintento.
+    """
+    report = stage_status(VirtualFS.from_state(state))
+    message = _format_report(report)
+    logger.info(message)
+
+    return Command(
+        update={
+            "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
+        }
+    )
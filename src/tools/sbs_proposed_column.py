@@ -9,12 +9,10 @@ warnings.filterwarnings(
 )
 
 import base64
-import json
 import logging
 import os
 import tempfile
 import time
-from datetime import datetime, timezone
 from pathlib import Path
 from typing import Annotated, Any, List, Optional, Tuple
 
@@ -28,6 +26,7 @@ from langgraph.types import Command
 from mistralai import Mistral
 
 from src.graph.state import DeepAgentState
+from src.utils.file_entries import make_file_entry
 
 logger = logging.getLogger(__name__)
 
@@ -252,14 +251,6 @@ def _extract_markdown_with_ocr(pdf_path: str, max_retries: int = 3) -> str:
     raise last_error or Exception("OCR falló después de todos los reintentos")
 
 
-def _safe_json_dumps(payload: dict) -> str:
-    try:
-        return json.dumps(payload, indent=2, ensure_ascii=False)
-    except Exception:
-        logger.exception("No se pudo serializar el payload a JSON.")
-        return "{}"
-
-
 @tool(
     description=(
         "Extrae la columna derecha (metodo propuesto) de un PDF Side-by-Side, "
@@ -321,12 +312,8 @@ def sbs_proposed_column_to_pdf_md(
         "source_file_name": source_file_name,
     } if markdown else {"source_file_name": source_file_name}
     
-    files = dict(state.get("files", {}))
-    files[document_name] = {
-        "content": _safe_json_dumps(stored_data),
-        "data": stored_data,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+    files = {}
+    files[document_name] = make_file_entry(stored_data)
 
     warning_note = ""
     if low_confidence:
@@ -8,23 +8,41 @@ warnings.filterwarnings(
     module="pydantic.*"
 )
 
+import asyncio
 import json
 import logging
-from datetime import datetime, timezone
-from typing import Annotated, Dict, Optional, Any
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Any, Dict, List, Optional, Tuple
 
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, ToolMessage, SystemMessage
-from langchain_core.tools import InjectedToolCallId, tool
+from langchain_core.tools import InjectedToolCallId, StructuredTool
 from langgraph.prebuilt import InjectedState
 from langgraph.types import Command
+from pydantic import create_model
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import httpx
 
 from src.graph.state import DeepAgentState
 from src.prompts.tool_description_prompts import TEST_SOLUTION_STRUCTURED_EXTRACTION_TOOL_DESC
-from src.prompts.tool_llm_calls_prompts import TEST_SOLUTION_STRUCTURED_EXTRACTION_PROMPT, TEST_SOLUTION_STRUCTURED_EXTRACTION_HUMAN_PROMPT
-from src.models.structured_test_model import TestSolutions
+from src.prompts.tool_llm_calls_prompts import (
+    TEST_SOLUTION_STRUCTURED_EXTRACTION_PROMPT,
+    TEST_SOLUTION_STRUCTURED_EXTRACTION_HUMAN_PROMPT,
+    TEST_SOLUTION_STRUCTURED_EXTRACTION_COMPACT_HUMAN_PROMPT,
+    TEST_SOLUTION_STRUCTURED_EXTRACTION_PART_NOTE,
+    TEST_SOLUTION_STRUCTURED_EXTRACTION_SLICE_NOTE,
+)
+from src.models.structured_test_model import TestSolution, TestSolutions
+from src.utils.hashing import content_hash
+from src.utils.file_entries import make_file_entry
+from src.utils.llm_cache import cache_get, cache_put, llm_cache_key
+from src.utils.markdown_chunker import chunk_markdown_by_structure
+from src.utils.markdown_spans import load_canonical_markdown, materialize_item_markdown
+from src.utils.token_counter import count_tokens
+from src.utils.virtual_fs import VirtualFS
 
 logger = logging.getLogger(__name__)
 
@@ -39,20 +57,111 @@ TEMP_DIR_MAPPING = {
 }
 
 
+STRUCTURED_EXTRACTION_MODEL = "openai:gpt-5-mini"
+
+# Cualquier cambio en los prompts invalida las entradas de caché anteriores
+STRUCTURED_EXTRACTION_PROMPT_VERSION = content_hash(
+    TEST_SOLUTION_STRUCTURED_EXTRACTION_PROMPT
+    + TEST_SOLUTION_STRUCTURED_EXTRACTION_HUMAN_PROMPT
+    + TEST_SOLUTION_STRUCTURED_EXTRACTION_COMPACT_HUMAN_PROMPT
+    + TEST_SOLUTION_STRUCTURED_EXTRACTION_PART_NOTE
+    + TEST_SOLUTION_STRUCTURED_EXTRACTION_SLICE_NOTE
+)
+STRUCTURED_EXTRACTION_CACHE_NAMESPACE = "test_solution_structured_extraction"
+
+# Techo de tokens del prompt humano; segmentos mayores se extraen por partes
+MAX_SEGMENT_TOKENS = int(os.getenv("STRUCTURED_EXTRACTION_MAX_SEGMENT_TOKENS", "6000"))
+# Presupuesto mínimo por parte al dividir un segmento
+MIN_PART_TOKENS = 500
+
+# Modos de extracción: "full" (un solo TestSolutions), "sliced" (sub-esquemas en
+# paralelo) o "auto" (sliced a partir de SLICED_EXTRACTION_MIN_TOKENS). Cada parte
+# sliced repite el prompt en 6 llamadas, así que "auto" solo lo usa cerca del techo
+# de MAX_SEGMENT_TOKENS, donde la salida completa arriesga truncarse.
+EXTRACTION_MODES = ("auto", "full", "sliced")
+DEFAULT_EXTRACTION_MODE = "auto"
+SLICED_EXTRACTION_MIN_TOKENS = int(os.getenv("STRUCTURED_EXTRACTION_SLICED_MIN_TOKENS", "5000"))
+
+# Llamadas simultáneas al LLM en el proceso, sumando ítems del batch y sub-esquemas
+LLM_MAX_CONCURRENCY = max(1, int(os.getenv("STRUCTURED_EXTRACTION_LLM_CONCURRENCY", "8")))
+
+# Partes de TestSolution que se extraen por separado en modo "sliced"
+TEST_SOLUTION_SLICES = {
+    "identificacion": ("section_id", "section_title", "test_name", "test_type", "equipos", "reactivos", "referencias"),
+    "soluciones": ("soluciones",),
+    "condiciones_cromatograficas": ("condiciones_cromatograficas",),
+    "procedimiento": ("procedimiento",),
+    "calculos": ("calculos", "tabla_parametros"),
+    "criterio_aceptacion": ("criterio_aceptacion",),
+}
+
+# Valores que no aportan información al fusionar partes
+_EMPTY_VALUES = (None, "", [], {}, "Por definir")
+
+# Campos del ítem que dependen del documento y no del contenido del segmento
+_VOLATILE_ITEM_FIELDS = ("id", "content_hash")
+
+
 # LLM para Herramientas
-llm_model = init_chat_model(model="openai:gpt-5-mini")
+llm_model = init_chat_model(model=STRUCTURED_EXTRACTION_MODEL)
+
+
+def _build_slice_model(name: str, fields: Tuple[str, ...]):
+    """Sub-esquema de ``TestSolution`` con solo los campos indicados."""
+    return create_model(
+        f"TestSolutionSlice_{name}",
+        __doc__=f"Campos '{', '.join(fields)}' de una prueba analítica.",
+        **{field: (TestSolution.model_fields[field].annotation, TestSolution.model_fields[field]) for field in fields},
+    )
+
+
+SLICE_MODELS = {name: _build_slice_model(name, fields) for name, fields in TEST_SOLUTION_SLICES.items()}
 
 
-@retry(
+# Misma política de reintentos para la variante síncrona y la asíncrona
+LLM_RETRY_POLICY = dict(
     stop=stop_after_attempt(MAX_LLM_RETRIES),
     wait=wait_exponential(multiplier=1, min=2, max=30),
     retry=retry_if_exception_type((httpx.RemoteProtocolError, httpx.ReadTimeout, ConnectionError)),
     reraise=True,
 )
+
+
+# Limitador compartido por todas las llamadas al LLM de este módulo. Los hilos usan
+# el semáforo de proceso; cada event loop tiene el suyo con el mismo límite
+# (un asyncio.Semaphore no puede compartirse entre loops).
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_async_llm_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+_async_llm_slots_lock = threading.Lock()
+
+
+def _loop_llm_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    with _async_llm_slots_lock:
+        slots = _async_llm_slots.get(loop)
+        if slots is None:
+            slots = _async_llm_slots[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        return slots
+
+
+@retry(**LLM_RETRY_POLICY)
 def _invoke_structured_llm(structured_model, messages):
     """Invoca el LLM con retry automático para errores de conexión."""
-    logger.debug("Invocando LLM para extracción estructurada...")
-    return structured_model.invoke(messages)
+    # El cupo se toma por intento: las esperas entre reintentos no lo ocupan
+    with _llm_slots:
+        logger.debug("Invocando LLM para extracción estructurada...")
+        return structured_model.invoke(messages)
+
+
+@retry(**LLM_RETRY_POLICY)
+async def _ainvoke_structured_llm(structured_model, messages):
+    """Variante asíncrona de ``_invoke_structured_llm`` (no bloquea el hilo durante la llamada)."""
+    async with _loop_llm_slots():
+        logger.debug("Invocando LLM (async) para extracción estructurada...")
+        return await structured_model.ainvoke(messages)
+
 
 def _get_temp_dir(base_path: str) -> str:
     """Obtiene la carpeta temporal correspondiente al base_path."""
@@ -75,48 +184,71 @@ def _extract_source_file_name(path: str) -> str:
     return filename.rsplit('.', 1)[0]
 
 
-@tool(description=TEST_SOLUTION_STRUCTURED_EXTRACTION_TOOL_DESC)
-def test_solution_structured_extraction(
-    id: int,
+def _load_markdown_payload(
+    vfs: VirtualFS,
+    base_path: str,
     source_file_name: str,
-    state: Annotated[DeepAgentState, InjectedState],
-    tool_call_id: Annotated[str, InjectedToolCallId] = "",
-    base_path: str = DEFAULT_BASE_PATH,
-) -> Command:
-    """
-    Extrae y estructura una prueba/solución individual del markdown.
-    
-    Args:
-        id: Índice de la prueba en el archivo markdown
-        source_file_name: Nombre del archivo de origen (sin extensión)
-        base_path: Ruta base (/actual_method o /proposed_method)
-    """
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Obtiene el payload de test_solution_markdown; retorna (payload, mensaje_de_error)."""
     base = (base_path or DEFAULT_BASE_PATH).rstrip("/")
-    temp_dir = _get_temp_dir(base_path)
     markdown_doc = f"{base}/test_solution_markdown_{source_file_name}.json"
 
-    files = dict(state.get("files", {}))
-    test_solution_markdown = files.get(markdown_doc)
-    if not test_solution_markdown:
-        message = f"No se encontró el archivo de markdown: {markdown_doc}"
-        logger.warning(message)
-        return Command(
-            update={
-                "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
-            }
-        )
-    
-    test_solution_markdown_data = test_solution_markdown.get("data") or {}
+    if not vfs.exists(markdown_doc):
+        return None, f"No se encontró el archivo de markdown: {markdown_doc}"
+
+    test_solution_markdown_data = vfs.read_json(markdown_doc, expect=dict) or {}
     if not test_solution_markdown_data:
-        message = f"El archivo {markdown_doc} no contiene datos válidos."
-        logger.warning(message)
-        return Command(
-            update={
-                "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
-            }
+        return None, f"El archivo {markdown_doc} no contiene datos válidos."
+
+    # Con spans, un markdown canónico ausente o modificado deja los ítems sin texto:
+    # se rechaza antes de llamar al LLM o escribir la caché
+    if "markdown_source" in test_solution_markdown_data and load_canonical_markdown(
+        vfs, test_solution_markdown_data
+    ) is None:
+        return None, (
+            f"El markdown canónico de {markdown_doc} no está disponible o cambió desde la "
+            f"segmentación. Re-ejecuta la segmentación de '{source_file_name}' "
+            "(test_solution_clean_markdown o test_solution_clean_markdown_sbs) antes de la "
+            "extracción estructurada."
         )
 
-    items = test_solution_markdown_data.get("items") or []
+    return test_solution_markdown_data, None
+
+
+def _payload_item_ids(payload: Dict[str, Any]) -> Any:
+    """Ids disponibles: claves de ``item_index`` o, en payloads antiguos, la lista ``items``."""
+    return payload.get("item_index") or payload.get("items") or []
+
+
+def _get_target_item(vfs: VirtualFS, payload: Dict[str, Any], id: int) -> Optional[Dict[str, Any]]:
+    """
+    Obtiene el ítem por id desde su archivo individual (vía ``item_index``);
+    solo los payloads generados antes del índice, que traen ``items`` en línea,
+    usan la búsqueda lineal.
+    Si el ítem guarda ``markdown_spans``, su texto se materializa desde el
+    markdown canónico; sin markdown canónico válido retorna ``None``.
+    """
+    target_item: Optional[Dict[str, Any]] = None
+    item_index = payload.get("item_index")
+    if isinstance(item_index, dict):
+        item_path = item_index.get(str(id))
+        if item_path is None:
+            return None
+        item_data = vfs.read_json(item_path, expect=dict)
+        if item_data is not None:
+            target_item = item_data
+        else:
+            logger.debug("Archivo individual %s no disponible; se buscan items en línea del payload", item_path)
+
+    if target_item is None:
+        target_item = _find_target_item(payload.get("items") or [], id)
+    if target_item is None or "markdown_spans" not in target_item:
+        return target_item
+    return materialize_item_markdown(target_item, load_canonical_markdown(vfs, payload))
+
+
+def _find_target_item(items: Any, id: int) -> Optional[Dict[str, Any]]:
+    """Busca el ítem por su campo ``id`` (con respaldo por posición o clave)."""
     target_item: Optional[Dict[str, Any]] = None
 
     if isinstance(items, list):
@@ -135,36 +267,231 @@ def test_solution_structured_extraction(
     elif isinstance(items, dict):
         target_item = items.get(id) or items.get(str(id))
 
-    if not target_item:
-        message = (
-            "No se encontró el markdown asociado a la prueba/solución con id "
-            f"{id}."
-        )
-        logger.warning(message)
-        return Command(
-            update={
-                "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
-            }
-        )
+    return target_item
 
+
+def _build_json_prompt(target_item: Dict[str, Any]) -> str:
+    """Prompt original: el ítem completo serializado como JSON."""
     test_solution_string = json.dumps(target_item, indent=2, ensure_ascii=False)
-    
-    structured_model = llm_model.with_structured_output(TestSolutions)
-    messages = [
+    return TEST_SOLUTION_STRUCTURED_EXTRACTION_HUMAN_PROMPT.format(
+        test_solution_string=test_solution_string
+    )
+
+
+def _build_compact_prompt(
+    target_item: Dict[str, Any],
+    markdown: str,
+    part: int = 1,
+    total: int = 1,
+) -> str:
+    """Prompt compacto: markdown crudo del segmento con metadatos mínimos."""
+    part_note = ""
+    if total > 1:
+        part_note = TEST_SOLUTION_STRUCTURED_EXTRACTION_PART_NOTE.format(part=part, total=total) + "\n"
+    return TEST_SOLUTION_STRUCTURED_EXTRACTION_COMPACT_HUMAN_PROMPT.format(
+        section_id=target_item.get("section_id") or "N/A",
+        title=target_item.get("title") or target_item.get("raw") or "N/A",
+        part_note=part_note,
+        markdown=markdown,
+    )
+
+
+def _build_extraction_messages(human_prompt: str) -> List[Any]:
+    """Arma los mensajes system/human para estructurar un ítem."""
+    return [
         SystemMessage(
             content=TEST_SOLUTION_STRUCTURED_EXTRACTION_PROMPT
         ),
         HumanMessage(
-            content=TEST_SOLUTION_STRUCTURED_EXTRACTION_HUMAN_PROMPT.format(
-                test_solution_string=test_solution_string
-            )
+            content=human_prompt
         )
     ]
-    
+
+
+def _resolve_extraction_mode(mode: Optional[str]) -> str:
+    normalized = (mode or DEFAULT_EXTRACTION_MODE).strip().lower()
+    if normalized not in EXTRACTION_MODES:
+        logger.warning("extraction_mode '%s' no reconocido; usando '%s'", mode, DEFAULT_EXTRACTION_MODE)
+        return DEFAULT_EXTRACTION_MODE
+    return normalized
+
+
+def _plan_extraction(
+    target_item: Dict[str, Any],
+    id: int,
+    mode: str = DEFAULT_EXTRACTION_MODE,
+) -> Tuple[List[Tuple[str, bool]], Dict[str, int]]:
+    """
+    Construye los prompts a enviar para un ítem y mide el ahorro de tokens
+    frente al prompt JSON. Si el segmento supera ``MAX_SEGMENT_TOKENS`` se
+    divide por estructura (secciones/tablas) en varias sub-extracciones.
+
+    Retorna una lista ``(prompt, sliced)`` donde ``sliced`` indica si esa
+    parte se extrae por sub-esquemas en paralelo.
+    """
+    json_tokens = count_tokens(_build_json_prompt(target_item))
+    markdown = (target_item.get("markdown") or "").strip()
+    if not markdown:
+        # Ítems sin segmento (p. ej. payloads antiguos): se mantiene el prompt JSON
+        prompts = [_build_json_prompt(target_item)]
+        prompt_tokens = [json_tokens]
+    else:
+        prompts = [_build_compact_prompt(target_item, markdown)]
+        prompt_tokens = [count_tokens(prompts[0])]
+        if prompt_tokens[0] > MAX_SEGMENT_TOKENS:
+            overhead = prompt_tokens[0] - count_tokens(markdown)
+            budget = max(MAX_SEGMENT_TOKENS - overhead, MIN_PART_TOKENS)
+            chunks = chunk_markdown_by_structure(markdown, max_tokens=budget)
+            total = len(chunks)
+            prompts = [
+                _build_compact_prompt(target_item, chunk["text"], chunk["index"], total)
+                for chunk in chunks
+            ]
+            prompt_tokens = [count_tokens(prompt) for prompt in prompts]
+            logger.info(
+                "Segmento id=%s excede %d tokens; extracción dividida en %d partes",
+                id,
+                MAX_SEGMENT_TOKENS,
+                total,
+            )
+
+    sliced_flags = [
+        mode == "sliced" or (mode == "auto" and tokens >= SLICED_EXTRACTION_MIN_TOKENS)
+        for tokens in prompt_tokens
+    ]
+    stats = {
+        "prompt_tokens": sum(prompt_tokens),
+        "json_tokens": json_tokens,
+        "parts": len(prompts),
+        "sliced_parts": sum(sliced_flags),
+    }
+    logger.info(
+        "Prompt de extracción id=%s: %d tokens (JSON: %d, ahorro: %d, partes por sub-esquemas: %d)",
+        id,
+        stats["prompt_tokens"],
+        json_tokens,
+        json_tokens - stats["prompt_tokens"],
+        stats["sliced_parts"],
+    )
+    return list(zip(prompts, sliced_flags)), stats
+
+
+def _slice_messages(human_prompt: str, slice_name: str) -> List[Any]:
+    fields = ", ".join(TEST_SOLUTION_SLICES[slice_name])
+    return _build_extraction_messages(
+        human_prompt + TEST_SOLUTION_STRUCTURED_EXTRACTION_SLICE_NOTE.format(fields=fields)
+    )
+
+
+def _assemble_slices(slice_outputs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Une las salidas de los sub-esquemas y valida el ``TestSolution`` completo."""
+    assembled: Dict[str, Any] = {}
+    for name in TEST_SOLUTION_SLICES:
+        assembled.update(slice_outputs.get(name) or {})
+    test_solution = TestSolution.model_validate(assembled)
+    return {"tests": [test_solution.model_dump()]}
+
+
+def _extract_part(human_prompt: str, sliced: bool, id: int) -> Dict[str, Any]:
+    """Extrae una parte del segmento (un solo esquema o sub-esquemas en paralelo)."""
+    if sliced:
+        try:
+            # Los hilos solo esperan: el cupo de llamadas simultáneas lo impone _llm_slots
+            with ThreadPoolExecutor(max_workers=len(SLICE_MODELS)) as executor:
+                futures = {
+                    name: executor.submit(
+                        _invoke_structured_llm,
+                        llm_model.with_structured_output(model),
+                        _slice_messages(human_prompt, name),
+                    )
+                    for name, model in SLICE_MODELS.items()
+                }
+                slice_outputs = {name: future.result().model_dump() for name, future in futures.items()}
+            return _assemble_slices(slice_outputs)
+        except Exception as exc:
+            # Cualquier fallo de un sub-esquema (LLM, salida inválida o ensamblado) degrada a extracción completa
+            logger.warning("Extracción por sub-esquemas fallida para id=%s; extracción completa: %s", id, exc)
+
+    structured_model = llm_model.with_structured_output(TestSolutions)
     # Usar función con retry para manejar errores de conexión
-    test_solution_input = _invoke_structured_llm(structured_model, messages)
-    test_solution_input = test_solution_input.model_dump()
+    return _invoke_structured_llm(structured_model, _build_extraction_messages(human_prompt)).model_dump()
+
+
+async def _aextract_part(human_prompt: str, sliced: bool, id: int) -> Dict[str, Any]:
+    """Variante asíncrona de ``_extract_part``."""
+    if sliced:
+        names = list(SLICE_MODELS)
+        # return_exceptions: un sub-esquema fallido no deja a los demás corriendo sin esperar
+        outputs = await asyncio.gather(
+            *(
+                _ainvoke_structured_llm(
+                    llm_model.with_structured_output(SLICE_MODELS[name]),
+                    _slice_messages(human_prompt, name),
+                )
+                for name in names
+            ),
+            return_exceptions=True,
+        )
+        try:
+            for output in outputs:
+                if isinstance(output, BaseException):
+                    raise output
+            return _assemble_slices({name: output.model_dump() for name, output in zip(names, outputs)})
+        except Exception as exc:
+            logger.warning("Extracción por sub-esquemas fallida para id=%s; extracción completa: %s", id, exc)
+
+    structured_model = llm_model.with_structured_output(TestSolutions)
+    output = await _ainvoke_structured_llm(structured_model, _build_extraction_messages(human_prompt))
+    return output.model_dump()
+
+
+def _merge_values(base: Any, extra: Any) -> Any:
+    """Fusiona dos salidas parciales: listas se concatenan, dicts se combinan y
+    en escalares prevalece el primer valor con contenido."""
+    if base in _EMPTY_VALUES:
+        return extra if extra not in _EMPTY_VALUES else base
+    if extra in _EMPTY_VALUES:
+        return base
+    if isinstance(base, dict) and isinstance(extra, dict):
+        merged = dict(base)
+        for key, value in extra.items():
+            merged[key] = _merge_values(base.get(key), value)
+        return merged
+    if isinstance(base, list) and isinstance(extra, list):
+        return base + [value for value in extra if value not in base]
+    return base
+
+
+def _merge_part_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combina las sub-extracciones de un segmento en un único ``TestSolutions``."""
+    if len(results) == 1:
+        return results[0]
+    tests = [result["tests"][0] for result in results if result.get("tests")]
+    if not tests:
+        return results[0]
+    merged = tests[0]
+    for test in tests[1:]:
+        merged = _merge_values(merged, test)
+    return {"tests": [merged]}
+
 
+def _structured_cache_key(target_item: Dict[str, Any], mode: str = DEFAULT_EXTRACTION_MODE) -> str:
+    """Clave de caché del segmento: contenido del ítem (sin id) + prompt + modo + modelo."""
+    segment = {
+        key: value
+        for key, value in target_item.items()
+        if key not in _VOLATILE_ITEM_FIELDS
+    }
+    prompt_version = f"{STRUCTURED_EXTRACTION_PROMPT_VERSION}:{mode}"
+    return llm_cache_key(segment, prompt_version, STRUCTURED_EXTRACTION_MODEL)
+
+
+def _finalize_structured_result(
+    test_solution_input: Dict[str, Any],
+    id: int,
+    source_file_name: str,
+) -> Dict[str, Any]:
+    """Agrega la trazabilidad al ítem de origen sobre la salida serializada del LLM."""
     # Validación: asegurar que solo haya un test (el LLM a veces duplica)
     if "tests" in test_solution_input and isinstance(test_solution_input["tests"], list):
         if len(test_solution_input["tests"]) > 1:
@@ -175,28 +502,221 @@ def test_solution_structured_extraction(
 
     test_solution_input["source_id"] = id
     test_solution_input["source_file_name"] = source_file_name
-    
-    # Guardar en carpeta temporal: /temp_{base_path}/{source_file_name}/{id}.json
-    structured_file_path = f"{temp_dir}/{source_file_name}/{id}.json"
+    return test_solution_input
 
-    content_str = json.dumps(test_solution_input, indent=2, ensure_ascii=False)
-    files[structured_file_path] = {
-        "content": content_str.split("\n"),
-        "data": test_solution_input,
-        "modified_at": datetime.now(timezone.utc).isoformat(),
-    }
+
+def _cache_hit_stats() -> Dict[str, Any]:
+    return {"cache_hit": True, "prompt_tokens": 0, "json_tokens": 0, "parts": 0, "sliced_parts": 0}
+
+
+def _extract_structured_item(
+    target_item: Dict[str, Any],
+    id: int,
+    source_file_name: str,
+    extraction_mode: str = DEFAULT_EXTRACTION_MODE,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Ejecuta el LLM sobre un ítem y retorna (``TestSolutions`` serializado con
+    trazabilidad, estadísticas). Si el segmento ya fue extraído antes con el
+    mismo prompt y modelo se reutiliza el resultado de la caché.
+
+    Las estadísticas incluyen ``cache_hit``, ``prompt_tokens``, ``json_tokens``
+    (tamaño equivalente con el prompt JSON), ``parts`` y ``sliced_parts``.
+    """
+    mode = _resolve_extraction_mode(extraction_mode)
+    cache_key = _structured_cache_key(target_item, mode)
+    cached = cache_get(STRUCTURED_EXTRACTION_CACHE_NAMESPACE, cache_key)
+    if cached is not None:
+        logger.debug("Caché de extracción estructurada: hit para id=%s (%s)", id, cache_key)
+        return _finalize_structured_result(cached, id, source_file_name), _cache_hit_stats()
+
+    plan, stats = _plan_extraction(target_item, id, mode)
+    results = [_extract_part(prompt, sliced, id) for prompt, sliced in plan]
+    result = _merge_part_results(results)
+    cache_put(STRUCTURED_EXTRACTION_CACHE_NAMESPACE, cache_key, result)
+    return _finalize_structured_result(result, id, source_file_name), {**stats, "cache_hit": False}
+
+
+async def _aextract_structured_item(
+    target_item: Dict[str, Any],
+    id: int,
+    source_file_name: str,
+    extraction_mode: str = DEFAULT_EXTRACTION_MODE,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Variante asíncrona de ``_extract_structured_item`` basada en ``ainvoke``."""
+    mode = _resolve_extraction_mode(extraction_mode)
+    cache_key = _structured_cache_key(target_item, mode)
+    cached = cache_get(STRUCTURED_EXTRACTION_CACHE_NAMESPACE, cache_key)
+    if cached is not None:
+        logger.debug("Caché de extracción estructurada: hit para id=%s (%s)", id, cache_key)
+        return _finalize_structured_result(cached, id, source_file_name), _cache_hit_stats()
+
+    plan, stats = _plan_extraction(target_item, id, mode)
+    results = await asyncio.gather(*(_aextract_part(prompt, sliced, id) for prompt, sliced in plan))
+    result = _merge_part_results(list(results))
+    cache_put(STRUCTURED_EXTRACTION_CACHE_NAMESPACE, cache_key, result)
+    return _finalize_structured_result(result, id, source_file_name), {**stats, "cache_hit": False}
+
+
+def _format_extraction_stats(stats_list: List[Dict[str, Any]]) -> str:
+    """Resumen de caché y tokens para el mensaje de la herramienta."""
+    hits = sum(1 for stats in stats_list if stats.get("cache_hit"))
+    misses = len(stats_list) - hits
+    summary = f"Caché: {hits} hits, {misses} misses."
+    prompt_tokens = sum(stats.get("prompt_tokens", 0) for stats in stats_list)
+    json_tokens = sum(stats.get("json_tokens", 0) for stats in stats_list)
+    if json_tokens:
+        saved = json_tokens - prompt_tokens
+        summary += (
+            f" Tokens de entrada: {prompt_tokens} (JSON: {json_tokens}, "
+            f"ahorro {saved} / {saved * 100 // json_tokens}%)."
+        )
+    split_items = sum(1 for stats in stats_list if stats.get("parts", 0) > 1)
+    if split_items:
+        summary += f" {split_items} ítems extraídos por partes (techo {MAX_SEGMENT_TOKENS} tokens)."
+    sliced_items = sum(1 for stats in stats_list if stats.get("sliced_parts"))
+    if sliced_items:
+        summary += (
+            f" {sliced_items} ítems extraídos por sub-esquemas en paralelo "
+            f"({len(TEST_SOLUTION_SLICES)} llamadas por parte)."
+        )
+    return summary
+
+
+def _structured_temp_path(base_path: str, source_file_name: str, id: int) -> str:
+    """Ruta temporal del resultado: /temp_{base_path}/{source_file_name}/{id}.json"""
+    return f"{_get_temp_dir(base_path)}/{source_file_name}/{id}.json"
+
+
+def _structured_file_entry(test_solution_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Construye la entrada de archivo virtual para un resultado estructurado."""
+    return make_file_entry(test_solution_input)
+
+
+def _resolve_target_item(
+    state: DeepAgentState,
+    id: int,
+    source_file_name: str,
+    base_path: str,
+    tool_call_id: str,
+) -> Tuple[Optional[Dict[str, Any]], Optional[Command]]:
+    """Retorna (ítem objetivo, Command de error si no se puede procesar)."""
+    vfs = VirtualFS.from_state(state)
+    payload, error_message = _load_markdown_payload(vfs, base_path, source_file_name)
+    if error_message:
+        logger.warning(error_message)
+        return None, Command(
+            update={
+                "messages": [ToolMessage(error_message, tool_call_id=tool_call_id)],
+            }
+        )
+
+    target_item = _get_target_item(vfs, payload, id)
+    if not target_item:
+        message = (
+            "No se encontró el markdown asociado a la prueba/solución con id "
+            f"{id}."
+        )
+        logger.warning(message)
+        return None, Command(
+            update={
+                "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
+            }
+        )
+
+    return target_item, None
+
+
+def _structured_extraction_command(
+    test_solution_input: Dict[str, Any],
+    stats: Dict[str, Any],
+    id: int,
+    source_file_name: str,
+    base_path: str,
+    tool_call_id: str,
+) -> Command:
+    """Guarda el resultado en la carpeta temporal y arma el Command de la herramienta."""
+    # Guardar en carpeta temporal: /temp_{base_path}/{source_file_name}/{id}.json
+    structured_file_path = _structured_temp_path(base_path, source_file_name, id)
 
     summary_message = (
         f"Generé la solución de prueba estructurada para '{source_file_name}' id={id}. "
-        f"Archivo temporal: {structured_file_path}"
+        f"Archivo temporal: {structured_file_path}. "
+        f"{_format_extraction_stats([stats])}"
     )
     logger.info(summary_message)
 
+    # Solo el archivo nuevo: el reducer de archivos lo combina con el estado
     return Command(
         update={
-            "files": files,
+            "files": {structured_file_path: _structured_file_entry(test_solution_input)},
             "messages": [
                 ToolMessage(summary_message, tool_call_id=tool_call_id)
             ],
         }
     )
+
+
+def _test_solution_structured_extraction(
+    id: int,
+    source_file_name: str,
+    state: Annotated[DeepAgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId] = "",
+    base_path: str = DEFAULT_BASE_PATH,
+    extraction_mode: str = DEFAULT_EXTRACTION_MODE,
+) -> Command:
+    """
+    Extrae y estructura una prueba/solución individual del markdown.
+    
+    Args:
+        id: Índice de la prueba en el archivo markdown
+        source_file_name: Nombre del archivo de origen (sin extensión)
+        base_path: Ruta base (/actual_method o /proposed_method)
+        extraction_mode: "auto", "full" o "sliced" (sub-esquemas en paralelo)
+    """
+    target_item, error_command = _resolve_target_item(
+        state, id, source_file_name, base_path, tool_call_id
+    )
+    if error_command:
+        return error_command
+
+    test_solution_input, stats = _extract_structured_item(
+        target_item, id, source_file_name, extraction_mode
+    )
+    return _structured_extraction_command(
+        test_solution_input, stats, id, source_file_name, base_path, tool_call_id
+    )
+
+
+async def _atest_solution_structured_extraction(
+    id: int,
+    source_file_name: str,
+    state: Annotated[DeepAgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId] = "",
+    base_path: str = DEFAULT_BASE_PATH,
+    extraction_mode: str = DEFAULT_EXTRACTION_MODE,
+) -> Command:
+    """Variante asíncrona: la llamada al LLM se espera en el event loop del grafo."""
+    target_item, error_command = _resolve_target_item(
+        state, id, source_file_name, base_path, tool_call_id
+    )
+    if error_command:
+        return error_command
+
+    test_solution_input, stats = await _aextract_structured_item(
+        target_item, id, source_file_name, extraction_mode
+    )
+    return _structured_extraction_command(
+        test_solution_input, stats, id, source_file_name, base_path, tool_call_id
+    )
+
+
+# Herramienta con implementación síncrona y asíncrona: cuando el grafo corre con
+# ainvoke/astream, LangGraph usa la corrutina y las extracciones en paralelo
+# comparten el event loop en lugar de ocupar un hilo cada una.
+test_solution_structured_extraction = StructuredTool.from_function(
+    func=_test_solution_structured_extraction,
+    coroutine=_atest_solution_structured_extraction,
+    name="test_solution_structured_extraction",
+    description=TEST_SOLUTION_STRUCTURED_EXTRACTION_TOOL_DESC,
+)
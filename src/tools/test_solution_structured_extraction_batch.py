@@ -0,0 +1,320 @@
+import warnings
+
+# Silenciar warnings de Pydantic sobre NotRequired y FileData de deepagents
+warnings.filterwarnings(
+    "ignore",
+    message=".*NotRequired.*",
+    category=UserWarning,
+    module="pydantic.*"
+)
+
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Union
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import InjectedToolCallId, StructuredTool
+from langgraph.prebuilt import InjectedState
+from langgraph.types import Command
+
+from src.graph.state import DeepAgentState
+from src.prompts.tool_description_prompts import TEST_SOLUTION_STRUCTURED_EXTRACTION_BATCH_TOOL_DESC
+from src.tools.test_solution_structured_extraction import (
+    DEFAULT_BASE_PATH,
+    DEFAULT_EXTRACTION_MODE,
+    _aextract_structured_item,
+    _extract_structured_item,
+    _format_extraction_stats,
+    _get_target_item,
+    _load_markdown_payload,
+    _payload_item_ids,
+    _structured_file_entry,
+    _structured_temp_path,
+)
+from src.utils.progress import ProgressReporter
+from src.utils.virtual_fs import VirtualFS
+
+logger = logging.getLogger(__name__)
+
+TOOL_NAME = "test_solution_structured_extraction_batch"
+
+# Ítems simultáneos dentro de una misma invocación del batch; el total de llamadas
+# al LLM del proceso lo acota LLM_MAX_CONCURRENCY (incluye los sub-esquemas)
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+def _parse_ids_string(ids: str) -> List[str]:
+    """Separa un string de ids ("3,4" o "3 4"); cualquier otra cosa es un error."""
+    values = [value for value in re.split(r"[\s,;]+", ids.strip()) if value]
+    invalid = [value for value in values if not value.isdigit()]
+    if not values or invalid:
+        raise ValueError(
+            f"ids inválido: {ids!r}. Usa \"all\", una lista de enteros o ids separados por comas (p. ej. \"3,4\")."
+        )
+    return values
+
+
+def _resolve_ids(items: Any, ids: Union[List[int], str, None]) -> List[int]:
+    """
+    Convierte ``ids`` ("all", lista o string separado por comas) en la lista de
+    ids a procesar, sin duplicados. Lanza ``ValueError`` si un string no es
+    "all" ni una lista de enteros separados por comas.
+    """
+    if ids is None or (isinstance(ids, str) and ids.strip().lower() == "all"):
+        if isinstance(items, dict):
+            return [int(key) for key in items.keys() if str(key).isdigit()]
+        return [
+            item.get("id")
+            for item in items or []
+            if isinstance(item, dict) and isinstance(item.get("id"), int)
+        ]
+    if isinstance(ids, str):
+        ids = _parse_ids_string(ids)
+    elif isinstance(ids, int):
+        ids = [ids]
+
+    resolved: List[int] = []
+    for value in ids:
+        try:
+            item_id = int(value)
+        except (TypeError, ValueError):
+            logger.warning("id inválido ignorado en batch: %r", value)
+            continue
+        if item_id not in resolved:
+            resolved.append(item_id)
+    return resolved
+
+
+def _prepare_batch(
+    state: DeepAgentState,
+    source_file_name: str,
+    ids: Union[List[int], str],
+    base_path: str,
+    tool_call_id: str,
+) -> Tuple[Dict[int, Dict[str, Any]], List[int], Optional[Command]]:
+    """Retorna (ítems a procesar por id, ids sin markdown, Command de error)."""
+    vfs = VirtualFS.from_state(state)
+    payload, error_message = _load_markdown_payload(vfs, base_path, source_file_name)
+    if error_message:
+        logger.warning(error_message)
+        return {}, [], Command(
+            update={
+                "messages": [ToolMessage(error_message, tool_call_id=tool_call_id)],
+            }
+        )
+
+    try:
+        target_ids = _resolve_ids(_payload_item_ids(payload), ids)
+    except ValueError as exc:
+        logger.warning(str(exc))
+        return {}, [], Command(
+            update={
+                "messages": [ToolMessage(str(exc), tool_call_id=tool_call_id)],
+            }
+        )
+    targets: Dict[int, Dict[str, Any]] = {}
+    missing_ids: List[int] = []
+    for item_id in target_ids:
+        target_item = _get_target_item(vfs, payload, item_id)
+        if target_item:
+            targets[item_id] = target_item
+        else:
+            missing_ids.append(item_id)
+
+    if not targets:
+        message = (
+            f"No se encontraron ítems para procesar en '{source_file_name}' "
+            f"(ids solicitados: {ids})."
+        )
+        logger.warning(message)
+        return {}, missing_ids, Command(
+            update={
+                "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
+            }
+        )
+
+    return targets, missing_ids, None
+
+
+def _batch_concurrency(max_concurrency: int, total: int) -> int:
+    return max(1, min(int(max_concurrency or DEFAULT_MAX_CONCURRENCY), total))
+
+
+def _batch_command(
+    results: Dict[int, Dict[str, Any]],
+    failed: Dict[int, str],
+    stats_list: List[Dict[str, Any]],
+    missing_ids: List[int],
+    total: int,
+    source_file_name: str,
+    base_path: str,
+    tool_call_id: str,
+) -> Command:
+    """Escribe todos los temporales de una sola vez y arma el resumen del batch."""
+    files: Dict[str, Any] = {}
+    for item_id in sorted(results):
+        structured_file_path = _structured_temp_path(base_path, source_file_name, item_id)
+        files[structured_file_path] = _structured_file_entry(results[item_id])
+    written_paths = list(files)
+
+    summary_message = (
+        f"Extracción estructurada en batch para '{source_file_name}': "
+        f"{len(results)}/{total} ítems generados (ids {sorted(results)}). "
+        f"{_format_extraction_stats(stats_list)}"
+    )
+    if failed:
+        summary_message += (
+            f" Fallaron {len(failed)} ids {sorted(failed)}; reintenta solo esos ids con esta herramienta."
+        )
+    if missing_ids:
+        summary_message += f" Ids sin markdown asociado: {missing_ids}."
+    if written_paths:
+        temp_dir = written_paths[0].rsplit("/", 1)[0]
+        summary_message += f" Archivos temporales en {temp_dir}/."
+    logger.info(summary_message)
+
+    return Command(
+        update={
+            "files": files,
+            "messages": [ToolMessage(summary_message, tool_call_id=tool_call_id)],
+        }
+    )
+
+
+def _test_solution_structured_extraction_batch(
+    source_file_name: str,
+    state: Annotated[DeepAgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId] = "",
+    ids: Union[List[int], str] = "all",
+    base_path: str = DEFAULT_BASE_PATH,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    extraction_mode: str = DEFAULT_EXTRACTION_MODE,
+) -> Command:
+    """
+    Estructura varias pruebas/soluciones en una sola llamada (fan-out interno).
+
+    Args:
+        source_file_name: Nombre del archivo de origen (sin extensión)
+        ids: Lista de ids a procesar, ids separados por comas ("3,4") o "all" para todos los ítems del markdown
+        base_path: Ruta base (/actual_method o /proposed_method)
+        max_concurrency: Máximo de ítems extraídos a la vez
+        extraction_mode: "auto", "full" o "sliced" (sub-esquemas en paralelo)
+    """
+    targets, missing_ids, error_command = _prepare_batch(
+        state, source_file_name, ids, base_path, tool_call_id
+    )
+    if error_command:
+        return error_command
+
+    workers = _batch_concurrency(max_concurrency, len(targets))
+    logger.info(
+        "Extracción estructurada en batch para '%s': %d ítems (concurrencia=%d)",
+        source_file_name,
+        len(targets),
+        workers,
+    )
+
+    progress = ProgressReporter(TOOL_NAME, "extraction", total=len(targets))
+    progress.start(f"{source_file_name}: {len(targets)} ítems (concurrencia={workers})")
+
+    results: Dict[int, Dict[str, Any]] = {}
+    failed: Dict[int, str] = {}
+    stats_list: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                _extract_structured_item, target_item, item_id, source_file_name, extraction_mode
+            ): item_id
+            for item_id, target_item in targets.items()
+        }
+        for future in as_completed(futures):
+            item_id = futures[future]
+            try:
+                results[item_id], stats = future.result()
+            except Exception as exc:
+                logger.warning("Falló la extracción del id=%s: %s", item_id, exc)
+                failed[item_id] = str(exc)
+                progress.advance(f"Falló el id {item_id}: {exc}", failed=True)
+                continue
+            stats_list.append(stats)
+            progress.advance(f"id {item_id}", tokens=stats.get("prompt_tokens", 0), cache_hit=stats.get("cache_hit", False))
+
+    progress.done(f"{len(results)} generados, {len(failed)} fallidos")
+    return _batch_command(
+        results, failed, stats_list, missing_ids, len(targets), source_file_name, base_path, tool_call_id
+    )
+
+
+async def _atest_solution_structured_extraction_batch(
+    source_file_name: str,
+    state: Annotated[DeepAgentState, InjectedState],
+    tool_call_id: Annotated[str, InjectedToolCallId] = "",
+    ids: Union[List[int], str] = "all",
+    base_path: str = DEFAULT_BASE_PATH,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    extraction_mode: str = DEFAULT_EXTRACTION_MODE,
+) -> Command:
+    """Variante asíncrona: las llamadas al LLM comparten el event loop (sin un hilo por ítem)."""
+    targets, missing_ids, error_command = _prepare_batch(
+        state, source_file_name, ids, base_path, tool_call_id
+    )
+    if error_command:
+        return error_command
+
+    limit = _batch_concurrency(max_concurrency, len(targets))
+    logger.info(
+        "Extracción estructurada en batch (async) para '%s': %d ítems (concurrencia=%d)",
+        source_file_name,
+        len(targets),
+        limit,
+    )
+
+    progress = ProgressReporter(TOOL_NAME, "extraction", total=len(targets))
+    progress.start(f"{source_file_name}: {len(targets)} ítems (concurrencia={limit})")
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _run(item_id: int, target_item: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        async with semaphore:
+            try:
+                result, stats = await _aextract_structured_item(
+                    target_item, item_id, source_file_name, extraction_mode
+                )
+            except Exception as exc:
+                progress.advance(f"Falló el id {item_id}: {exc}", failed=True)
+                raise
+        progress.advance(f"id {item_id}", tokens=stats.get("prompt_tokens", 0), cache_hit=stats.get("cache_hit", False))
+        return result, stats
+
+    item_ids = list(targets)
+    outcomes = await asyncio.gather(
+        *(_run(item_id, targets[item_id]) for item_id in item_ids),
+        return_exceptions=True,
+    )
+
+    results: Dict[int, Dict[str, Any]] = {}
+    failed: Dict[int, str] = {}
+    stats_list: List[Dict[str, Any]] = []
+    for item_id, outcome in zip(item_ids, outcomes):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            logger.warning("Falló la extracción del id=%s: %s", item_id, outcome)
+            failed[item_id] = str(outcome)
+        else:
+            results[item_id], stats = outcome
+            stats_list.append(stats)
+
+    progress.done(f"{len(results)} generados, {len(failed)} fallidos")
+    return _batch_command(
+        results, failed, stats_list, missing_ids, len(targets), source_file_name, base_path, tool_call_id
+    )
+
+
+test_solution_structured_extraction_batch = StructuredTool.from_function(
+    func=_test_solution_structured_extraction_batch,
+    coroutine=_atest_solution_structured_extraction_batch,
+    name=TOOL_NAME,
+    description=TEST_SOLUTION_STRUCTURED_EXTRACTION_BATCH_TOOL_DESC,
+)
@@ -0,0 +1,178 @@
+"""
+Almacén local de blobs direccionado por contenido.
+
+Los payloads grandes del filesystem virtual (``markdown_completo``,
+``full_markdown``, contenidos estructurados) se guardan en disco bajo su hash
+SHA-256 y el estado solo conserva una referencia ``{"sha256", "bytes"}``. Así
+los checkpoints de LangGraph y los traspasos entre subagentes serializan unos
+pocos bytes por archivo en lugar de megabytes en cada paso.
+
+Al ser direccionado por contenido, un mismo payload escrito varias veces (o por
+varios hilos) se almacena una sola vez y las escrituras son idempotentes.
+
+El almacén no se limpia solo: ``collect_garbage(live)`` borra los blobs que no
+están en ``live`` (los referenciados por checkpoints vivos) y llevan más de
+``BLOB_GC_MAX_AGE_HOURS`` sin escribirse. El margen de edad protege a las
+ejecuciones en curso, cuyos blobs aún no figuran en ningún checkpoint; cada
+``put_blob`` de un payload existente renueva su fecha. Una ruta relativa en
+``BLOB_STORE_PATH`` se resuelve respecto a la raíz del proyecto, no al
+directorio de trabajo.
+
+Uso manual::
+
+    python -m src.utils.blob_store --max-age-hours 24
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+BLOB_STORE_PATH = PROJECT_ROOT / os.getenv("BLOB_STORE_PATH", ".cache/blobs")
+# Payloads (JSON serializado) a partir de este tamaño se guardan fuera del estado
+BLOB_OFFLOAD_MIN_BYTES = int(os.getenv("BLOB_OFFLOAD_MIN_BYTES", "16384"))
+BLOB_STORE_ENABLED = os.getenv("BLOB_STORE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+# Blobs sin referencias vivas se borran tras este tiempo sin escribirse
+BLOB_GC_MAX_AGE_HOURS = float(os.getenv("BLOB_GC_MAX_AGE_HOURS", "24"))
+BLOB_SUFFIX = ".json.z"
+
+
+def _blob_path(digest: str) -> Path:
+    return Path(BLOB_STORE_PATH) / digest[:2] / f"{digest}{BLOB_SUFFIX}"
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and isinstance(value.get("sha256"), str) and "bytes" in value
+
+
+def put_blob(raw: bytes) -> Dict[str, Any]:
+    """Guarda bytes JSON (comprimidos) y retorna la referencia ``{"sha256", "bytes"}``."""
+    digest = hashlib.sha256(raw).hexdigest()
+    path = _blob_path(digest)
+    if path.exists():
+        # Renueva la fecha: el GC por edad no debe borrar un blob recién referenciado
+        try:
+            os.utime(path)
+        except OSError as exc:
+            logger.debug("No se pudo actualizar la fecha del blob %s: %s", digest, exc)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica: otro hilo/proceso puede estar escribiendo el mismo blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(zlib.compress(raw, 6))
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+    return {"sha256": digest, "bytes": len(raw)}
+
+
+def get_blob(ref: Dict[str, Any]) -> Optional[Any]:
+    """Carga el payload referenciado; ``None`` si el blob no existe o está corrupto."""
+    digest = ref.get("sha256", "")
+    path = _blob_path(digest)
+    try:
+        raw = zlib.decompress(path.read_bytes())
+    except (OSError, zlib.error) as exc:
+        logger.error("No se pudo leer el blob %s (%s): %s", digest, path, exc)
+        return None
+    if hashlib.sha256(raw).hexdigest() != digest:
+        logger.error("Blob %s corrupto: el hash no coincide", digest)
+        return None
+    return json.loads(raw)
+
+
+def offload_payload(data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Guarda ``data`` en el almacén si su JSON supera ``BLOB_OFFLOAD_MIN_BYTES``.
+
+    Retorna la referencia o ``None`` si el payload debe quedarse en el estado
+    (pequeño, no serializable, almacén desactivado o error de disco).
+    """
+    if not BLOB_STORE_ENABLED or data is None:
+        return None
+    try:
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    except (TypeError, ValueError):
+        return None
+    if len(raw) < BLOB_OFFLOAD_MIN_BYTES:
+        return None
+    try:
+        return put_blob(raw)
+    except OSError as exc:
+        logger.warning("No se pudo escribir el blob (%d bytes); se mantiene en el estado: %s", len(raw), exc)
+        return None
+
+
+def collect_garbage(
+    live: Iterable[str] = (),
+    max_age_hours: float = BLOB_GC_MAX_AGE_HOURS,
+    now: Optional[float] = None,
+) -> Dict[str, int]:
+    """
+    Borra los blobs cuyo digest no está en ``live`` y que llevan más de
+    ``max_age_hours`` sin escribirse (también los temporales huérfanos).
+
+    Retorna ``{"kept", "removed", "removed_bytes"}``.
+    """
+    live_digests = set(live)
+    cutoff = (time.time() if now is None else now) - max_age_hours * 3600
+    stats = {"kept": 0, "removed": 0, "removed_bytes": 0}
+    root = Path(BLOB_STORE_PATH)
+    if not root.exists():
+        return stats
+    for path in root.glob("*/*"):
+        digest = path.name[: -len(BLOB_SUFFIX)] if path.name.endswith(BLOB_SUFFIX) else None
+        try:
+            info = path.stat()
+        except OSError:
+            continue
+        if digest in live_digests or info.st_mtime >= cutoff:
+            stats["kept"] += 1
+            continue
+        try:
+            path.unlink()
+        except OSError as exc:
+            logger.warning("No se pudo borrar el blob %s: %s", path, exc)
+            continue
+        stats["removed"] += 1
+        stats["removed_bytes"] += info.st_size
+    for directory in root.iterdir():
+        if directory.is_dir() and not any(directory.iterdir()):
+            directory.rmdir()
+    logger.info(
+        "GC de blobs en %s: %d borrados (%d bytes), %d conservados",
+        root, stats["removed"], stats["removed_bytes"], stats["kept"],
+    )
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Borra los blobs sin referencias vivas.")
+    parser.add_argument(
+        "--max-age-hours",
+        type=float,
+        default=BLOB_GC_MAX_AGE_HOURS,
+        help="Edad mínima (horas sin escribirse) de un blob para borrarlo",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    # Import diferido: utils no depende de la capa del grafo salvo en la CLI
+    from src.graph.checkpointer import live_blob_digests
+
+    print(collect_garbage(live_blob_digests(), max_age_hours=args.max_age_hours))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Formato compacto de las entradas del filesystem virtual (``state["files"]``).
+
+Las herramientas guardan solo ``data`` (el payload parseado) y ``modified_at``;
+el ``content`` en líneas que esperan las herramientas de archivos de deepagents
+(``read_file``, ``grep``, ``ls``...) se renderiza bajo demanda a partir de
+``data`` (ver ``src/graph/backend.py``). Así cada payload grande
+(``markdown_completo``, ``test_solution_structured_content_*``) se almacena una
+sola vez en el estado y en los checkpoints.
+
+Los archivos de texto sin ``data`` (p. ej. el log de parches) conservan su
+``content`` tal cual.
+
+Los payloads grandes ni siquiera viajan en el estado: ``make_file_entry`` los
+guarda en el almacén de blobs (``src/utils/blob_store.py``) y la entrada queda
+como ``{"blob_ref": {"sha256", "bytes"}, "modified_at"}``. Los lectores obtienen
+el payload con ``file_entry_data(entry)``, que resuelve la referencia.
+
+Migración de estados antiguos (entradas con ``content`` duplicado)::
+
+    python -m src.utils.file_entries tests/state_example.json state_compact.json
+"""
+
+import argparse
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from src.utils.blob_store import get_blob, is_blob_ref, offload_payload
+
+logger = logging.getLogger(__name__)
+
+# Renderizados recientes reutilizados por (ruta, modified_at)
+RENDER_CACHE_SIZE = 64
+
+_render_cache: "OrderedDict[tuple, List[str]]" = OrderedDict()
+
+
+def make_file_entry(data: Any, modified_at: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Entrada compacta: solo ``data`` y ``modified_at`` (sin ``content`` duplicado).
+    Si ``data`` supera ``BLOB_OFFLOAD_MIN_BYTES`` se guarda como ``blob_ref``.
+    """
+    modified_at = modified_at or datetime.now(timezone.utc).isoformat()
+    blob_ref = offload_payload(data)
+    if blob_ref:
+        return {"blob_ref": blob_ref, "modified_at": modified_at}
+    return {"data": data, "modified_at": modified_at}
+
+
+def file_entry_data(entry: Any) -> Any:
+    """Payload de la entrada: ``data`` en línea o el blob referenciado (``None`` si no hay)."""
+    if not isinstance(entry, dict):
+        return None
+    data = entry.get("data")
+    if data is not None:
+        return data
+    blob_ref = entry.get("blob_ref")
+    if is_blob_ref(blob_ref):
+        return get_blob(blob_ref)
+    return None
+
+
+def file_entry_size(entry: Any) -> int:
+    """
+    Tamaño aproximado del contenido de la entrada, sin renderizarla.
+
+    Usa ``content`` si existe, la longitud del texto en ``data``, los ``bytes``
+    de la referencia al blob o el JSON compacto de ``data``. Sirve para
+    ``ls``/``glob``, que no necesitan el contenido en líneas.
+    """
+    if not isinstance(entry, dict):
+        return 0
+    content = entry.get("content")
+    if isinstance(content, list):
+        return len("\n".join(content))
+    if isinstance(content, str):
+        return len(content)
+    data = entry.get("data")
+    if isinstance(data, str):
+        return len(data)
+    if data is not None:
+        return len(json.dumps(data, ensure_ascii=False, default=str))
+    blob_ref = entry.get("blob_ref")
+    if is_blob_ref(blob_ref):
+        return int(blob_ref["bytes"])
+    return 0
+
+
+def _render_lines(entry: Dict[str, Any]) -> List[str]:
+    content = entry.get("content")
+    if isinstance(content, list):
+        return content
+    if isinstance(content, str):
+        return content.split("\n")
+
+    data = file_entry_data(entry)
+    if data is None:
+        return []
+    if isinstance(data, str):
+        return data.split("\n")
+    return json.dumps(data, indent=2, ensure_ascii=False, default=str).split("\n")
+
+
+def render_file_content(entry: Dict[str, Any], path: Optional[str] = None) -> List[str]:
+    """
+    Devuelve el contenido de la entrada como lista de líneas.
+
+    Usa ``content`` si existe (entradas antiguas o archivos de texto); si no,
+    serializa ``data`` como JSON indentado. Con ``path`` el resultado se cachea
+    por ``(path, modified_at)``.
+    """
+    if path is None or "content" in entry:
+        return _render_lines(entry)
+
+    key = (path, entry.get("modified_at"))
+    lines = _render_cache.get(key)
+    if lines is not None:
+        _render_cache.move_to_end(key)
+        return lines
+
+    lines = _render_lines(entry)
+    _render_cache[key] = lines
+    if len(_render_cache) > RENDER_CACHE_SIZE:
+        _render_cache.popitem(last=False)
+    return lines
+
+
+def with_rendered_content(entry: Dict[str, Any], path: Optional[str] = None) -> Dict[str, Any]:
+    """Copia superficial de la entrada con ``content`` materializado."""
+    if "content" in entry and isinstance(entry["content"], list):
+        return entry
+    return {**entry, "content": render_file_content(entry, path)}
+
+
+def compact_file_entry(entry: Any) -> Any:
+    """
+    Shim de migración: elimina ``content`` de una entrada que ya tiene ``data``
+    y mueve al almacén de blobs los payloads grandes.
+    """
+    if not isinstance(entry, dict) or entry.get("data") is None:
+        return entry
+    compacted = {key: value for key, value in entry.items() if key != "content"}
+    blob_ref = offload_payload(compacted["data"])
+    if blob_ref:
+        compacted.pop("data")
+        compacted["blob_ref"] = blob_ref
+    return compacted
+
+
+def compact_files(files: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica ``compact_file_entry`` a todo un diccionario ``files``."""
+    return {path: compact_file_entry(entry) for path, entry in (files or {}).items()}
+
+
+def migrate_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compacta los archivos de un estado exportado. Acepta tanto el estado
+    directo (``{"files": ...}``) como el formato con envoltura ``{"state": {...}}``.
+    """
+    if isinstance(state.get("state"), dict):
+        return {**state, "state": migrate_state(state["state"])}
+    if isinstance(state.get("files"), dict):
+        return {**state, "files": compact_files(state["files"])}
+    return state
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compacta las entradas de files de un estado exportado.")
+    parser.add_argument("input", help="JSON del estado original")
+    parser.add_argument("output", help="Ruta del JSON compactado")
+    args = parser.parse_args(argv)
+
+    with open(args.input, encoding="utf-8") as handle:
+        state = json.load(handle)
+    before = len(json.dumps(state, ensure_ascii=False))
+    migrated = migrate_state(state)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(migrated, handle, ensure_ascii=False, indent=2)
+    after = len(json.dumps(migrated, ensure_ascii=False))
+    print(f"{args.input} -> {args.output}: {before} -> {after} caracteres")
+
+
+if __name__ == "__main__":
+    main()
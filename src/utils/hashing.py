@@ -0,0 +1,25 @@
+"""
+Hash de contenido estable para detectar cambios entre ejecuciones.
+"""
+
+import hashlib
+import json
+from typing import Any
+
+HASH_LENGTH = 16
+
+
+def content_hash(value: Any) -> str:
+    """
+    Devuelve un hash sha256 (truncado) del contenido.
+
+    Los strings se hashean tal cual; el resto se serializa como JSON canónico
+    (claves ordenadas) para que el mismo contenido produzca siempre el mismo hash.
+    """
+    if isinstance(value, bytes):
+        data = value
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+    else:
+        data = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
@@ -0,0 +1,128 @@
+"""
+Caché local de respuestas del LLM direccionada por contenido (SQLite).
+
+Cada entrada se identifica por el hash de la entrada enviada al modelo junto
+con la versión del prompt y el modelo, de modo que un mismo segmento que
+aparece en varios controles de cambio (método de referencia, monografía de
+farmacopea) se extrae una sola vez. Las entradas menos usadas recientemente se
+eliminan cuando se supera ``LLM_CACHE_MAX_ENTRIES``.
+
+Cualquier error de SQLite se registra y se trata como un fallo de caché: la
+caché nunca interrumpe la extracción.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.utils.hashing import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Anclada a la raíz del proyecto (como el almacén de blobs): los workers de
+# trabajos y Streamlit comparten la caché aunque se lancen desde otro directorio
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+LLM_CACHE_PATH = str(PROJECT_ROOT / os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)"
+
+_lock = threading.Lock()
+_connections: Dict[str, sqlite3.Connection] = {}
+
+
+def _get_connection(path: Optional[str] = None) -> Optional[sqlite3.Connection]:
+    """Abre (una sola vez por ruta) la base SQLite de la caché."""
+    path = path or LLM_CACHE_PATH
+    connection = _connections.get(path)
+    if connection is not None:
+        return connection
+    try:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(_SCHEMA)
+        connection.execute(_INDEX)
+        connection.commit()
+    except sqlite3.Error as exc:
+        logger.warning("No se pudo abrir la caché LLM en %s: %s", path, exc)
+        return None
+    _connections[path] = connection
+    return connection
+
+
+def llm_cache_key(payload: Any, prompt_version: str, model: str) -> str:
+    """Clave de caché: hash de la entrada + versión del prompt + modelo."""
+    return content_hash({
+        "payload": content_hash(payload),
+        "prompt_version": prompt_version,
+        "model": model,
+    })
+
+
+def cache_get(namespace: str, key: str) -> Optional[Any]:
+    """Retorna el valor cacheado (o ``None``) y actualiza su último acceso."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _lock:
+        connection = _get_connection()
+        if connection is None:
+            return None
+        try:
+            row = connection.execute(
+                "SELECT value FROM llm_cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                (time.time(), namespace, key),
+            )
+            connection.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as exc:
+            logger.warning("Lectura de caché LLM fallida (%s/%s): %s", namespace, key, exc)
+            return None
+
+
+def cache_put(namespace: str, key: str, value: Any) -> None:
+    """Guarda un valor serializable en JSON y aplica la política de desalojo LRU."""
+    if not LLM_CACHE_ENABLED:
+        return
+    with _lock:
+        connection = _get_connection()
+        if connection is None:
+            return
+        now = time.time()
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (namespace, key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            connection.execute(
+                "DELETE FROM llm_cache WHERE rowid IN ("
+                "SELECT rowid FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (max(LLM_CACHE_MAX_ENTRIES, 0),),
+            )
+            connection.commit()
+        except (sqlite3.Error, TypeError, ValueError) as exc:
+            logger.warning("Escritura de caché LLM fallida (%s/%s): %s", namespace, key, exc)
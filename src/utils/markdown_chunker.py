@@ -0,0 +1,298 @@
+"""
+Chunking de markdown consciente de la estructura del documento.
+
+En lugar de cortar por separadores genéricos, el markdown se divide en
+secciones a partir de los encabezados (``# 7.1 ...`` o líneas numeradas como
+``7.1 VALORACION``) y las tablas se tratan como bloques indivisibles. Las
+secciones completas se empaquetan en chunks hasta el presupuesto de tokens,
+manteniendo juntas las subsecciones de una misma prueba siempre que quepan.
+
+Cada chunk es un slice contiguo del markdown original (``start``/``end``), de
+modo que ningún encabezado queda separado de su contenido ni aparece en dos
+chunks a la vez.
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional, Sequence
+
+from src.utils.hashing import content_hash
+from src.utils.token_counter import DEFAULT_ENCODING_MODEL, count_tokens, get_text_splitter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FALLBACK_SEPARATORS = ("\n\n", "\n", ". ", " ", "")
+
+# Encabezado markdown: "# 7.1 VALORACION", "### Procedimiento"
+MARKDOWN_HEADING_PATTERN = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+# Línea numerada tipo encabezado: "7 DESARROLLO", "7.4.2 Identificación B", "**7.1 DESCRIPCION**"
+NUMBERED_HEADING_PATTERN = re.compile(
+    r"^\s{0,3}(?:\*\*)?(\d+(?:\.\d+)+\.?|\d+)\s+(?:\*\*)?([A-ZÁÉÍÓÚÑ¿(\[].*?)(?:\*\*)?\s*$"
+)
+SECTION_ID_PATTERN = re.compile(r"^(\d+(?:\.\d+)*)\.?(?:\s|$)")
+TABLE_LINE_PATTERN = re.compile(r"^\s*\|")
+
+# Las secciones con más puntos que este valor se consideran subapartados
+# de la prueba anterior (7.4 -> prueba, 7.4.1 -> subapartado).
+MAX_UNIT_DEPTH = 1
+
+
+def _parse_heading(line: str) -> Optional[Dict[str, Optional[str]]]:
+    """Devuelve título y section_id si la línea es un encabezado."""
+    if TABLE_LINE_PATTERN.match(line):
+        return None
+
+    md_match = MARKDOWN_HEADING_PATTERN.match(line)
+    if md_match:
+        title = md_match.group(2).strip().strip("*").strip()
+        id_match = SECTION_ID_PATTERN.match(title)
+        return {
+            "title": title,
+            "section_id": id_match.group(1) if id_match else None,
+        }
+
+    num_match = NUMBERED_HEADING_PATTERN.match(line)
+    if num_match:
+        section_id = num_match.group(1).rstrip(".")
+        title = f"{section_id} {num_match.group(2).strip()}"
+        return {"title": title, "section_id": section_id}
+
+    return None
+
+
+def _split_into_sections(markdown: str) -> List[Dict[str, object]]:
+    """
+    Divide el markdown en secciones contiguas que empiezan en un encabezado.
+
+    El texto previo al primer encabezado forma una sección sin título.
+    """
+    sections: List[Dict[str, object]] = []
+    current: Optional[Dict[str, object]] = None
+    offset = 0
+
+    for line in markdown.splitlines(keepends=True):
+        heading = _parse_heading(line)
+
+        if heading or current is None:
+            if current is not None:
+                current["end"] = offset
+                sections.append(current)
+            current = {
+                "title": heading["title"] if heading else None,
+                "section_id": heading["section_id"] if heading else None,
+                "start": offset,
+            }
+        offset += len(line)
+
+    if current is not None:
+        current["end"] = offset
+        sections.append(current)
+
+    return [s for s in sections if markdown[s["start"]:s["end"]].strip()]
+
+
+def _section_depth(section: Dict[str, object]) -> int:
+    section_id = section.get("section_id") or ""
+    return section_id.count(".") if section_id else 0
+
+
+def _group_sections_into_units(sections: List[Dict[str, object]]) -> List[List[Dict[str, object]]]:
+    """Agrupa cada prueba principal con sus subapartados (7.4, 7.4.1, 7.4.2...)."""
+    units: List[List[Dict[str, object]]] = []
+    for section in sections:
+        is_subsection = section.get("section_id") and _section_depth(section) > MAX_UNIT_DEPTH
+        if units and is_subsection:
+            units[-1].append(section)
+        else:
+            units.append([section])
+    return units
+
+
+def _split_into_blocks(markdown: str, start: int, end: int) -> List[Dict[str, int]]:
+    """
+    Divide un rango en bloques: párrafos separados por líneas en blanco y
+    tablas completas (nunca se corta dentro de una tabla).
+    """
+    blocks: List[Dict[str, int]] = []
+    block_start: Optional[int] = None
+    block_is_table = False
+    offset = start
+
+    for line in markdown[start:end].splitlines(keepends=True):
+        is_table_line = bool(TABLE_LINE_PATTERN.match(line))
+        is_blank = not line.strip()
+
+        boundary = is_blank or (block_start is not None and is_table_line != block_is_table)
+        if boundary and block_start is not None:
+            blocks.append({"start": block_start, "end": offset})
+            block_start = None
+
+        if not is_blank and block_start is None:
+            block_start = offset
+            block_is_table = is_table_line
+        offset += len(line)
+
+    if block_start is not None:
+        blocks.append({"start": block_start, "end": end})
+
+    if blocks:
+        # Los bloques cubren el rango completo (incluye líneas en blanco)
+        blocks[0]["start"] = start
+        for prev, nxt in zip(blocks, blocks[1:]):
+            prev["end"] = nxt["start"]
+        blocks[-1]["end"] = end
+    return blocks
+
+
+def _split_oversized_range(
+    markdown: str,
+    start: int,
+    end: int,
+    max_tokens: int,
+    separators: Sequence[str],
+    model_name: str,
+) -> List[Dict[str, int]]:
+    """Último recurso para un bloque que por sí solo excede el presupuesto."""
+    splitter = get_text_splitter(max_tokens, 0, tuple(separators), model_name=model_name)
+    pieces: List[Dict[str, int]] = []
+    cursor = start
+    for piece in splitter.split_text(markdown[start:end]):
+        found = markdown.find(piece, cursor, end)
+        if found == -1:
+            continue
+        pieces.append({"start": cursor, "end": found + len(piece)})
+        cursor = found + len(piece)
+    if pieces:
+        pieces[-1]["end"] = end
+    else:
+        pieces.append({"start": start, "end": end})
+    return pieces
+
+
+def chunk_markdown_by_structure(
+    markdown: str,
+    max_tokens: int,
+    separators: Sequence[str] = DEFAULT_FALLBACK_SEPARATORS,
+    model_name: str = DEFAULT_ENCODING_MODEL,
+) -> List[Dict[str, object]]:
+    """
+    Divide el markdown en chunks alineados a secciones.
+
+    Returns:
+        Lista de chunks ``{"index", "text", "start", "end", "token_count", "sections", "pieces"}``
+        donde ``sections`` son los encabezados contenidos en el chunk, en orden, y
+        ``pieces`` las unidades empaquetadas (``start``, ``end``, ``hash``). Las piezas
+        solo dependen de su propio texto, por lo que su hash sirve para detectar
+        qué partes cambiaron entre dos versiones del markdown.
+    """
+    if not markdown or not markdown.strip():
+        return []
+
+    def tokens(start: int, end: int) -> int:
+        return count_tokens(markdown[start:end], model_name)
+
+    sections = _split_into_sections(markdown)
+    for section in sections:
+        section["tokens"] = tokens(section["start"], section["end"])
+
+    # Piezas empaquetables: unidades completas si caben, si no secciones,
+    # y si una sección no cabe, sus bloques (párrafos/tablas).
+    pieces: List[Dict[str, object]] = []
+    for unit in _group_sections_into_units(sections):
+        unit_tokens = sum(s["tokens"] for s in unit)
+        if unit_tokens <= max_tokens:
+            pieces.append({
+                "start": unit[0]["start"],
+                "end": unit[-1]["end"],
+                "tokens": unit_tokens,
+                "sections": [s["title"] for s in unit if s["title"]],
+            })
+            continue
+
+        for section in unit:
+            if section["tokens"] <= max_tokens:
+                pieces.append({
+                    "start": section["start"],
+                    "end": section["end"],
+                    "tokens": section["tokens"],
+                    "sections": [section["title"]] if section["title"] else [],
+                })
+                continue
+
+            logger.debug(
+                "Sección '%s' excede %d tokens (%d); dividiendo por bloques",
+                section["title"],
+                max_tokens,
+                section["tokens"],
+            )
+            first = True
+            for block in _split_into_blocks(markdown, section["start"], section["end"]):
+                block_tokens = tokens(block["start"], block["end"])
+                ranges = [block]
+                if block_tokens > max_tokens:
+                    ranges = _split_oversized_range(
+                        markdown, block["start"], block["end"], max_tokens, separators, model_name
+                    )
+                for rng in ranges:
+                    pieces.append({
+                        "start": rng["start"],
+                        "end": rng["end"],
+                        "tokens": block_tokens if len(ranges) == 1 else tokens(rng["start"], rng["end"]),
+                        "sections": [section["title"]] if (first and section["title"]) else [],
+                    })
+                    first = False
+
+    chunks: List[Dict[str, object]] = []
+    current: Optional[Dict[str, object]] = None
+    for piece in pieces:
+        if current is not None and current["token_count"] + piece["tokens"] <= max_tokens:
+            current["end"] = piece["end"]
+            current["token_count"] += piece["tokens"]
+            current["sections"].extend(piece["sections"])
+            current["pieces"].append(piece)
+            continue
+        if current is not None:
+            chunks.append(current)
+        current = {
+            "start": piece["start"],
+            "end": piece["end"],
+            "token_count": piece["tokens"],
+            "sections": list(piece["sections"]),
+            "pieces": [piece],
+        }
+    if current is not None:
+        chunks.append(current)
+
+    for idx, chunk in enumerate(chunks, start=1):
+        chunk["index"] = idx
+        chunk["text"] = markdown[chunk["start"]:chunk["end"]]
+        chunk["pieces"] = [
+            {
+                "start": piece["start"],
+                "end": piece["end"],
+                "hash": content_hash(markdown[piece["start"]:piece["end"]]),
+            }
+            for piece in chunk["pieces"]
+        ]
+
+    logger.info(
+        "Chunking estructural: %d secciones -> %d chunks (máx. %d tokens)",
+        len(sections),
+        len(chunks),
+        max_tokens,
+    )
+    return chunks
+
+
+def chunk_report(chunks: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """Resumen serializable de los chunks (sin el texto)."""
+    return [
+        {
+            "index": chunk["index"],
+            "start": chunk["start"],
+            "end": chunk["end"],
+            "token_count": chunk["token_count"],
+            "sections": chunk["sections"],
+        }
+        for chunk in chunks
+    ]
@@ -0,0 +1,124 @@
+"""
+Segmentos de markdown por referencia al markdown canónico.
+
+Los ítems de ``test_solution_markdown_{source}`` no copian el texto de cada
+prueba: guardan ``markdown_spans`` (pares ``[inicio, fin]``) dentro del
+``markdown_completo`` de ``method_metadata_TOC_{source}.json``, que es la única
+copia del documento en el estado. El texto se materializa solo cuando un
+consumidor lo necesita (``materialize_item_markdown``).
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.utils.hashing import content_hash
+from src.utils.virtual_fs import VirtualFS
+
+logger = logging.getLogger(__name__)
+
+CANONICAL_MARKDOWN_FIELD = "markdown_completo"
+# Separador con el que se unen las piezas de una misma prueba
+SPAN_JOINER = "\n\n"
+CANONICAL_CACHE_SIZE = 8
+
+_canonical_cache: "OrderedDict[tuple, str]" = OrderedDict()
+# Las ramas de ingesta y los lotes de extracción leen en paralelo
+_canonical_lock = threading.Lock()
+
+
+def locate_markdown_spans(chunks: Sequence[str], canonical_markdown: str) -> Optional[List[List[int]]]:
+    """
+    Ubica cada pieza de texto dentro del markdown canónico.
+
+    La búsqueda solo avanza: cada pieza se busca a partir del final de la
+    anterior, nunca desde el inicio del documento, donde podría coincidir con
+    una aparición previa (p. ej. la tabla de contenido). Retorna ``None`` si
+    alguna pieza no aparece literalmente a partir de ese punto (p. ej. el
+    pre-procesamiento eliminó líneas intermedias); el ítem conserva entonces su
+    ``markdown`` en línea.
+    """
+    spans: List[List[int]] = []
+    cursor = 0
+    for chunk in chunks:
+        # Las piezas de una prueba aparecen en orden: se busca desde la anterior
+        start = canonical_markdown.find(chunk, cursor)
+        if start < 0:
+            return None
+        spans.append([start, start + len(chunk)])
+        cursor = start + len(chunk)
+    return spans
+
+
+def markdown_source_ref(path: str, canonical_markdown: str) -> Dict[str, Any]:
+    """Referencia al markdown canónico que se guarda en el payload de segmentación."""
+    return {
+        "path": path,
+        "field": CANONICAL_MARKDOWN_FIELD,
+        "content_hash": content_hash(canonical_markdown),
+    }
+
+
+def load_canonical_markdown(vfs: VirtualFS, payload: Dict[str, Any]) -> Optional[str]:
+    """
+    Obtiene el markdown canónico de un payload de segmentación.
+
+    Payloads antiguos traen ``full_markdown`` en línea. En el formato por
+    referencia se lee ``markdown_source`` y se verifica ``content_hash``: si el
+    documento cambió desde la segmentación, los spans ya no son válidos.
+    """
+    if isinstance(payload.get("full_markdown"), str):
+        return payload["full_markdown"]
+
+    source = payload.get("markdown_source")
+    if not isinstance(source, dict):
+        return None
+    entry = vfs.entry(source.get("path"))
+    if not isinstance(entry, dict):
+        logger.warning("No se encontró el markdown canónico %s", source.get("path"))
+        return None
+
+    cache_key = (source.get("path"), entry.get("modified_at"), source.get("content_hash"))
+    with _canonical_lock:
+        cached = _canonical_cache.get(cache_key)
+        if cached is not None:
+            _canonical_cache.move_to_end(cache_key)
+            return cached
+
+    markdown = (vfs.read_json(source["path"], expect=dict) or {}).get(source.get("field") or CANONICAL_MARKDOWN_FIELD)
+    if not isinstance(markdown, str):
+        return None
+    if content_hash(markdown) != source.get("content_hash"):
+        logger.warning(
+            "El markdown de %s cambió desde la segmentación; re-ejecuta la segmentación",
+            source.get("path"),
+        )
+        return None
+
+    with _canonical_lock:
+        _canonical_cache[cache_key] = markdown
+        if len(_canonical_cache) > CANONICAL_CACHE_SIZE:
+            _canonical_cache.popitem(last=False)
+    return markdown
+
+
+def materialize_item_markdown(item: Dict[str, Any], canonical_markdown: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Copia del ítem con ``markdown`` reconstruido desde sus spans (sin ``markdown_spans``).
+
+    Retorna ``None`` si el ítem tiene spans pero no hay markdown canónico válido
+    (ausente o modificado desde la segmentación): sus spans ya no apuntan a su
+    texto y el ítem no debe procesarse hasta re-segmentar.
+    """
+    spans = item.get("markdown_spans")
+    if spans is None:
+        return item
+    if canonical_markdown is None:
+        logger.warning("Ítem id=%s sin markdown canónico disponible para sus spans", item.get("id"))
+        return None
+    materialized = {key: value for key, value in item.items() if key != "markdown_spans"}
+    materialized["markdown"] = SPAN_JOINER.join(
+        canonical_markdown[start:end] for start, end in spans
+    ).strip()
+    return materialized
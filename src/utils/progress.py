@@ -0,0 +1,211 @@
+"""
+Eventos de progreso de las herramientas (streaming ``custom`` de LangGraph).
+
+Las herramientas largas (OCR por chunks, extracción estructurada en batch,
+limpieza de markdown, análisis y parcheo con LLM) publican eventos
+estructurados a través de ``get_stream_writer()``. Quien ejecuta el grafo con
+``stream(..., stream_mode="custom")`` (la app de Streamlit) los recibe en vivo;
+con ``invoke`` o fuera de un grafo la emisión no hace nada.
+
+Formato de cada evento::
+
+    {
+        "type": "progress",
+        "tool": "pdf_da_metadata_toc",
+        "stage": "ocr",
+        "status": "start" | "item" | "done" | "error",
+        "item": 3,              # ítems terminados (opcional)
+        "total": 12,            # ítems esperados (opcional)
+        "elapsed": 41.2,        # segundos desde que empezó la etapa
+        "tokens": 18250,        # tokens del prompt enviados (opcional)
+        "message": "...",       # texto libre (opcional)
+        "ts": 1760000000.0,
+    }
+
+Los eventos llevan además ``task`` cuando la herramienta corre dentro de
+``progress_task(...)`` (el pipeline lo fija con el nombre de cada rama), para
+distinguir la misma herramienta ejecutándose en paralelo sobre varios
+documentos.
+
+El writer vive en una contextvar que no se propaga a los hilos de un
+``ThreadPoolExecutor``: ``ProgressReporter`` lo captura al crearse, en el hilo
+de la herramienta, y los bucles ``as_completed`` emiten desde ese mismo hilo.
+``ProgressBoard`` agrega los eventos recibidos para mostrarlos (throughput por
+etapa y etapas detenidas).
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langgraph.config import get_stream_writer
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVENT_TYPE = "progress"
+
+STATUS_START = "start"
+STATUS_ITEM = "item"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+# Segundos sin eventos tras los cuales una etapa en curso se considera detenida
+DEFAULT_STALL_SECONDS = 120.0
+
+
+_current_task: ContextVar[Optional[str]] = ContextVar("progress_task", default=None)
+
+
+def _noop_writer(_: Any) -> None:
+    return None
+
+
+@contextmanager
+def progress_task(task: str) -> Iterator[None]:
+    """Etiqueta con ``task`` los eventos emitidos dentro del bloque."""
+    token = _current_task.set(task)
+    try:
+        yield
+    finally:
+        _current_task.reset(token)
+
+
+def progress_writer() -> Callable[[Any], None]:
+    """Writer de streaming del grafo en curso, o uno que descarta fuera de un grafo."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return _noop_writer
+
+
+def is_progress_event(chunk: Any) -> bool:
+    """Indica si un chunk del modo ``custom`` es un evento de progreso."""
+    return isinstance(chunk, dict) and chunk.get("type") == PROGRESS_EVENT_TYPE
+
+
+class ProgressReporter:
+    """
+    Emisor de eventos de progreso para una etapa de una herramienta.
+
+    Lleva el conteo de ítems terminados y el tiempo transcurrido; es seguro
+    llamar ``advance`` desde varios hilos (el writer se captura al crearse).
+    """
+
+    def __init__(self, tool: str, stage: str, total: Optional[int] = None) -> None:
+        self.tool = tool
+        self.stage = stage
+        self.total = total
+        self.done_items = 0
+        self.tokens = 0
+        self.task = _current_task.get()
+        self._writer = progress_writer()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return round(time.perf_counter() - self._started, 2)
+
+    def emit(self, status: str, message: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        event: Dict[str, Any] = {
+            "type": PROGRESS_EVENT_TYPE,
+            "tool": self.tool,
+            "stage": self.stage,
+            "status": status,
+            "elapsed": self.elapsed,
+            "ts": time.time(),
+        }
+        if self.task:
+            event["task"] = self.task
+        if self.total is not None:
+            event["total"] = self.total
+        if self.done_items:
+            event["item"] = self.done_items
+        if self.tokens:
+            event["tokens"] = self.tokens
+        if message:
+            event["message"] = message
+        event.update(fields)
+        try:
+            self._writer(event)
+        except Exception as exc:  # el progreso nunca debe romper la herramienta
+            logger.debug("No se pudo emitir el evento de progreso %s/%s: %s", self.tool, self.stage, exc)
+        return event
+
+    def start(self, message: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        return self.emit(STATUS_START, message, **fields)
+
+    def advance(self, message: Optional[str] = None, tokens: int = 0, **fields: Any) -> Dict[str, Any]:
+        """Marca un ítem terminado (y suma los tokens que consumió)."""
+        with self._lock:
+            self.done_items += 1
+            self.tokens += tokens
+            return self.emit(STATUS_ITEM, message, **fields)
+
+    def add_tokens(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens += tokens
+
+    def done(self, message: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        return self.emit(STATUS_DONE, message, **fields)
+
+    def error(self, message: str, **fields: Any) -> Dict[str, Any]:
+        return self.emit(STATUS_ERROR, message, **fields)
+
+
+class ProgressBoard:
+    """
+    Agrega los eventos de progreso por (rama, herramienta, etapa) para mostrarlos.
+
+    Para cada etapa conserva el último estado, ítems terminados, tokens,
+    tiempo transcurrido y la hora del último evento, de modo que la UI pueda
+    calcular el throughput y marcar como detenida una etapa que lleva más de
+    ``stall_seconds`` sin emitir eventos.
+    """
+
+    def __init__(self, stall_seconds: float = DEFAULT_STALL_SECONDS) -> None:
+        self.stall_seconds = stall_seconds
+        self.stages: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def update(self, event: Dict[str, Any]) -> None:
+        key = (event.get("task", ""), event.get("tool", ""), event.get("stage", ""))
+        entry = self.stages.setdefault(key, {"task": key[0], "tool": key[1], "stage": key[2], "failed": 0})
+        entry.update(
+            {
+                "status": event.get("status"),
+                "elapsed": event.get("elapsed", entry.get("elapsed", 0.0)),
+                "last_event_at": event.get("ts", time.time()),
+                "message": event.get("message", entry.get("message")),
+            }
+        )
+        for field in ("item", "total", "tokens"):
+            if field in event:
+                entry[field] = event[field]
+        if event.get("failed") or event.get("status") == STATUS_ERROR:
+            entry["failed"] += 1
+
+    def rows(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Filas por etapa con throughput (ítems/min) y segundos sin eventos."""
+        now = time.time() if now is None else now
+        rows = []
+        for entry in self.stages.values():
+            elapsed = entry.get("elapsed") or 0.0
+            item = entry.get("item") or 0
+            idle = round(now - entry["last_event_at"], 1)
+            running = entry.get("status") in (STATUS_START, STATUS_ITEM)
+            rows.append(
+                {
+                    **entry,
+                    "item": item,
+                    "items_per_min": round(item * 60 / elapsed, 2) if item and elapsed else None,
+                    "idle_seconds": idle,
+                    "stalled": running and idle > self.stall_seconds,
+                }
+            )
+        return rows
+
+    def stalled(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        return [row for row in self.rows(now) if row["stalled"]]
@@ -0,0 +1,190 @@
+"""
+Cache de lecturas del filesystem virtual con vistas inmutables.
+
+Cada llamada a una herramienta volvía a resolver los mismos payloads (parseo de
+``content`` JSON, descompresión de blobs) y a reconstruir estructuras derivadas
+(p. ej. las listas de pruebas legadas/propuestas en ``apply_method_patch``).
+Este módulo memoriza el objeto ya resuelto bajo una clave estable, típicamente
+``(ruta, modified_at)``: una entrada reescrita cambia su ``modified_at`` y deja
+de coincidir, por lo que no hace falta invalidar a mano.
+
+El cache pertenece a la ejecución: cada ``thread_id`` de LangGraph (en
+``job_runner`` es el id del job) tiene su propio LRU y solo se conservan los
+``READ_CACHE_RUNS`` más recientes, así que un worker de larga vida no retiene
+los payloads de migraciones anteriores. Fuera de un grafo se usa un ámbito
+común. ``clear_read_cache(thread_id)`` descarta el de una ejecución terminada.
+
+Los valores se guardan congelados (``FrozenDict``/``FrozenList``): son
+subclases de ``dict``/``list`` (funcionan con ``json``, Pydantic e
+``isinstance``) pero rechazan cualquier mutación, de modo que un consumidor no
+puede corromper el cache ni, a través de él, el estado. Para modificar un
+payload se trabaja sobre una copia: ``thaw(obj)``, ``copy.deepcopy(obj)`` o,
+a un solo nivel, ``obj.copy()`` / ``dict(obj)``.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from langgraph.config import get_config
+
+logger = logging.getLogger(__name__)
+
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "256"))
+# Ejecuciones (thread_id) con cache propio retenidas a la vez
+READ_CACHE_RUNS = max(1, int(os.getenv("READ_CACHE_RUNS", "4")))
+
+# thread_id -> LRU de lecturas de esa ejecución (None: fuera de un grafo)
+_caches: "OrderedDict[Optional[str], OrderedDict[Hashable, Any]]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _current_run() -> Optional[str]:
+    """``thread_id`` de la ejecución de LangGraph en curso (``None`` fuera de un grafo)."""
+    try:
+        config = get_config()
+    except RuntimeError:
+        return None
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    return str(thread_id) if thread_id is not None else None
+
+
+def _run_cache(run: Optional[str]) -> "OrderedDict[Hashable, Any]":
+    """LRU de la ejecución; crea uno nuevo y descarta el más antiguo si hace falta (con ``_lock``)."""
+    cache = _caches.get(run)
+    if cache is None:
+        cache = _caches[run] = OrderedDict()
+        while len(_caches) > READ_CACHE_RUNS:
+            _caches.popitem(last=False)
+    _caches.move_to_end(run)
+    return cache
+
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError(
+        f"{type(self).__name__} es de solo lectura (payload cacheado); usa thaw() para obtener una copia editable"
+    )
+
+
+class FrozenDict(dict):
+    """``dict`` de solo lectura devuelto por el cache de lecturas."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def copy(self) -> Dict[Any, Any]:
+        """Copia superficial editable (los valores anidados siguen congelados)."""
+        return dict(self)
+
+    def __copy__(self) -> Dict[Any, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[Any, Any]:
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class FrozenList(list):
+    """``list`` de solo lectura devuelta por el cache de lecturas."""
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+
+    def copy(self) -> list:
+        """Copia superficial editable (los valores anidados siguen congelados)."""
+        return list(self)
+
+    def __copy__(self) -> list:
+        return list(self)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> list:
+        return thaw(self)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def freeze(obj: Any) -> Any:
+    """Copia congelada recursiva de dicts/listas (los escalares se devuelven tal cual)."""
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return obj
+    if isinstance(obj, dict):
+        frozen = FrozenDict()
+        # dict.__setitem__ directo: FrozenDict bloquea la asignación normal
+        for key, value in obj.items():
+            dict.__setitem__(frozen, key, freeze(value))
+        return frozen
+    if isinstance(obj, (list, tuple)):
+        return FrozenList(freeze(item) for item in obj)
+    return obj
+
+
+def thaw(obj: Any) -> Any:
+    """Copia profunda editable (``dict``/``list`` planos) de un payload congelado o no."""
+    if isinstance(obj, dict):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [thaw(item) for item in obj]
+    return obj
+
+
+def cached_read(key: Optional[Hashable], loader: Callable[[], Any]) -> Any:
+    """
+    Retorna la vista congelada de ``loader()`` memorizada bajo ``key``.
+
+    Con ``key=None`` (entrada sin ``modified_at`` ni otra huella fiable) no se
+    cachea, pero el resultado igualmente se congela para mantener la misma
+    semántica de solo lectura. Los ``None`` del loader no se memorizan.
+    """
+    if key is None:
+        return freeze(loader())
+
+    run = _current_run()
+    with _lock:
+        cache = _run_cache(run)
+        if key in cache:
+            cache.move_to_end(key)
+            _stats["hits"] += 1
+            return cache[key]
+        _stats["misses"] += 1
+
+    value = freeze(loader())
+    if value is None:
+        return None
+    with _lock:
+        cache = _run_cache(run)
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > READ_CACHE_SIZE:
+            cache.popitem(last=False)
+    return value
+
+
+def clear_read_cache(thread_id: Optional[str] = None) -> None:
+    """Descarta el cache de ``thread_id`` o, sin argumento, el de todas las ejecuciones."""
+    with _lock:
+        if thread_id is not None:
+            _caches.pop(str(thread_id), None)
+            return
+        _caches.clear()
+        _stats["hits"] = _stats["misses"] = 0
+
+
+def read_cache_info() -> Dict[str, int]:
+    with _lock:
+        return {
+            **_stats,
+            "size": sum(len(cache) for cache in _caches.values()),
+            "runs": len(_caches),
+            "max_size": READ_CACHE_SIZE,
+            "max_runs": READ_CACHE_RUNS,
+        }
@@ -0,0 +1,295 @@
+"""
+Manifiesto de etapas del flujo de implementación de cambios.
+
+Cada herramienta del ``change_implementation_agent`` registra al terminar un
+archivo ``/new/stage_manifest/{etapa}.json`` con el hash de sus entradas y de
+sus salidas. ``stage_status`` recalcula esos hashes sobre el estado actual y
+determina la primera etapa faltante o desactualizada, de modo que tras un
+error (p. ej. una variable de la plantilla en ``render_method_docx``) se retoma
+desde ahí sin repetir OCR, plan ni parches.
+
+La vigencia se decide por contenido, nunca por ``modified_at``: el hash de
+entrada de una etapa combina el contenido de sus archivos de entrada con el
+hash de salida registrado por las etapas previas. Así una etapa sigue vigente
+aunque sus insumos intermedios ya se hayan consumido (los parches de
+``/new/applied_changes/`` se eliminan al consolidar).
+
+``apply_method_patch`` registra una entrada por acción
+(``/new/stage_manifest/apply_method_patch/{indice}.json``) porque sus llamadas
+corren en paralelo y un único archivo perdería registros en el reducer.
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.utils.hashing import content_hash
+from src.utils.virtual_fs import VirtualFS
+
+logger = logging.getLogger(__name__)
+
+STAGE_MANIFEST_DIR = "/new/stage_manifest"
+
+STAGE_RESOLVE = "resolve_source_references"
+STAGE_ANALYZE = "analyze_change_impact"
+STAGE_APPLY = "apply_method_patch"
+STAGE_CONSOLIDATE = "consolidate_new_method"
+STAGE_RENDER = "render_method_docx"
+
+CC_SUMMARY_PATHS = ("/new/change_control_summary.json", "/change_control/change_control_summary.json")
+PLAN_PATH = "/new/change_implementation_plan.json"
+PATCHES_DIR = "/new/applied_changes"
+METHOD_FINAL_PATH = "/new/new_method_final.json"
+RENDERED_DOCX_INFO_PATH = "/new/rendered_docx_info.json"
+
+# Orden del flujo: entradas (globs del filesystem virtual), etapas previas y salidas
+STAGES: List[Dict[str, Any]] = [
+    {
+        "name": STAGE_RESOLVE,
+        "inputs": ["/actual_method/**method_metadata_TOC_*", "/proposed_method/**method_metadata_TOC_*"],
+        "depends_on": [],
+        "outputs": ["/new/change_control_summary.json", "/new/source_reference_mapping.json"],
+    },
+    {
+        "name": STAGE_ANALYZE,
+        "inputs": [
+            *CC_SUMMARY_PATHS,
+            "/actual_method/test_solution_structured_content_*.json",
+            "/proposed_method/test_solution_structured_content_*.json",
+            "/analytical_tests/**",
+        ],
+        "depends_on": [STAGE_RESOLVE],
+        "outputs": [PLAN_PATH],
+    },
+    {
+        # Por acción: ver ``apply_action_input_hash``
+        "name": STAGE_APPLY,
+        "inputs": [
+            "/actual_method/test_solution_structured_content_*.json",
+            "/proposed_method/test_solution_structured_content_*.json",
+        ],
+        "depends_on": [STAGE_ANALYZE],
+        "outputs": [],
+    },
+    {
+        "name": STAGE_CONSOLIDATE,
+        "inputs": [
+            "/actual_method/test_solution_structured_content_*.json",
+            "/actual_method/**method_metadata_TOC*",
+        ],
+        "depends_on": [STAGE_APPLY],
+        "outputs": [METHOD_FINAL_PATH],
+    },
+    {
+        "name": STAGE_RENDER,
+        "inputs": [METHOD_FINAL_PATH],
+        "depends_on": [STAGE_CONSOLIDATE],
+        "outputs": [RENDERED_DOCX_INFO_PATH],
+    },
+]
+
+_STAGES_BY_NAME = {stage["name"]: stage for stage in STAGES}
+
+
+def _stage_record_path(name: str) -> str:
+    return f"{STAGE_MANIFEST_DIR}/{name}.json"
+
+
+def _action_record_path(action_index: int) -> str:
+    return f"{STAGE_MANIFEST_DIR}/{STAGE_APPLY}/{action_index}.json"
+
+
+def _files_hash(vfs: VirtualFS, patterns: Sequence[str]) -> str:
+    """Hash del contenido de todos los archivos que cumplen ``patterns`` (orden estable)."""
+    paths = sorted({path for pattern in patterns for path in vfs.glob(pattern)})
+    return content_hash([[path, vfs.content_digest(path)] for path in paths])
+
+
+def disk_file_hash(path: Any) -> Optional[str]:
+    """Hash de un archivo en disco (plantillas DOCX); ``None`` si no existe o no hay ruta."""
+    if not path:
+        return None
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+# --- Registros ---
+
+def load_stage_record(vfs: VirtualFS, name: str) -> Optional[Dict[str, Any]]:
+    return vfs.read_json(_stage_record_path(name), expect=dict)
+
+
+def load_action_records(vfs: VirtualFS) -> Dict[int, Dict[str, Any]]:
+    records: Dict[int, Dict[str, Any]] = {}
+    for path in vfs.listdir(f"{STAGE_MANIFEST_DIR}/{STAGE_APPLY}"):
+        record = vfs.read_json(path, expect=dict)
+        if record is not None and isinstance(record.get("action_index"), int):
+            records[record["action_index"]] = record
+    return records
+
+
+def _upstream_hash(vfs: VirtualFS, name: str) -> List[Optional[str]]:
+    """Hashes de salida registrados por las etapas previas (``None`` si no corrieron)."""
+    hashes: List[Optional[str]] = []
+    for dependency in _STAGES_BY_NAME[name]["depends_on"]:
+        if dependency == STAGE_APPLY:
+            hashes.append(apply_output_hash(vfs))
+            continue
+        record = load_stage_record(vfs, dependency)
+        hashes.append(record.get("output_hash") if record else None)
+    return hashes
+
+
+def stage_input_hash(vfs: VirtualFS, name: str, extra: Any = None) -> str:
+    """
+    Hash de entrada de una etapa: contenido de sus archivos de entrada, salidas
+    registradas de las etapas previas y ``extra`` (p. ej. hash de la plantilla).
+    Las herramientas lo calculan antes de escribir.
+    """
+    stage = _STAGES_BY_NAME[name]
+    return content_hash([_files_hash(vfs, stage["inputs"]), _upstream_hash(vfs, name), extra])
+
+
+def stage_output_hash(vfs: VirtualFS, name: str) -> str:
+    return content_hash([[path, vfs.content_digest(path)] for path in _STAGES_BY_NAME[name]["outputs"]])
+
+
+def record_stage(vfs: VirtualFS, name: str, input_hash: str, **details: Any) -> None:
+    """Registra una etapa completada (las salidas ya deben estar escritas en ``vfs``)."""
+    vfs.write_json(_stage_record_path(name), {
+        "stage": name,
+        "input_hash": input_hash,
+        "output_hash": stage_output_hash(vfs, name),
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+        **details,
+    })
+
+
+def apply_action_input_hash(vfs: VirtualFS, plan_action: Any) -> str:
+    """Hash de entrada de una acción del plan: la acción misma más las entradas de la etapa."""
+    return stage_input_hash(vfs, STAGE_APPLY, extra=plan_action)
+
+
+def record_apply_action(vfs: VirtualFS, action_index: int, input_hash: str, patch_path: Optional[str]) -> None:
+    vfs.write_json(_action_record_path(action_index), {
+        "stage": STAGE_APPLY,
+        "action_index": action_index,
+        "input_hash": input_hash,
+        "patch_path": patch_path,
+        "output_hash": vfs.content_digest(patch_path) if patch_path else None,
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+def apply_output_hash(vfs: VirtualFS) -> Optional[str]:
+    """Salida agregada de los parches registrados (``None`` si no hay ninguno)."""
+    records = load_action_records(vfs)
+    if not records:
+        return None
+    return content_hash([[idx, records[idx].get("output_hash")] for idx in sorted(records)])
+
+
+# --- Estado del flujo ---
+
+def _plan_actions(vfs: VirtualFS) -> List[Any]:
+    plan = vfs.read_json(PLAN_PATH, expect=dict) or {}
+    actions = plan.get("plan_intervencion")
+    return list(actions) if isinstance(actions, list) else []
+
+
+def _has_change_inputs(vfs: VirtualFS) -> bool:
+    """Hay CC o método propuesto: el flujo completo aplica (si no, solo método legado)."""
+    return any(vfs.exists(path) for path in CC_SUMMARY_PATHS) or bool(
+        vfs.glob("/proposed_method/test_solution_structured_content_*.json")
+    )
+
+
+def _simple_stage_status(vfs: VirtualFS, name: str, extra: Any = None) -> Dict[str, Any]:
+    record = load_stage_record(vfs, name)
+    if record is None:
+        return {"stage": name, "status": "pendiente", "reason": "sin registro de ejecución"}
+    if record.get("input_hash") != stage_input_hash(vfs, name, extra):
+        return {"stage": name, "status": "desactualizada", "reason": "sus entradas cambiaron"}
+    if record.get("output_hash") != stage_output_hash(vfs, name):
+        return {"stage": name, "status": "desactualizada", "reason": "sus salidas faltan o fueron modificadas"}
+    return {"stage": name, "status": "vigente", "completed_at": record.get("completed_at")}
+
+
+def _apply_stage_status(vfs: VirtualFS) -> Dict[str, Any]:
+    actions = _plan_actions(vfs)
+    records = load_action_records(vfs)
+    pending = [
+        idx for idx, action in enumerate(actions)
+        if (records.get(idx) or {}).get("input_hash") != apply_action_input_hash(vfs, action)
+    ]
+    if not actions:
+        return {"stage": STAGE_APPLY, "status": "pendiente", "reason": "el plan no tiene acciones", "pending_actions": []}
+    if pending:
+        return {
+            "stage": STAGE_APPLY,
+            "status": "pendiente" if len(pending) == len(actions) else "desactualizada",
+            "reason": f"{len(pending)} de {len(actions)} acciones sin aplicar o con entradas cambiadas",
+            "pending_actions": pending,
+        }
+    return {"stage": STAGE_APPLY, "status": "vigente", "pending_actions": []}
+
+
+def stage_status(vfs: VirtualFS) -> Dict[str, Any]:
+    """
+    Estado de cada etapa y punto de reanudación.
+
+    Retorna ``{"stages": [...], "resume_from": etapa | None, "pending_actions": [...]}``.
+    A partir de la primera etapa no vigente, las siguientes se marcan como
+    pendientes (dependen de su salida).
+    """
+    full_flow = _has_change_inputs(vfs)
+    statuses: List[Dict[str, Any]] = []
+    resume_from: Optional[str] = None
+    pending_actions: List[int] = []
+
+    for stage in STAGES:
+        name = stage["name"]
+        if not full_flow and name in (STAGE_RESOLVE, STAGE_ANALYZE, STAGE_APPLY):
+            statuses.append({"stage": name, "status": "no aplica", "reason": "solo hay método legado"})
+            continue
+        if resume_from is not None:
+            statuses.append({"stage": name, "status": "pendiente", "reason": f"depende de {resume_from}"})
+            continue
+
+        if name == STAGE_APPLY:
+            status = _apply_stage_status(vfs)
+            pending_actions = status.get("pending_actions", [])
+        elif name == STAGE_RENDER:
+            record = load_stage_record(vfs, name) or {}
+            status = _simple_stage_status(vfs, name, disk_file_hash(record.get("template_path")))
+            docx_path = record.get("docx_path")
+            if status["status"] == "vigente" and docx_path and not Path(docx_path).exists():
+                status = {"stage": name, "status": "desactualizada", "reason": f"no existe {docx_path}"}
+        else:
+            status = _simple_stage_status(vfs, name)
+
+        if status["status"] != "vigente":
+            resume_from = name
+            if name == STAGE_CONSOLIDATE and full_flow:
+                # Los parches se consumen al consolidar: sin ellos hay que re-aplicar esas acciones
+                missing = [
+                    idx for idx, record in sorted(load_action_records(vfs).items())
+                    if record.get("patch_path") and not vfs.exists(record["patch_path"])
+                ]
+                if missing:
+                    resume_from = STAGE_APPLY
+                    pending_actions = missing
+                    statuses[-1] = {
+                        "stage": STAGE_APPLY,
+                        "status": "desactualizada",
+                        "reason": "la consolidación debe repetirse y sus parches ya fueron consumidos",
+                        "pending_actions": missing,
+                    }
+                    status = {"stage": name, "status": "pendiente", "reason": f"depende de {STAGE_APPLY}"}
+        statuses.append(status)
+
+    return {"stages": statuses, "resume_from": resume_from, "pending_actions": pending_actions}
@@ -0,0 +1,72 @@
+"""
+Utilidades compartidas de tokenización (tiktoken).
+
+El encoder y los splitters se crean de forma perezosa y se reutilizan entre
+llamadas, de modo que ninguna herramienta vuelve a cargar el encoder en cada
+invocación. ``count_tokens`` es la API rápida para dimensionar prompts antes
+de enviarlos al LLM.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Optional, Sequence
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+# Modelo usado para elegir el encoding por defecto (o200k_base)
+DEFAULT_ENCODING_MODEL = "gpt-4.1-mini"
+FALLBACK_ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name: str = DEFAULT_ENCODING_MODEL):
+    """Devuelve el encoder de tiktoken para el modelo, creado una sola vez."""
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        logger.debug(
+            "tiktoken no conoce el modelo '%s'; usando encoding %s",
+            model_name,
+            FALLBACK_ENCODING,
+        )
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+
+def count_tokens(text: Optional[str], model_name: str = DEFAULT_ENCODING_MODEL) -> int:
+    """Cuenta los tokens de un texto con el encoder cacheado."""
+    if not text:
+        return 0
+    return len(get_encoder(model_name).encode_ordinary(text))
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(
+    chunk_size: int,
+    chunk_overlap: int,
+    separators: Sequence[str],
+    model_name: str = DEFAULT_ENCODING_MODEL,
+) -> RecursiveCharacterTextSplitter:
+    """
+    Devuelve un splitter por tokens compartido para la configuración dada.
+
+    ``separators`` debe ser hashable (tupla) para poder cachear el splitter.
+    """
+    def _token_length(text: str) -> int:
+        return count_tokens(text, model_name)
+
+    logger.debug(
+        "Creando splitter compartido (chunk_size=%d, overlap=%d, modelo=%s)",
+        chunk_size,
+        chunk_overlap,
+        model_name,
+    )
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=list(separators),
+        length_function=_token_length,
+    )
@@ -0,0 +1,235 @@
+"""
+Fachada del filesystem virtual (``state["files"]``) para las herramientas.
+
+Mantiene un índice de rutas ordenadas, de modo que ``listdir(prefix)`` y
+``glob(pattern)`` resuelven con búsqueda binaria sobre el prefijo literal
+(O(log n + k)) en lugar de recorrer todas las claves con regex en cada
+herramienta. ``read_json`` centraliza la lectura de payloads (``data`` en
+línea, blobs, ``content`` JSON de archivos antiguos) y ``write_json``/``delete``
+acumulan el delta que la herramienta devuelve en ``Command(update={"files": vfs.updates})``.
+
+Los payloads leídos se memorizan por ``(ruta, modified_at)`` en
+``src/utils/read_cache.py`` y se devuelven como vistas inmutables: una
+herramienta que necesite modificarlos trabaja sobre ``thaw(payload)``.
+
+Las escrituras se ven en lecturas posteriores de la misma fachada; el
+``files`` original del estado nunca se modifica.
+"""
+
+import json
+import logging
+import re
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Type, Union
+
+from src.graph.state import FILE_TOMBSTONE
+from src.utils.file_entries import file_entry_data, make_file_entry
+from src.utils.hashing import HASH_LENGTH, content_hash
+from src.utils.read_cache import cached_read, thaw
+
+logger = logging.getLogger(__name__)
+
+JsonType = Union[Type, Tuple[Type, ...]]
+
+_GLOB_SPECIAL = re.compile(r"[*?\[]")
+
+
+def _glob_to_regex(pattern: str) -> "re.Pattern[str]":
+    """``*`` y ``?`` no cruzan ``/``; ``**`` sí (cualquier profundidad)."""
+    parts: List[str] = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        if pattern.startswith("**", idx):
+            parts.append(".*")
+            idx += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", idx + 1)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                parts.append(pattern[idx:end + 1])
+                idx = end
+        else:
+            parts.append(re.escape(char))
+        idx += 1
+    return re.compile("".join(parts) + r"\Z")
+
+
+def _dir_prefix(directory: str) -> str:
+    return directory.rstrip("/") + "/"
+
+
+def _read_cache_key(path: str, entry: Any) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Clave del cache de lecturas; ``None`` si la entrada no trae ``modified_at``."""
+    if not isinstance(entry, dict) or not entry.get("modified_at"):
+        return None
+    blob_ref = entry.get("blob_ref")
+    digest = blob_ref.get("sha256") if isinstance(blob_ref, dict) else None
+    return (path, entry["modified_at"], digest)
+
+
+class VirtualFS:
+    """Vista indexada de ``state["files"]`` con lecturas/escrituras JSON tipadas."""
+
+    def __init__(self, files: Optional[Mapping[str, Any]] = None):
+        self._files: Mapping[str, Any] = files or {}
+        self._updates: Dict[str, Any] = {}
+        self._sorted_paths: Optional[List[str]] = None
+
+    @classmethod
+    def from_state(cls, state: Mapping[str, Any]) -> "VirtualFS":
+        return cls(state.get("files") or {})
+
+    # --- Índice ---
+
+    def _index(self) -> List[str]:
+        if self._sorted_paths is None:
+            self._sorted_paths = sorted(
+                path for path, entry in self._files.items()
+                if isinstance(path, str) and entry is not None
+            )
+        return self._sorted_paths
+
+    def _iter_prefix(self, prefix: str) -> Iterator[str]:
+        paths = self._index()
+        for idx in range(bisect_left(paths, prefix), len(paths)):
+            path = paths[idx]
+            if not path.startswith(prefix):
+                break
+            yield path
+
+    # --- Consultas ---
+
+    def entry(self, path: str) -> Optional[Any]:
+        """Entrada cruda (``None`` si no existe o fue eliminada en esta fachada)."""
+        if path in self._updates:
+            return self._updates[path]
+        return self._files.get(path)
+
+    def exists(self, path: str) -> bool:
+        return self.entry(path) is not None
+
+    def listdir(self, directory: str, recursive: bool = False) -> List[str]:
+        """Rutas de archivos dentro de ``directory`` (hijos directos salvo ``recursive``)."""
+        prefix = _dir_prefix(directory)
+        return [
+            path for path in self._iter_prefix(prefix)
+            if recursive or "/" not in path[len(prefix):]
+        ]
+
+    def glob(self, pattern: str) -> List[str]:
+        """Rutas que cumplen ``pattern`` (``*``/``?`` dentro de un segmento, ``**`` recursivo)."""
+        special = _GLOB_SPECIAL.search(pattern)
+        if special is None:
+            return [pattern] if self.exists(pattern) else []
+        regex = _glob_to_regex(pattern)
+        return [path for path in self._iter_prefix(pattern[:special.start()]) if regex.match(path)]
+
+    def content_digest(self, path: str) -> Optional[str]:
+        """
+        Hash del contenido de ``path`` (``None`` si no existe). Usa el sha256
+        del blob sin descargarlo; en otro caso, ``content_hash`` del payload o
+        del ``content`` de texto. No depende de ``modified_at``.
+        """
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        if isinstance(entry, dict):
+            blob_ref = entry.get("blob_ref")
+            if isinstance(blob_ref, dict) and blob_ref.get("sha256"):
+                return blob_ref["sha256"][:HASH_LENGTH]
+            if entry.get("data") is None and isinstance(entry.get("content"), (str, list)):
+                return content_hash(entry["content"])
+        return content_hash(self.read_json(path))
+
+    def fingerprint(self, paths: List[str]) -> Optional[Tuple[Any, ...]]:
+        """
+        Huella de versión de un conjunto de archivos (rutas + ``modified_at``),
+        útil como clave de cache para estructuras derivadas de varios payloads.
+        ``None`` si alguna entrada no trae ``modified_at``.
+        """
+        keys = tuple(_read_cache_key(path, self.entry(path)) for path in paths)
+        return None if any(key is None for key in keys) else keys
+
+    def read_json(self, path: str, expect: Optional[JsonType] = None, default: Any = None) -> Any:
+        """
+        Payload JSON de ``path``: ``data`` (o su blob), o ``content`` parseado en
+        entradas antiguas. Retorna ``default`` si no existe, no se puede parsear
+        o no es instancia de ``expect``.
+
+        El resultado es una vista inmutable (``FrozenDict``/``FrozenList``)
+        compartida entre lecturas de la misma versión del archivo.
+        """
+        entry = self.entry(path)
+        payload = cached_read(_read_cache_key(path, entry), lambda: self._load_payload(path, entry))
+        if payload is None or (expect is not None and not isinstance(payload, expect)):
+            return default
+        return payload
+
+    def _load_payload(self, path: str, entry: Any) -> Any:
+        if entry is None:
+            return None
+        if isinstance(entry, str):
+            return self._parse_json(path, entry)
+        if isinstance(entry, list):
+            return entry
+        if not isinstance(entry, dict):
+            return None
+
+        data = file_entry_data(entry)
+        if data is not None:
+            return data
+        if "blob_ref" in entry:
+            # Blob no disponible en disco (el error ya quedó registrado)
+            return None
+        content = entry.get("content")
+        if isinstance(content, list):
+            content = "\n".join(content)
+        if isinstance(content, str):
+            return self._parse_json(path, content) if content.strip() else None
+        if "modified_at" in entry:
+            return None
+        # Sin 'data' ni 'content': el propio valor es el payload
+        return entry
+
+    @staticmethod
+    def _parse_json(path: str, text: str) -> Any:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            logger.warning("Error parseando JSON desde 'content' en %s", path)
+            return None
+
+    # --- Escrituras (delta para el reducer de archivos) ---
+
+    def write_json(self, path: str, data: Any, modified_at: Optional[str] = None) -> Dict[str, Any]:
+        """Registra una entrada compacta para ``path`` y la retorna."""
+        # Los payloads leídos llegan congelados: el estado guarda siempre dict/list planos
+        entry = make_file_entry(thaw(data), modified_at)
+        self.write_entry(path, entry)
+        return entry
+
+    def write_entry(self, path: str, entry: Dict[str, Any]) -> None:
+        """Registra una entrada ya construida (p. ej. archivos de texto con ``content``)."""
+        if self._sorted_paths is not None and not self.exists(path):
+            insort(self._sorted_paths, path)
+        self._updates[path] = entry
+
+    def delete(self, path: str) -> None:
+        """Elimina ``path`` del estado (tombstone en el reducer)."""
+        if self._sorted_paths is not None and self.exists(path):
+            idx = bisect_left(self._sorted_paths, path)
+            if idx < len(self._sorted_paths) and self._sorted_paths[idx] == path:
+                self._sorted_paths.pop(idx)
+        self._updates[path] = FILE_TOMBSTONE
+
+    @property
+    def updates(self) -> Dict[str, Any]:
+        """Delta acumulado: solo las rutas escritas o eliminadas."""
+        return dict(self._updates)
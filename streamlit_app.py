@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-import json
-import tempfile
+import os
+import time
+import uuid
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -11,7 +12,22 @@ import streamlit as st
 # Carga variables desde .env antes de inicializar agentes/LLMs
 load_dotenv()
 
-from src.graph.builder import am_change_control_agent
+from src.graph import job_runner
+from src.utils.progress import DEFAULT_STALL_SECONDS, ProgressBoard
+
+# "pipeline": flujo determinista (el supervisor solo interviene si falla un paso); "agent": supervisor completo
+ORCHESTRATOR = os.getenv("AURA_ORCHESTRATOR", "pipeline").strip().lower()
+# Segundos sin eventos de una etapa en curso antes de marcarla como detenida
+STALL_SECONDS = float(os.getenv("AURA_STALL_SECONDS", DEFAULT_STALL_SECONDS))
+# Cada cuánto la UI vuelve a leer el estado de los trabajos en disco
+JOB_POLL_SECONDS = float(os.getenv("AURA_JOB_POLL_SECONDS", "3"))
+JOB_LIST_LIMIT = 20
+JOB_STATUS_LABELS = {
+    job_runner.STATUS_QUEUED: "en cola",
+    job_runner.STATUS_RUNNING: "en ejecucion",
+    job_runner.STATUS_COMPLETED: "completado",
+    job_runner.STATUS_FAILED: "fallido",
+}
 
 
 st.set_page_config(
@@ -340,14 +356,137 @@ def render_table_section() -> None:
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+def _render_progress(board: ProgressBoard) -> None:
+    """Tabla de progreso de un trabajo (una fila por rama/herramienta/etapa)."""
+    rows = board.rows()
+    if not rows:
+        st.info("Esperando el primer evento de progreso...")
+        return
+    st.dataframe(
+        pd.DataFrame(
+            [
+                {
+                    "rama": row["task"],
+                    "herramienta": row["tool"],
+                    "etapa": row["stage"],
+                    "estado": row.get("status"),
+                    "progreso": f"{row['item']}/{row['total']}" if row.get("total") else str(row["item"] or ""),
+                    "segundos": row.get("elapsed"),
+                    "tokens": row.get("tokens"),
+                    "items/min": row["items_per_min"],
+                    "fallidos": row["failed"],
+                    "sin eventos (s)": row["idle_seconds"],
+                    "detalle": row.get("message") or "",
+                }
+                for row in rows
+            ]
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
+    for row in board.stalled():
+        st.warning(
+            f"{row['tool']} / {row['stage']} lleva {row['idle_seconds']:.0f} s sin avanzar "
+            f"({row.get('message') or 'sin detalle'})."
+        )
+
+
+def _format_ts(value) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(value)) if value else ""
+
+
+def _render_job_detail(job: dict) -> None:
+    job_id = job["job_id"]
+    status = job.get("status")
+    started = job.get("started_at")
+    end = job.get("finished_at") or (time.time() if status == job_runner.STATUS_RUNNING else None)
+    duration = f" · {end - started:.0f} s" if started and end else ""
+    st.markdown(f"**Trabajo `{job_id}`**: {JOB_STATUS_LABELS.get(status, status)}{duration}")
+
+    if status in job_runner.ACTIVE_STATUSES or status == job_runner.STATUS_COMPLETED:
+        _render_progress(job_runner.read_progress(job_id, stall_seconds=STALL_SECONDS))
+    if job.get("error"):
+        st.error(job["error"])
+
+    for artifact in job.get("artifacts") or []:
+        docx_path = Path(artifact)
+        if docx_path.exists():
+            st.download_button(
+                f"Descargar {docx_path.name}",
+                data=docx_path.read_bytes(),
+                file_name=docx_path.name,
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                use_container_width=True,
+                key=f"download_{job_id}_{docx_path.name}",
+            )
+
+    result = job_runner.read_result(job_id)
+    if result:
+        timings = result.get("timings")
+        if timings:
+            with st.expander("Tiempos por rama y etapa", expanded=False):
+                st.dataframe(
+                    pd.DataFrame(
+                        [
+                            {"rama": t["task"], "segundos": t["seconds"], "estado": t["status"]}
+                            for t in timings
+                        ]
+                    ),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+        with st.expander("Detalles de ejecucion (payload y respuesta)", expanded=False):
+            st.code(job.get("request") or "", language="text")
+            st.json(result)
+
+
+def _session_owner() -> str:
+    """Dueño de los trabajos de este navegador; vive en la URL para sobrevivir a una recarga."""
+    owner = st.query_params.get("owner")
+    if not owner:
+        owner = uuid.uuid4().hex
+        st.query_params["owner"] = owner
+    return owner
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_jobs_section() -> None:
+    """Estado de los trabajos en segundo plano; se refresca solo cada JOB_POLL_SECONDS."""
+    jobs = job_runner.list_jobs(limit=JOB_LIST_LIMIT, owner=_session_owner())
+    if not jobs:
+        return
+
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown('<div class="section-title">Migraciones en curso e historial</div>', unsafe_allow_html=True)
+    st.dataframe(
+        pd.DataFrame(
+            [
+                {
+                    "trabajo": job["job_id"],
+                    "estado": JOB_STATUS_LABELS.get(job.get("status"), job.get("status")),
+                    "orquestador": job.get("orchestrator", ""),
+                    "enviado": _format_ts(job.get("submitted_at")),
+                    "inicio": _format_ts(job.get("started_at")),
+                    "fin": _format_ts(job.get("finished_at")),
+                }
+                for job in jobs
+            ]
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    job_ids = [job["job_id"] for job in jobs]
+    default_id = next((job_id for job_id in reversed(st.session_state.get("job_ids", [])) if job_id in job_ids), job_ids[0])
+    selected = st.selectbox("Trabajo", job_ids, index=job_ids.index(default_id), key="job_selected")
+    _render_job_detail(next(job for job in jobs if job["job_id"] == selected))
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
 def render_cta() -> None:
     cols = st.columns([5, 1.2])
     with cols[1]:
         if st.button("Iniciar migracion", use_container_width=True, key="cta_iniciar"):
-            # Preparamos carpeta temporal para guardar los uploads y construir el mensaje para DeepAgents.
-            tmp_dir = Path(st.session_state.get("_tmp_upload_dir") or tempfile.mkdtemp(prefix="aura_uploads_"))
-            st.session_state["_tmp_upload_dir"] = str(tmp_dir)
-
             legacy = st.session_state.get("pdf_antiguo")
             control = st.session_state.get("control_cambios")
             sbs = st.session_state.get("anexos_side")
@@ -358,23 +497,31 @@ def render_cta() -> None:
                 st.error("Falta el PDF del metodo antiguo (obligatorio).")
                 return
 
+            # Cada trabajo guarda sus uploads en su propia carpeta (sin colisiones entre analistas)
+            job = job_runner.create_job(owner=_session_owner())
+            upload_dir = Path(job["uploads_dir"])
+
             payload_lines = []
-            legacy_path = _persist_upload(legacy, tmp_dir).as_posix()
+            legacy_path = _persist_upload(legacy, upload_dir).as_posix()
             payload_lines.append(f"- Metodo analitico legado: '{legacy_path}'.")
+            documents = {"legacy_method": legacy_path}
 
             if control:
-                control_path = _persist_upload(control, tmp_dir).as_posix()
+                control_path = _persist_upload(control, upload_dir).as_posix()
                 payload_lines.append(f"- Control de cambio: '{control_path}'.")
+                documents["change_control"] = control_path
             if sbs:
-                sbs_path = _persist_upload(sbs, tmp_dir).as_posix()
+                sbs_path = _persist_upload(sbs, upload_dir).as_posix()
                 payload_lines.append(f"- Anexo Side by Side: '{sbs_path}'.")
+                documents["side_by_side"] = sbs_path
             if soporte:
                 soporte_files = soporte if isinstance(soporte, list) else [soporte]
-                soporte_paths = _persist_uploads(soporte_files, tmp_dir)
+                soporte_paths = _persist_uploads(soporte_files, upload_dir)
                 for sp in soporte_paths:
                     payload_lines.append(f"- Soportes del metodo: '{sp.as_posix()}'.")
+                documents["reference_methods"] = [sp.as_posix() for sp in soporte_paths]
             if evidencia:
-                evidencia_path = _persist_upload(evidencia, tmp_dir).as_posix()
+                evidencia_path = _persist_upload(evidencia, upload_dir).as_posix()
                 payload_lines.append(f"- Evidencias adicionales: '{evidencia_path}'.")
 
             content = (
@@ -382,47 +529,14 @@ def render_cta() -> None:
                 "al legacy agent, side by side y control de cambios, luego procede con change_implementation_agent:\n\n"
                 + "\n".join(payload_lines)
             )
-            message = {"messages": [{"content": content, "type": "human"}]}
-
-            st.success("Payload generado para DeepAgents.")
-
-            with st.spinner("Ejecutando Aura (DeepAgents)..."):
-                try:
-                    result = am_change_control_agent.invoke(message)
-                    st.success("Ejecucion completada. Buscando DOCX final en output/ ...")
-
-                    docx_path = None
-                    output_dir = Path("output")
-                    if output_dir.exists():
-                        docx_files = sorted(output_dir.glob("*.docx"), key=lambda p: p.stat().st_mtime, reverse=True)
-                        if docx_files:
-                            docx_path = docx_files[0]
-
-                    if docx_path and docx_path.exists():
-                        st.markdown(f"Documento final listo: `{docx_path}`")
-                        dcol, link_col = st.columns([2, 1])
-                        with dcol:
-                            st.download_button(
-                                "Descargar Word final",
-                                data=docx_path.read_bytes(),
-                                file_name=docx_path.name,
-                                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                                use_container_width=True,
-                            )
-                        with link_col:
-                            st.markdown(f"[Abrir en carpeta]({docx_path.as_uri()})")
-                    else:
-                        st.warning("No se encontró un DOCX en la carpeta output/. Revisa el log del agente o ejecuta render_method_docx.")
-
-                    with st.expander("Detalles de ejecucion (payload y respuesta)", expanded=False):
-                        st.code(content, language="text")
-                        try:
-                            st.json(result)
-                        except Exception:
-                            st.write(result)
-                except Exception as exc:  # pragma: no cover - defensivo en UI
-                    st.error(f"Fallo al ejecutar el agente: {exc}")
-                    st.code(json.dumps(message, indent=2), language="json")
+
+            try:
+                job_runner.submit_job(job["job_id"], documents, content, orchestrator=ORCHESTRATOR)
+            except Exception as exc:  # pragma: no cover - defensivo en UI
+                st.error(f"No se pudo encolar la migracion: {exc}")
+                return
+            st.session_state.setdefault("job_ids", []).append(job["job_id"])
+            st.success(f"Migracion en cola: trabajo `{job['job_id']}`. Puedes recargar la pagina; el avance se muestra abajo.")
 
 
 def main() -> None:
@@ -441,6 +555,7 @@ def main() -> None:
 
     st.markdown("<div style='height:8px;'></div>", unsafe_allow_html=True)
     render_cta()
+    render_jobs_section()
     render_table_section()
 
     st.markdown("</div>", unsafe_allow_html=True)
@@ -0,0 +1,21 @@
+"""
+Configuración común de pytest.
+
+Las herramientas crean sus modelos de chat al importarse, por lo que se fijan
+credenciales ficticias; los tests nunca llaman a un LLM. El almacén de blobs,
+la cache LLM y el checkpointer se desactivan para no escribir en ``.cache/``.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("MISTRAL_API_KEY", "test")
+os.environ.setdefault("BLOB_STORE_ENABLED", "0")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("CHECKPOINTER_ENABLED", "0")
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
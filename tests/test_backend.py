@@ -0,0 +1,81 @@
+"""
+``CompactStateBackend`` solo renderiza lo que las herramientas de archivos leen.
+
+``ls`` y ``glob`` listan y miden desde las entradas compactas; ``grep`` renderiza
+únicamente los archivos bajo su ruta y glob.
+"""
+
+import pytest
+
+from src.graph.backend import CompactStateBackend
+from src.utils import file_entries
+
+
+class _Runtime:
+    def __init__(self, files: dict):
+        self.state = {"messages": [], "files": files}
+
+
+@pytest.fixture
+def rendered_paths(monkeypatch):
+    """Registra las rutas que el backend renderiza."""
+    paths = []
+
+    def spy(entry, path=None):
+        paths.append(path)
+        return file_entries.with_rendered_content(entry, path)
+
+    monkeypatch.setattr("src.graph.backend.with_rendered_content", spy)
+    return paths
+
+
+def _backend() -> CompactStateBackend:
+    files = {
+        "/actual_method/metadata.json": {"data": {"markdown_completo": "x" * 5000}, "modified_at": "2025-01-02"},
+        "/actual_method/notes.txt": {"content": ["linea uno", "linea dos"], "modified_at": "2025-01-01"},
+        "/actual_method/big.json": {"blob_ref": {"sha256": "0" * 64, "bytes": 123456}, "modified_at": "2025-01-03"},
+        "/new/method.json": {"data": {"prueba": "Valoración"}, "modified_at": "2025-01-04"},
+        "/removed.json": None,
+    }
+    return CompactStateBackend(_Runtime(files))
+
+
+def test_ls_info_does_not_render(rendered_paths):
+    infos = _backend().ls_info("/actual_method")
+
+    assert [info["path"] for info in infos] == [
+        "/actual_method/big.json",
+        "/actual_method/metadata.json",
+        "/actual_method/notes.txt",
+    ]
+    sizes = {info["path"]: info["size"] for info in infos}
+    assert sizes["/actual_method/big.json"] == 123456
+    assert sizes["/actual_method/notes.txt"] == len("linea uno\nlinea dos")
+    assert sizes["/actual_method/metadata.json"] > 5000
+    assert rendered_paths == []
+
+
+def test_ls_info_lists_subdirectories(rendered_paths):
+    infos = _backend().ls_info("/")
+
+    assert {"path": "/actual_method/", "is_dir": True, "size": 0, "modified_at": ""} in infos
+    assert all(info["path"] != "/removed.json" for info in infos)
+    assert rendered_paths == []
+
+
+def test_glob_info_does_not_render(rendered_paths):
+    infos = _backend().glob_info("**/*.json")
+
+    assert [info["path"] for info in infos] == [
+        "/new/method.json",
+        "/actual_method/big.json",
+        "/actual_method/metadata.json",
+    ]
+    assert rendered_paths == []
+
+
+def test_grep_renders_only_candidates(rendered_paths):
+    matches = _backend().grep_raw("linea", path="/actual_method", glob="*.txt")
+
+    assert [match["line"] for match in matches] == [1, 2]
+    assert rendered_paths == ["/actual_method/notes.txt"]
@@ -0,0 +1,56 @@
+"""
+GC del almacén de blobs: solo se borran blobs sin referencias vivas y con más de
+``max_age_hours`` sin escribirse; la ruta relativa se resuelve en el proyecto.
+"""
+
+import os
+import time
+
+import pytest
+
+from src.utils import blob_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_STORE_PATH", tmp_path / "blobs")
+    return tmp_path / "blobs"
+
+
+def _age(ref: dict, hours: float) -> None:
+    path = blob_store._blob_path(ref["sha256"])
+    stamp = time.time() - hours * 3600
+    os.utime(path, (stamp, stamp))
+
+
+def test_store_path_is_relative_to_the_project():
+    assert blob_store.BLOB_STORE_PATH.is_absolute()
+    assert blob_store.BLOB_STORE_PATH.is_relative_to(blob_store.PROJECT_ROOT)
+
+
+def test_gc_keeps_live_and_recent_blobs(store):
+    live = blob_store.put_blob(b'{"markdown_completo": "vivo"}')
+    stale = blob_store.put_blob(b'{"markdown_completo": "huerfano"}')
+    recent = blob_store.put_blob(b'{"markdown_completo": "en curso"}')
+    _age(live, 48)
+    _age(stale, 48)
+
+    stats = blob_store.collect_garbage({live["sha256"]}, max_age_hours=24)
+
+    assert stats["removed"] == 1
+    assert blob_store.get_blob(live) == {"markdown_completo": "vivo"}
+    assert blob_store.get_blob(recent) == {"markdown_completo": "en curso"}
+    assert not blob_store._blob_path(stale["sha256"]).exists()
+
+
+def test_rewriting_a_blob_renews_its_age(store):
+    ref = blob_store.put_blob(b'{"x": 1}')
+    _age(ref, 48)
+
+    blob_store.put_blob(b'{"x": 1}')
+
+    assert blob_store.collect_garbage(max_age_hours=24)["removed"] == 0
+
+
+def test_gc_without_store_is_a_noop(store):
+    assert blob_store.collect_garbage() == {"kept": 0, "removed": 0, "removed_bytes": 0}
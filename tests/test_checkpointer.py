@@ -0,0 +1,87 @@
+"""
+``CompactSqliteSaver``: la cache de digests solo se actualiza tras un commit y
+un checkpoint con entradas de archivos faltantes no se reanuda en silencio.
+"""
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+from src.graph.checkpointer import CompactSqliteSaver
+
+CONFIG = {"configurable": {"thread_id": "job-1", "checkpoint_ns": ""}}
+
+
+def _checkpoint(saver: CompactSqliteSaver, files: dict) -> tuple:
+    checkpoint = empty_checkpoint()
+    versions = {"files": saver.get_next_version(None, None)}
+    checkpoint["channel_values"] = {"files": files}
+    checkpoint["channel_versions"] = versions
+    return checkpoint, versions
+
+
+def test_failed_put_keeps_the_digest_cache(monkeypatch):
+    saver = CompactSqliteSaver(":memory:")
+    files = {"/actual_method/metodo.json": {"data": {"pruebas": ["Valoración"]}, "modified_at": "t1"}}
+    checkpoint, versions = _checkpoint(saver, files)
+
+    dumps_typed = saver.serde.dumps_typed
+
+    def fail_on_checkpoint(obj):
+        if isinstance(obj, dict) and "channel_versions" in obj:
+            raise RuntimeError("disco lleno")
+        return dumps_typed(obj)
+
+    monkeypatch.setattr(saver.serde, "dumps_typed", fail_on_checkpoint)
+    with pytest.raises(RuntimeError):
+        saver.put(CONFIG, checkpoint, {}, versions)
+    monkeypatch.setattr(saver.serde, "dumps_typed", dumps_typed)
+
+    assert saver._entry_digests == {}
+    assert saver.conn.execute("SELECT COUNT(*) FROM file_entries").fetchone()[0] == 0
+
+    # Las mismas entradas (misma identidad) deben volver a escribirse
+    saver.put(CONFIG, checkpoint, {}, versions)
+    restored = saver.get_tuple({"configurable": {"thread_id": "job-1"}})
+    assert restored.checkpoint["channel_values"]["files"] == files
+
+
+def test_missing_file_entry_is_a_hard_error():
+    saver = CompactSqliteSaver(":memory:")
+    files = {"/actual_method/metodo.json": {"data": {"pruebas": []}, "modified_at": "t1"}}
+    checkpoint, versions = _checkpoint(saver, files)
+    saver.put(CONFIG, checkpoint, {}, versions)
+
+    with saver.conn:
+        saver.conn.execute("DELETE FROM file_entries")
+
+    with pytest.raises(RuntimeError, match="/actual_method/metodo.json"):
+        saver.get_tuple({"configurable": {"thread_id": "job-1"}})
+
+
+def test_vacuum_resets_the_digest_cache():
+    saver = CompactSqliteSaver(":memory:")
+    files = {"/a.json": {"data": {"x": 1}, "modified_at": "t1"}}
+    checkpoint, versions = _checkpoint(saver, files)
+    saver.put(CONFIG, checkpoint, {}, versions)
+
+    saver.delete_thread("job-1")
+    assert saver.vacuum() == 1
+
+    # Sin el reinicio de la cache, el nuevo checkpoint apuntaría a una fila borrada
+    checkpoint, versions = _checkpoint(saver, files)
+    saver.put(CONFIG, checkpoint, {}, versions)
+    restored = saver.get_tuple({"configurable": {"thread_id": "job-1"}})
+    assert restored.checkpoint["channel_values"]["files"] == files
+
+
+def test_blob_digests_lists_referenced_blobs():
+    saver = CompactSqliteSaver(":memory:")
+    files = {
+        "/actual_method/metadata.json": {"blob_ref": {"sha256": "a" * 64, "bytes": 10}, "modified_at": "t1"},
+        "/actual_method/metodo.json": {"data": {"pruebas": []}, "modified_at": "t1"},
+    }
+    checkpoint, versions = _checkpoint(saver, files)
+    config = saver.put(CONFIG, checkpoint, {}, versions)
+    saver.put_writes(config, [("files", {"/new.json": {"blob_ref": {"sha256": "b" * 64, "bytes": 5}}})], "task-1")
+
+    assert saver.blob_digests() == {"a" * 64, "b" * 64}
@@ -0,0 +1,94 @@
+"""
+El payload de ``test_solution_markdown_{source}`` no repite los ítems: cada ítem
+vive en su archivo y el payload solo guarda ``item_index``. Los payloads antiguos
+con ``items`` en línea siguen funcionando.
+
+El pipeline de segmentación se sustituye por uno falso (sin LLM).
+"""
+
+import importlib
+
+import pytest
+
+from src.utils.file_entries import make_file_entry
+from src.utils.markdown_spans import markdown_source_ref
+from src.utils.virtual_fs import VirtualFS
+
+# ``src.tools`` reexporta cada herramienta con el nombre de su módulo
+engine = importlib.import_module("src.tools.clean_markdown_engine")
+extraction = importlib.import_module("src.tools.test_solution_structured_extraction")
+
+SOURCE = "MA-001"
+BASE = "/actual_method"
+METADATA_PATH = engine._metadata_toc_path(BASE, SOURCE)
+PAYLOAD_PATH = engine._markdown_doc_path(BASE, SOURCE)
+MARKDOWN = "# DESARROLLO\n\n5.1 VALORACIÓN\n\nPesar 50 mg.\n\n5.2 DESCRIPCIÓN\n\nPolvo blanco.\n"
+SECTIONS = ["5.1 VALORACIÓN\n\nPesar 50 mg.", "5.2 DESCRIPCIÓN\n\nPolvo blanco."]
+
+
+@pytest.fixture
+def previous_payloads(monkeypatch):
+    """Pipeline falso: un ítem por sección de ``SECTIONS``; registra el payload previo."""
+    seen = []
+
+    def fake_pipeline(full_markdown, profile_name, previous_payload=None):
+        seen.append(previous_payload)
+        items = []
+        for idx, text in enumerate(SECTIONS, 1):
+            start = full_markdown.index(text)
+            items.append({
+                "id": idx,
+                "raw": text.split("\n")[0],
+                "title": text.split("\n")[0].split(" ", 1)[1],
+                "section_id": f"5.{idx}",
+                "markdown": text,
+                "markdown_spans": [[start, start + len(text)]],
+                "content_hash": f"h{idx}",
+            })
+        report = {"chunks": [], "duplicates_collapsed": [], "header_cache": {}, "last_run": {}}
+        return items, report
+
+    monkeypatch.setattr(engine, "run_segmentation_pipeline", fake_pipeline)
+    return seen
+
+
+def _state(markdown: str = MARKDOWN, extra: dict = None) -> dict:
+    return {"messages": [], "files": {METADATA_PATH: make_file_entry({"markdown_completo": markdown}), **(extra or {})}}
+
+
+def _segment(state: dict, incremental: bool = False) -> dict:
+    command = engine.run_clean_markdown_tool(state, "call-1", SOURCE, "legacy", BASE, incremental)
+    return {**state["files"], **command.update["files"]}
+
+
+def test_payload_keeps_only_the_index(previous_payloads):
+    files = _segment(_state())
+    vfs = VirtualFS(files)
+
+    payload = vfs.read_json(PAYLOAD_PATH, expect=dict)
+    assert "items" not in payload
+    assert payload["item_index"] == {str(idx): engine._markdown_item_path(BASE, SOURCE, idx) for idx in (1, 2)}
+    item = vfs.read_json(payload["item_index"]["2"], expect=dict)
+    assert "markdown" not in item and item["markdown_spans"]
+    assert extraction._get_target_item(vfs, payload, 2)["markdown"] == SECTIONS[1]
+
+
+def test_incremental_reads_previous_items_from_their_files(previous_payloads):
+    files = _segment(_state())
+    files[METADATA_PATH] = make_file_entry({"markdown_completo": "Portada\n\n" + MARKDOWN})
+
+    _segment({"messages": [], "files": files}, incremental=True)
+
+    previous = previous_payloads[-1]
+    assert [item["id"] for item in previous["items"]] == [1, 2]
+    assert previous["items"][0]["content_hash"] == "h1"
+
+
+def test_legacy_payload_with_inline_items_still_works(previous_payloads):
+    legacy_items = [{"id": idx, "section_id": f"5.{idx}", "markdown": text} for idx, text in enumerate(SECTIONS, 1)]
+    legacy_payload = {"markdown_source": markdown_source_ref(METADATA_PATH, MARKDOWN), "items": legacy_items}
+    state = _state(extra={PAYLOAD_PATH: make_file_entry(legacy_payload)})
+    vfs = VirtualFS.from_state(state)
+
+    assert extraction._get_target_item(vfs, legacy_payload, 2)["markdown"] == SECTIONS[1]
+    assert engine._load_previous_payload(vfs, PAYLOAD_PATH)["items"] == legacy_items
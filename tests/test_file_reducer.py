@@ -0,0 +1,81 @@
+"""
+``file_reducer`` y ``file_tombstones``: borrado de archivos del filesystem
+virtual con lápidas (``FILE_TOMBSTONE``), directo y a través de un grafo.
+"""
+
+import operator
+from typing import Annotated, Any, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from src.graph.state import FILE_TOMBSTONE, file_reducer, file_tombstones
+
+ENTRY = {"data": {"prueba": "Valoración"}, "modified_at": "2025-01-01T00:00:00+00:00"}
+
+
+def test_file_tombstones_maps_every_path_to_the_tombstone():
+    assert file_tombstones(["/a.json", "/b.json"]) == {"/a.json": FILE_TOMBSTONE, "/b.json": FILE_TOMBSTONE}
+    assert file_tombstones([]) == {}
+
+
+def test_tombstone_removes_an_existing_path():
+    left = {"/a.json": ENTRY, "/b.json": ENTRY}
+
+    merged = file_reducer(left, file_tombstones(["/a.json"]))
+
+    assert merged == {"/b.json": ENTRY}
+    # El estado anterior no se modifica
+    assert "/a.json" in left
+
+
+def test_tombstone_on_a_missing_path_is_a_noop():
+    left = {"/b.json": ENTRY}
+
+    assert file_reducer(left, file_tombstones(["/a.json"])) == {"/b.json": ENTRY}
+
+
+def test_tombstone_when_left_is_none():
+    right = {"/a.json": ENTRY, **file_tombstones(["/b.json"])}
+
+    assert file_reducer(None, right) == {"/a.json": ENTRY}
+    assert file_reducer(None, None) is None
+
+
+def test_right_none_keeps_left():
+    left = {"/a.json": ENTRY}
+
+    assert file_reducer(left, None) is left
+
+
+def test_write_overrides_existing_entry():
+    newer = {**ENTRY, "modified_at": "2025-01-02T00:00:00+00:00"}
+
+    assert file_reducer({"/a.json": ENTRY}, {"/a.json": newer}) == {"/a.json": newer}
+
+
+class _State(TypedDict):
+    files: Annotated[dict[str, Any], file_reducer]
+    visited: Annotated[list[str], operator.add]
+
+
+def test_parallel_write_and_tombstone_in_the_same_step():
+    builder = StateGraph(_State)
+    builder.add_node("seed", lambda state: {
+        "files": {"/temp/1.json": ENTRY, "/temp/2.json": ENTRY},
+        "visited": ["seed"],
+    })
+    builder.add_node("consolidate", lambda state: {
+        "files": {"/final.json": ENTRY, **file_tombstones(["/temp/1.json", "/temp/2.json"])},
+        "visited": ["consolidate"],
+    })
+    builder.add_node("log", lambda state: {"files": {"/log.txt": ENTRY}, "visited": ["log"]})
+    builder.add_edge(START, "seed")
+    builder.add_edge("seed", "consolidate")
+    builder.add_edge("seed", "log")
+    builder.add_edge("consolidate", END)
+    builder.add_edge("log", END)
+
+    result = builder.compile().invoke({"files": {}, "visited": []})
+
+    assert sorted(result["visited"]) == ["consolidate", "log", "seed"]
+    assert result["files"] == {"/final.json": ENTRY, "/log.txt": ENTRY}
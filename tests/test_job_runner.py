@@ -0,0 +1,186 @@
+"""
+Trabajos en segundo plano: ciclo de estados de ``run_job`` con un grafo falso,
+una ejecución sin DOCX cuenta como fallida, recuperación de trabajos al
+arrancar el pool y filtro por dueño de ``list_jobs``.
+"""
+
+import json
+import sys
+import tempfile
+import types
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+from src.graph import job_runner
+from src.graph.job_runner import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    create_job,
+    list_jobs,
+    read_job,
+    read_progress,
+    read_result,
+    recover_jobs,
+    run_job,
+)
+
+PROGRESS_EVENT = {"type": "progress", "tool": "pdf_da_metadata_toc", "stage": "ocr", "status": "done", "item": 2, "total": 2, "ts": 1.0}
+
+
+class _StubGraph:
+    """Grafo falso: emite progreso, escribe (o no) el DOCX y termina con un estado final."""
+
+    def __init__(self, write_docx=True, error=None):
+        self.write_docx = write_docx
+        self.error = error
+        self.calls = []
+
+    def stream(self, graph_input, config, stream_mode, subgraphs):
+        self.calls.append((graph_input, config))
+        yield ("legacy",), "custom", PROGRESS_EVENT
+        yield ("legacy",), "custom", {"type": "otro"}
+        # El tempdir de la ejecución es el tmp/ del trabajo
+        Path(tempfile.mkstemp()[1]).write_text("x")
+        if self.error:
+            raise self.error
+        if self.write_docx:
+            Path(graph_input["output_dir"], "metodo.docx").write_bytes(b"docx")
+        yield ("legacy",), "values", {"messages": [{"content": "subgrafo"}]}
+        yield (), "values", {"messages": [{"content": "Migración lista"}], "timings": [{"step": "render"}], "errors": []}
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    stub = _StubGraph()
+    builder = types.ModuleType("src.graph.builder")
+    builder.am_change_control_pipeline = stub
+    builder.am_change_control_agent = stub
+    monkeypatch.setitem(sys.modules, "src.graph.builder", builder)
+    return stub
+
+
+def _queued_job(jobs_dir: Path, owner: str = "navegador-a") -> dict:
+    job = create_job(owner=owner, jobs_dir=jobs_dir)
+    job_runner._update_job(
+        job["job_id"], jobs_dir, status=STATUS_QUEUED, documents={"legacy_method": "legado.pdf"}, request="migrar"
+    )
+    return job
+
+
+def test_create_job_allocates_isolated_directories(tmp_path):
+    job = create_job(owner="navegador-a", jobs_dir=tmp_path)
+
+    root = tmp_path / job["job_id"]
+    assert all((root / name).is_dir() for name in ("uploads", "output", "tmp"))
+    assert read_job(job["job_id"], tmp_path) == job
+    assert job["status"] == "created" and job["owner"] == "navegador-a"
+
+
+def test_run_job_completes_when_a_docx_is_written(tmp_path, graph):
+    job = _queued_job(tmp_path)
+    previous_tempdir = tempfile.tempdir
+
+    assert run_job(job["job_id"], str(tmp_path)) == STATUS_COMPLETED
+
+    final = read_job(job["job_id"], tmp_path)
+    assert final["status"] == STATUS_COMPLETED
+    assert final["artifacts"] == [str(Path(job["output_dir"]) / "metodo.docx")]
+    assert final["error"] is None and final["started_at"] <= final["finished_at"]
+    assert read_result(job["job_id"], tmp_path) == {
+        "timings": [{"step": "render"}], "errors": [], "message": "Migración lista"
+    }
+    # Solo los eventos de progreso llegan a progress.jsonl
+    lines = (tmp_path / job["job_id"] / "progress.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [PROGRESS_EVENT]
+    (row,) = read_progress(job["job_id"], tmp_path).rows(now=1.0)
+    assert (row["tool"], row["item"], row["status"]) == ("pdf_da_metadata_toc", 2, "done")
+    # El grafo corre con el id del trabajo como thread_id y el tempdir se restaura
+    assert graph.calls[0][1] == {"configurable": {"thread_id": job["job_id"]}}
+    assert list((tmp_path / job["job_id"] / "tmp").iterdir())
+    assert tempfile.tempdir == previous_tempdir
+
+
+def test_run_without_docx_counts_as_failed(tmp_path, graph):
+    graph.write_docx = False
+    job = _queued_job(tmp_path)
+
+    assert run_job(job["job_id"], str(tmp_path)) == STATUS_FAILED
+
+    final = read_job(job["job_id"], tmp_path)
+    assert final["status"] == STATUS_FAILED
+    assert final["artifacts"] == []
+    assert "sin generar un DOCX" in final["error"]
+
+
+def test_graph_error_fails_the_job(tmp_path, graph):
+    graph.error = RuntimeError("OCR no disponible")
+    job = _queued_job(tmp_path)
+
+    assert run_job(job["job_id"], str(tmp_path)) == STATUS_FAILED
+
+    final = read_job(job["job_id"], tmp_path)
+    assert final["error"] == "OCR no disponible"
+    assert "RuntimeError" in final["traceback"]
+
+
+def test_agent_orchestrator_receives_the_request(tmp_path, graph):
+    job = _queued_job(tmp_path)
+    job_runner._update_job(job["job_id"], tmp_path, orchestrator=job_runner.ORCHESTRATOR_AGENT)
+
+    run_job(job["job_id"], str(tmp_path))
+
+    graph_input = graph.calls[0][0]
+    assert graph_input["messages"][0]["content"].startswith("migrar")
+    assert job["output_dir"] in graph_input["messages"][0]["content"]
+
+
+class _RecordingPool:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(STATUS_QUEUED)
+        return future
+
+
+def test_recover_jobs_fails_running_and_resubmits_queued(tmp_path):
+    running = _queued_job(tmp_path)
+    job_runner._update_job(running["job_id"], tmp_path, status=STATUS_RUNNING)
+    queued = _queued_job(tmp_path)
+    finished = _queued_job(tmp_path)
+    job_runner._update_job(finished["job_id"], tmp_path, status=STATUS_COMPLETED)
+    pool = _RecordingPool()
+
+    recover_jobs(pool, tmp_path)
+
+    assert read_job(running["job_id"], tmp_path)["status"] == STATUS_FAILED
+    assert "reinicio" in read_job(running["job_id"], tmp_path)["error"]
+    assert pool.submitted == [(queued["job_id"], str(tmp_path))]
+    assert read_job(finished["job_id"], tmp_path)["status"] == STATUS_COMPLETED
+
+
+def test_crashed_worker_marks_the_job_failed(tmp_path):
+    job = _queued_job(tmp_path)
+    future = Future()
+    future.set_exception(RuntimeError("proceso terminado"))
+
+    job_runner._log_job_outcome(job["job_id"], tmp_path, future)
+
+    assert read_job(job["job_id"], tmp_path)["status"] == STATUS_FAILED
+
+
+def test_list_jobs_filters_by_owner(tmp_path):
+    first, other, second = (create_job(owner=owner, jobs_dir=tmp_path) for owner in ("navegador-a", "navegador-b", "navegador-a"))
+    for created_at, job in enumerate((first, other, second)):
+        job_runner._update_job(job["job_id"], tmp_path, created_at=created_at)
+
+    assert [job["job_id"] for job in list_jobs(tmp_path, owner="navegador-a")] == [second["job_id"], first["job_id"]]
+    assert [job["job_id"] for job in list_jobs(tmp_path, owner="navegador-b")] == [other["job_id"]]
+    assert len(list_jobs(tmp_path)) == 3
+    assert len(list_jobs(tmp_path, limit=1)) == 1
@@ -0,0 +1,87 @@
+"""
+Caché LLM: hit/miss, desalojo LRU, desactivación con ``LLM_CACHE_ENABLED=0`` y
+ruta anclada a la raíz del proyecto.
+"""
+
+import importlib
+import itertools
+from pathlib import Path
+
+import pytest
+
+from src.utils import llm_cache
+
+
+class _Clock:
+    """Reloj monótono: cada lectura avanza un segundo (sin empates de ``last_access``)."""
+
+    def __init__(self):
+        self._ticks = itertools.count(1)
+
+    def time(self):
+        return float(next(self._ticks))
+
+
+@pytest.fixture(autouse=True)
+def cache_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "llm_cache.sqlite")
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", path)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "time", _Clock())
+    yield path
+    connection = llm_cache._connections.pop(path, None)
+    if connection is not None:
+        connection.close()
+
+
+def test_miss_then_hit():
+    key = llm_cache.llm_cache_key({"markdown": "5.1 VALORACIÓN"}, "v1", "modelo")
+
+    assert llm_cache.cache_get("extraccion", key) is None
+    llm_cache.cache_put("extraccion", key, {"tests": [{"prueba": "Valoración"}]})
+
+    assert llm_cache.cache_get("extraccion", key) == {"tests": [{"prueba": "Valoración"}]}
+    assert llm_cache.cache_get("otro_namespace", key) is None
+
+
+def test_key_changes_with_prompt_version_and_model():
+    payload = {"markdown": "5.1 VALORACIÓN"}
+    key = llm_cache.llm_cache_key(payload, "v1", "modelo")
+
+    assert key == llm_cache.llm_cache_key({"markdown": "5.1 VALORACIÓN"}, "v1", "modelo")
+    assert key != llm_cache.llm_cache_key(payload, "v2", "modelo")
+    assert key != llm_cache.llm_cache_key(payload, "v1", "otro_modelo")
+
+
+def test_least_recently_used_entries_are_evicted(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_ENTRIES", 2)
+    llm_cache.cache_put("ns", "a", 1)
+    llm_cache.cache_put("ns", "b", 2)
+    # Leer "a" lo vuelve el más reciente: el desalojado al insertar "c" es "b"
+    assert llm_cache.cache_get("ns", "a") == 1
+
+    llm_cache.cache_put("ns", "c", 3)
+
+    assert llm_cache.cache_get("ns", "b") is None
+    assert llm_cache.cache_get("ns", "a") == 1
+    assert llm_cache.cache_get("ns", "c") == 3
+
+
+def test_disabled_cache_neither_reads_nor_writes(monkeypatch, cache_db):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+
+    llm_cache.cache_put("ns", "a", 1)
+
+    assert llm_cache.cache_get("ns", "a") is None
+    assert not Path(cache_db).exists()
+
+
+def test_default_path_is_anchored_to_the_project_root(monkeypatch, tmp_path):
+    monkeypatch.delenv("LLM_CACHE_PATH", raising=False)
+    monkeypatch.chdir(tmp_path)
+    try:
+        reloaded = importlib.reload(llm_cache)
+        assert reloaded.LLM_CACHE_PATH == str(Path(__file__).resolve().parents[1] / ".cache" / "llm_cache.sqlite")
+    finally:
+        monkeypatch.undo()
+        importlib.reload(llm_cache)
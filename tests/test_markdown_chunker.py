@@ -0,0 +1,122 @@
+"""
+``chunk_markdown_by_structure``: tablas indivisibles, encabezados como inicio de
+sección, respaldo al splitter para secciones que no caben y offsets/hashes
+estables.
+
+El conteo de tokens usa un encoder de palabras determinista (sin descargar el
+encoding de tiktoken).
+"""
+
+import re
+
+import pytest
+
+from src.utils import token_counter
+from src.utils.markdown_chunker import chunk_markdown_by_structure
+
+
+class _WordEncoder:
+    def encode_ordinary(self, text):
+        return re.findall(r"\S+", text)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(token_counter, "get_encoder", lambda model_name=None: _WordEncoder())
+    token_counter.get_text_splitter.cache_clear()
+    yield
+    token_counter.get_text_splitter.cache_clear()
+
+
+def _paragraph(word: str, count: int) -> str:
+    return " ".join([word] * count) + "\n"
+
+
+TABLE = "".join(
+    ["| Parámetro | Criterio |\n", "|---|---|\n"]
+    + [f"| Resolución {i} | NLT 2.0 entre picos {i} y {i + 1} |\n" for i in range(8)]
+)
+
+MARKDOWN = (
+    "# 7 DESARROLLO\n\n"
+    + _paragraph("introduccion", 10)
+    + "\n## 7.1 DESCRIPCION\n\n"
+    + _paragraph("polvo", 20)
+    + "\n## 7.2 VALORACION\n\n"
+    + _paragraph("procedimiento", 40)
+    + "\n"
+    + TABLE
+    + "\n"
+    + _paragraph("calculos", 40)
+    + "\n7.3 IDENTIFICACION\n\n"
+    + _paragraph("espectro", 15)
+)
+
+
+def _contiguous(chunks) -> bool:
+    return all(prev["end"] == nxt["start"] for prev, nxt in zip(chunks, chunks[1:]))
+
+
+def test_tables_are_never_split():
+    table_start = MARKDOWN.index(TABLE)
+    table_end = table_start + len(TABLE)
+    table_tokens = token_counter.count_tokens(TABLE)
+
+    # Presupuestos donde la tabla cabe pero su sección (7.2) no
+    for max_tokens in (table_tokens, table_tokens + 20, table_tokens + 50):
+        chunks = chunk_markdown_by_structure(MARKDOWN, max_tokens=max_tokens)
+        holders = [chunk for chunk in chunks if chunk["start"] < table_end and chunk["end"] > table_start]
+        assert len(holders) == 1, f"tabla repartida con max_tokens={max_tokens}"
+        assert holders[0]["start"] <= table_start and holders[0]["end"] >= table_end
+
+
+def test_headings_start_new_sections():
+    chunks = chunk_markdown_by_structure(MARKDOWN, max_tokens=30)
+
+    titles = [title for chunk in chunks for title in chunk["sections"]]
+    assert titles == ["7 DESARROLLO", "7.1 DESCRIPCION", "7.2 VALORACION", "7.3 IDENTIFICACION"]
+    piece_starts = {piece["start"] for chunk in chunks for piece in chunk["pieces"]}
+    for heading in ("# 7 DESARROLLO", "## 7.1 DESCRIPCION", "## 7.2 VALORACION", "7.3 IDENTIFICACION"):
+        assert MARKDOWN.index(heading) in piece_starts, f"{heading} no inicia una pieza"
+
+
+def test_sections_are_packed_while_they_fit():
+    chunks = chunk_markdown_by_structure(MARKDOWN, max_tokens=1000)
+
+    assert len(chunks) == 1
+    assert chunks[0]["text"] == MARKDOWN
+
+
+def test_oversized_section_falls_back_to_the_splitter():
+    markdown = "# 5.1 VALORACION\n\n" + " ".join(f"palabra{i}." for i in range(300)) + "\n"
+
+    chunks = chunk_markdown_by_structure(markdown, max_tokens=50)
+
+    assert len(chunks) > 1
+    assert all(chunk["token_count"] <= 50 for chunk in chunks)
+    assert _contiguous(chunks)
+    assert "".join(chunk["text"] for chunk in chunks) == markdown
+    assert chunks[0]["sections"] == ["5.1 VALORACION"]
+    assert all(chunk["sections"] == [] for chunk in chunks[1:])
+
+
+def test_offsets_and_hashes_are_stable():
+    first = chunk_markdown_by_structure(MARKDOWN, max_tokens=60)
+    second = chunk_markdown_by_structure(MARKDOWN, max_tokens=60)
+
+    assert first == second
+    assert _contiguous(first)
+    for chunk in first:
+        assert chunk["text"] == MARKDOWN[chunk["start"]:chunk["end"]]
+
+    # Editar la última sección no cambia el hash de las piezas anteriores
+    edited = MARKDOWN.replace("espectro", "espectro IR")
+    before = [piece["hash"] for chunk in first for piece in chunk["pieces"]]
+    after = [piece["hash"] for chunk in chunk_markdown_by_structure(edited, max_tokens=60) for piece in chunk["pieces"]]
+    assert before[:-1] == after[:-1]
+    assert before[-1] != after[-1]
+
+
+def test_empty_markdown_has_no_chunks():
+    assert chunk_markdown_by_structure("", max_tokens=50) == []
+    assert chunk_markdown_by_structure("  \n\n", max_tokens=50) == []
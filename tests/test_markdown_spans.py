@@ -0,0 +1,54 @@
+"""
+``locate_markdown_spans`` busca cada pieza solo hacia adelante; si no la
+encuentra, el ítem conserva su ``markdown`` en línea.
+"""
+
+from src.utils.markdown_spans import locate_markdown_spans, materialize_item_markdown
+
+CANONICAL = (
+    "# ÍNDICE\n\n"
+    "5.2 DESCRIPCIÓN\n\n"
+    "5.1 VALORACIÓN\n\n"
+    "# DESARROLLO\n\n"
+    "5.1 VALORACIÓN\n\nPesar 50 mg.\n\n"
+    "5.2 DESCRIPCIÓN\n\nPolvo blanco.\n"
+)
+
+
+def test_pieces_are_located_in_order():
+    chunks = ["5.1 VALORACIÓN\n\nPesar 50 mg.", "5.2 DESCRIPCIÓN\n\nPolvo blanco."]
+
+    spans = locate_markdown_spans(chunks, CANONICAL)
+
+    assert [CANONICAL[start:end] for start, end in spans] == chunks
+    assert spans[0][0] > CANONICAL.index("# DESARROLLO")
+
+
+def test_repeated_piece_binds_after_the_previous_one():
+    # El título suelto también aparece en el índice, antes de la primera pieza
+    chunks = ["# DESARROLLO", "5.2 DESCRIPCIÓN"]
+
+    spans = locate_markdown_spans(chunks, CANONICAL)
+
+    assert spans[1][0] == CANONICAL.index("5.2 DESCRIPCIÓN", CANONICAL.index("# DESARROLLO"))
+
+
+def test_piece_only_found_earlier_keeps_inline_markdown():
+    # La segunda pieza solo existe antes de la primera: no se vuelve al inicio
+    chunks = ["5.2 DESCRIPCIÓN\n\nPolvo blanco.", "5.1 VALORACIÓN\n\nPesar 50 mg."]
+
+    assert locate_markdown_spans(chunks, CANONICAL) is None
+
+
+def test_materialize_joins_located_pieces():
+    chunks = ["5.1 VALORACIÓN\n\nPesar 50 mg.", "5.2 DESCRIPCIÓN\n\nPolvo blanco."]
+    item = {"id": 1, "markdown_spans": locate_markdown_spans(chunks, CANONICAL)}
+
+    assert materialize_item_markdown(item, CANONICAL) == {"id": 1, "markdown": "\n\n".join(chunks)}
+
+
+def test_materialize_without_canonical_returns_none():
+    item = {"id": 1, "markdown_spans": [[0, 5]]}
+
+    assert materialize_item_markdown(item, None) is None
+    assert materialize_item_markdown({"id": 2, "markdown": "x"}, None) == {"id": 2, "markdown": "x"}
@@ -0,0 +1,291 @@
+"""
+Pipeline determinista con herramientas falsas: rutas según los documentos,
+rechazo de entradas inválidas, barreras de ingesta y de parches, y entrega al
+supervisor cuando un paso falla.
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from src.graph import pipeline
+from src.graph.state import FILE_TOMBSTONE
+from src.utils.file_entries import make_file_entry
+from src.utils.stage_manifest import PATCHES_DIR, PLAN_PATH
+
+TOOL_NAMES = [
+    "pdf_da_metadata_toc",
+    "test_solution_clean_markdown",
+    "test_solution_clean_markdown_sbs",
+    "test_solution_structured_extraction_batch",
+    "consolidate_test_solution_structured",
+    "extract_annex_cc",
+    "sbs_proposed_column_to_pdf_md",
+    "resolve_source_references",
+    "analyze_change_impact",
+    "apply_method_patch",
+    "consolidate_new_method",
+    "render_method_docx",
+]
+
+
+class _FakeTool:
+    """Herramienta falsa: registra la llamada y escribe un archivo por invocación."""
+
+    def __init__(self, name, calls, lock):
+        self.name = name
+        self.calls = calls
+        self.lock = lock
+        self.fail_when = lambda args: False
+        self.on_call = lambda args, files: None
+
+    def invoke(self, tool_call):
+        args = dict(tool_call["args"])
+        files = args.pop("state")["files"]
+        with self.lock:
+            self.calls.append((self.name, args, set(files)))
+        self.on_call(args, files)
+        message = ToolMessage(f"{self.name} ejecutada", tool_call_id=tool_call["id"])
+        if self.fail_when(args):
+            return SimpleNamespace(update={"messages": [ToolMessage(f"{self.name} falló", tool_call_id=tool_call["id"])]})
+        return SimpleNamespace(update={"files": self._written(args), "messages": [message]})
+
+    def _written(self, args):
+        if self.name == "apply_method_patch":
+            return {f"{PATCHES_DIR}/{args['action_index']}.json": make_file_entry(args)}
+        key = args.get("source_file_name") or args.get("dir_method") or args.get("dir_document") or ""
+        return {f"/fake/{self.name}/{key}.json": make_file_entry(args)}
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    calls, lock = [], threading.Lock()
+    fakes = {name: _FakeTool(name, calls, lock) for name in TOOL_NAMES}
+    for name, fake in fakes.items():
+        monkeypatch.setattr(pipeline, name, fake)
+    fakes["calls"] = calls
+    return fakes
+
+
+def _plan(tools, actions: int) -> None:
+    """``analyze_change_impact`` escribe un plan con ``actions`` acciones."""
+    analyze = tools["analyze_change_impact"]
+    plan = {"plan_intervencion": [{"accion": "editar", "id_prueba": f"5.{idx}"} for idx in range(actions)]}
+    analyze._written = lambda args: {PLAN_PATH: make_file_entry(plan)}
+
+
+class _FakeSupervisor:
+    def __init__(self):
+        self.inputs = []
+
+    def invoke(self, graph_input):
+        self.inputs.append(graph_input)
+        return {"files": graph_input["files"], "messages": [AIMessage(content="Retomado por el supervisor")]}
+
+
+def _run(documents, supervisor=None, **extra):
+    graph = pipeline.build_pipeline(fallback_agent=supervisor)
+    return graph.invoke({"documents": documents, **extra})
+
+
+def _called(tools):
+    return [name for name, _, _ in tools["calls"]]
+
+
+FULL = {
+    "legacy_method": "/uploads/MA-001.pdf",
+    "change_control": "/uploads/CC-7.pdf",
+    "side_by_side": "/uploads/SBS-7.pdf",
+    "reference_methods": ["/uploads/USP.pdf"],
+}
+
+
+def test_legacy_only_skips_change_stages(tools):
+    result = _run({"legacy_method": "/uploads/MA-001.pdf"}, output_dir="/jobs/1/output")
+
+    assert _called(tools) == [
+        "pdf_da_metadata_toc",
+        "test_solution_clean_markdown",
+        "test_solution_structured_extraction_batch",
+        "consolidate_test_solution_structured",
+        "consolidate_new_method",
+        "render_method_docx",
+    ]
+    assert tools["calls"][-1][1] == {"output_dir": "/jobs/1/output"}
+    assert not result.get("errors")
+
+
+def test_full_flow_runs_every_branch_then_the_change_stages(tools):
+    _plan(tools, actions=3)
+
+    result = _run(FULL)
+
+    called = _called(tools)
+    ingestion = called[: called.index("resolve_source_references")]
+    assert sorted(ingestion) == sorted([
+        *["pdf_da_metadata_toc", "test_solution_clean_markdown", "test_solution_structured_extraction_batch", "consolidate_test_solution_structured"] * 2,
+        "extract_annex_cc",
+        "sbs_proposed_column_to_pdf_md",
+        "test_solution_clean_markdown_sbs",
+        "test_solution_structured_extraction_batch",
+        "consolidate_test_solution_structured",
+    ])
+    assert called[len(ingestion):] == [
+        "resolve_source_references",
+        "analyze_change_impact",
+        "apply_method_patch",
+        "apply_method_patch",
+        "apply_method_patch",
+        "consolidate_new_method",
+        "render_method_docx",
+    ]
+    assert {f"{PATCHES_DIR}/{idx}.json" for idx in range(3)} <= set(result["files"])
+    assert not result.get("errors")
+
+
+def test_ingestion_barrier_reports_every_branch(tools):
+    result = _run(FULL)
+
+    join = next(timing for timing in result["timings"] if timing["task"] == pipeline.NODE_INGEST_JOIN)
+    assert {step["tool"] for step in join["steps"]} == {
+        "legacy_method", "change_control", "side_by_side", "reference_method:USP"
+    }
+    # La barrera corre una sola vez, tras todas las ramas
+    assert [timing["task"] for timing in result["timings"]].count(pipeline.NODE_INGEST_JOIN) == 1
+
+
+def test_steps_of_a_branch_see_the_files_of_the_previous_steps(tools):
+    _run({"legacy_method": "/uploads/MA-001.pdf"})
+
+    seen = {name: files for name, _, files in tools["calls"]}
+    assert "/fake/pdf_da_metadata_toc//uploads/MA-001.pdf.json" in seen["test_solution_clean_markdown"]
+    assert "/fake/test_solution_clean_markdown/MA-001.json" in seen["test_solution_structured_extraction_batch"]
+
+
+def test_documents_without_change_control_are_rejected_before_ingestion(tools):
+    result = _run({"legacy_method": "/uploads/MA-001.pdf", "side_by_side": "/uploads/SBS-7.pdf"})
+
+    assert tools["calls"] == []
+    assert [error["task"] for error in result["errors"]] == [pipeline.NODE_REJECT]
+    assert "change_control" in result["errors"][0]["error"]
+    assert result["messages"][-1].content.startswith("No se puede iniciar la migración")
+
+
+def test_missing_legacy_method_is_rejected(tools):
+    result = _run({"change_control": "/uploads/CC-7.pdf"})
+
+    assert tools["calls"] == []
+    assert "legacy_method" in result["errors"][0]["error"]
+
+
+def test_failed_ingestion_branch_goes_to_the_supervisor(tools):
+    tools["sbs_proposed_column_to_pdf_md"].fail_when = lambda args: True
+    supervisor = _FakeSupervisor()
+
+    result = _run(FULL, supervisor)
+
+    called = _called(tools)
+    assert "test_solution_clean_markdown_sbs" not in called
+    assert "resolve_source_references" not in called
+    # Las demás ramas terminaron y sus archivos llegan al supervisor
+    assert "consolidate_test_solution_structured" in called
+    (request,) = supervisor.inputs
+    assert "/fake/consolidate_test_solution_structured/MA-001.json" in request["files"]
+    assert "sbs_proposed_column_to_pdf_md" in request["messages"][0].content
+    assert result["errors"][0]["tool"] == "sbs_proposed_column_to_pdf_md"
+    assert result["messages"][-1].content == "Retomado por el supervisor"
+
+
+def test_apply_actions_run_in_parallel_and_see_the_plan(tools):
+    _plan(tools, actions=3)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def wait_for_all(args, files):
+        assert PLAN_PATH in files
+        barrier.wait()
+
+    tools["apply_method_patch"].on_call = wait_for_all
+
+    result = _run(FULL)
+
+    assert not result.get("errors")
+    assert sorted(args["action_index"] for name, args, _ in tools["calls"] if name == "apply_method_patch") == [0, 1, 2]
+
+
+def test_failed_action_skips_consolidation_and_keeps_the_other_patches(tools):
+    _plan(tools, actions=3)
+    tools["apply_method_patch"].fail_when = lambda args: args["action_index"] == 1
+    supervisor = _FakeSupervisor()
+
+    result = _run(FULL, supervisor)
+
+    called = _called(tools)
+    assert called.count("apply_method_patch") == 3
+    assert "consolidate_new_method" not in called
+    assert [error["task"] for error in result["errors"]] == ["apply_method_patch:1"]
+    patches = {path for path in supervisor.inputs[0]["files"] if path.startswith(PATCHES_DIR)}
+    assert patches == {f"{PATCHES_DIR}/0.json", f"{PATCHES_DIR}/2.json"}
+
+
+def test_plan_without_actions_goes_straight_to_consolidation(tools):
+    _plan(tools, actions=0)
+
+    _run(FULL)
+
+    called = _called(tools)
+    assert "apply_method_patch" not in called
+    assert called[-2:] == ["consolidate_new_method", "render_method_docx"]
+
+
+def test_apply_progress_events_reach_the_stream(tools):
+    _plan(tools, actions=2)
+    graph = pipeline.build_pipeline()
+
+    events = list(graph.stream({"documents": FULL}, stream_mode="custom"))
+
+    stages = {event["stage"] for event in events if event.get("tool") == "pipeline"}
+    assert {"apply_method_patch:0", "apply_method_patch:1"} <= stages
+
+
+def test_tool_exception_is_recorded_as_an_error(tools):
+    def explode(args, files):
+        raise RuntimeError("plantilla inválida")
+
+    tools["render_method_docx"].on_call = explode
+
+    result = _run({"legacy_method": "/uploads/MA-001.pdf"})
+
+    assert result["errors"] == [{
+        "task": "render_method_docx", "stage": "render_method_docx", "tool": "render_method_docx",
+        "args": {}, "error": "plantilla inválida",
+    }]
+
+
+def test_fallback_without_supervisor_ends_the_run(tools):
+    tools["render_method_docx"].fail_when = lambda args: True
+
+    result = _run({"legacy_method": "/uploads/MA-001.pdf"})
+
+    assert result["errors"][0]["tool"] == "render_method_docx"
+
+
+def test_fallback_returns_only_the_supervisor_changes():
+    kept = make_file_entry({"a": 1})
+    state = {
+        "documents": {"legacy_method": "/uploads/MA-001.pdf"},
+        "files": {"/kept.json": kept, "/consumed.json": make_file_entry({"b": 2})},
+        "errors": [{"task": "t", "tool": "x", "args": {}, "error": "falló"}],
+    }
+    new_entry = make_file_entry({"c": 3})
+
+    class _Supervisor:
+        def invoke(self, graph_input):
+            return {"files": {"/kept.json": kept, "/new.json": new_entry}, "messages": [AIMessage(content="ok")]}
+
+    update = pipeline.make_fallback_node(_Supervisor())(state)
+
+    assert update["files"] == {"/consumed.json": FILE_TOMBSTONE, "/new.json": new_entry}
+    assert [message.content for message in update["messages"]] == ["ok"]
+    assert pipeline.make_fallback_node(None)(state) == {}
@@ -0,0 +1,102 @@
+"""
+``ProgressBoard`` agrega los eventos por (rama, herramienta, etapa) y marca como
+detenidas las etapas en curso sin eventos durante más de ``stall_seconds``.
+"""
+
+import pytest
+
+from src.utils import progress
+from src.utils.progress import ProgressBoard, ProgressReporter, progress_task
+
+
+def _event(status, ts, tool="extraction_batch", stage="extraction", task="", **fields):
+    event = {"type": "progress", "tool": tool, "stage": stage, "status": status, "ts": ts, **fields}
+    if task:
+        event["task"] = task
+    return event
+
+
+def test_events_fold_into_one_row_per_stage():
+    board = ProgressBoard()
+    board.update(_event("start", 100.0, total=4, elapsed=0.0, message="4 ítems"))
+    board.update(_event("item", 110.0, item=1, tokens=500, elapsed=10.0))
+    board.update(_event("item", 130.0, item=2, tokens=900, elapsed=30.0, failed=True, message="Falló el id 2"))
+
+    (row,) = board.rows(now=130.0)
+
+    assert row["status"] == "item"
+    assert (row["item"], row["total"], row["tokens"]) == (2, 4, 900)
+    assert row["failed"] == 1
+    assert row["message"] == "Falló el id 2"
+    assert row["items_per_min"] == 4.0
+    assert row["idle_seconds"] == 0.0
+
+
+def test_fields_missing_from_an_event_keep_their_last_value():
+    board = ProgressBoard()
+    board.update(_event("item", 100.0, item=3, total=5, elapsed=12.0, message="id 3"))
+    board.update(_event("done", 105.0))
+
+    (row,) = board.rows(now=105.0)
+
+    assert (row["item"], row["total"], row["elapsed"], row["message"]) == (3, 5, 12.0, "id 3")
+    assert row["status"] == "done"
+
+
+def test_same_tool_in_different_tasks_is_tracked_separately():
+    board = ProgressBoard()
+    board.update(_event("start", 100.0, task="legacy"))
+    board.update(_event("start", 100.0, task="side_by_side"))
+    board.update(_event("error", 101.0, task="side_by_side", message="OCR falló"))
+
+    rows = {row["task"]: row for row in board.rows(now=101.0)}
+
+    assert set(rows) == {"legacy", "side_by_side"}
+    assert rows["legacy"]["failed"] == 0
+    assert rows["side_by_side"]["failed"] == 1
+
+
+@pytest.mark.parametrize(
+    "status,now,stalled",
+    [
+        ("start", 160.0, True),
+        ("item", 160.0, True),
+        ("item", 150.0, False),  # justo en el umbral: aún no está detenida
+        ("done", 500.0, False),
+        ("error", 500.0, False),
+    ],
+)
+def test_stall_detection(status, now, stalled):
+    board = ProgressBoard(stall_seconds=50)
+    board.update(_event(status, 100.0))
+
+    assert board.rows(now=now)[0]["stalled"] is stalled
+    assert bool(board.stalled(now=now)) is stalled
+
+
+def test_reporter_events_feed_the_board(monkeypatch):
+    events = []
+    monkeypatch.setattr(progress, "get_stream_writer", lambda: events.append)
+
+    with progress_task("legacy"):
+        reporter = ProgressReporter("pdf_da_metadata_toc", "ocr", total=2)
+    reporter.start()
+    reporter.advance("chunk 1", tokens=100)
+    reporter.advance("chunk 2", tokens=50, failed=True)
+    reporter.done()
+
+    board = ProgressBoard()
+    for event in events:
+        assert progress.is_progress_event(event)
+        board.update(event)
+    (row,) = board.rows()
+
+    assert (row["task"], row["tool"], row["stage"]) == ("legacy", "pdf_da_metadata_toc", "ocr")
+    assert (row["status"], row["item"], row["total"], row["tokens"], row["failed"]) == ("done", 2, 2, 150, 1)
+    assert row["stalled"] is False
+
+
+def test_reporter_outside_a_graph_does_not_fail():
+    reporter = ProgressReporter("herramienta", "etapa")
+
+    assert reporter.advance()["item"] == 1
@@ -0,0 +1,63 @@
+"""
+El cache de lecturas pertenece a cada ejecución (``thread_id``) y se puede
+descartar al terminar un job.
+"""
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.utils import read_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    read_cache.clear_read_cache()
+    yield
+    read_cache.clear_read_cache()
+
+
+def _read_in_run(thread_id, key, loader):
+    read = RunnableLambda(lambda _: read_cache.cached_read(key, loader))
+    return read.invoke(None, config={"configurable": {"thread_id": thread_id}})
+
+
+def test_runs_do_not_share_entries():
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {"data": [1, 2]}
+
+    first = _read_in_run("job-a", ("/a.json", "t1"), loader)
+    again = _read_in_run("job-a", ("/a.json", "t1"), loader)
+    other = _read_in_run("job-b", ("/a.json", "t1"), loader)
+
+    assert first is again
+    assert other is not first
+    assert len(loads) == 2
+
+
+def test_clear_drops_only_that_run():
+    _read_in_run("job-a", ("/a.json", "t1"), lambda: {"a": 1})
+    _read_in_run("job-b", ("/b.json", "t1"), lambda: {"b": 1})
+
+    read_cache.clear_read_cache("job-a")
+
+    info = read_cache.read_cache_info()
+    assert info["runs"] == 1
+    assert info["size"] == 1
+
+
+def test_oldest_runs_are_evicted(monkeypatch):
+    monkeypatch.setattr(read_cache, "READ_CACHE_RUNS", 2)
+    for job in ("job-a", "job-b", "job-c"):
+        _read_in_run(job, ("/a.json", "t1"), lambda: {"a": 1})
+
+    assert read_cache.read_cache_info()["runs"] == 2
+
+
+def test_outside_a_graph_uses_a_shared_scope():
+    value = read_cache.cached_read(("/a.json", "t1"), lambda: {"a": 1})
+
+    assert read_cache.cached_read(("/a.json", "t1"), lambda: {"a": 2}) is value
+    assert read_cache.read_cache_info()["runs"] == 1
@@ -0,0 +1,147 @@
+"""
+Subagentes con alcance: ``files_delta`` devuelve solo lo que cambió dentro de
+los prefijos de escritura, y cada herramienta de un subagente escribe dentro
+de esos prefijos (si no, su salida se descartaría en silencio).
+"""
+
+import importlib
+import logging
+
+import pytest
+
+from src.agents import sub_agents_config
+from src.agents.scoped_subagents import files_delta, scope_files
+from src.graph.state import FILE_TOMBSTONE
+from src.utils import stage_manifest
+
+ENTRY = {"data": {"prueba": "Valoración"}, "modified_at": "2025-01-01T00:00:00+00:00"}
+WRITE = ("/new/", "/logs/")
+
+
+def test_files_delta_reports_new_replaced_and_deleted_paths():
+    kept = dict(ENTRY)
+    before = {"/new/plan.json": ENTRY, "/new/old.json": ENTRY, "/new/kept.json": kept}
+    replaced = {**ENTRY, "modified_at": "2025-01-02T00:00:00+00:00"}
+    after = {"/new/plan.json": replaced, "/new/kept.json": kept, "/new/method.json": ENTRY}
+
+    delta = files_delta(before, after, WRITE)
+
+    assert delta == {
+        "/new/plan.json": replaced,
+        "/new/method.json": ENTRY,
+        "/new/old.json": FILE_TOMBSTONE,
+    }
+
+
+def test_files_delta_skips_equal_entries_with_new_identity():
+    before = {"/new/plan.json": ENTRY}
+
+    assert files_delta(before, {"/new/plan.json": dict(ENTRY)}, WRITE) == {}
+
+
+def test_files_delta_drops_out_of_scope_writes(caplog):
+    before = {"/actual_method/metadata.json": ENTRY}
+    after = {"/proposed_method/metadata.json": ENTRY, "/new/plan.json": ENTRY}
+
+    with caplog.at_level(logging.WARNING, logger="src.agents.scoped_subagents"):
+        delta = files_delta(before, after, WRITE, "change_implementation_agent")
+
+    # Ni la escritura fuera de alcance ni una lápida para la ruta de solo lectura
+    assert delta == {"/new/plan.json": ENTRY}
+    assert "/proposed_method/metadata.json" in caplog.text
+
+
+def test_scope_files_keeps_only_visible_prefixes():
+    files = {"/actual_method/metadata.json": ENTRY, "/new/plan.json": ENTRY, "/logs/x.jsonl": ENTRY}
+
+    assert scope_files(files, ("/new/", "/logs/")) == {"/new/plan.json": ENTRY, "/logs/x.jsonl": ENTRY}
+
+
+# --- Cobertura del alcance de escritura ---
+
+def _module(name: str):
+    # ``src.tools`` reexporta cada herramienta con el nombre de su módulo
+    return importlib.import_module(f"src.tools.{name}")
+
+
+def _ingestion_outputs(base: str, source: str = "MA-001") -> dict:
+    engine = _module("clean_markdown_engine")
+    extraction = _module("test_solution_structured_extraction")
+    consolidate = _module("consolidate_test_solution_structured")
+    markdown_outputs = [
+        engine._markdown_doc_path(base, source),
+        engine._markdown_item_path(base, source, 0),
+    ]
+    return {
+        "pdf_da_metadata_toc": [engine._metadata_toc_path(base, source)],
+        "sbs_proposed_column_to_pdf_md": [
+            f"{_module('sbs_proposed_column').DEFAULT_BASE_PATH}/method_metadata_TOC_{source}.json"
+        ],
+        "test_solution_clean_markdown": markdown_outputs,
+        "test_solution_clean_markdown_sbs": markdown_outputs,
+        "test_solution_structured_extraction": [extraction._structured_temp_path(base, source, 0)],
+        "test_solution_structured_extraction_batch": [extraction._structured_temp_path(base, source, 0)],
+        "consolidate_test_solution_structured": [
+            consolidate._structured_content_path(base, source),
+            consolidate._analytical_tests_path(source),
+            # Lápidas de los temporales consumidos
+            f"{consolidate._temp_structured_dir(base, source)}/0.json",
+        ],
+    }
+
+
+def _change_control_outputs() -> dict:
+    annex = _module("extract_annex_cc")
+    # El change_control_agent siempre usa document_type="change_control"
+    return {"extract_annex_cc": [annex.filenames["change_control"], annex.summary_filenames["change_control"]]}
+
+
+def _implementation_outputs() -> dict:
+    patch = _module("apply_method_patch")
+    consolidate = _module("consolidate_new_method")
+    resolve = _module("resolve_source_references")
+    analyze = _module("analyze_change_impact")
+    record = stage_manifest._stage_record_path
+    return {
+        "resume_change_implementation": [],
+        "resolve_source_references": [
+            resolve.CC_SUMMARY_PATH,
+            *stage_manifest.STAGES[0]["outputs"],
+            record(stage_manifest.STAGE_RESOLVE),
+        ],
+        "analyze_change_impact": [analyze.CHANGE_IMPLEMENTATION_PLAN_PATH, record(stage_manifest.STAGE_ANALYZE)],
+        "apply_method_patch": [
+            patch.PATCH_LOG_PATH,
+            f"{patch.PATCHES_DIR}/0.json",
+            patch.METHOD_DEFAULT_PATH,
+            stage_manifest._action_record_path(0),
+        ],
+        "consolidate_new_method": [
+            consolidate.METHOD_DEFAULT_PATH,
+            f"{consolidate.PATCHES_DIR_DEFAULT}/0.json",
+            record(stage_manifest.STAGE_CONSOLIDATE),
+        ],
+        "render_method_docx": [stage_manifest.RENDERED_DOCX_INFO_PATH, record(stage_manifest.STAGE_RENDER)],
+    }
+
+
+SUBAGENT_OUTPUTS = [
+    (sub_agents_config.legacy_migration_subagent, lambda: _ingestion_outputs("/actual_method")),
+    (sub_agents_config.side_by_side_subagent, lambda: _ingestion_outputs("/proposed_method")),
+    (sub_agents_config.reference_methods_subagent, lambda: _ingestion_outputs("/proposed_method")),
+    (sub_agents_config.change_control_subagent, _change_control_outputs),
+    (sub_agents_config.change_implementation_agent, _implementation_outputs),
+]
+
+
+@pytest.mark.parametrize(
+    "spec,outputs", [pytest.param(spec, outputs, id=spec["name"]) for spec, outputs in SUBAGENT_OUTPUTS]
+)
+def test_tool_outputs_fall_inside_write_scope(spec, outputs):
+    write_prefixes = tuple(spec["file_scope"]["write"])
+    tool_outputs = outputs()
+
+    for tool in spec["tools"]:
+        assert tool.name in tool_outputs, f"{tool.name}: declara sus rutas de salida en este test"
+        outside = [path for path in tool_outputs[tool.name] if not path.startswith(write_prefixes)]
+        assert not outside, f"{spec['name']}/{tool.name} escribe fuera de {write_prefixes}: {outside}"
@@ -0,0 +1,205 @@
+"""
+Manifiesto de etapas: cada etapa registrada queda vigente mientras no cambien
+sus entradas ni sus salidas; ``resume_change_implementation`` reporta la primera
+etapa que hay que repetir.
+
+Las herramientas se simulan escribiendo sus salidas y registrando la etapa como
+lo hacen ellas (hash de entrada antes de escribir, registro después).
+"""
+
+import pytest
+
+from src.tools.resume_change_implementation import resume_change_implementation
+from src.utils import stage_manifest as sm
+from src.utils.virtual_fs import VirtualFS
+
+PLAN = {"plan_intervencion": [{"accion": "editar", "id_prueba": "5.1"}, {"accion": "adicionar", "id_prueba": "5.9"}]}
+
+
+def _step(files: dict, run) -> None:
+    """Ejecuta ``run(vfs)`` y aplica su delta a ``files`` como el reducer."""
+    vfs = VirtualFS(files)
+    run(vfs)
+    for path, entry in vfs.updates.items():
+        if entry is None:
+            files.pop(path, None)
+        else:
+            files[path] = entry
+
+
+def _resolve(vfs):
+    input_hash = sm.stage_input_hash(vfs, sm.STAGE_RESOLVE)
+    for path in sm.STAGES[0]["outputs"]:
+        vfs.write_json(path, {"fuente": path})
+    sm.record_stage(vfs, sm.STAGE_RESOLVE, input_hash)
+
+
+def _analyze(vfs, plan=PLAN):
+    input_hash = sm.stage_input_hash(vfs, sm.STAGE_ANALYZE)
+    vfs.write_json(sm.PLAN_PATH, plan)
+    sm.record_stage(vfs, sm.STAGE_ANALYZE, input_hash)
+
+
+def _apply(vfs, indices=(0, 1)):
+    actions = vfs.read_json(sm.PLAN_PATH, expect=dict)["plan_intervencion"]
+    for idx in indices:
+        input_hash = sm.apply_action_input_hash(vfs, actions[idx])
+        patch_path = f"{sm.PATCHES_DIR}/{idx}.json"
+        vfs.write_json(patch_path, {"action_index": idx, **actions[idx]})
+        sm.record_apply_action(vfs, idx, input_hash, patch_path)
+
+
+def _consolidate(vfs):
+    input_hash = sm.stage_input_hash(vfs, sm.STAGE_CONSOLIDATE)
+    vfs.write_json(sm.METHOD_FINAL_PATH, {"pruebas": [{"id_prueba": "5.1"}, {"id_prueba": "5.9"}]})
+    for path in vfs.listdir(sm.PATCHES_DIR):
+        vfs.delete(path)
+    sm.record_stage(vfs, sm.STAGE_CONSOLIDATE, input_hash)
+
+
+def _render(template, docx):
+    def run(vfs):
+        input_hash = sm.stage_input_hash(vfs, sm.STAGE_RENDER, extra=sm.disk_file_hash(template))
+        docx.write_bytes(b"docx")
+        vfs.write_json(sm.RENDERED_DOCX_INFO_PATH, {"docx_path": str(docx)})
+        sm.record_stage(vfs, sm.STAGE_RENDER, input_hash, template_path=str(template), docx_path=str(docx))
+    return run
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / "Plantilla.docx"
+    path.write_bytes(b"plantilla v1")
+    return path
+
+
+@pytest.fixture
+def files():
+    return {
+        "/actual_method/method_metadata_TOC_MA-001.json": {"data": {"markdown_completo": "# MA-001"}},
+        "/proposed_method/method_metadata_TOC_REF-1.json": {"data": {"markdown_completo": "# REF-1"}},
+        "/change_control/change_control_summary.json": {"data": {"cambios": ["5.1", "5.9"]}},
+        "/actual_method/test_solution_structured_content_MA-001.json": {"data": [{"tests": [{"prueba": "5.1"}]}]},
+    }
+
+
+@pytest.fixture
+def completed(files, template, tmp_path):
+    for run in (_resolve, _analyze, _apply, _consolidate, _render(template, tmp_path / "metodo.docx")):
+        _step(files, run)
+    return files
+
+
+def _status(files: dict) -> dict:
+    return sm.stage_status(VirtualFS(files))
+
+
+def _by_stage(report: dict) -> dict:
+    return {status["stage"]: status["status"] for status in report["stages"]}
+
+
+def test_empty_flow_starts_from_the_first_stage(files):
+    report = _status(files)
+
+    assert report["resume_from"] == sm.STAGE_RESOLVE
+    assert set(_by_stage(report).values()) == {"pendiente"}
+
+
+def test_recorded_stages_are_current(completed):
+    report = _status(completed)
+
+    assert report["resume_from"] is None
+    assert set(_by_stage(report).values()) == {"vigente"}
+    assert all(path not in completed for path in (f"{sm.PATCHES_DIR}/0.json", f"{sm.PATCHES_DIR}/1.json"))
+
+
+def test_each_stage_resumes_after_the_last_recorded_one(files, template, tmp_path):
+    steps = [
+        (_resolve, sm.STAGE_ANALYZE),
+        (_analyze, sm.STAGE_APPLY),
+        (_apply, sm.STAGE_CONSOLIDATE),
+        (_consolidate, sm.STAGE_RENDER),
+        (_render(template, tmp_path / "metodo.docx"), None),
+    ]
+    for run, expected in steps:
+        _step(files, run)
+        assert _status(files)["resume_from"] == expected
+
+
+def test_template_change_invalidates_only_the_render_stage(completed, template):
+    template.write_bytes(b"plantilla v2")
+
+    report = _status(completed)
+
+    assert report["resume_from"] == sm.STAGE_RENDER
+    assert _by_stage(report)[sm.STAGE_CONSOLIDATE] == "vigente"
+    assert _by_stage(report)[sm.STAGE_RENDER] == "desactualizada"
+
+
+def test_missing_docx_invalidates_the_render_stage(completed, tmp_path):
+    (tmp_path / "metodo.docx").unlink()
+
+    assert _status(completed)["resume_from"] == sm.STAGE_RENDER
+
+
+def test_changed_input_invalidates_the_stage_and_the_following_ones(completed):
+    completed["/change_control/change_control_summary.json"] = {"data": {"cambios": ["5.1"]}}
+
+    report = _status(completed)
+
+    assert report["resume_from"] == sm.STAGE_ANALYZE
+    assert _by_stage(report)[sm.STAGE_RESOLVE] == "vigente"
+    assert _by_stage(report)[sm.STAGE_RENDER] == "pendiente"
+
+
+def test_only_unapplied_actions_are_pending(files):
+    for run in (_resolve, _analyze, lambda vfs: _apply(vfs, indices=(0,))):
+        _step(files, run)
+
+    report = _status(files)
+
+    assert report["resume_from"] == sm.STAGE_APPLY
+    assert report["pending_actions"] == [1]
+
+
+def test_stale_consolidation_reapplies_consumed_patches(completed):
+    completed[sm.METHOD_FINAL_PATH] = {"data": {"pruebas": []}}
+
+    report = _status(completed)
+
+    assert report["resume_from"] == sm.STAGE_APPLY
+    assert report["pending_actions"] == [0, 1]
+    assert _by_stage(report)[sm.STAGE_CONSOLIDATE] == "pendiente"
+
+
+def test_legacy_only_flow_skips_change_stages():
+    files = {"/actual_method/test_solution_structured_content_MA-001.json": {"data": [{"tests": []}]}}
+
+    report = _status(files)
+
+    assert report["resume_from"] == sm.STAGE_CONSOLIDATE
+    assert _by_stage(report)[sm.STAGE_RESOLVE] == "no aplica"
+
+
+def _resume_message(files: dict) -> str:
+    command = resume_change_implementation.invoke(
+        {"type": "tool_call", "id": "call-1", "name": resume_change_implementation.name, "args": {"state": {"messages": [], "files": files}}}
+    )
+    return command.update["messages"][0].content
+
+
+def test_resume_tool_reports_the_next_stage(completed, template):
+    assert "Todas las etapas están vigentes" in _resume_message(completed)
+
+    template.write_bytes(b"plantilla v2")
+    assert "Reanudar desde: render_method_docx" in _resume_message(completed)
+
+
+def test_resume_tool_lists_pending_actions(files):
+    for run in (_resolve, _analyze, lambda vfs: _apply(vfs, indices=(1,))):
+        _step(files, run)
+
+    message = _resume_message(files)
+
+    assert "Reanudar desde: apply_method_patch" in message
+    assert "action_index: 0" in message
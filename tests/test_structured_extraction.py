@@ -0,0 +1,241 @@
+"""
+Extracción por sub-esquemas: degradación a extracción completa ante cualquier
+fallo y límite compartido de llamadas simultáneas al LLM. Un markdown canónico
+modificado tras la segmentación se rechaza sin llamar al LLM.
+
+El LLM se sustituye por modelos falsos; los tests nunca llaman a un proveedor.
+"""
+
+import asyncio
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.models import structured_test_model as models
+from src.utils.file_entries import make_file_entry
+from src.utils.markdown_spans import markdown_source_ref
+from src.utils.virtual_fs import VirtualFS
+
+# ``src.tools`` reexporta la herramienta con el mismo nombre que el módulo
+extraction = importlib.import_module("src.tools.test_solution_structured_extraction")
+batch = importlib.import_module("src.tools.test_solution_structured_extraction_batch")
+
+
+class _FailingSliceModel:
+    def __init__(self, schema, calls):
+        self.schema = schema
+        self.calls = calls
+
+    def _respond(self):
+        self.calls.append(self.schema.__name__)
+        if self.schema is models.TestSolutions:
+            return models.TestSolutions(tests=[])
+        if self.schema is extraction.SLICE_MODELS["calculos"]:
+            raise RuntimeError("respuesta truncada")
+        return self.schema.model_construct()
+
+    def invoke(self, messages):
+        return self._respond()
+
+    async def ainvoke(self, messages):
+        return self._respond()
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.calls = []
+
+    def with_structured_output(self, schema):
+        return _FailingSliceModel(schema, self.calls)
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    llm = _FakeLLM()
+    monkeypatch.setattr(extraction, "llm_model", llm)
+    return llm
+
+
+def test_slice_failure_falls_back_to_full(fake_llm):
+    result = extraction._extract_part("## 5.1 VALORACIÓN", sliced=True, id=1)
+
+    assert result == {"tests": []}
+    assert fake_llm.calls.count("TestSolutions") == 1
+    assert len(fake_llm.calls) == len(extraction.SLICE_MODELS) + 1
+
+
+def test_async_slice_failure_falls_back_to_full(fake_llm):
+    result = asyncio.run(extraction._aextract_part("## 5.1 VALORACIÓN", sliced=True, id=1))
+
+    assert result == {"tests": []}
+    assert fake_llm.calls.count("TestSolutions") == 1
+    assert len(fake_llm.calls) == len(extraction.SLICE_MODELS) + 1
+
+
+class _CountingModel:
+    """Modelo falso que registra el máximo de llamadas simultáneas."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def with_structured_output(self, schema):
+        return self
+
+    def _enter(self):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self._lock:
+            self.active -= 1
+
+    def invoke(self, messages):
+        self._enter()
+        time.sleep(0.02)
+        self._exit()
+        return models.TestSolutions(tests=[])
+
+    async def ainvoke(self, messages):
+        self._enter()
+        await asyncio.sleep(0.02)
+        self._exit()
+        return models.TestSolutions(tests=[])
+
+
+def test_sliced_calls_share_the_llm_limit(monkeypatch):
+    llm = _CountingModel()
+    monkeypatch.setattr(extraction, "llm_model", llm)
+    monkeypatch.setattr(extraction, "_llm_slots", threading.BoundedSemaphore(2))
+
+    # 4 ítems sliced a la vez: sin el limitador serían hasta 24 llamadas simultáneas
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda item_id: extraction._extract_part("## 5.1", True, item_id), range(4)))
+
+    assert llm.peak == 2
+
+
+def test_async_sliced_calls_share_the_llm_limit(monkeypatch):
+    llm = _CountingModel()
+    monkeypatch.setattr(extraction, "llm_model", llm)
+    monkeypatch.setattr(extraction, "LLM_MAX_CONCURRENCY", 2)
+
+    async def run():
+        await asyncio.gather(*(extraction._aextract_part("## 5.1", True, item_id) for item_id in range(4)))
+
+    asyncio.run(run())
+
+    assert llm.peak == 2
+
+
+# --- Markdown canónico modificado tras la segmentación ---
+
+SOURCE = "MA-001"
+METADATA_PATH = f"/actual_method/method_metadata_TOC_{SOURCE}.json"
+CANONICAL = "# ÍNDICE\n\n5.1 VALORACIÓN\n\n# DESARROLLO\n\n5.1 VALORACIÓN\n\nPesar 50 mg.\n"
+
+
+def _segmented_state(markdown: str) -> dict:
+    """Estado tras segmentar ``CANONICAL`` con la metadata actual en ``markdown``."""
+    item_path = f"/actual_method/test_solution_markdown_{SOURCE}/1.json"
+    start = CANONICAL.index("5.1 VALORACIÓN", CANONICAL.index("# DESARROLLO"))
+    item = {"id": 1, "section_id": "5.1", "title": "VALORACIÓN", "markdown_spans": [[start, len(CANONICAL) - 1]]}
+    payload = {
+        "markdown_source": markdown_source_ref(METADATA_PATH, CANONICAL),
+        "items": [item],
+        "item_index": {"1": item_path},
+    }
+    return {
+        "messages": [],
+        "files": {
+            METADATA_PATH: make_file_entry({"markdown_completo": markdown}),
+            f"/actual_method/test_solution_markdown_{SOURCE}.json": make_file_entry(payload),
+            item_path: make_file_entry(item),
+        },
+    }
+
+
+class _ForbiddenLLM:
+    def with_structured_output(self, schema):
+        raise AssertionError("no se debe llamar al LLM con un ítem obsoleto")
+
+
+@pytest.fixture
+def no_llm_writes(monkeypatch):
+    puts = []
+    monkeypatch.setattr(extraction, "llm_model", _ForbiddenLLM())
+    monkeypatch.setattr(extraction, "cache_put", lambda *args: puts.append(args))
+    return puts
+
+
+def _tool_message(command) -> str:
+    assert "files" not in command.update
+    return command.update["messages"][0].content
+
+
+def test_stale_canonical_markdown_is_rejected(no_llm_writes):
+    state = _segmented_state(CANONICAL.replace("50 mg", "100 mg"))
+
+    command = extraction._test_solution_structured_extraction(1, SOURCE, state, "call-1")
+
+    assert "Re-ejecuta la segmentación" in _tool_message(command)
+    assert no_llm_writes == []
+
+
+def test_batch_rejects_stale_canonical_markdown(no_llm_writes):
+    state = _segmented_state(CANONICAL.replace("50 mg", "100 mg"))
+
+    command = batch._test_solution_structured_extraction_batch(SOURCE, state, "call-1")
+    async_command = asyncio.run(batch._atest_solution_structured_extraction_batch(SOURCE, state, "call-2"))
+
+    assert "Re-ejecuta la segmentación" in _tool_message(command)
+    assert "Re-ejecuta la segmentación" in _tool_message(async_command)
+    assert no_llm_writes == []
+
+
+def test_missing_canonical_markdown_is_rejected(no_llm_writes):
+    state = _segmented_state(CANONICAL)
+    del state["files"][METADATA_PATH]
+
+    command = extraction._test_solution_structured_extraction(1, SOURCE, state, "call-1")
+
+    assert "Re-ejecuta la segmentación" in _tool_message(command)
+    assert no_llm_writes == []
+
+
+def test_current_canonical_markdown_materializes_the_item():
+    state = _segmented_state(CANONICAL)
+    vfs = VirtualFS.from_state(state)
+    payload, error = extraction._load_markdown_payload(vfs, "/actual_method", SOURCE)
+
+    assert error is None
+    assert extraction._get_target_item(vfs, payload, 1)["markdown"] == "5.1 VALORACIÓN\n\nPesar 50 mg."
+
+
+# --- ids del batch ---
+
+@pytest.mark.parametrize(
+    "ids,expected",
+    [("all", [1, 2, 12]), ("12", [12]), ("3,4", [3, 4]), (" 3, 4 ,3 ", [3, 4]), ([2, "5", 2], [2, 5]), (7, [7])],
+)
+def test_resolve_ids(ids, expected):
+    items = [{"id": 1}, {"id": 2}, {"id": 12}]
+
+    assert batch._resolve_ids(items, ids) == expected
+
+
+@pytest.mark.parametrize("ids", ["", "uno", "3,x", "[3, 4]"])
+def test_resolve_ids_rejects_other_strings(ids):
+    with pytest.raises(ValueError, match="ids inválido"):
+        batch._resolve_ids([{"id": 1}], ids)
+
+
+def test_batch_reports_invalid_ids(no_llm_writes):
+    command = batch._test_solution_structured_extraction_batch(SOURCE, _segmented_state(CANONICAL), "call-1", ids="uno")
+
+    assert "ids inválido" in _tool_message(command)
@@ -0,0 +1,95 @@
+"""
+Las herramientas devuelven en ``Command.update["files"]`` solo lo que escribieron.
+
+El estado de entrada incluye un ``markdown_completo`` de varios MB; si alguna
+herramienta volviera a copiar ``state["files"]`` completo, el update lo
+arrastraría y superaría la cota de bytes.
+"""
+
+import json
+
+import pytest
+
+from src.graph.state import FILE_TOMBSTONE
+from src.tools.consolidate_new_method import consolidate_new_method
+from src.tools.consolidate_test_solution_structured import consolidate_test_solution_structured
+from src.utils.file_entries import make_file_entry
+from src.utils.stage_manifest import METHOD_FINAL_PATH, PATCHES_DIR, STAGE_MANIFEST_DIR
+
+SOURCE = "metodo_legado"
+METADATA_PATH = f"/actual_method/method_metadata_TOC_{SOURCE}.json"
+STRUCTURED_PATH = f"/actual_method/test_solution_structured_content_{SOURCE}.json"
+TEMP_DIR = f"/temp_actual_method/{SOURCE}"
+MARKDOWN_BYTES = 3 * 1024 * 1024
+# Cota holgada para lo que escriben las herramientas; muy por debajo del markdown
+MAX_UPDATE_BYTES = 64 * 1024
+
+
+def _test(name: str, idx: int) -> dict:
+    return {
+        "section_id": f"5.{idx}",
+        "prueba": name,
+        "procedimientos": [{"texto": f"Procedimiento de {name}"}],
+        "especificaciones": [{"prueba": name, "texto_especificacion": "Cumple"}],
+    }
+
+
+def _large_state(extra_files: dict) -> dict:
+    markdown = "# METODO\n" + ("Linea de procedimiento analitico. " * 32 + "\n") * (MARKDOWN_BYTES // 1024)
+    files = {
+        METADATA_PATH: {"data": {"markdown_completo": markdown, "tipo_metodo": "MA", "codigo_producto": "P-01"}},
+        **extra_files,
+    }
+    return {"messages": [], "files": files}
+
+
+def _invoke(tool, state: dict, **args) -> dict:
+    command = tool.invoke({"type": "tool_call", "id": "call-1", "name": tool.name, "args": {**args, "state": state}})
+    return command.update
+
+
+def _update_bytes(files_update: dict) -> int:
+    return len(json.dumps(files_update, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def test_consolidate_test_solution_structured_returns_only_written_and_tombstoned_keys():
+    temp_paths = [f"{TEMP_DIR}/{idx}.json" for idx in range(1, 6)]
+    state = _large_state(
+        {path: make_file_entry({"source_id": idx, "tests": [_test(f"Prueba {idx}", idx)]}) for idx, path in enumerate(temp_paths, 1)}
+    )
+
+    update = _invoke(consolidate_test_solution_structured, state, source_file_name=SOURCE, base_path="/actual_method")
+    files_update = update["files"]
+
+    assert set(files_update) == {STRUCTURED_PATH, f"/analytical_tests/{SOURCE}.json", *temp_paths}
+    assert all(files_update[path] is FILE_TOMBSTONE for path in temp_paths)
+    assert METADATA_PATH not in files_update
+    assert _update_bytes(files_update) < MAX_UPDATE_BYTES
+
+
+def test_consolidate_new_method_returns_only_written_and_tombstoned_keys():
+    patch_paths = [f"{PATCHES_DIR}/{idx}.json" for idx in range(3)]
+    patches = {
+        patch_paths[0]: make_file_entry({"action_index": 0, "accion": "editar", "id_prueba": "5.1", "prueba": "Prueba 1", "contenido": _test("Prueba 1 editada", 1)}),
+        patch_paths[1]: make_file_entry({"action_index": 1, "accion": "eliminar", "id_prueba": "5.2", "prueba": "Prueba 2"}),
+        patch_paths[2]: make_file_entry({"action_index": 2, "accion": "adicionar", "id_prueba": "5.9", "prueba": "Prueba 9", "contenido": _test("Prueba 9", 9)}),
+    }
+    structured = [{"source_id": idx, "tests": [_test(f"Prueba {idx}", idx)]} for idx in range(1, 4)]
+    state = _large_state({STRUCTURED_PATH: make_file_entry(structured), **patches})
+
+    update = _invoke(consolidate_new_method, state)
+    files_update = update["files"]
+
+    manifest_paths = {path for path in files_update if path.startswith(f"{STAGE_MANIFEST_DIR}/")}
+    assert manifest_paths, "consolidate_new_method debe registrar su etapa"
+    assert set(files_update) - manifest_paths == {METHOD_FINAL_PATH, *patch_paths}
+    assert all(files_update[path] is FILE_TOMBSTONE for path in patch_paths)
+    assert METADATA_PATH not in files_update and STRUCTURED_PATH not in files_update
+    assert _update_bytes(files_update) < MAX_UPDATE_BYTES
+
+
+@pytest.mark.parametrize("tool", [consolidate_test_solution_structured, consolidate_new_method])
+def test_tools_without_input_return_no_files(tool):
+    args = {"source_file_name": SOURCE} if tool is consolidate_test_solution_structured else {}
+    update = _invoke(tool, _large_state({}), **args)
+    assert not update.get("files")